@@ -0,0 +1,125 @@
+"""文档检索基准：扁平检索 vs 两阶段检索（先选工具再检索 chunk）vs BM25 + 向量混合检索
+
+用法：
+    python benchmark_doc_retrieval.py [--queries labeled.jsonl] [--samples 200] [--top-m 3] [--k 4]
+
+labeled.jsonl 每行 {"question": ..., "tool": ...}；不提供时从文档库中随机抽取 chunk，
+用 chunk 开头的一段文字作为查询，该 chunk 所属的工具和 chunk 本身作为标准答案。
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+sys.path.append('../src')
+from docQA import docs_filter_expr, iter_docs_rows
+from registry import registry
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def sample_queries(samples, query_chars=200, seed=0):
+    """从文档库中抽样 chunk 构造查询"""
+    rows = list(iter_docs_rows(["pk", "tool_name", "text"]))
+    random.Random(seed).shuffle(rows)
+    return [
+        {"question": row["text"][:query_chars], "tool": row["tool_name"], "pk": row["pk"]}
+        for row in rows[:samples]
+    ]
+
+
+def load_queries(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_benchmark(queries, top_m=3, k=4):
+    vectorstore = registry.get("tool_docs_vectorstore")
+    start = time.perf_counter()
+    index = registry.get("tool_docs_index")
+    index_build_seconds = time.perf_counter() - start
+
+    hybrid = registry.get("hybrid_doc_retriever")
+
+    latencies = {"embed": [], "flat": [], "route": [], "two_stage_search": [], "hybrid": []}
+    hits = {"flat_tool": 0, "flat_chunk": 0, "route_tool": 0, "two_stage_tool": 0, "two_stage_chunk": 0,
+            "hybrid_tool": 0, "hybrid_chunk": 0}
+    with_pk = sum(1 for q in queries if "pk" in q)
+
+    for query in queries:
+        t = time.perf_counter()
+        vector = vectorstore.embeddings.embed_query(query["question"])
+        latencies["embed"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        flat = vectorstore.similarity_search_by_vector(vector, k=k)
+        latencies["flat"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        tools = [tool for tool, _ in index.route(vector, query["question"], top_m)]
+        latencies["route"].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        two_stage = vectorstore.similarity_search_by_vector(vector, k=k, expr=docs_filter_expr(tools)) if tools else []
+        latencies["two_stage_search"].append(time.perf_counter() - t)
+
+        # 混合检索包含自己的 embedding 请求和 BM25 检索
+        t = time.perf_counter()
+        hybrid_docs = hybrid.search(query["question"], k=k)
+        latencies["hybrid"].append(time.perf_counter() - t)
+
+        hits["flat_tool"] += any(d.metadata.get("tool_name") == query["tool"] for d in flat)
+        hits["route_tool"] += query["tool"] in tools
+        hits["two_stage_tool"] += any(d.metadata.get("tool_name") == query["tool"] for d in two_stage)
+        hits["hybrid_tool"] += any(d.metadata.get("tool_name") == query["tool"] for d in hybrid_docs)
+        if "pk" in query:
+            hits["flat_chunk"] += any(d.metadata.get("pk") == query["pk"] for d in flat)
+            hits["two_stage_chunk"] += any(d.metadata.get("pk") == query["pk"] for d in two_stage)
+            hits["hybrid_chunk"] += any(d.metadata.get("pk") == query["pk"] for d in hybrid_docs)
+
+    n = len(queries)
+    two_stage_total = [r + s for r, s in zip(latencies["route"], latencies["two_stage_search"])]
+    return {
+        "queries": n,
+        "tools": len(index),
+        "top_m": top_m,
+        "k": k,
+        "index_build_seconds": index_build_seconds,
+        "recall": {
+            f"flat_tool@{k}": hits["flat_tool"] / n,
+            f"route_tool@{top_m}": hits["route_tool"] / n,
+            f"two_stage_tool@{k}": hits["two_stage_tool"] / n,
+            f"flat_chunk@{k}": hits["flat_chunk"] / with_pk if with_pk else None,
+            f"two_stage_chunk@{k}": hits["two_stage_chunk"] / with_pk if with_pk else None,
+            f"hybrid_tool@{k}": hits["hybrid_tool"] / n,
+            f"hybrid_chunk@{k}": hits["hybrid_chunk"] / with_pk if with_pk else None,
+        },
+        "latency_ms": {
+            name: {"p50": percentile(values, 0.5) * 1000, "p95": percentile(values, 0.95) * 1000,
+                   "mean": statistics.mean(values) * 1000}
+            for name, values in {**latencies, "two_stage_total": two_stage_total}.items() if values
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", help="带标注的查询 JSONL 文件")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--top-m", type=int, default=3)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--output", default="doc_retrieval_benchmark.json")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else sample_queries(args.samples)
+    report = run_benchmark(queries, top_m=args.top_m, k=args.k)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
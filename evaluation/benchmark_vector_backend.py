@@ -0,0 +1,104 @@
+"""工具库向量检索后端基准：Milvus Lite vs NumPy（float / int8 / binary 量化）
+
+用法：
+    python benchmark_vector_backend.py [--queries 200] [--k 5] [--noise 0.05]
+
+查询向量取自库中随机抽样的向量加高斯噪声，不需要 embedding 服务；
+以 NumPy float 精确检索结果为标准答案计算 recall@k，同时统计单条/批量查询延迟和索引占用。
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.append('../src')
+from numpy_store import NumpyVectorStore
+from registry import registry
+import toolRecommend
+
+
+def latency_summary(values):
+    values = sorted(values)
+    return {
+        "p50": values[len(values) // 2] * 1000,
+        "p95": values[min(len(values) - 1, int(0.95 * len(values)))] * 1000,
+        "mean": statistics.mean(values) * 1000,
+    }
+
+
+def recall(results, truth):
+    return statistics.mean(len(set(r) & set(t)) / len(t) for r, t in zip(results, truth) if t)
+
+
+def run_benchmark(n_queries=200, k=5, noise=0.05, seed=0):
+    embedding = registry.get(toolRecommend.current_embedding_model)
+    exact = NumpyVectorStore.load(toolRecommend.TOOLS_NUMPY_INDEX_PATH, embedding, "none") \
+        if os.path.exists(toolRecommend.TOOLS_NUMPY_INDEX_PATH) else toolRecommend.export_tools_to_numpy()
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(exact), size=min(n_queries, len(exact)), replace=False)
+    vectors = np.asarray(exact.vectors)[rows]
+    queries = vectors + rng.normal(0, noise, vectors.shape).astype(np.float32)
+
+    truth = [[exact.ids[i] for i, _ in hits] for hits in exact.batch_search(queries, k)]
+    report = {"rows": len(exact), "dim": int(vectors.shape[1]), "queries": len(queries), "k": k, "backends": {}}
+
+    milvus = toolRecommend.load_tools_milvus()
+    latencies, results = [], []
+    for query in queries:
+        t = time.perf_counter()
+        docs = milvus.similarity_search_by_vector(query.tolist(), k=k)
+        latencies.append(time.perf_counter() - t)
+        results.append([str(doc.metadata["pk"]) for doc in docs])
+    report["backends"]["milvus"] = {"recall": recall(results, truth), "latency_ms": latency_summary(latencies)}
+
+    for quantization in ("none", "int8", "binary"):
+        store = NumpyVectorStore(embedding, quantization)
+        store.ids, store.texts, store.metadatas, store.vectors = exact.ids, exact.texts, exact.metadatas, exact.vectors
+        store._ensure_codes()
+        latencies, results = [], []
+        for query in queries:
+            t = time.perf_counter()
+            hits = store.batch_search([query], k)[0]
+            latencies.append(time.perf_counter() - t)
+            results.append([store.ids[i] for i, _ in hits])
+        t = time.perf_counter()
+        store.batch_search(queries, k)
+        batch_seconds = time.perf_counter() - t
+        report["backends"][f"numpy_{quantization}"] = {
+            "recall": recall(results, truth),
+            "latency_ms": latency_summary(latencies),
+            "batch_per_query_ms": batch_seconds / len(queries) * 1000,
+            "index_bytes": store.index_bytes(),
+        }
+
+    # 元数据过滤：取最常见的 year 值
+    years = [meta.get("year") for meta in exact.metadatas]
+    if any(years):
+        year = max(set(years), key=years.count)
+        t = time.perf_counter()
+        for query in queries:
+            exact.batch_search([query], k, filter={"year": year})
+        report["filtered_numpy_ms"] = (time.perf_counter() - t) / len(queries) * 1000
+        t = time.perf_counter()
+        for query in queries:
+            milvus.similarity_search_by_vector(query.tolist(), k=k, expr=f'year == "{year}"')
+        report["filtered_milvus_ms"] = (time.perf_counter() - t) / len(queries) * 1000
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--output", default="vector_backend_benchmark.json")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.queries, args.k, args.noise)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
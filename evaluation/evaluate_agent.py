@@ -3,7 +3,8 @@ import pandas as pd
 from langchain_core.messages import HumanMessage
 import sys
 sys.path.append('../src')
-from sub_graph.langchainA import agent
+from langchainA import agent
+from registry import registry
 
 def load_test_cases(json_path):
     """加载测试用例"""
@@ -87,6 +88,11 @@ def main():
     
     # 保存结果
     save_results(results, 'evaluation_results.json', 'evaluation_results.xlsx')
+
+    # 使用模型级联时，同时保存升级率和延迟统计
+    if registry.is_ready("chat_cascade"):
+        with open('cascade_stats.json', 'w', encoding='utf-8') as f:
+            json.dump(registry.get("chat_cascade").stats(), f, indent=2)
     
     print("Evaluation completed. Results saved to evaluation_results.json and evaluation_results.xlsx")
 
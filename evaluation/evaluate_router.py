@@ -0,0 +1,94 @@
+"""路由评估：逐条 re.search 的旧路由 vs 单一正则的路由引擎（可选质心分类兜底）
+
+用法：
+    python evaluate_router.py [--labeled router_labeled.jsonl] [--centroid] [--folds 5] [--repeat 200]
+
+labeled.jsonl 每行 {"query": ..., "route": ...}。--centroid 时需要 embedding 服务，
+按 folds 折交叉验证：每折用其余查询训练质心，评估关键词不能确定的查询。
+输出各方法的准确率、各智能体的混淆情况和单条查询的路由耗时。
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.append('../src')
+from registry import registry
+from router import ROUTE_KEYWORDS, RouterEngine, current_embedding_model, train_centroids
+
+
+def legacy_route(query):
+    """旧版 Router.route_query：按固定优先级依次对每个关键词 re.search"""
+    query_lower = query.lower()
+    for keywords in ROUTE_KEYWORDS.values():
+        if any(re.search(kw.lower(), query_lower) for kw in keywords):
+            return next(route for route, kws in ROUTE_KEYWORDS.items() if kws is keywords)
+    return "tool-recommend"
+
+
+def load_labeled(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def per_query_us(fn, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(queries)
+    return (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+
+
+def report(name, predicted, labeled):
+    truth = [row["route"] for row in labeled]
+    accuracy = statistics.mean(p == t for p, t in zip(predicted, truth))
+    confusion = Counter(f"{t} -> {p}" for p, t in zip(predicted, truth) if p != t)
+    return {"method": name, "accuracy": round(accuracy, 4), "errors": dict(confusion)}
+
+
+def cross_validate(labeled, folds):
+    """质心分类兜底的交叉验证，每折的质心只用其余各折训练"""
+    embedding = registry.get(current_embedding_model)
+    predicted = [None] * len(labeled)
+    methods = Counter()
+    for fold in range(folds):
+        test = [i for i in range(len(labeled)) if i % folds == fold]
+        train = [(row["query"], row["route"]) for i, row in enumerate(labeled) if i % folds != fold]
+        engine = RouterEngine(embedding=embedding, classifier=train_centroids(train, embedding), log_path="")
+        for i, decision in zip(test, engine.route_batch([labeled[i]["query"] for i in test])):
+            predicted[i] = decision.route
+            methods[decision.method] += 1
+    return predicted, dict(methods)
+
+
+def run_evaluation(labeled, centroid=False, folds=5, repeat=200):
+    queries = [row["query"] for row in labeled]
+    engine = RouterEngine(classifier=None, log_path="")
+    results = [
+        report("legacy", [legacy_route(q) for q in queries], labeled),
+        report("keywords", [d.route for d in engine.route_batch(queries)], labeled),
+    ]
+    results[0]["us_per_query"] = round(per_query_us(lambda qs: [legacy_route(q) for q in qs], queries, repeat), 2)
+    results[1]["us_per_query"] = round(per_query_us(lambda qs: [engine.route(q) for q in qs], queries, repeat), 2)
+    results[1]["us_per_query_batch"] = round(per_query_us(engine.route_batch, queries, repeat), 2)
+    results[1]["methods"] = dict(Counter(d.method for d in engine.route_batch(queries)))
+    if centroid:
+        predicted, methods = cross_validate(labeled, folds)
+        results.append({**report("keywords+centroid", predicted, labeled), "methods": methods})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--labeled", default="router_labeled.jsonl")
+    parser.add_argument("--centroid", action="store_true")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    labeled = load_labeled(args.labeled)
+    print(f"{len(labeled)} 条标注查询: {dict(Counter(row['route'] for row in labeled))}")
+    for result in run_evaluation(labeled, args.centroid, args.folds, args.repeat):
+        print(json.dumps(result, ensure_ascii=False))
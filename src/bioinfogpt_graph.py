@@ -1,22 +1,38 @@
 from langgraph.graph import StateGraph, START, END
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from typing_extensions import TypedDict
 from langchain_milvus import Milvus
 from langchain_ollama import OllamaEmbeddings
 from langchain_community.document_loaders import CSVLoader
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import os
+import threading
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from bridge_llm.llm_doubao import chat_doubao   
-from bridge_llm.llm_ollama import embeddings_nomic
-
-current_embedding_model = embeddings_nomic
-current_llm = chat_doubao
+from langgraph.graph.message import add_messages
+from langchain_core.messages import AIMessage, BaseMessage
+from typing_extensions import Annotated
+import bridge_llm.llm_doubao
+import bridge_llm.llm_ollama
+import langchainA
+from docQA import get_tool_docs_retriever
+from router import Router
+from facets import FacetExtractor, FacetedToolRetriever
+from registry import registry
+import context_packer
+from speculative import SpeculativePrefetcher
+from milvus_conn import reconnect_milvus
+
+# 注册表中的组件名，实例在首次使用时构建
+current_embedding_model = "embeddings_nomic"
+current_llm = "chat_doubao"
+
+# 推测式路由：路由的同时预取最可能的 SPECULATIVE_BRANCHES 个分支，选中后取消其余分支（多出的检索请求计入 wasted_ms）
+SPECULATIVE_ROUTING = os.getenv("BIOINFO_SPECULATIVE_ROUTING", "0") == "1"
+SPECULATIVE_BRANCHES = int(os.getenv("BIOINFO_SPECULATIVE_BRANCHES", "2"))
 
 ## 工具库检索
 
@@ -42,7 +58,7 @@ def create_tools_vectorstore() :
     documents = loader.load()
     
     # 初始化embedding模型
-    embeddings = current_embedding_model
+    embeddings = registry.get(current_embedding_model)
     
     # 创建向量数据库
     vectorstore = Milvus(
@@ -58,17 +74,26 @@ def create_tools_vectorstore() :
 
     return vectorstore
 
-# load vectorstore
-embeddings = current_embedding_model
-bioinfo_tools_vectorstore = Milvus(
-    embedding_function=embeddings,
-    collection_name="bioinfo_tools",
-    connection_args={"uri":"/home/awgao/BioinfoGPT/data/vector_db/milvus_100_demo.db"},
-    auto_id=True,
+# load vectorstore（首次使用时连接）
+registry.register(
+    "graph_tools_vectorstore",
+    lambda: Milvus(
+        embedding_function=registry.get(current_embedding_model),
+        collection_name="bioinfo_tools",
+        connection_args={"uri":"/home/awgao/BioinfoGPT/data/vector_db/milvus_100_demo.db"},
+        auto_id=True,
+    ),
+    tags=("vectorstore",),
+    fork_safe=False,
+    reconnect=reconnect_milvus
 )
 
 # 创建retriever并设置搜索参数
-bioinfo_tools_retriever = bioinfo_tools_vectorstore.as_retriever(search_kwargs={'k': 3})
+registry.register(
+    "graph_tools_retriever",
+    lambda: FacetedToolRetriever(vectorstore=registry.get("graph_tools_vectorstore"), extractor=FacetExtractor(), k=3),
+    tags=("retriever",)
+)
     
 # 工具推荐rag chain
 
@@ -89,118 +114,21 @@ recommend_tools_prompt = PromptTemplate(
 保持回答简洁专业。
 """
 )
-recommend_tools_chain = recommend_tools_prompt | current_llm | StrOutputParser()
+registry.register(
+    "graph_recommend_tools_chain",
+    lambda: recommend_tools_prompt | registry.get(current_llm) | StrOutputParser(),
+    tags=("chain",)
+)
 
 
 ## 生信工具文档库检索
 
-# 初始化生信工具文档库
-def create_bioinfo_tools_docs_vectorstores() -> Dict[str, Milvus]:
-    """初始化生信工具文档向量数据库
-    
-    所有工具共用一个db文件,但使用不同的collection
-    """
-    base_path = "/home/awgao/BioinfoGPT/data/vBioconduactor_top_75"
-    vectorstores = {}
-    
-    # 初始化embedding模型
-    embeddings = current_embedding_model
-    
-    # 文本分割器
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
-        length_function=len,
-    )
-    
-    # 遍历所有工具目录
-    for tool_dir in os.listdir(base_path):
-        tool_path = os.path.join(base_path, tool_dir)
-        if not os.path.isdir(tool_path):
-            continue
-            
-        # 查找merged.txt文件
-        merged_file = os.path.join(tool_path, "merged.txt")
-        if os.path.exists(merged_file):
-            try:
-                # 加载文档
-                loader = TextLoader(merged_file, encoding='utf-8')
-                tool_docs = loader.load()
-                
-                # 为文档添加元数据
-                for doc in tool_docs:
-                    doc.metadata.update({
-                        "tool_name": tool_dir,
-                        "source": "Bioconductor",
-                        "doc_type": "manual"
-                    })
-                
-                # 分割文档
-                splits = text_splitter.split_documents(tool_docs)
-                
-                # 创建该工具的collection
-                vectorstore = Milvus(
-                    embedding_function=embeddings,
-                    collection_name=f"bioinfo_{tool_dir}",
-                    connection_args={"uri": "/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db"},  # 所有工具共用一个db
-                    auto_id=True,
-                    drop_old=True
-                )
-                
-                # 添加文档到向量数据库
-                vectorstore.add_documents(splits)
-                
-                # 保存到字典
-                vectorstores[tool_dir] = vectorstore
-                
-                print(f"成功处理工具: {tool_dir}")
-                
-            except Exception as e:
-                print(f"处理 {tool_dir} 时出错: {str(e)}")
-    
-    return vectorstores
-# 加载已存在的向量数据库collections
-def load_existing_bioinfo_tools_docs_vectorstores() -> Dict[str, Milvus]:
-    """加载已存在的向量数据库collections
-    """
-    base_path = "/home/awgao/BioinfoGPT/data/vector_db/Bioconduactor_top_75"
-    all_bioinfo_tools_docs_vectorstores_dict = {}
-    
-    # 初始化embedding模型
-    embeddings = current_embedding_model
-    
-    # 遍历所有工具目录
-    for tool_dir in os.listdir(base_path):
-        if not os.path.isdir(os.path.join(base_path, tool_dir)):
-            continue
-            
-        try:
-            # 连接到对应的collection
-            vectorstore = Milvus(
-                embedding_function=embeddings,
-                collection_name=f"bioinfo_{tool_dir}",
-                connection_args={"uri": "/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db"},
-                auto_id=True,
-                drop_old=False  # 不删除已有数据
-            )
-            
-            all_bioinfo_tools_docs_vectorstores_dict[tool_dir] = vectorstore
-            print(f"成功加载工具collection: {tool_dir}")
-            
-        except Exception as e:
-            print(f"加载 {tool_dir} collection时出错: {str(e)}")
-    
-    return all_bioinfo_tools_docs_vectorstores_dict
-
 def get_specific_doc_vectorstore_retriever(toolname:str):
-    """获取指定工具的向量存储库
+    """获取指定工具的文档检索器（合并后的文档 collection 按工具名过滤）
     """
-    
-    all_bioinfo_tools_docs_vectorstores_dict = load_existing_bioinfo_tools_docs_vectorstores()
-    if toolname not in all_bioinfo_tools_docs_vectorstores_dict:
+    if toolname not in registry.get("tool_docs_names"):
         raise ValueError(f"工具 {toolname} 不存在")
-    return all_bioinfo_tools_docs_vectorstores_dict[toolname].as_retriever(search_kwargs={'k': 3})
+    return get_tool_docs_retriever([toolname], k=3)
 
 # 文档问答 RAG chain
 doc_query_prompt = PromptTemplate(
@@ -280,7 +208,11 @@ Remember to check the function's help page first, as noted in the documentation:
 """
 )
 
-doc_query_chain = doc_query_prompt | current_llm | StrOutputParser()
+registry.register(
+    "graph_doc_query_chain",
+    lambda: doc_query_prompt | registry.get(current_llm) | StrOutputParser(),
+    tags=("chain",)
+)
 
 
 
@@ -288,27 +220,50 @@ doc_query_chain = doc_query_prompt | current_llm | StrOutputParser()
 
 
 # 定义图状态
-class GraphState(TypedDict):
+class GraphState(TypedDict, total=False):
     """
     
     """
+    messages: Annotated[List[BaseMessage], add_messages]
     question: str
+    next_step: str
     retrieve_bioinfo_tools_name: str
     tools: str
+    tools_docs: str
     documents: List[str] 
     web_search_results: str
     database_results: Dict[str, Any] 
     generation: str # 生成的答案 generation_anwser
-
-# 定义图结构
-workflow = StateGraph(GraphState)
+    prefetch: Any # 选中分支的推测式预取（speculative.Prefetch）
 
 # 路由节点
-def route_question(state: GraphState) -> str:
-    # 实现路由逻辑
-    pass
+ROUTE_TO_NODE = {
+    "tool-recommend": "tool_recommender",
+    "doc-qa": "document_query",
+    "bio-db": "database_query",
+}
+
+def route_question(state: GraphState) -> GraphState:
+    # 取最后一条用户消息作为问题
+    question = state.get("question") or state["messages"][-1].content
+    if not SPECULATIVE_ROUTING:
+        return {"question": question, "next_step": ROUTE_TO_NODE.get(Router.route_query(question), "tool_recommender")}
+    # 先为候选分支启动预取，再路由；路由确定后取消其他分支
+    prefetcher = registry.get("graph_prefetcher")
+    prefetches = prefetcher.start(question, Router.candidate_routes(question, SPECULATIVE_BRANCHES))
+    route = Router.route_query(question)
+    return {
+        "question": question,
+        "next_step": ROUTE_TO_NODE.get(route, "tool_recommender"),
+        "prefetch": prefetcher.commit(prefetches, route),
+    }
 
-workflow.add_node("router", route_question)
+def take_prefetch(state: GraphState, route: str) -> Optional[Dict[str, Any]]:
+    """取出本分支的预取结果，没有预取、预取属于其他分支或预取失败时返回 None"""
+    prefetch = state.get("prefetch")
+    if prefetch is None or prefetch.route != route:
+        return None
+    return registry.get("graph_prefetcher").result(prefetch)
 
 
 # RECOMMEND TOOLS LINE 
@@ -321,19 +276,26 @@ def retrieve_recommend_tools(state: GraphState) -> GraphState:
     Returns:
         state: 更新后的状态,包含推荐工具信息和生成的回答
     """
-    question = state.question
+    question = state['question']
     
-    # 执行检索
-    tools_docs = bioinfo_tools_retriever.invoke(question)
-    tools_docs_str = "\n".join([doc.page_content for doc in tools_docs])
+    # 执行检索（推测式路由已预取时直接使用）
+    prefetched = take_prefetch(state, "tool-recommend")
+    tools_docs = prefetched["tools_docs"] if prefetched else registry.get("graph_tools_retriever").invoke(question)
+    # 去重、按得分排序并压缩到模型的上下文预算内，保留 DOI / PubMed 等来源信息
+    tools_docs_str = registry.get("context_packer").pack(tools_docs, llm=current_llm).text
 
     return {"question": question, "tools_docs": tools_docs_str}
 
-def generate_tool_recommendation(tools_info: List[dict], question: str) -> str:
-    pass
+def generate_tool_recommendation(state: GraphState) -> GraphState:
+    generation = registry.get("graph_recommend_tools_chain").invoke(
+        {"question": state["question"], "tools_docs": state["tools_docs"]}
+    )
+    return {"generation": generation}
 
+def recommend_tools(state: GraphState) -> GraphState:
+    retrieved = retrieve_recommend_tools(state)
+    return {**retrieved, **generate_tool_recommendation({**state, **retrieved})}
 
-workflow.add_node("tool_recommender", recommend_tools)
 
 # DOCUMENT QUERY LINE
 def retrieve_bioinfo_tools_documents_context(state: GraphState) -> GraphState:
@@ -341,9 +303,14 @@ def retrieve_bioinfo_tools_documents_context(state: GraphState) -> GraphState:
     question = state['question']
     retrieve_bioinfo_tools_name = state['retrieve_bioinfo_tools_name']
     
-    retriever = get_specific_doc_vectorstore_retriever(retrieve_bioinfo_tools_name)
-    docs = retriever.invoke(question)
-    docs_str = "\n".join([doc.page_content for doc in docs])
+    prefetched = take_prefetch(state, "doc-qa")
+    if prefetched and prefetched["tool_name"] == retrieve_bioinfo_tools_name:
+        docs = prefetched["docs"]
+    else:
+        retriever = get_specific_doc_vectorstore_retriever(retrieve_bioinfo_tools_name)
+        docs = retriever.invoke(question)
+    # 合并 chunk_overlap 造成的相邻重复片段
+    docs_str = registry.get("context_packer").pack(docs, llm=current_llm).text
     
     return {"question": question, "documents": docs_str}
 
@@ -351,42 +318,109 @@ def retrieve_bioinfo_tools_documents_context(state: GraphState) -> GraphState:
 
 def generate_documents_query_anwser(state: GraphState):
     question = state['question']
-    generation = doc_query_chain.invoke({'question':question,'documents':state['documents']})
+    generation = registry.get("graph_doc_query_chain").invoke({
+        'question': question,
+        'tool_name': state.get('retrieve_bioinfo_tools_name', ''),
+        'context': state.get('documents', ''),
+    })
     
     return {"question": question, "generation": generation}
 
-workflow.add_node("document_query", query_documents)
+def match_documented_tool(question: str) -> str:
+    """从问题中匹配已有文档库的工具名，没有时返回空字符串"""
+    question_lower = question.lower()
+    return next((name for name in registry.get("tool_docs_names") if name.lower() in question_lower), "")
+
+def query_documents(state: GraphState) -> GraphState:
+    # 未指定工具时，从问题中匹配已有文档库的工具名
+    tool_name = state.get("retrieve_bioinfo_tools_name") or match_documented_tool(state["question"])
+    state = {**state, "retrieve_bioinfo_tools_name": tool_name}
+    if tool_name:
+        state.update(retrieve_bioinfo_tools_documents_context(state))
+    return {"retrieve_bioinfo_tools_name": tool_name, **generate_documents_query_anwser(state)}
 
 # DATABASE QUERY LINE
 def query_database(state: GraphState) -> GraphState:
-    # 实现数据库查询逻辑
-    pass
-
-workflow.add_node("database_query", query_database)
+    take_prefetch(state, "bio-db")
+    response = registry.get("bio_db_agent").invoke({"messages": state["messages"]})
+    return {"generation": response["messages"][-1].content}
 
 # 生成答案节点
 def generate_answer(state: GraphState) -> GraphState:
-
-    
-    return state
-
-workflow.add_node("answer_generator", generate_answer)
-
-# 定义边和条件
-workflow.add_edge(START, "router")
-workflow.add_conditional_edges(
-    "router",
-    lambda x: x["next_step"],
-    {
-        "tool_recommender": "tool_recommender",
-        "document_query": "document_query",
-        "database_query": "database_query",
-    }
+    return {"messages": [AIMessage(content=state.get("generation") or "")]}
+
+
+# 推测式预取：各分支只做无副作用的检索 / 抽取，生成等 LLM 调用仍在路由确定之后
+def prefetch_tool_recommend(question: str, cancelled: threading.Event) -> Optional[Dict[str, Any]]:
+    if cancelled.is_set():
+        return None
+    return {"tools_docs": registry.get("graph_tools_retriever").invoke(question)}
+
+def prefetch_doc_qa(question: str, cancelled: threading.Event) -> Optional[Dict[str, Any]]:
+    # 实体抽取（工具名）之后检查一次，被取消时不再检索文档
+    tool_name = match_documented_tool(question)
+    if cancelled.is_set():
+        return None
+    docs = get_specific_doc_vectorstore_retriever(tool_name).invoke(question) if tool_name else []
+    return {"tool_name": tool_name, "docs": docs}
+
+def prefetch_bio_db(question: str, cancelled: threading.Event) -> Optional[Dict[str, Any]]:
+    # 数据库智能体的工作全部依赖 LLM，只提前构建组件
+    if not cancelled.is_set():
+        registry.get("bio_db_agent")
+    return {}
+
+registry.register(
+    "speculative_executor",
+    lambda: ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative"),
+    fork_safe=False
+)
+registry.register(
+    "graph_prefetcher",
+    lambda: SpeculativePrefetcher(registry.get("speculative_executor"), {
+        "tool-recommend": prefetch_tool_recommend,
+        "doc-qa": prefetch_doc_qa,
+        "bio-db": prefetch_bio_db,
+    }),
+    tags=("router",)
 )
-workflow.add_edge("tool_recommender", "answer_generator")
-workflow.add_edge("document_query", "answer_generator")
-workflow.add_edge("database_query", "answer_generator")
-workflow.add_edge("answer_generator", END)
 
-# 编译图
-app = workflow.compile()
\ No newline at end of file
+
+def create_bioinfo_graph():
+    """构建并编译综合路由图"""
+    # 定义图结构
+    workflow = StateGraph(GraphState)
+
+    workflow.add_node("router", route_question)
+    workflow.add_node("tool_recommender", recommend_tools)
+    workflow.add_node("document_query", query_documents)
+    workflow.add_node("database_query", query_database)
+    workflow.add_node("answer_generator", generate_answer)
+
+    # 定义边和条件
+    workflow.add_edge(START, "router")
+    workflow.add_conditional_edges(
+        "router",
+        lambda x: x["next_step"],
+        {
+            "tool_recommender": "tool_recommender",
+            "document_query": "document_query",
+            "database_query": "database_query",
+        }
+    )
+    workflow.add_edge("tool_recommender", "answer_generator")
+    workflow.add_edge("document_query", "answer_generator")
+    workflow.add_edge("database_query", "answer_generator")
+    workflow.add_edge("answer_generator", END)
+
+    # 编译图
+    return workflow.compile()
+
+registry.register("bioinfo_graph", create_bioinfo_graph, tags=("graph",))
+
+
+def __getattr__(name):
+    # 兼容旧的模块级变量 app
+    if name == "app":
+        return registry.get("bioinfo_graph")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
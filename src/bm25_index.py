@@ -0,0 +1,170 @@
+"""进程内 BM25 倒排索引
+
+函数名、参数名这类精确词（如 DESeq() 的 fitType 参数）用 embedding 检索效果差，
+BM25 与向量检索结果融合后可以同时照顾语义和关键词。
+
+索引以 CSR 形式保存在一个目录中：
+    offsets.npy   每个词的倒排表在 postings/tfs 中的起止位置（int64）
+    postings.npy  文档序号（int32）
+    tfs.npy       词频（uint16）
+    doc_len.npy   文档长度（uint16）
+    doc_tool.npy  文档所属工具序号（int32），用于按工具过滤
+    meta.json     词表、文档 id、工具名和参数
+加载时 .npy 以内存映射方式打开，多个进程共享同一份页缓存。
+"""
+import json
+import os
+import re
+import shutil
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_.]*[A-Za-z0-9_]|[A-Za-z0-9]+")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """面向代码文档的分词：保留完整标识符（如 fitType、res.df），同时拆出其中的子词"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        lower = token.lower()
+        tokens.append(lower)
+        parts = [p.lower() for piece in re.split(r"[._]", token) for p in CAMEL_PATTERN.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p != lower)
+    return tokens
+
+
+class BM25Index:
+    """不可变的 BM25 索引，通过 build 构建、save/load 持久化
+
+    Args:
+        k1, b: BM25 参数
+    """
+
+    FILES = ("offsets", "postings", "tfs", "doc_len", "doc_tool")
+
+    def __init__(self, vocab: Dict[str, int], doc_ids: List[str], tools: List[str], arrays: Dict[str, np.ndarray],
+                 k1: float = 1.2, b: float = 0.75):
+        self.vocab = vocab
+        self.doc_ids = doc_ids
+        self.tools = tools
+        self.tool_index = {tool: i for i, tool in enumerate(tools)}
+        self.offsets = arrays["offsets"]
+        self.postings = arrays["postings"]
+        self.tfs = arrays["tfs"]
+        self.doc_len = arrays["doc_len"]
+        self.doc_tool = arrays["doc_tool"]
+        self.k1 = k1
+        self.b = b
+        self.avg_len = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+        # 每个文档的长度归一项与查询无关，预先算好
+        self.norm = k1 * (1 - b + b * np.asarray(self.doc_len, dtype=np.float32) / (self.avg_len or 1))
+        df = np.diff(self.offsets).astype(np.float32)
+        n = len(doc_ids)
+        self.idf = np.log(1 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[str, str, str]], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """由 (doc_id, 工具名, 文本) 序列构建索引"""
+        vocab: Dict[str, int] = {}
+        tools: Dict[str, int] = {}
+        term_docs: List[List[int]] = []
+        term_tfs: List[List[int]] = []
+        doc_ids, doc_len, doc_tool = [], [], []
+        for doc_idx, (doc_id, tool, text) in enumerate(docs):
+            counts = Counter(tokenize(text))
+            doc_ids.append(doc_id)
+            doc_len.append(min(sum(counts.values()), 65535))
+            doc_tool.append(tools.setdefault(tool, len(tools)))
+            for term, tf in counts.items():
+                term_idx = vocab.get(term)
+                if term_idx is None:
+                    term_idx = vocab[term] = len(vocab)
+                    term_docs.append([])
+                    term_tfs.append([])
+                term_docs[term_idx].append(doc_idx)
+                term_tfs[term_idx].append(min(tf, 65535))
+        lengths = np.fromiter((len(d) for d in term_docs), dtype=np.int64, count=len(term_docs))
+        offsets = np.zeros(len(term_docs) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        arrays = {
+            "offsets": offsets,
+            "postings": np.fromiter((d for docs in term_docs for d in docs), dtype=np.int32, count=int(offsets[-1])),
+            "tfs": np.fromiter((t for tfs in term_tfs for t in tfs), dtype=np.uint16, count=int(offsets[-1])),
+            "doc_len": np.asarray(doc_len, dtype=np.uint16),
+            "doc_tool": np.asarray(doc_tool, dtype=np.int32),
+        }
+        return cls(vocab, doc_ids, list(tools), arrays, k1, b)
+
+    def save(self, path: str) -> None:
+        """写入临时目录后整体替换，读者不会看到写了一半的索引"""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in self.FILES:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        terms = [None] * len(self.vocab)
+        for term, idx in self.vocab.items():
+            terms[idx] = term
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"terms": terms, "doc_ids": self.doc_ids, "tools": self.tools, "k1": self.k1, "b": self.b}, f)
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in cls.FILES}
+        vocab = {term: idx for idx, term in enumerate(meta["terms"])}
+        return cls(vocab, meta["doc_ids"], meta["tools"], arrays, meta["k1"], meta["b"])
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        if not len(self.doc_ids):
+            return scores
+        for term in set(tokenize(query)):
+            idx = self.vocab.get(term)
+            if idx is None:
+                continue
+            start, end = self.offsets[idx], self.offsets[idx + 1]
+            docs = self.postings[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            # 同一个词的倒排表中文档不重复，可以直接按下标累加
+            scores[docs] += self.idf[idx] * tf * (self.k1 + 1) / (tf + self.norm[docs])
+        return scores
+
+    def search(self, query: str, k: int = 10, tool_names: Optional[Sequence[str]] = None) -> List[Tuple[str, float]]:
+        """返回得分最高的 k 个 (doc_id, 得分)，可限定工具范围"""
+        scores = self.scores(query)
+        if tool_names:
+            allowed = [self.tool_index[t] for t in tool_names if t in self.tool_index]
+            scores[~np.isin(self.doc_tool, allowed)] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if not len(candidates):
+            return []
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.doc_ids[i], float(scores[i])) for i in ranked]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[str, float]]:
+    """RRF 融合多路排序结果：score(d) = Σ w_i / (k + rank_i(d))"""
+    fused: Dict[str, float] = {}
+    for i, ranking in enumerate(rankings):
+        weight = weights[i] if weights else 1.0
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -0,0 +1,187 @@
+"""合并并发 embedding 请求的微批处理客户端
+
+检索时每个查询都单独发一次 embed 请求；并发高时大量小请求会把 embedding 服务拖慢。
+MicroBatchEmbeddings 把若干毫秒内到达的 embed_query / embed_documents 调用合并成一次批量请求，
+再把结果按调用方拆分返回，同一批中重复的文本只计算一次。
+后台线程只负责攒批，批量请求交给线程池执行，最多 max_concurrency 批同时在途；
+在途批数已满时新请求留在队列中继续攒批，下一批因此更大。
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# 所有实例，fork 后在子进程中统一重置；弱引用不会延长实例的生命周期
+_instances: "weakref.WeakSet[MicroBatchEmbeddings]" = weakref.WeakSet()
+
+
+def _reset_after_fork() -> None:
+    for instance in list(_instances):
+        instance._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """把并发的 embedding 调用合并成批量请求
+
+    Args:
+        inner: 实际执行 embedding 的模型
+        max_wait_ms: 第一个请求到达后最多等待多少毫秒再发出批量请求
+        max_batch_size: 单批最多包含的文本数，达到后立即发出
+        max_concurrency: 最多同时在途的批量请求数，内部模型有多个节点时可以调大
+    """
+
+    def __init__(self, inner: Embeddings, max_wait_ms: float = 5.0, max_batch_size: int = 64,
+                 max_concurrency: int = 4):
+        self.inner = inner
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size_hist = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_time_hist = Histogram()
+        self.request_time_hist = Histogram()
+        self._reset()
+        _instances.add(self)
+
+    def _reset(self) -> None:
+        # fork 后后台线程和线程池都不会被继承，子进程里重新创建队列并延迟启动
+        self._queue: "queue.Queue[Tuple[List[str], Future, float]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="embedding-batch")
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _submit(self, texts: List[str]) -> Future:
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((texts, future, time.perf_counter()))
+        return future
+
+    def _collect(self) -> List[Tuple[List[str], Future, float]]:
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            # 先占到在途名额再攒批：名额用完时请求在队列里继续累积
+            self._slots.acquire()
+            pending: List[Tuple[List[str], Future, float]] = []
+            try:
+                # 调用方已取消的请求（扇出检索超时、推测预取被放弃）直接丢弃；其余标记为运行中，之后不能再被取消
+                pending = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+                if not pending:
+                    self._slots.release()
+                    continue
+                self._executor.submit(self._dispatch, pending)
+            except Exception as e:
+                # 任何异常都不能结束后台线程，否则之后的请求永远等不到结果
+                logger.exception("embedding 微批调度失败")
+                self._slots.release()
+                for _, future, _ in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _dispatch(self, pending: List[Tuple[List[str], Future, float]]) -> None:
+        try:
+            self._process(pending)
+        except Exception as e:
+            logger.exception("embedding 微批处理失败")
+            for _, future, _ in pending:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _process(self, pending: List[Tuple[List[str], Future, float]]) -> None:
+        sent_at = time.perf_counter()
+        # 同一批中重复的文本只计算一次
+        unique: Dict[str, int] = {}
+        for texts, _, _ in pending:
+            for text in texts:
+                unique.setdefault(text, len(unique))
+        self.batch_size_hist.observe(len(unique))
+        for _, _, enqueued_at in pending:
+            self.wait_time_hist.observe((sent_at - enqueued_at) * 1000)
+        try:
+            vectors = self.inner.embed_documents(list(unique))
+            if len(vectors) != len(unique):
+                raise ValueError(f"embedding 数量不匹配: 期望 {len(unique)}，实际 {len(vectors)}")
+        except Exception as e:
+            for _, future, _ in pending:
+                future.set_exception(e)
+            return
+        self.request_time_hist.observe((time.perf_counter() - sent_at) * 1000)
+        for texts, future, _ in pending:
+            future.set_result([vectors[unique[text]] for text in texts])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # 大批量（如入库）本身已经是批量请求，直接发送
+        if len(texts) >= self.max_batch_size:
+            return self.inner.embed_documents(texts)
+        return self._submit(list(texts)).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit([text]).result()[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        if len(texts) >= self.max_batch_size:
+            return await self.inner.aembed_documents(texts)
+        return await asyncio.wrap_future(self._submit(list(texts)))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await asyncio.wrap_future(self._submit([text])))[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size_hist.snapshot(),
+            "wait_ms": self.wait_time_hist.snapshot(),
+            "request_ms": self.request_time_hist.snapshot(),
+            "queue_depth": self._queue.qsize(),
+            "max_concurrency": self.max_concurrency,
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        # 其余属性（如 model）转发给内部模型
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
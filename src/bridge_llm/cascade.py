@@ -0,0 +1,270 @@
+"""模型级联：先用小模型回答，校验不通过再升级到更大的模型
+
+每一级的输出都会做三项检查：
+1. 工具调用是否合法（工具名存在、必填参数齐全、没有解析失败的调用）
+2. 模型自报的置信度是否达到阈值（非最后一级会被要求在答案末尾给出 Confidence: 0~1）
+3. 答案格式检查（默认拒绝空回答和"不知道"类回答，可自定义）
+
+只有全部通过才采用该级结果，否则升级到下一级；最后一级的结果总是被采用。
+CascadeChatModel 本身就是一个 chat model，可以直接放在任何使用 current_llm 的地方。
+"""
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from metrics import Histogram
+from registry import registry
+
+CONFIDENCE_INSTRUCTION = (
+    "If you give a final answer (not a tool call), end it with a separate line "
+    "'Confidence: <number between 0 and 1>' stating how sure you are that the answer is correct."
+)
+
+CONFIDENCE_PATTERN = re.compile(r"^[ \t]*\**confidence\**[ \t]*[:：][ \t]*([0-9]*\.?[0-9]+)[ \t]*(%?)[ \t]*$",
+                                re.IGNORECASE | re.MULTILINE)
+
+REFUSAL_PATTERN = re.compile(
+    r"\b(i don't know|i do not know|i'm not sure|i am not sure|i cannot|i can't|unable to)\b",
+    re.IGNORECASE,
+)
+
+
+# 延迟直方图的桶（秒）：本地小模型亚秒级，远程模型和长回答可达数十秒
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+
+def extract_confidence(text: str) -> Tuple[Optional[float], str]:
+    """解析并移除答案中的置信度行，返回 (置信度, 去掉置信度后的文本)"""
+    matches = list(CONFIDENCE_PATTERN.finditer(text))
+    if not matches:
+        return None, text
+    match = matches[-1]
+    value = float(match.group(1))
+    if match.group(2) or value > 1:
+        value /= 100
+    cleaned = (text[:match.start()] + text[match.end():]).strip()
+    return value, cleaned
+
+
+def default_answer_check(text: str) -> bool:
+    """默认答案格式检查：非空且不是拒答"""
+    return bool(text.strip()) and not REFUSAL_PATTERN.search(text)
+
+
+class CascadeStats:
+    """级联统计：每级尝试/采用次数、升级原因、延迟以及估算的节省"""
+
+    def __init__(self, tiers: Sequence[str]):
+        self.tiers = list(tiers)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.attempts = {tier: 0 for tier in self.tiers}
+        self.accepted = {tier: 0 for tier in self.tiers}
+        self.escalations: Dict[str, Dict[str, int]] = {tier: {} for tier in self.tiers}
+        # 延迟只保留直方图，内存占用不随请求数增长
+        self.tier_latencies = {tier: Histogram(LATENCY_BUCKETS) for tier in self.tiers}
+        self.request_latencies = Histogram(LATENCY_BUCKETS)
+
+    def record_attempt(self, tier: str, latency: float, reason: Optional[str]) -> None:
+        self.tier_latencies[tier].observe(latency)
+        with self.lock:
+            self.attempts[tier] += 1
+            if reason is None:
+                self.accepted[tier] += 1
+            else:
+                self.escalations[tier][reason] = self.escalations[tier].get(reason, 0) + 1
+
+    def record_request(self, latency: float) -> None:
+        self.request_latencies.observe(latency)
+        with self.lock:
+            self.requests += 1
+
+    def snapshot(self, tier_costs: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        tier_latencies = {tier: hist.snapshot() for tier, hist in self.tier_latencies.items()}
+        request_latencies = self.request_latencies.snapshot()
+        with self.lock:
+            top = self.tiers[-1]
+            top_mean = tier_latencies[top]["mean"] if tier_latencies[top]["count"] else None
+            escalated = sum(sum(reasons.values()) for reasons in self.escalations.values())
+            snapshot = {
+                "requests": self.requests,
+                "attempts": dict(self.attempts),
+                "accepted": dict(self.accepted),
+                "escalations": {tier: dict(reasons) for tier, reasons in self.escalations.items()},
+                "escalation_rate": escalated / self.requests if self.requests else 0.0,
+                # 中位数按直方图桶上界估算
+                "median_latency": request_latencies["p50"] if request_latencies["count"] else None,
+                "tier_mean_latency": {
+                    tier: hist["mean"] if hist["count"] else None for tier, hist in tier_latencies.items()
+                },
+                "request_latency": request_latencies,
+                "tier_latency": tier_latencies,
+            }
+            # 与每次都直接调用最后一级相比节省的时间（用最后一级的平均延迟估算）
+            if top_mean is not None:
+                snapshot["estimated_latency_saved"] = top_mean * request_latencies["count"] - request_latencies["sum"]
+            if tier_costs:
+                actual = sum(tier_costs.get(t, 0.0) * n for t, n in self.attempts.items())
+                snapshot["estimated_cost_saved"] = tier_costs.get(top, 0.0) * self.requests - actual
+            return snapshot
+
+
+class CascadeChatModel(BaseChatModel):
+    """按顺序尝试多个模型的级联 chat model
+
+    Args:
+        tiers: 注册表中的模型组件名，从便宜到昂贵排列
+        min_confidence: 非最后一级的答案需要达到的自报置信度
+        require_confidence: 为 True 时缺少置信度行视为不通过
+        answer_validator: 答案格式检查函数
+        tier_costs: 每级的相对成本，用于估算节省
+    """
+
+    tiers: List[str]
+    min_confidence: float = 0.7
+    require_confidence: bool = True
+    answer_validator: Callable[[str], bool] = default_answer_check
+    tier_costs: Dict[str, float] = {}
+
+    _tools: List[Dict[str, Any]] = PrivateAttr(default_factory=list)
+    _tool_kwargs: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _stats: CascadeStats = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        if not self.tiers:
+            raise ValueError("级联至少需要一个模型")
+        self._stats = CascadeStats(self.tiers)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cascade"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "CascadeChatModel":
+        """返回绑定了工具的级联模型，统计信息与原模型共享"""
+        bound = self.model_copy()
+        bound._tools = [convert_to_openai_tool(tool) for tool in tools]
+        bound._tool_kwargs = kwargs
+        bound._stats = self._stats
+        return bound
+
+    def stats(self) -> Dict[str, Any]:
+        return self._stats.snapshot(self.tier_costs)
+
+    def _tier_model(self, index: int):
+        model = registry.get(self.tiers[index])
+        if self._tools:
+            model = model.bind_tools(self._tools, **self._tool_kwargs)
+        return model
+
+    def _tier_messages(self, index: int, messages: List[BaseMessage]) -> List[BaseMessage]:
+        if index == len(self.tiers) - 1:
+            return messages
+        return [SystemMessage(content=CONFIDENCE_INSTRUCTION)] + list(messages)
+
+    def _validate_tool_calls(self, message: AIMessage) -> Optional[str]:
+        if getattr(message, "invalid_tool_calls", None):
+            return "invalid_tool_call"
+        schemas = {tool["function"]["name"]: tool["function"].get("parameters", {}) for tool in self._tools}
+        for call in message.tool_calls:
+            if call["name"] not in schemas:
+                return "unknown_tool"
+            parameters = schemas[call["name"]]
+            args = call.get("args") or {}
+            if any(name not in args for name in parameters.get("required", [])):
+                return "missing_tool_args"
+            properties = parameters.get("properties", {})
+            if any(name not in properties for name in args):
+                return "unexpected_tool_args"
+        return None
+
+    def _check(self, message: BaseMessage) -> Tuple[Optional[str], BaseMessage]:
+        """校验一级的输出，返回 (失败原因或 None, 清理后的消息)"""
+        if not isinstance(message, AIMessage):
+            return None, message
+        if message.tool_calls or getattr(message, "invalid_tool_calls", None):
+            return self._validate_tool_calls(message), message
+
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        confidence, cleaned = extract_confidence(content)
+        if cleaned != content:
+            message = message.model_copy(update={"content": cleaned})
+        if confidence is None and self.require_confidence:
+            return "missing_confidence", message
+        if confidence is not None and confidence < self.min_confidence:
+            return "low_confidence", message
+        if not self.answer_validator(cleaned):
+            return "answer_format", message
+        return None, message
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        request_start = time.perf_counter()
+        last = len(self.tiers) - 1
+        for index, tier in enumerate(self.tiers):
+            start = time.perf_counter()
+            try:
+                message = self._tier_model(index).invoke(
+                    self._tier_messages(index, messages), stop=stop, **kwargs
+                )
+                reason, message = self._check(message)
+            except Exception:
+                if index == last:
+                    raise
+                reason, message = "error", None
+            if index == last:
+                # 最后一级的结果总是被采用
+                reason = None
+            self._stats.record_attempt(tier, time.perf_counter() - start, reason)
+            if reason is None:
+                self._stats.record_request(time.perf_counter() - request_start)
+                return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        request_start = time.perf_counter()
+        last = len(self.tiers) - 1
+        for index, tier in enumerate(self.tiers):
+            start = time.perf_counter()
+            try:
+                message = await self._tier_model(index).ainvoke(
+                    self._tier_messages(index, messages), stop=stop, **kwargs
+                )
+                reason, message = self._check(message)
+            except Exception:
+                if index == last:
+                    raise
+                reason, message = "error", None
+            if index == last:
+                # 最后一级的结果总是被采用
+                reason = None
+            self._stats.record_attempt(tier, time.perf_counter() - start, reason)
+            if reason is None:
+                self._stats.record_request(time.perf_counter() - request_start)
+                return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+# 默认级联：本地 3B -> 本地 8B -> 远程 gpt-4o-mini，可用 BIOINFO_CASCADE_TIERS 覆盖（逗号分隔的组件名）
+DEFAULT_CASCADE_TIERS = ["chat_ollama_llama32_3b_fp16", "chat_ollama_llama31", "chat_openai"]
+DEFAULT_TIER_COSTS = {"chat_ollama_llama32_3b_fp16": 0.1, "chat_ollama_llama31": 0.3, "chat_openai": 1.0}
+
+
+def _build_chat_cascade() -> CascadeChatModel:
+    import bridge_llm.llm_ollama
+    import bridge_llm.llm_openai
+    tiers = [t.strip() for t in os.getenv("BIOINFO_CASCADE_TIERS", "").split(",") if t.strip()]
+    return CascadeChatModel(
+        tiers=tiers or DEFAULT_CASCADE_TIERS,
+        min_confidence=float(os.getenv("BIOINFO_CASCADE_MIN_CONFIDENCE", "0.7")),
+        tier_costs=DEFAULT_TIER_COSTS,
+    )
+
+
+registry.register("chat_cascade", _build_chat_cascade, tags=("llm",))
@@ -0,0 +1,367 @@
+"""按内容寻址的持久化 embedding 缓存
+
+键为 sha256(文本) + 模型名 + 维度；向量按行追加写入一个 float16/float32 的裸二进制文件，
+读取时以内存映射方式访问，行号记录在 SQLite 索引中。
+重建向量库时只有新增或修改过的文本需要重新计算 embedding。
+
+设置了 max_bytes 时，某个模型的向量文件超过上限后整理（compact）为新一代文件：
+按最近使用时间只保留约 COMPACT_RATIO × max_bytes 的向量，其余从索引中删除。
+索引中每行记录所在文件的代数，读取时按代数打开对应文件，因此其他进程整理文件时读取不需要加锁；
+追加和整理由缓存目录中的 write.lock 文件锁串行化。
+
+查询另有一层进程内 LRU 缓存，命中时连 SQLite 都不用访问。
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# 整理后保留的大小占上限的比例，留出余量避免每次追加都触发整理
+COMPACT_RATIO = 0.8
+# 最近使用时间的精度（秒）：同一小时内重复命中不再写索引
+USED_AT_RESOLUTION = 3600
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """磁盘上的 embedding 存储：SQLite 索引 + 内存映射的向量文件
+
+    Args:
+        cache_dir: 缓存目录，所有模型共用一个 index.sqlite
+        dtype: 向量存储精度，float16 或 float32
+        max_bytes: 每个模型（及维度）向量文件的大小上限，0 表示不限制
+    """
+
+    def __init__(self, cache_dir: str, dtype: str = "float32", max_bytes: int = 0):
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"不支持的存储精度: {dtype}")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.sqlite")
+        self.lock_path = os.path.join(cache_dir, "write.lock")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._maps: Dict[tuple, np.memmap] = {}
+        self.counters = {"compactions": 0, "evicted": 0}
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT NOT NULL, model TEXT NOT NULL, dim INTEGER NOT NULL, dtype TEXT NOT NULL,"
+                " row INTEGER NOT NULL, gen INTEGER NOT NULL DEFAULT 0, used_at INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (key, model, dim, dtype))"
+            )
+            # 早期版本的索引没有 gen / used_at 列：原有的行都在第 0 代文件中，按从未使用处理
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+            for column in ("gen", "used_at"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE embeddings ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vector_files ("
+                " model TEXT NOT NULL, dim INTEGER NOT NULL, dtype TEXT NOT NULL, gen INTEGER NOT NULL,"
+                " PRIMARY KEY (model, dim, dtype))"
+            )
+            conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite 连接不能跨 fork 使用，子进程中重新打开
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn_pid = os.getpid()
+            self._maps = {}
+        return self._conn
+
+    def vector_path(self, model: str, dim: int, gen: int = 0) -> str:
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+        suffix = f".g{gen}" if gen else ""
+        return os.path.join(self.cache_dir, f"{slug}_{dim}_{self.dtype.name}{suffix}.vec")
+
+    def _current_gen(self, conn: sqlite3.Connection, model: str, dim: int) -> int:
+        row = conn.execute("SELECT gen FROM vector_files WHERE model = ? AND dim = ? AND dtype = ?",
+                           (model, dim, self.dtype.name)).fetchone()
+        return row[0] if row else 0
+
+    def known_dim(self, model: str) -> Optional[int]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT dim FROM embeddings WHERE model = ? AND dtype = ? LIMIT 1", (model, self.dtype.name)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _rows(self, model: str, dim: int, gen: int) -> np.memmap:
+        """某一代文件的内存映射，文件增长后重新映射；整理后旧代文件被删除时抛出 FileNotFoundError"""
+        n_rows = os.path.getsize(self.vector_path(model, dim, gen)) // (dim * self.dtype.itemsize)
+        mapped = self._maps.get((model, dim, gen))
+        if mapped is None or mapped.shape[0] < n_rows:
+            mapped = np.memmap(self.vector_path(model, dim, gen), dtype=self.dtype, mode="r",
+                               shape=(n_rows, dim)) if n_rows else np.zeros((0, dim), dtype=self.dtype)
+            # 旧代文件已被删除，释放映射后磁盘空间才会回收
+            for old in [k for k in self._maps if k[:2] == (model, dim) and k[2] < gen]:
+                del self._maps[old]
+            self._maps[(model, dim, gen)] = mapped
+        return mapped
+
+    def get_many(self, keys: Sequence[str], model: str, dim: int) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        found: Dict[str, tuple] = {}
+        now = int(time.time())
+        with self._lock:
+            conn = self._connection()
+            # SQLite 单条语句的参数数量有限，分批查询
+            for start in range(0, len(keys), 500):
+                chunk = list(keys[start:start + 500])
+                placeholders = ",".join("?" * len(chunk))
+                for key, row, gen, used_at in conn.execute(
+                    f"SELECT key, row, gen, used_at FROM embeddings WHERE model = ? AND dim = ? AND dtype = ?"
+                    f" AND key IN ({placeholders})",
+                    [model, dim, self.dtype.name, *chunk],
+                ):
+                    found[key] = (row, gen, used_at)
+            if not found:
+                return [None] * len(keys)
+            # 记录最近使用时间，整理时优先保留；精度为一小时，大多数命中不需要写索引
+            stale = [key for key, (_, _, used_at) in found.items() if now - used_at >= USED_AT_RESOLUTION]
+            if stale:
+                try:
+                    conn.executemany(
+                        "UPDATE embeddings SET used_at = ? WHERE key = ? AND model = ? AND dim = ? AND dtype = ?",
+                        [(now, key, model, dim, self.dtype.name) for key in stale],
+                    )
+                    conn.commit()
+                except sqlite3.OperationalError as e:
+                    # 其他进程长时间持有写锁时放弃本次更新，不影响读取
+                    conn.rollback()
+                    logger.debug(f"更新 embedding 缓存使用时间失败: {e}")
+            files: Dict[int, Optional[np.memmap]] = {}
+            for gen in {gen for _, gen, _ in found.values()}:
+                try:
+                    files[gen] = self._rows(model, dim, gen)
+                except FileNotFoundError:
+                    # 查询之后该代文件已被其他进程整理删除，按未命中处理
+                    files[gen] = None
+        results: List[Optional[List[float]]] = []
+        for key in keys:
+            row, gen, _ = found.get(key, (None, None, None))
+            rows = files.get(gen)
+            results.append(rows[row].astype(np.float32).tolist()
+                           if rows is not None and row < rows.shape[0] else None)
+        return results
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]], model: str) -> None:
+        if not keys:
+            return
+        array = np.asarray(vectors, dtype=self.dtype)
+        dim = array.shape[1]
+        row_bytes = dim * self.dtype.itemsize
+        now = int(time.time())
+        with self._lock, open(self.lock_path, "a") as lock:
+            # 多进程同时追加或整理时用文件锁保证行号和代数一致
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                conn = self._connection()
+                gen = self._current_gen(conn, model, dim)
+                path = self.vector_path(model, dim, gen)
+                with open(path, "ab") as f:
+                    f.seek(0, os.SEEK_END)
+                    first_row = f.tell() // row_bytes
+                    f.write(array.tobytes())
+                    f.flush()
+                    size = f.tell()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, dtype, row, gen, used_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(key, model, dim, self.dtype.name, first_row + i, gen, now) for i, key in enumerate(keys)],
+                )
+                conn.commit()
+                if self.max_bytes and size > self.max_bytes:
+                    self._compact(conn, model, dim, gen)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _compact(self, conn: sqlite3.Connection, model: str, dim: int, gen: int) -> None:
+        """把最近使用的向量复制到新一代文件，其余从索引中删除；调用方持有写锁"""
+        row_bytes = dim * self.dtype.itemsize
+        entries = conn.execute(
+            "SELECT key, row, used_at FROM embeddings WHERE model = ? AND dim = ? AND dtype = ? AND gen = ?"
+            " ORDER BY used_at DESC, row DESC",
+            (model, dim, self.dtype.name, gen),
+        ).fetchall()
+        # 同一个键重复写入时旧行已经没有索引指向，整理时一并回收
+        keep = sorted(entries[:int(self.max_bytes * COMPACT_RATIO) // row_bytes], key=lambda entry: entry[1])
+        old_path, new_path = self.vector_path(model, dim, gen), self.vector_path(model, dim, gen + 1)
+        old_rows = np.memmap(old_path, dtype=self.dtype, mode="r",
+                             shape=(os.path.getsize(old_path) // row_bytes, dim))
+        tmp_path = f"{new_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for start in range(0, len(keep), 4096):
+                f.write(np.ascontiguousarray(old_rows[[row for _, row, _ in keep[start:start + 4096]]]).tobytes())
+        del old_rows
+        os.replace(tmp_path, new_path)
+        # 索引在一个事务中切换到新文件：读取方要么看到旧代的行号，要么看到新代的行号
+        conn.execute("DELETE FROM embeddings WHERE model = ? AND dim = ? AND dtype = ? AND gen = ?",
+                     (model, dim, self.dtype.name, gen))
+        conn.executemany(
+            "INSERT INTO embeddings (key, model, dim, dtype, row, gen, used_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(key, model, dim, self.dtype.name, i, gen + 1, used_at) for i, (key, _, used_at) in enumerate(keep)],
+        )
+        conn.execute("INSERT OR REPLACE INTO vector_files (model, dim, dtype, gen) VALUES (?, ?, ?, ?)",
+                     (model, dim, self.dtype.name, gen + 1))
+        conn.commit()
+        # 已经映射旧文件的进程仍可读取（文件删除后映射保持有效）
+        os.remove(old_path)
+        self._maps.pop((model, dim, gen), None)
+        self.counters["compactions"] += 1
+        self.counters["evicted"] += len(entries) - len(keep)
+        logger.info(f"embedding 缓存 {model}（{dim} 维）已整理：保留 {len(keep)} 条，淘汰 {len(entries) - len(keep)} 条")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "max_bytes": self.max_bytes}
+
+
+_stores: Dict[tuple, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(cache_dir: str, dtype: str = "float32", max_bytes: int = 0) -> EmbeddingStore:
+    """同一目录和精度在进程内共用一个存储"""
+    with _stores_lock:
+        key = (os.path.abspath(cache_dir), dtype)
+        if key not in _stores:
+            _stores[key] = EmbeddingStore(cache_dir, dtype, max_bytes)
+        return _stores[key]
+
+
+class CachedEmbeddings(Embeddings):
+    """带持久化缓存的 embedding 模型
+
+    Args:
+        inner: 实际执行 embedding 的模型
+        store: 磁盘缓存
+        model: 模型名，作为缓存键的一部分
+        query_cache_size: 查询 LRU 缓存的容量
+    """
+
+    def __init__(self, inner: Embeddings, store: EmbeddingStore, model: str, query_cache_size: int = 10000):
+        self.inner = inner
+        self.store = store
+        self.model = model
+        self.dim = store.known_dim(model)
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"doc_hits": 0, "doc_misses": 0, "query_lru_hits": 0, "query_store_hits": 0,
+                         "query_misses": 0}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def _lookup(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if self.dim is None:
+            return [None] * len(keys)
+        return self.store.get_many(keys, self.model, self.dim)
+
+    def _save(self, keys: List[str], vectors: List[List[float]]) -> None:
+        if not vectors:
+            return
+        self.dim = len(vectors[0])
+        self.store.put_many(keys, vectors, self.model)
+
+    def _merge(self, texts: List[str]):
+        keys = [text_key(text) for text in texts]
+        cached = self._lookup(keys)
+        # 同一批中重复的文本只计算一次
+        missing: Dict[str, int] = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(keys[i], i)
+        self._count("doc_hits", len(texts) - sum(1 for v in cached if v is None))
+        self._count("doc_misses", len(missing))
+        return keys, cached, missing
+
+    def _fill(self, keys, cached, missing, vectors) -> List[List[float]]:
+        miss_keys = list(missing)
+        self._save(miss_keys, vectors)
+        computed = dict(zip(miss_keys, vectors))
+        return [vector if vector is not None else computed[keys[i]] for i, vector in enumerate(cached)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._merge(texts)
+        vectors = self.inner.embed_documents([texts[i] for i in missing.values()]) if missing else []
+        return self._fill(keys, cached, missing, vectors)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._merge(texts)
+        vectors = await self.inner.aembed_documents([texts[i] for i in missing.values()]) if missing else []
+        return self._fill(keys, cached, missing, vectors)
+
+    def _query_lookup(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+                self.counters["query_lru_hits"] += 1
+                return vector
+        vector = self._lookup([key])[0]
+        if vector is not None:
+            self._count("query_store_hits")
+            self._query_remember(key, vector)
+        return vector
+
+    def _query_remember(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._query_cache[key] = vector
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = text_key(text)
+        vector = self._query_lookup(key)
+        if vector is None:
+            self._count("query_misses")
+            vector = self.inner.embed_query(text)
+            self._query_remember(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = text_key(text)
+        vector = self._query_lookup(key)
+        if vector is None:
+            self._count("query_misses")
+            vector = await self.inner.aembed_query(text)
+            self._query_remember(key, vector)
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = {"cache": dict(self.counters), "query_lru_size": len(self._query_cache)}
+        stats["store"] = self.store.stats()
+        inner_stats = getattr(self.inner, "stats", None)
+        if callable(inner_stats):
+            stats.update(inner_stats())
+        return stats
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
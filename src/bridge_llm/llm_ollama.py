@@ -1,6 +1,9 @@
 import os
 from dotenv import load_dotenv
-from langchain_ollama import ChatOllama, OllamaEmbeddings
+from registry import registry
+from bridge_llm.ollama_pool import PooledChatOllama, PooledOllamaEmbeddings, endpoint_stats
+from bridge_llm.batching import MicroBatchEmbeddings
+from bridge_llm.embedding_cache import CachedEmbeddings, get_store
 
 # 使用相对路径加载.env文件
 # current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,59 +15,115 @@ load_dotenv(dotenv_path=env_path)
 OLLAMA_BASE_URL1 = os.getenv("OLLAMA_BASE_URL1")
 OLLAMA_BASE_URL2 = os.getenv("OLLAMA_BASE_URL2")
 
-# 定义模型实例
-chat_ollama_llama31_json = ChatOllama(
-    model="llama3.1",
-    format="json",
-    base_url=OLLAMA_BASE_URL1,
-    temperature=0.1
-)
-
-chat_ollama_llama31 = ChatOllama(
-    model="llama3.1",
-    base_url=OLLAMA_BASE_URL1,
-    temperature=0.1
-)
-
-chat_ollama_llama31_fp16 = ChatOllama(
-    model="llama3.1:8b-instruct-fp16",
-    base_url=OLLAMA_BASE_URL1,
-    temperature=0.1
-)
-
-chat_ollama_llama32_3b_fp16 = ChatOllama(
-    model="llama3.2:3b-instruct-fp16",
-    base_url=OLLAMA_BASE_URL1,
-    temperature=0
-)
-
-chat_ollama_llama31_fp16_json = ChatOllama(
-    model="llama3.1:8b-instruct-fp16",
-    base_url=OLLAMA_BASE_URL2,
-    format="json",
-    temperature=0.1
-)
-
-chat_ollama_llama31_70b = ChatOllama(
-    model="llama3.1:70b",
-    base_url=OLLAMA_BASE_URL2,
-    temperature=0.1
-)
-
-embeddings_nomic = OllamaEmbeddings(
-    model="nomic-embed-text",
-    base_url=OLLAMA_BASE_URL1
-)
-
-embeddings_jina = OllamaEmbeddings(
-    model="jina-embeddings-v2-base-en",
-    base_url=OLLAMA_BASE_URL1
-)
-
-embeddings_bge_m3 = OllamaEmbeddings(
-    model="bge-m3",
-    base_url=OLLAMA_BASE_URL1
-)
+# 全部可用节点，逗号分隔；未设置时使用 URL1、URL2
+OLLAMA_BASE_URLS = [
+    url.strip() for url in os.getenv("OLLAMA_BASE_URLS", "").split(",") if url.strip()
+] or [url for url in (OLLAMA_BASE_URL1, OLLAMA_BASE_URL2) if url]
+
+
+def model_endpoints(name: str, default):
+    """模型可用的节点列表，可用 OLLAMA_ENDPOINTS_<NAME> 单独指定（逗号分隔）"""
+    override = os.getenv(f"OLLAMA_ENDPOINTS_{name.upper()}")
+    if override:
+        return [url.strip() for url in override.split(",") if url.strip()]
+    return [url for url in default if url]
+
+# 并发 embedding 请求的合并窗口（毫秒），0 表示不合并
+EMBED_BATCH_WAIT_MS = float(os.getenv("BIOINFO_EMBED_BATCH_WAIT_MS", "5"))
+EMBED_BATCH_MAX_SIZE = int(os.getenv("BIOINFO_EMBED_BATCH_MAX_SIZE", "64"))
+EMBED_BATCH_CONCURRENCY = int(os.getenv("BIOINFO_EMBED_BATCH_CONCURRENCY", "4"))
+
+# 持久化 embedding 缓存目录，设为空字符串关闭；精度可选 float16 / float32
+EMBED_CACHE_DIR = os.getenv("BIOINFO_EMBED_CACHE_DIR", "/home/awgao/BioinfoGPT/data/embedding_cache")
+EMBED_CACHE_DTYPE = os.getenv("BIOINFO_EMBED_CACHE_DTYPE", "float32")
+# 每个模型向量文件的大小上限（MB），超过后按最近使用时间淘汰，0 表示不限制
+EMBED_CACHE_MAX_MB = float(os.getenv("BIOINFO_EMBED_CACHE_MAX_MB", "4096"))
+QUERY_CACHE_SIZE = int(os.getenv("BIOINFO_QUERY_CACHE_SIZE", "10000"))
+
+# 模型配置：名称 -> 构造参数（实例在首次使用时才创建）
+CHAT_MODELS = {
+    "chat_ollama_llama31_json": dict(
+        model="llama3.1",
+        format="json",
+        endpoints=OLLAMA_BASE_URLS,
+        temperature=0.1
+    ),
+    "chat_ollama_llama31": dict(
+        model="llama3.1",
+        endpoints=OLLAMA_BASE_URLS,
+        temperature=0.1
+    ),
+    "chat_ollama_llama31_fp16": dict(
+        model="llama3.1:8b-instruct-fp16",
+        endpoints=OLLAMA_BASE_URLS,
+        temperature=0.1
+    ),
+    "chat_ollama_llama32_3b_fp16": dict(
+        model="llama3.2:3b-instruct-fp16",
+        endpoints=OLLAMA_BASE_URLS,
+        temperature=0
+    ),
+    "chat_ollama_llama31_fp16_json": dict(
+        model="llama3.1:8b-instruct-fp16",
+        endpoints=OLLAMA_BASE_URLS,
+        format="json",
+        temperature=0.1
+    ),
+    "chat_ollama_llama31_70b": dict(
+        model="llama3.1:70b",
+        endpoints=[OLLAMA_BASE_URL2],  # 70B 只部署在第二台机器上
+        temperature=0.1
+    ),
+}
+
+EMBEDDING_MODELS = {
+    "embeddings_nomic": dict(
+        model="nomic-embed-text",
+        endpoints=OLLAMA_BASE_URLS
+    ),
+    "embeddings_jina": dict(
+        model="jina-embeddings-v2-base-en",
+        endpoints=OLLAMA_BASE_URLS
+    ),
+    "embeddings_bge_m3": dict(
+        model="bge-m3",
+        endpoints=OLLAMA_BASE_URLS
+    ),
+}
+
+def _build_chat(name: str, kwargs: dict) -> PooledChatOllama:
+    kwargs = dict(kwargs)
+    model = kwargs.pop("model")
+    endpoints = model_endpoints(name, kwargs.pop("endpoints"))
+    return PooledChatOllama(model=model, endpoints=endpoints, chat_kwargs=kwargs)
+
+
+def _build_embeddings(name: str, kwargs: dict):
+    kwargs = dict(kwargs)
+    endpoints = model_endpoints(name, kwargs.pop("endpoints"))
+    embeddings = PooledOllamaEmbeddings(endpoints=endpoints, **kwargs)
+    if EMBED_BATCH_WAIT_MS > 0:
+        embeddings = MicroBatchEmbeddings(embeddings, EMBED_BATCH_WAIT_MS, EMBED_BATCH_MAX_SIZE,
+                                          EMBED_BATCH_CONCURRENCY)
+    if EMBED_CACHE_DIR:
+        store = get_store(EMBED_CACHE_DIR, EMBED_CACHE_DTYPE, int(EMBED_CACHE_MAX_MB * 1024 * 1024))
+        embeddings = CachedEmbeddings(embeddings, store, kwargs["model"], QUERY_CACHE_SIZE)
+    return embeddings
+
+
+for _name, _kwargs in CHAT_MODELS.items():
+    registry.register(_name, lambda name=_name, kwargs=_kwargs: _build_chat(name, kwargs), tags=("llm",))
+
+for _name, _kwargs in EMBEDDING_MODELS.items():
+    registry.register(_name, lambda name=_name, kwargs=_kwargs: _build_embeddings(name, kwargs), tags=("embedding",))
+
+
+def __getattr__(name):
+    # 模块属性延迟解析：导入本模块不会创建客户端
+    if name in CHAT_MODELS or name in EMBEDDING_MODELS:
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # 导出模型实例
 __all__ = [
@@ -73,14 +132,15 @@ __all__ = [
     "chat_ollama_llama31_fp16",
     "embeddings_nomic",
     "embeddings_jina",
-    "embeddings_bge_m3"
+    "embeddings_bge_m3",
+    "endpoint_stats",
 ]
 
 # 示例用法（如果直接运行此文件）
 if __name__ == "__main__":
     question = "常见的十字花科植物有哪些？"
-    answer = chat_ollama_llama31.invoke(question)
+    answer = registry.get("chat_ollama_llama31").invoke(question)
     print(f"问题：{question}")
     print(f"回答：{answer.content}")
-    answer = chat_ollama_llama31_70b.invoke(question)
+    answer = registry.get("chat_ollama_llama31_70b").invoke(question)
     print(f"70B回答：{answer.content}")
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
+from registry import registry
 
 # 使用相对路径加载.env文件
 # current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -8,17 +9,27 @@ from langchain_openai import ChatOpenAI
 env_path = '/home/awgao/BioinfoGPT/.env'
 load_dotenv(dotenv_path=env_path)
 
-chat_openai = ChatOpenAI(
-    model="gpt-4o-mini",
-    openai_api_key=os.getenv("OPENAI_API_KEY"),
-    openai_api_base=os.getenv("OPENAI_API_BASE_URL"),
-    temperature=0,  # 可以根据需要调整
-)
+def _build_chat_openai():
+    return ChatOpenAI(
+        model="gpt-4o-mini",
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        openai_api_base=os.getenv("OPENAI_API_BASE_URL"),
+        temperature=0,  # 可以根据需要调整
+    )
+
+registry.register("chat_openai", _build_chat_openai, tags=("llm",))
+
+
+def __getattr__(name):
+    # 模块属性延迟解析：导入本模块不会创建客户端
+    if name == "chat_openai":
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 示例用法（如果直接运行此文件）
 if __name__ == "__main__":
     question = "常见的十字花科植物有哪些？"
-    answer = chat_openai.invoke(question)
+    answer = registry.get("chat_openai").invoke(question)
     print(f"问题：{question}")
     print(f"回答：{answer.content}")
 
@@ -0,0 +1,289 @@
+"""多 Ollama 节点的负载均衡与熔断
+
+同一模型可以部署在多台 Ollama 上，每次请求按 (在途请求数 + 1) × 平滑延迟 选择得分最低的健康节点；
+连续失败的节点会被熔断一段时间，冷却后放行一个探测请求（半开状态），成功即恢复。
+embedding 请求是幂等的，失败后会换一个节点重试；对话请求（含流式输出）只做路由不重试。
+请求被取消（如 fan-out 超时、推测执行被撤销）时只归还在途计数，不计为失败，也不计入延迟。
+
+节点状态按 URL 在进程内共享，因此同一台机器上不同模型的负载会一起计入。
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from pydantic import PrivateAttr
+
+
+class EndpointState:
+    """单个 Ollama 节点的运行状态"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.ewma_latency: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.half_open_probe = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "ewma_latency": self.ewma_latency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "state": self.circuit_state(),
+        }
+
+    def circuit_state(self, now: Optional[float] = None) -> str:
+        now = time.monotonic() if now is None else now
+        if self.opened_until == 0.0:
+            return "closed"
+        return "open" if now < self.opened_until else "half_open"
+
+
+_endpoints: Dict[str, EndpointState] = {}
+_endpoints_lock = threading.Lock()
+# 保护所有节点的在途数、延迟和熔断状态：选择节点时要在同一时刻比较各节点并计入在途请求
+_state_lock = threading.Lock()
+
+
+def get_endpoint(url: str) -> EndpointState:
+    with _endpoints_lock:
+        if url not in _endpoints:
+            _endpoints[url] = EndpointState(url)
+        return _endpoints[url]
+
+
+def endpoint_stats() -> List[Dict[str, Any]]:
+    """所有已使用节点的统计信息"""
+    with _endpoints_lock:
+        states = list(_endpoints.values())
+    with _state_lock:
+        return [state.snapshot() for state in states]
+
+
+def _reset_after_fork() -> None:
+    # 子进程不继承父进程的在途请求和锁状态
+    global _endpoints_lock, _state_lock
+    _endpoints_lock = threading.Lock()
+    _state_lock = threading.Lock()
+    for state in _endpoints.values():
+        state.in_flight = 0
+        state.half_open_probe = False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class OllamaEndpointPool:
+    """在一组节点之间选择请求目标
+
+    Args:
+        urls: 节点地址列表
+        failure_threshold: 连续失败多少次后熔断
+        cooldown: 熔断持续时间（秒）
+        latency_alpha: 延迟指数平滑系数
+    """
+
+    def __init__(self, urls: Sequence[str], failure_threshold: int = 3,
+                 cooldown: float = 30.0, latency_alpha: float = 0.2):
+        urls = [url for url in urls if url]
+        if not urls:
+            raise ValueError("至少需要一个 Ollama 节点地址")
+        self.urls = list(dict.fromkeys(urls))
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency_alpha = latency_alpha
+
+    @property
+    def endpoints(self) -> List[EndpointState]:
+        return [get_endpoint(url) for url in self.urls]
+
+    def _score(self, state: EndpointState) -> float:
+        # 未观测过延迟的节点优先尝试
+        latency = state.ewma_latency if state.ewma_latency is not None else 0.0
+        return (state.in_flight + 1) * max(latency, 1e-3)
+
+    def acquire(self, exclude: Sequence[str] = ()) -> EndpointState:
+        """选择一个节点并计入在途请求"""
+        endpoints = self.endpoints
+        with _state_lock:
+            now = time.monotonic()
+            candidates = [s for s in endpoints if s.url not in exclude] or endpoints
+            available = []
+            for state in candidates:
+                circuit = state.circuit_state(now)
+                if circuit == "closed":
+                    available.append(state)
+                elif circuit == "half_open" and not state.half_open_probe:
+                    available.append(state)
+            if not available:
+                # 全部熔断时选择最早恢复的节点，而不是直接失败
+                available = [min(candidates, key=lambda s: s.opened_until)]
+
+            chosen = min(available, key=self._score)
+            if chosen.circuit_state(now) != "closed":
+                chosen.half_open_probe = True
+            chosen.in_flight += 1
+            chosen.requests += 1
+        return chosen
+
+    def release(self, state: EndpointState, latency: float, ok: Optional[bool]) -> None:
+        """归还节点；ok 为 None 表示请求被取消，既不计入延迟也不计为失败"""
+        with _state_lock:
+            state.in_flight = max(0, state.in_flight - 1)
+            state.half_open_probe = False
+            if ok is None:
+                return
+            if ok:
+                state.consecutive_failures = 0
+                state.opened_until = 0.0
+                if state.ewma_latency is None:
+                    state.ewma_latency = latency
+                else:
+                    state.ewma_latency += self.latency_alpha * (latency - state.ewma_latency)
+            else:
+                state.failures += 1
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= self.failure_threshold or state.opened_until:
+                    state.opened_until = time.monotonic() + self.cooldown
+
+    @contextmanager
+    def lease(self, exclude: Sequence[str] = ()) -> Iterator[EndpointState]:
+        """占用一个节点直到退出；同步和异步调用（包括 await 被取消、流式输出提前结束）都用它归还节点"""
+        state = self.acquire(exclude)
+        start = time.perf_counter()
+        ok = None
+        try:
+            yield state
+            ok = True
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.release(state, time.perf_counter() - start, ok)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        endpoints = self.endpoints
+        with _state_lock:
+            return [state.snapshot() for state in endpoints]
+
+
+class PooledOllamaEmbeddings(Embeddings):
+    """在多个节点间均衡的 OllamaEmbeddings，失败时换节点重试"""
+
+    def __init__(self, model: str, endpoints: Sequence[str], max_attempts: Optional[int] = None,
+                 **kwargs):
+        self.model = model
+        self.pool = OllamaEndpointPool(endpoints)
+        self.max_attempts = max_attempts or len(self.pool.urls)
+        self._kwargs = kwargs
+        self._clients: Dict[str, OllamaEmbeddings] = {}
+
+    def _client(self, url: str) -> OllamaEmbeddings:
+        if url not in self._clients:
+            self._clients[url] = OllamaEmbeddings(model=self.model, base_url=url, **self._kwargs)
+        return self._clients[url]
+
+    def _call(self, method: str, *args):
+        tried: List[str] = []
+        for attempt in range(self.max_attempts):
+            try:
+                with self.pool.lease(exclude=tried) as state:
+                    tried.append(state.url)
+                    return getattr(self._client(state.url), method)(*args)
+            except Exception:
+                if attempt == self.max_attempts - 1:
+                    raise
+
+    async def _acall(self, method: str, *args):
+        tried: List[str] = []
+        for attempt in range(self.max_attempts):
+            try:
+                with self.pool.lease(exclude=tried) as state:
+                    tried.append(state.url)
+                    return await getattr(self._client(state.url), method)(*args)
+            except Exception:
+                if attempt == self.max_attempts - 1:
+                    raise
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._call("embed_documents", texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call("embed_query", text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._acall("aembed_documents", texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._acall("aembed_query", text)
+
+
+class PooledChatOllama(BaseChatModel):
+    """在多个节点间均衡的 ChatOllama；对话请求只路由，不重试"""
+
+    model: str
+    endpoints: List[str]
+    chat_kwargs: Dict[str, Any] = {}
+
+    _pool: OllamaEndpointPool = PrivateAttr()
+    _clients: Dict[str, ChatOllama] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._pool = OllamaEndpointPool(self.endpoints)
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-chat-ollama"
+
+    @property
+    def pool(self) -> OllamaEndpointPool:
+        return self._pool
+
+    def _client(self, url: str) -> ChatOllama:
+        if url not in self._clients:
+            self._clients[url] = ChatOllama(model=self.model, base_url=url, **self.chat_kwargs)
+        return self._clients[url]
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        # 与 ChatOllama.bind_tools 相同：工具定义作为调用参数传给选中的节点
+        kwargs.pop("tool_choice", None)
+        formatted_tools = [convert_to_openai_tool(tool) for tool in tools]
+        return super().bind(tools=formatted_tools, **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        with self._pool.lease() as state:
+            return self._client(state.url)._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        with self._pool.lease() as state:
+            return await self._client(state.url)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # 整个流式输出期间占用节点，调用方提前停止读取时按取消处理
+        with self._pool.lease() as state:
+            yield from self._client(state.url)._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        with self._pool.lease() as state:
+            async for chunk in self._client(state.url)._astream(messages, stop=stop, run_manager=run_manager,
+                                                                **kwargs):
+                yield chunk
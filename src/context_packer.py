@@ -0,0 +1,268 @@
+"""生成前的上下文打包
+
+检索结果直接拼进提示词时有大量浪费：RecursiveCharacterTextSplitter 的 chunk_overlap 让相邻 chunk 重复上百字符，
+同一文件的相邻 chunk 被拆成多段，Document 的 repr 把整个元数据字典也带进了提示词。
+ContextPacker 在生成前：
+    1. 去掉内容完全相同或被其他 chunk 包含的 chunk
+    2. 同一来源（文件 / 工具）的 chunk 首尾重叠时合并为一段
+    3. 按检索得分（score / rrf_score，没有时按检索顺序）排序
+    4. 在模型对应的 token 预算内依次放入，最后一段放不下时按行截断
+输出紧凑的文本（每段一行来源信息 + 正文），并统计打包前后的 token 数。
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from registry import registry
+
+logger = logging.getLogger(__name__)
+
+# 各 LLM 组件留给检索上下文的 token 数（提示词模板和回答另占），未列出的使用 DEFAULT_CONTEXT_BUDGET
+CONTEXT_BUDGETS = {
+    "chat_openai": 6000,
+    "chat_openrouter": 6000,
+    "chat_deepseek": 6000,
+    "chat_doubao": 6000,
+    # Ollama 默认上下文窗口 2048
+    "chat_cascade": 1200,
+    "chat_ollama_llama31": 1200,
+    "chat_ollama_llama31_fp16": 1200,
+    "chat_ollama_llama32_3b_fp16": 1200,
+    "chat_ollama_llama31_70b": 1200,
+}
+DEFAULT_CONTEXT_BUDGET = int(os.getenv("BIOINFO_CONTEXT_BUDGET", "3000"))
+
+# 参与来源分组的元数据字段，依次尝试
+SOURCE_FIELDS = (("tool_name", "file_name"), ("source",), ("doi",), ("pmid",), ("rowid",))
+SCORE_FIELDS = ("score", "rrf_score")
+
+CJK_PATTERN = re.compile(r"[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+class TokenCounter:
+    """优先使用 tiktoken 的 cl100k_base 编码；编码文件无法加载时（如离线环境）按字符估算"""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoding_name = encoding
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if not self._loaded:
+                try:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding(self._encoding_name)
+                except Exception as e:
+                    logger.warning(f"tiktoken 编码 {self._encoding_name} 加载失败，按字符估算 token 数: {e}")
+                self._loaded = True
+        return self._encoding
+
+    def __call__(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._encoding if self._loaded else self._load()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        # 中日韩字符约 1 token/字，其余约 4 字符/token
+        cjk = len(CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class Passage:
+    """打包后的一段上下文，由同一来源的一个或多个 chunk 合并而来"""
+    text: str
+    metadata: Dict[str, Any]
+    score: float
+    rank: int
+    source: Tuple
+    merged: int = 1
+
+
+@dataclass
+class PackedContext:
+    text: str
+    passages: List[Passage]
+    raw_tokens: int
+    packed_tokens: int
+    budget: int
+    stats: Dict[str, int] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _overlap(left: str, right: str, min_overlap: int, max_overlap: int) -> int:
+    """left 的结尾与 right 的开头重叠的最大长度，不足 min_overlap 时返回 0"""
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class ContextPacker:
+    """去重、合并相邻 chunk，并在 token 预算内打包检索结果
+
+    Args:
+        count_tokens: token 计数函数，默认为 TokenCounter
+        metadata_fields: 每段来源行中显示的元数据字段
+        min_overlap: 判定相邻 chunk 的最小首尾重叠字符数
+        max_overlap: 查找首尾重叠的最大字符数（不小于切分时的 chunk_overlap）
+        min_tail_tokens: 预算剩余不足该值时不再截断放入下一段
+    """
+
+    def __init__(self, count_tokens: Optional[Callable[[str], int]] = None,
+                 metadata_fields: Sequence[str] = ("tool_name", "file_name", "section", "function",
+                                                   "year", "tooltype", "doi", "pmid", "url"),
+                 min_overlap: int = 20, max_overlap: int = 400, min_tail_tokens: int = 64):
+        self.count_tokens = count_tokens or TokenCounter()
+        self.metadata_fields = tuple(metadata_fields)
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.min_tail_tokens = min_tail_tokens
+        self._lock = threading.Lock()
+        self.totals = {"calls": 0, "raw_tokens": 0, "packed_tokens": 0, "chunks_in": 0, "passages_out": 0,
+                       "duplicates": 0, "merged": 0, "dropped": 0, "truncated": 0}
+
+    @staticmethod
+    def budget_for(llm: Optional[str]) -> int:
+        return CONTEXT_BUDGETS.get(llm, DEFAULT_CONTEXT_BUDGET)
+
+    @staticmethod
+    def source_of(doc: Document) -> Tuple:
+        for fields in SOURCE_FIELDS:
+            values = tuple(doc.metadata.get(name) for name in fields)
+            if any(value not in (None, "") for value in values):
+                return fields + values
+        return ("content", hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest())
+
+    def header(self, passage: Passage, index: int) -> str:
+        parts = [f"{name}: {passage.metadata[name]}" for name in self.metadata_fields
+                 if passage.metadata.get(name) not in (None, "")]
+        return f"[{index}] " + " | ".join(parts) if parts else f"[{index}]"
+
+    def _dedupe_and_merge(self, docs: List[Document], stats: Dict[str, int]) -> List[Passage]:
+        passages: List[Passage] = []
+        seen = set()
+        for rank, doc in enumerate(docs):
+            text = doc.page_content.strip()
+            key = _normalize(text)
+            if not key or key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            score = next((float(doc.metadata[name]) for name in SCORE_FIELDS
+                          if isinstance(doc.metadata.get(name), (int, float))), None)
+            passages.append(Passage(text, dict(doc.metadata), score if score is not None else -rank, rank,
+                                    self.source_of(doc)))
+
+        # 同一来源内：被包含的 chunk 丢弃，首尾重叠的 chunk 合并，直到不再变化
+        by_source: Dict[Tuple, List[Passage]] = {}
+        for passage in passages:
+            by_source.setdefault(passage.source, []).append(passage)
+        merged_all: List[Passage] = []
+        for group in by_source.values():
+            changed = True
+            while changed and len(group) > 1:
+                changed = False
+                for i in range(len(group)):
+                    for j in range(len(group)):
+                        if i == j:
+                            continue
+                        a, b = group[i], group[j]
+                        if b.text in a.text:
+                            a.score, a.rank = max(a.score, b.score), min(a.rank, b.rank)
+                            stats["duplicates"] += 1
+                        else:
+                            size = _overlap(a.text, b.text, self.min_overlap, self.max_overlap)
+                            if not size:
+                                continue
+                            a.text = a.text + b.text[size:]
+                            a.score, a.rank = max(a.score, b.score), min(a.rank, b.rank)
+                            a.merged += b.merged
+                            stats["merged"] += 1
+                        del group[j]
+                        changed = True
+                        break
+                    if changed:
+                        break
+            merged_all.extend(group)
+        return merged_all
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """按行截断到预算内，单行过长时按字符截断"""
+        lines, kept, used = text.split("\n"), [], 0
+        for line in lines:
+            tokens = self.count_tokens(line) + 1
+            if used + tokens > budget:
+                if not kept:
+                    # 按比例估算字符数后逐步缩短
+                    cut = max(1, len(line) * budget // max(tokens, 1))
+                    while cut > 1 and self.count_tokens(line[:cut]) > budget:
+                        cut = cut * 3 // 4
+                    kept.append(line[:cut])
+                break
+            kept.append(line)
+            used += tokens
+        return "\n".join(kept)
+
+    def pack(self, docs: Sequence[Document], budget: Optional[int] = None, llm: Optional[str] = None) -> PackedContext:
+        """打包检索结果；budget 为空时按 llm 组件名取 CONTEXT_BUDGETS 中的预算"""
+        budget = budget if budget is not None else self.budget_for(llm)
+        docs = list(docs)
+        stats = {"chunks_in": len(docs), "duplicates": 0, "merged": 0, "dropped": 0, "truncated": 0}
+        # 打包前的基准：正文加元数据 repr（直接把 Document 列表传给提示词时的内容）
+        raw_tokens = sum(self.count_tokens(doc.page_content) + self.count_tokens(repr(doc.metadata)) for doc in docs)
+
+        passages = sorted(self._dedupe_and_merge(docs, stats), key=lambda p: (-p.score, p.rank))
+        packed: List[Passage] = []
+        blocks: List[str] = []
+        used = 0
+        for passage in passages:
+            header = self.header(passage, len(packed) + 1)
+            cost = self.count_tokens(header) + self.count_tokens(passage.text) + 2
+            if used + cost > budget:
+                remaining = budget - used - self.count_tokens(header) - 2
+                if remaining < self.min_tail_tokens:
+                    stats["dropped"] += 1
+                    continue
+                passage.text = self._truncate(passage.text, remaining)
+                cost = self.count_tokens(header) + self.count_tokens(passage.text) + 2
+                stats["truncated"] += 1
+            packed.append(passage)
+            blocks.append(f"{header}\n{passage.text}")
+            used += cost
+
+        text = "\n\n".join(blocks)
+        result = PackedContext(text, packed, raw_tokens, self.count_tokens(text), budget, stats)
+        with self._lock:
+            self.totals["calls"] += 1
+            self.totals["raw_tokens"] += result.raw_tokens
+            self.totals["packed_tokens"] += result.packed_tokens
+            self.totals["passages_out"] += len(packed)
+            for name, value in stats.items():
+                self.totals[name] += value
+        logger.info(f"上下文打包: {len(docs)} 个 chunk -> {len(packed)} 段, "
+                    f"{result.raw_tokens} -> {result.packed_tokens} tokens (预算 {budget})")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = dict(self.totals)
+        totals["saved_ratio"] = 1 - totals["packed_tokens"] / totals["raw_tokens"] if totals["raw_tokens"] else 0.0
+        return totals
+
+
+registry.register("context_packer", ContextPacker, tags=("context",))
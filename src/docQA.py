@@ -4,231 +4,608 @@ from langgraph.graph import StateGraph, END
 from langchain.schema import Document, BaseMessage
 from langchain.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain.tools import Tool
-from langchain.tools.retriever import create_retriever_tool
 
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_milvus import Milvus
-from bridge_llm.llm_ollama import embeddings_bge_m3
-from bridge_llm.llm_openai import chat_openai
-from langchain_community.document_loaders import UnstructuredMarkdownLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter, MarkdownTextSplitter
+import bridge_llm.llm_ollama
+import bridge_llm.llm_openai
+from registry import registry
 from langchain_community.tools.tavily_search import TavilySearchResults
 import os
 import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from ingest.manifest import IngestManifest, chunk_id, file_hash
+from ingest.dedup import NearDuplicateIndex
+from ingest.loaders import load_file, load_task, split_file, split_task
+from ingest.pipeline import IngestPipeline, Stage, embed_stage, insert_stage
+from concurrent.futures import ThreadPoolExecutor
+from doc_retrieval import HierarchicalDocRetriever, HybridDocRetriever, ToolIndex
+from retrieval_cache import CachedRetriever, RetrievalCache, bump_collection_version, collection_version
+from fanout import FanoutRetriever, SearchSource, doc_key
+from snapshot import export_milvus_snapshot
+from milvus_conn import reconnect_milvus
+import context_packer
+import asyncio
+import logging
+import re
+import time
+from langgraph.config import get_stream_writer
+from metrics import Histogram
+from bm25_index import BM25Index
+from vector_compression import compression_report, write_report
+import numpy as np
 
-current_embedding_model = embeddings_bge_m3
-current_llm = chat_openai
+logger = logging.getLogger(__name__)
+
+# 注册表中的组件名，实例在首次使用时构建
+current_embedding_model = "embeddings_bge_m3"
+current_llm = "chat_openai"
 
 ## 生信工具文档库检索
 
-## Init vectorstores
+# 增量同步：文档来源配置（加载器和切分器见 ingest/loaders.py）
+DOC_SOURCES = {
+    "Bioconductor": {
+        "docs_dir": "/home/awgao/BioinfoGPT/data/documents/bioconductor_75",
+        "collection_prefix": "bioinfo",
+        "list_files": lambda tool_path: [f for f in ["merged.txt"] if os.path.exists(os.path.join(tool_path, f))],
+        "loader": "text",
+        "splitter": "structured",
+    },
+    "Bioconda": {
+        "docs_dir": "/home/awgao/BioinfoGPT/data/documents/bioconda_44",
+        "collection_prefix": "bioconda",
+        "list_files": lambda tool_path: sorted(f for f in os.listdir(tool_path) if f.endswith('.md')),
+        # 按原始 markdown 读取，保留标题和代码块供结构化切分使用
+        "loader": "text",
+        "splitter": "structured",
+    },
+}
 
-# 初始化生信工具文档库
-def init_bioconductor_docs_vectorstores(
-        docs_dir:str="/home/awgao/BioinfoGPT/data/documents/bioconductor_75",
-        vector_db_path:str="/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db"
-) -> Dict[str, Milvus]:
-    """初始化生信工具文档向量数据库
-    
-    所有工具共用一个db文件,但使用不同的collection
+def doc_metadata(source: str, tool_dir: str, file_name: str) -> Dict[str, str]:
+    return {
+        "tool_name": tool_dir,
+        "source": source,
+        "doc_type": "manual",
+        "file_name": file_name
+    }
+
+# 所有工具文档共用一个 collection，用 tool_name / source 字段区分工具
+DOCS_VECTOR_DB_PATH = "/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db"
+DOCS_COLLECTION = "tool_docs"
+
+def open_docs_vectorstore(vector_db_path: str = DOCS_VECTOR_DB_PATH, drop_old: bool = False) -> Milvus:
+    """打开合并后的工具文档 collection
+
+    Milvus 服务端以 tool_name 作为 partition key，按工具过滤时只搜索对应分区；
+    Milvus Lite（本地 .db 文件）不支持 partition key 上的过滤表达式，tool_name 作为普通标量字段过滤。
+    元数据存放在动态字段中：迁移来的旧 chunk 没有 section / function / content_type，
+    与结构化切分写入的 chunk 共存于同一 collection，不受先写入哪一种的影响。
     """
-    vectorstores = {}
-    
-    # 初始化embedding模型
-    embeddings = current_embedding_model
-    
-    # 文本分割器
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=100,
-        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
-        length_function=len,
-    )
-    
-    # 遍历所有工具目录
-    for tool_dir in os.listdir(docs_dir):
-        tool_path = os.path.join(docs_dir, tool_dir)
-        if not os.path.isdir(tool_path):
-            continue
-            
-        # 查找merged.txt文件
-        merged_file = os.path.join(tool_path, "merged.txt")
-        if os.path.exists(merged_file):
-            try:
-                # 加载文档
-                loader = TextLoader(merged_file, encoding='utf-8')
-                tool_docs = loader.load()
-                
-                # 为文档添加元数据
-                for doc in tool_docs:
-                    doc.metadata.update({
-                        "tool_name": tool_dir,
-                        "source": "Bioconductor",
-                        "doc_type": "manual"
-                    })
-                
-                # 分割文档
-                splits = text_splitter.split_documents(tool_docs)
-                
-                # 创建该工具的collection
-                vectorstore = Milvus(
-                    embedding_function=embeddings,
-                    collection_name=f"bioinfo_{tool_dir}",
-                    connection_args={"uri": vector_db_path},  # 所有工具共用一个db
-                    auto_id=True,
-                    drop_old=True
-                )
-                
-                # 添加文档到向量数据库
-                vectorstore.add_documents(splits)
-                
-                # 保存到字典
-                vectorstores[tool_dir] = vectorstore
-                
-                print(f"成功处理工具: {tool_dir}")
-                
-            except Exception as e:
-                print(f"处理 {tool_dir} 时出错: {str(e)}")
-    
-    return vectorstores
-
-def init_bioconda_docs_vectorstores(
-        docs_dir:str="/home/awgao/BioinfoGPT/data/documents/bioconda_44",
-        vector_db_path:str="/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db"
-) -> Dict[str, Milvus]:
-    """初始化bioconda工具文档向量数据库"""
-    vectorstores = {}
-    embeddings = current_embedding_model
-    
-    # Markdown专用分割器
-    text_splitter = MarkdownTextSplitter(
-        chunk_size=500,
-        chunk_overlap=100
+    partition_kwargs = {}
+    if not vector_db_path.endswith(".db"):
+        partition_kwargs = {"partition_key_field": "tool_name", "num_partitions": 64}
+    vectorstore = Milvus(
+        embedding_function=registry.get(current_embedding_model),
+        collection_name=DOCS_COLLECTION,
+        connection_args={"uri": vector_db_path},
+        auto_id=False,
+        drop_old=drop_old,
+        enable_dynamic_field=True,
+        **partition_kwargs
     )
-    
-    for tool_dir in os.listdir(docs_dir):
+    if vectorstore.col is not None and not vectorstore.col.schema.enable_dynamic_field:
+        # 早期版本按首次写入的元数据固定了 schema，其余字段写入时会被丢弃；按原 schema 继续使用
+        logger.warning(f"{DOCS_COLLECTION} 使用固定 schema（字段: {vectorstore.fields}），"
+                       f"section / function / content_type 等元数据不会保存，需要 --rebuild 重新创建")
+        vectorstore.enable_dynamic_field = False
+    return vectorstore
+
+def docs_filter_expr(tool_names: Optional[List[str]] = None, source: Optional[str] = None) -> Optional[str]:
+    """生成按工具名和来源过滤的表达式，都为空时返回 None（不过滤）"""
+    clauses = []
+    if tool_names:
+        clauses.append(f"tool_name in {json.dumps(list(tool_names))}")
+    if source:
+        clauses.append(f"source == {json.dumps(source)}")
+    return " and ".join(clauses) or None
+
+def manifest_path_for(vector_db_path: str) -> str:
+    return f"{vector_db_path}.manifest.json"
+
+def bm25_path_for(vector_db_path: str) -> str:
+    return f"{vector_db_path}.bm25"
+
+def dedup_path_for(vector_db_path: str) -> str:
+    return f"{vector_db_path}.minhash"
+
+def sync_docs_vectorstores(
+        source: str = "Bioconductor",
+        docs_dir: Optional[str] = None,
+        vector_db_path: str = "/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db"
+) -> Dict[str, Dict[str, int]]:
+    """增量同步工具文档向量库
+
+    根据清单中的文件哈希和 chunk 哈希，只对新增或修改的文件重新切分，
+    只插入新的 chunk、删除消失的 chunk，未变化的工具完全跳过。
+    首次同步（清单中没有记录）的工具会先删除其已有数据，再以 chunk 哈希作为主键写入。
+    新 chunk 与库中已有 chunk 近似重复（MinHash 估计相似度超过阈值）时不写入，清单中只记录它与哪个 chunk 重复；
+    原 chunk 被删除时重新处理记录了该重复的文件（即使文件未变化），被跳过的 chunk 重新检查，不再重复时写入。
+
+    Returns:
+        每个有变化的工具的 {"added": 新增 chunk 数, "deleted": 删除 chunk 数, "near_duplicates": 跳过的近似重复数}
+    """
+    config = DOC_SOURCES[source]
+    docs_dir = docs_dir or config["docs_dir"]
+    manifest = IngestManifest(manifest_path_for(vector_db_path))
+    dedup = NearDuplicateIndex.open(dedup_path_for(vector_db_path))
+    vectorstore = open_docs_vectorstore(vector_db_path)
+    prefix = config["collection_prefix"]
+    results = {}
+
+    tool_dirs = [d for d in os.listdir(docs_dir) if os.path.isdir(os.path.join(docs_dir, d))]
+    for tool_dir in tool_dirs:
         tool_path = os.path.join(docs_dir, tool_dir)
-        if not os.path.isdir(tool_path):
-            continue
-            
+        collection_name = f"{prefix}_{tool_dir}"
+        checked = []
         try:
-            # 加载所有markdown文件
-            md_files = [f for f in os.listdir(tool_path) if f.endswith('.md')]
-            tool_docs = []
-            
-            for md_file in md_files:
-                loader = UnstructuredMarkdownLoader(
-                    os.path.join(tool_path, md_file),
-                    encoding='utf-8'
-                )
-                docs = loader.load()
-                
-                # 添加元数据
-                for doc in docs:
-                    doc.metadata.update({
-                        "tool_name": tool_dir,
-                        "source": "Bioconda",
-                        "doc_type": "manual",
-                        "file_name": md_file
-                    })
-                tool_docs.extend(docs)
-            
-            # 分割文档
-            splits = text_splitter.split_documents(tool_docs)
-            
-            # 创建向量存储
-            vectorstore = Milvus(
-                embedding_function=embeddings,
-                collection_name=f"bioconda_{tool_dir}",
-                connection_args={"uri": vector_db_path},
-                auto_id=True,
-                drop_old=True
-            )
-            
-            vectorstore.add_documents(splits)
-            vectorstores[tool_dir] = vectorstore
-            print(f"成功处理bioconda工具: {tool_dir}")
-            
+            current = {f: file_hash(os.path.join(tool_path, f)) for f in config["list_files"](tool_path)}
+            changed, removed, _ = manifest.diff(collection_name, current)
+            if not changed and not removed:
+                continue
+
+            first_sync = collection_name not in manifest.collections
+            known = manifest.files(collection_name)
+            to_add, to_delete = {}, set()
+            new_chunks = {}
+            for file_name in removed:
+                to_delete |= set(known[file_name]["chunks"])
+            pending = changed
+            while True:
+                for file_name in pending:
+                    docs = load_file(config["loader"], os.path.join(tool_path, file_name),
+                                     doc_metadata(source, tool_dir, file_name))
+                    chunks = split_file(config["splitter"], collection_name, file_name, docs)
+                    to_add.update(chunks)
+                    ids = list(chunks)
+                    old_ids = set(known.get(file_name, {}).get("chunks", []))
+                    to_delete |= old_ids - set(ids)
+                    for cid in old_ids & set(ids):
+                        to_add.pop(cid, None)
+                    new_chunks[file_name] = ids
+                # 被删除的 chunk 是其他文件中被跳过 chunk 的原件：重新处理这些文件
+                pending = [f for f in manifest.files_duplicating(collection_name, to_delete)
+                           if f not in new_chunks and f in current]
+                if not pending:
+                    break
+
+            if first_sync:
+                dedup.remove_groups(lambda group: group == collection_name)
+            dedup.remove(to_delete)
+            duplicates = {}
+            for cid, doc in list(to_add.items()):
+                original = dedup.check(cid, doc.page_content, collection_name)
+                if original is not None:
+                    to_add.pop(cid)
+                    duplicates[cid] = original
+                else:
+                    checked.append(cid)
+            near_duplicates = len(duplicates)
+
+            if first_sync and vectorstore.col is not None:
+                # 首次同步时清掉该工具已有的数据（如迁移来的旧主键数据）
+                vectorstore.delete(expr=docs_filter_expr([tool_dir], source))
+            elif to_delete:
+                vectorstore.delete(ids=list(to_delete))
+            if to_add:
+                vectorstore.add_documents(list(to_add.values()), ids=list(to_add))
+
+            for file_name, ids in new_chunks.items():
+                manifest.update_file(collection_name, file_name, current[file_name],
+                                     [cid for cid in ids if cid not in duplicates],
+                                     {cid: duplicates[cid] for cid in ids if cid in duplicates})
+            for file_name in removed:
+                manifest.remove_file(collection_name, file_name)
+            # 每个工具完成后立即保存清单，中断后可以继续
+            manifest.save()
+            dedup.save(dedup_path_for(vector_db_path))
+
+            results[tool_dir] = {"added": len(to_add), "deleted": len(to_delete), "near_duplicates": near_duplicates}
+            print(f"同步工具 {tool_dir}: 新增 {len(to_add)} 个chunk, 删除 {len(to_delete)} 个chunk, "
+                  f"跳过 {near_duplicates} 个近似重复chunk")
+
         except Exception as e:
-            print(f"处理 {tool_dir} 时出错: {str(e)}")
-    
-    return vectorstores
-
-# 加载已存在的向量数据库collections
-def load_existing_docs_vectorstores(
-        vector_db_path:str="/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db",
-        docs_dir:str="/home/awgao/BioinfoGPT/data/documents/bioconductor_75"
-) -> Dict[str, Milvus]:
-    """加载已存在的向量数据库collections
+            # 未写入的 chunk 不能留在去重索引中，否则之后的相同内容会被误判为重复
+            dedup.remove(checked)
+            print(f"同步 {tool_dir} 时出错: {str(e)}")
+
+    # 文档目录中已删除的工具：删除其 chunk 并移出清单
+    for collection_name in [c for c in manifest.collections if c.startswith(f"{prefix}_")]:
+        tool_dir = collection_name[len(prefix) + 1:]
+        if tool_dir in tool_dirs:
+            continue
+        stale_ids = [cid for entry in manifest.files(collection_name).values() for cid in entry["chunks"]]
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+        dedup.remove(stale_ids)
+        manifest.remove_collection(collection_name)
+        manifest.save()
+        dedup.save(dedup_path_for(vector_db_path))
+        results[tool_dir] = {"added": 0, "deleted": len(stale_ids)}
+
+    if results:
+        # 文档内容已变化，丢弃已打开的文档库及工具列表、使检索结果缓存失效，并重建 BM25 索引
+        registry.invalidate("tool_docs_vectorstore")
+        bump_collection_version(vector_db_path)
+        rebuild_bm25_index(vector_db_path)
+    return results
+
+def build_docs_vectorstores_pipelined(
+        source: str = "Bioconductor",
+        docs_dir: Optional[str] = None,
+        vector_db_path: str = "/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db",
+        load_workers: int = 4,
+        split_workers: int = 2,
+        embed_workers: int = 4,
+        embed_batch_size: int = 64
+) -> Dict[str, Any]:
+    """流水线并行重建工具文档向量库
+
+    加载和切分在进程池中执行，切分后的 chunk 经过 MinHash 近似去重，embedding 按批并发请求，
+    写入按 collection 批量提交，各阶段通过有界队列连接同时运行。重建结果写入同步清单，之后可以用 sync_docs_vectorstores 增量更新。
+
+    Returns:
+        流水线各阶段的统计（吞吐量、队列深度、错误数等）
     """
-    all_bioinfo_tools_docs_vectorstores_dict = {}
-    
-    # 初始化embedding模型
-    embeddings = current_embedding_model
-    
-    # 遍历所有工具目录
-    for tool_dir in os.listdir(docs_dir):
-        if not os.path.isdir(os.path.join(docs_dir, tool_dir)):
+    config = DOC_SOURCES[source]
+    docs_dir = docs_dir or config["docs_dir"]
+    prefix = config["collection_prefix"]
+    embeddings = registry.get(current_embedding_model)
+
+    tool_dirs = [d for d in os.listdir(docs_dir) if os.path.isdir(os.path.join(docs_dir, d))]
+    tasks = [
+        {
+            "collection": f"{prefix}_{tool_dir}",
+            "file_name": file_name,
+            "path": os.path.join(docs_dir, tool_dir, file_name),
+            "loader": config["loader"],
+            "splitter": config["splitter"],
+            "metadata": doc_metadata(source, tool_dir, file_name),
+        }
+        for tool_dir in tool_dirs
+        for file_name in config["list_files"](os.path.join(docs_dir, tool_dir))
+    ]
+
+    # 只重建该来源的数据，其他来源的文档保留
+    vectorstore = open_docs_vectorstore(vector_db_path)
+    recreate = vectorstore.col is not None and not vectorstore.enable_dynamic_field
+    if recreate:
+        # 固定 schema 的旧 collection 无法增加元数据字段，整体重新创建；
+        # 其他来源的清单一并清空，下次 --sync 时按首次同步全部重新写入
+        logger.warning(f"重新创建 {DOCS_COLLECTION}，其他来源的文档需要重新 --sync")
+        vectorstore = open_docs_vectorstore(vector_db_path, drop_old=True)
+    elif vectorstore.col is not None:
+        vectorstore.delete(expr=docs_filter_expr(source=source))
+    dedup = NearDuplicateIndex.open(dedup_path_for(vector_db_path))
+    dedup.remove_groups(lambda group: recreate or group.startswith(f"{prefix}_"))
+
+    # 记录每个文件已写入的 chunk 和作为近似重复跳过的 chunk，全部处理成功的文件才记入清单
+    inserted = {}
+    kept, near_duplicates = [], []
+
+    def entry_for(chunk: Dict[str, Any]) -> Dict[str, Any]:
+        return inserted.setdefault((chunk["collection"], chunk["file_name"]), {
+            "hash": chunk["hash"], "expected": chunk["file_chunks"], "ids": [], "duplicates": {}
+        })
+
+    def record(chunk: Dict[str, Any]) -> None:
+        entry_for(chunk)["ids"].append(chunk["id"])
+
+    def dedup_task(chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # 单线程执行，去重索引不需要加锁
+        original = dedup.check(chunk["id"], chunk["doc"].page_content, chunk["collection"])
+        if original is not None:
+            near_duplicates.append(chunk["id"])
+            entry_for(chunk)["duplicates"][chunk["id"]] = original
+            return []
+        kept.append(chunk["id"])
+        return [chunk]
+
+    # 加载/切分进程池用 forkserver 启动，避免在已有后台线程的进程中 fork
+    mp_context = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(load_workers, mp_context=mp_context) as load_pool, \
+            ProcessPoolExecutor(split_workers, mp_context=mp_context) as split_pool:
+        pipeline = IngestPipeline([
+            Stage("load", load_task, workers=load_workers, queue_size=load_workers * 2, executor=load_pool),
+            Stage("split", split_task, workers=split_workers, queue_size=split_workers * 2, executor=split_pool),
+            Stage("dedup", dedup_task, workers=1, queue_size=embed_batch_size * 2),
+            embed_stage(embeddings, batch_size=embed_batch_size, workers=embed_workers),
+            insert_stage(lambda collection_name: vectorstore),
+        ])
+        stats = pipeline.run(tasks, sink=record)
+
+    manifest = IngestManifest(manifest_path_for(vector_db_path))
+    for collection_name in list(manifest.collections) if recreate else {task["collection"] for task in tasks}:
+        manifest.remove_collection(collection_name)
+    for (collection_name, file_name), entry in inserted.items():
+        if len(entry["ids"]) + len(entry["duplicates"]) == entry["expected"]:
+            manifest.update_file(collection_name, file_name, entry["hash"], entry["ids"], entry["duplicates"])
+    manifest.save()
+    # 写入失败的 chunk 移出去重索引
+    written = {cid for entry in inserted.values() for cid in entry["ids"]}
+    dedup.remove(cid for cid in kept if cid not in written)
+    dedup.save(dedup_path_for(vector_db_path))
+    registry.invalidate("tool_docs_vectorstore")
+    bump_collection_version(vector_db_path)
+    rebuild_bm25_index(vector_db_path)
+
+    stats["tools"] = len(tool_dirs)
+    stats["near_duplicates"] = len(near_duplicates)
+    return stats
+
+def migrate_docs_collections(
+        vector_db_path: str = DOCS_VECTOR_DB_PATH,
+        drop_old_collections: bool = True,
+        batch_size: int = 1000
+) -> Dict[str, int]:
+    """把旧的每工具一个 collection（bioinfo_*/bioconda_*）迁移到合并后的 collection
+
+    直接复制已有的向量，不重新计算 embedding；旧的自增主键替换为 chunk 哈希主键。
+
+    Returns:
+        每个旧 collection 迁移的 chunk 数
+    """
+    prefixes = {config["collection_prefix"]: source for source, config in DOC_SOURCES.items()}
+    vectorstore = open_docs_vectorstore(vector_db_path)
+    client = vectorstore.client
+    migrated = {}
+
+    for collection_name in client.list_collections():
+        prefix, _, tool_dir = collection_name.partition("_")
+        if collection_name == DOCS_COLLECTION or prefix not in prefixes or not tool_dir:
             continue
-            
+        source = prefixes[prefix]
+        count = 0
         try:
-            # 连接到对应的collection
-            vectorstore = Milvus(
-                embedding_function=embeddings,
-                collection_name=f"bioinfo_{tool_dir}",
-                connection_args={"uri": vector_db_path},
-                auto_id=True,
-                drop_old=False  # 不删除已有数据
-            )
-            
-            all_bioinfo_tools_docs_vectorstores_dict[tool_dir] = vectorstore
-            print(f"成功加载工具collection: {tool_dir}")
-            
+            iterator = client.query_iterator(collection_name, batch_size=batch_size, filter="", output_fields=["*"])
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    iterator.close()
+                    break
+                texts, vectors, metadatas, ids = [], [], [], []
+                for row in rows:
+                    file_name = row.get("file_name") or "merged.txt"
+                    metadata = doc_metadata(source, tool_dir, file_name)
+                    metadata["doc_type"] = row.get("doc_type") or metadata["doc_type"]
+                    texts.append(row["text"])
+                    vectors.append(row["vector"])
+                    metadatas.append(metadata)
+                    # 增量同步写入的数据主键本身就是 chunk 哈希，直接沿用
+                    pk = row["pk"]
+                    ids.append(pk if isinstance(pk, str) else chunk_id(collection_name, file_name, row["text"]))
+                vectorstore.add_embeddings(texts, vectors, metadatas, ids=ids)
+                count += len(rows)
+            if drop_old_collections:
+                client.drop_collection(collection_name)
+            migrated[collection_name] = count
+            print(f"迁移 {collection_name}: {count} 个chunk")
         except Exception as e:
-            print(f"加载 {tool_dir} collection时出错: {str(e)}")
-    
-    return all_bioinfo_tools_docs_vectorstores_dict
+            print(f"迁移 {collection_name} 时出错: {str(e)}")
 
+    registry.invalidate("tool_docs_vectorstore")
+    bump_collection_version(vector_db_path)
+    rebuild_bm25_index(vector_db_path)
+    return migrated
 
-def create_tool_retrievers() -> List[Tool]:
-    """创建所有工具的检索器"""
-    tools = []
-    
-    # 加载bioconductor工具
-    bioconductor_stores = load_existing_docs_vectorstores(
-        vector_db_path="/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db"
-    )
-    
-    for tool_name, vectorstore in bioconductor_stores.items():
-        retriever = vectorstore.as_retriever(search_kwargs={'k': 3})
-        tool = create_retriever_tool(
-            retriever,
-            f"search_{tool_name}_docs",
-            f"Search documentation for the Bioconductor tool {tool_name} to answer questions about usage, parameters, and examples."
-        )
-        tools.append(tool)
-    
-    # 加载bioconda工具
-    bioconda_stores = load_existing_docs_vectorstores(
-        vector_db_path="/home/awgao/BioinfoGPT/data/vector_db/milvus_tools.db",
-        docs_dir="/home/awgao/BioinfoGPT/data/documents/bioconda_44"
+
+# 合并后的文档库：按工具过滤检索
+registry.register("tool_docs_vectorstore", open_docs_vectorstore, tags=("vectorstore",), fork_safe=False,
+                  reconnect=reconnect_milvus)
+
+def iter_docs_rows(output_fields: List[str], batch_size: int = 10000, vectorstore: Optional[Milvus] = None):
+    """逐行遍历合并后的文档 collection"""
+    vectorstore = vectorstore or registry.get("tool_docs_vectorstore")
+    if vectorstore.col is None:
+        return
+    iterator = vectorstore.client.query_iterator(
+        DOCS_COLLECTION, batch_size=batch_size, filter="", output_fields=output_fields
     )
-    
-    for tool_name, vectorstore in bioconda_stores.items():
-        retriever = vectorstore.as_retriever(search_kwargs={'k': 3})
-        tool = create_retriever_tool(
-            retriever,
-            f"search_{tool_name}_docs",
-            f"Search documentation for the Bioconda tool {tool_name} to answer questions about installation, usage and examples."
-        )
-        tools.append(tool)
-    
-    # 添加Tavily搜索工具
-    tools.append(TavilySearchResults())
-    
+    while True:
+        rows = iterator.next()
+        if not rows:
+            iterator.close()
+            break
+        yield from rows
+
+@registry.component("tool_docs_names", tags=("index",))
+def list_documented_tools() -> Dict[str, str]:
+    """文档库中的全部工具，{tool_name: source}"""
+    tools = {}
+    for row in iter_docs_rows(["tool_name", "source"]):
+        tools.setdefault(row["tool_name"], row["source"])
     return tools
 
+# BM25 索引与文档 collection 一同维护，保存在向量库旁的 .bm25 目录中
+def rebuild_bm25_index(vector_db_path: str = DOCS_VECTOR_DB_PATH) -> BM25Index:
+    rows = iter_docs_rows(["pk", "tool_name", "text"], vectorstore=open_docs_vectorstore(vector_db_path))
+    index = BM25Index.build((row["pk"], row["tool_name"], row["text"]) for row in rows)
+    index.save(bm25_path_for(vector_db_path))
+    registry.invalidate("bm25_index")
+    return index
+
+def docs_compression_report(vector_db_path: str = DOCS_VECTOR_DB_PATH, max_rows: int = 100000) -> List[Dict]:
+    """文档向量各压缩配置的 recall@k 与大小，写入向量库旁的 .compression.json"""
+    rows = iter_docs_rows(["vector"], vectorstore=open_docs_vectorstore(vector_db_path))
+    vectors = np.asarray([row["vector"] for _, row in zip(range(max_rows), rows)], dtype=np.float32)
+    report = compression_report(vectors) if len(vectors) else []
+    write_report(report, f"{vector_db_path}.compression.json")
+    return report
+
+@registry.component("bm25_index", tags=("index",))
+def load_bm25_index() -> BM25Index:
+    path = bm25_path_for(DOCS_VECTOR_DB_PATH)
+    if os.path.exists(path):
+        return BM25Index.load(path)
+    return rebuild_bm25_index(DOCS_VECTOR_DB_PATH)
+
+# 文档库快照：检索仍依赖 Milvus 的过滤表达式，快照供 CI / 离线评估以内存映射方式加载（snapshot.load_snapshot）
+DOCS_SNAPSHOT_PATH = f"{DOCS_VECTOR_DB_PATH}.snapshot"
+
+def export_docs_snapshot(vector_db_path: str = DOCS_VECTOR_DB_PATH,
+                         snapshot_path: str = DOCS_SNAPSHOT_PATH) -> Dict[str, Any]:
+    """把合并后的文档 collection 导出为快照（不重新 embedding），返回 manifest"""
+    vectorstore = open_docs_vectorstore(vector_db_path)
+    return export_milvus_snapshot(vectorstore.client, DOCS_COLLECTION, snapshot_path, current_embedding_model,
+                                  batch_size=10000, source={"vector_db_path": vector_db_path})
+
+DOCS_OUTPUT_FIELDS = ["pk", "text", "tool_name", "source", "doc_type", "file_name", "section", "function", "content_type"]
+
+def fetch_docs_by_ids(ids: List[str]) -> List[Document]:
+    """按主键从文档 collection 取回 chunk"""
+    vectorstore = registry.get("tool_docs_vectorstore")
+    output_fields = DOCS_OUTPUT_FIELDS
+    if not vectorstore.enable_dynamic_field:
+        output_fields = [field for field in DOCS_OUTPUT_FIELDS if field in vectorstore.fields]
+    rows = vectorstore.client.query(
+        DOCS_COLLECTION,
+        filter=f"pk in {json.dumps(ids)}",
+        output_fields=output_fields
+    )
+    return [Document(page_content=row.pop("text"), metadata=row) for row in rows]
+
+# 检索用线程池，fork 后在子进程中重建
+registry.register(
+    "search_executor",
+    lambda: ThreadPoolExecutor(max_workers=8, thread_name_prefix="doc-search"),
+    fork_safe=False
+)
+
+registry.register(
+    "hybrid_doc_retriever",
+    lambda: HybridDocRetriever(
+        vectorstore=registry.get("tool_docs_vectorstore"),
+        bm25=registry.get("bm25_index"),
+        fetch_docs=fetch_docs_by_ids,
+        filter_expr=docs_filter_expr,
+        executor=registry.get("search_executor"),
+        k=4,
+        cache=registry.get("retrieval_cache"),
+        vector_db_paths=[DOCS_VECTOR_DB_PATH]
+    ),
+    tags=("retriever",)
+)
+
+# 两阶段检索：工具级索引（每个工具的 chunk 向量质心 + 工具名匹配）-> 选中工具内的 chunk 检索
+@registry.component("tool_docs_index", tags=("index",))
+def build_tool_docs_index() -> ToolIndex:
+    return ToolIndex.from_vectors(
+        (row["tool_name"], row["source"], row["vector"])
+        for row in iter_docs_rows(["tool_name", "source", "vector"])
+    )
+
+registry.register(
+    "hierarchical_doc_retriever",
+    lambda: HierarchicalDocRetriever(
+        vectorstore=registry.get("tool_docs_vectorstore"),
+        tool_index=registry.get("tool_docs_index"),
+        filter_expr=docs_filter_expr,
+        top_m=3,
+        k=4
+    ),
+    tags=("retriever",)
+)
+
+def search_tool_docs(
+        query: str,
+        tool_names: Optional[List[str]] = None,
+        source: Optional[str] = None,
+        k: int = 3,
+        query_vector: Optional[List[float]] = None
+) -> List[Document]:
+    """在指定工具（可多个）的文档中检索，tool_names 为空时检索全部工具；提供 query_vector 时不再请求 embedding"""
+    expr = docs_filter_expr(tool_names, source)
+
+    def search() -> List[Document]:
+        vectorstore = registry.get("tool_docs_vectorstore")
+        if query_vector is not None:
+            return vectorstore.similarity_search_by_vector(query_vector, k=k, expr=expr)
+        return vectorstore.similarity_search(query, k=k, expr=expr)
+
+    return registry.get("retrieval_cache").search(
+        RetrievalCache.key("tool_docs", query, k, expr),
+        collection_version(DOCS_VECTOR_DB_PATH),
+        search,
+        fetch_docs_by_ids,
+    )
+
+def get_tool_docs_retriever(
+        tool_names: Optional[List[str]] = None,
+        source: Optional[str] = None,
+        k: int = 3
+):
+    """返回限定在指定工具范围内的检索器（带检索结果缓存）"""
+    search_kwargs = {"k": k}
+    expr = docs_filter_expr(tool_names, source)
+    if expr:
+        search_kwargs["expr"] = expr
+    return CachedRetriever(
+        retriever=registry.get("tool_docs_vectorstore").as_retriever(search_kwargs=search_kwargs),
+        cache=registry.get("retrieval_cache"),
+        retriever_id=f"tool_docs:{expr}",
+        vector_db_paths=[DOCS_VECTOR_DB_PATH],
+        fetch_docs=fetch_docs_by_ids,
+        k=k,
+    )
+
+# 多来源并发检索：Bioconductor / Bioconda 文档库与网络搜索同时查询，超时的来源直接丢弃
+FANOUT_TIMEOUTS = json.loads(os.getenv("BIOINFO_FANOUT_TIMEOUTS", '{"Bioconductor": 2.0, "Bioconda": 2.0, "web": 4.0}'))
+FANOUT_DEADLINE = float(os.getenv("BIOINFO_FANOUT_DEADLINE", "5.0"))
+
+registry.register(
+    "fanout_executor",
+    lambda: ThreadPoolExecutor(max_workers=8, thread_name_prefix="doc-fanout"),
+    fork_safe=False
+)
+
+def docs_source_search(source: str):
+    """某个文档来源的检索函数：有候选工具时只在该来源的候选工具中做混合检索，否则检索整个来源"""
+    def search(query: str, k: int, tool_names: Optional[List[str]],
+               query_vector: Optional[List[float]] = None) -> List[Document]:
+        if tool_names:
+            documented = registry.get("tool_docs_names")
+            names = [name for name in tool_names if documented.get(name) == source]
+            return registry.get("hybrid_doc_retriever").search(query, names, k, query_vector) if names else []
+        return search_tool_docs(query, None, source, k, query_vector)
+    # Milvus 客户端是同步的，由 FanoutRetriever 放到 fanout_executor 中执行；超时后线程自行结束，结果被丢弃
+    return search
+
+async def web_search(query: str, k: int, tool_names: Optional[List[str]] = None,
+                     query_vector: Optional[List[float]] = None) -> List[Document]:
+    results = await TavilySearchResults(max_results=k).ainvoke({"query": query})
+    if isinstance(results, str):
+        # 出错时 Tavily 工具返回错误信息字符串
+        raise RuntimeError(results)
+    return [
+        Document(page_content=item.get("content", ""),
+                 metadata={"source": "web", "url": item.get("url", ""), "title": item.get("title", "")})
+        for item in results
+    ]
+
+@registry.component("doc_fanout_retriever", tags=("retriever",))
+def build_doc_fanout_retriever() -> FanoutRetriever:
+    sources = [
+        SearchSource(name, docs_source_search(name), timeout=FANOUT_TIMEOUTS.get(name, 2.0))
+        for name in ("Bioconductor", "Bioconda")
+    ]
+    if os.getenv("TAVILY_API_KEY"):
+        # 网络结果的相关性不如本地文档，融合时降低权重
+        sources.append(SearchSource("web", web_search, timeout=FANOUT_TIMEOUTS.get("web", 4.0), weight=0.5))
+    return FanoutRetriever(sources=sources, k=6, per_source_k=4, deadline=FANOUT_DEADLINE,
+                           executor=registry.get("fanout_executor"))
+
 
 # 文档问答 RAG chain
 
@@ -270,13 +647,41 @@ Please structure your response as follows:
 )
 
 ## chain 
-doc_query_chain = doc_query_prompt | current_llm | StrOutputParser()
+registry.register(
+    "doc_query_chain",
+    lambda: doc_query_prompt | registry.get(current_llm) | StrOutputParser(),
+    tags=("chain",)
+)
+
+# 文档问答流程：retrieve → generate → (refine → retrieve → generate)*，全程受墙钟时间预算约束
+DOC_QA_BUDGET = float(os.getenv("BIOINFO_DOC_QA_BUDGET", "30"))
+# 检索置信度（见 retrieval_confidence）不低于该值时跳过 refine
+DOC_QA_CONFIDENT_SCORE = float(os.getenv("BIOINFO_DOC_QA_CONFIDENT_SCORE", "0.8"))
+# 补充检索得到的回答追加在原回答之后，流式输出只追加、不回改
+SUPPLEMENT_HEADER = "\n\n---\n**补充：{}**\n\n"
+TIMEOUT_NOTE = "\n\n（已达到时间上限，回答可能不完整）"
+
+doc_qa_counters = {"runs": 0, "refine_rounds": 0, "skipped_confident": 0, "skipped_no_candidates": 0,
+                   "skipped_budget": 0, "skipped_attempts": 0, "timeouts": 0, "errors": 0}
+doc_qa_latency = Histogram()
+
+
+def retrieval_confidence(docs: List[Document], rrf_k: int = 60) -> float:
+    """检索结果的置信度，取值 [0, 1]
+
+    混合检索的 rrf_score 在 BM25 与向量检索都排第一时达到最大值 2 / (rrf_k + 1)；
+    归一化后接近 1 表示两路检索在最相关的 chunk 上一致。没有 rrf_score 的结果（网络搜索等）不计入。
+    """
+    scores = [doc.metadata["rrf_score"] for doc in docs if isinstance(doc.metadata.get("rrf_score"), (int, float))]
+    return min(1.0, max(scores) * (rrf_k + 1) / 2) if scores else 0.0
+
 
 # State Management
 class AgentState(BaseModel):
     """Track RAG workflow state"""
     question: str
     current_docs: List[Document] = Field(default_factory=list)
+    candidate_tools: List[str] = Field(default_factory=list)
     current_answer: Optional[str] = None 
     chat_history: List[BaseMessage] = Field(default_factory=list)
     should_retrieve: bool = True
@@ -284,73 +689,153 @@ class AgentState(BaseModel):
     should_refine: bool = False
     retrieval_attempts: int = 0
     max_attempts: int = 3
+    # refine 给出的缺失子问题，补充检索只用它查询
+    sub_question: Optional[str] = None
+    # 已用于生成的文档（fanout.doc_key），补充检索时跳过
+    seen_docs: List[str] = Field(default_factory=list)
+    confidence: float = 0.0
+    # time.monotonic() 下的截止时间，以及上一轮 retrieve + generate 的耗时
+    deadline: float = 0.0
+    cycle_started: float = 0.0
+    cycle_seconds: float = 0.0
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
 
 async def retrieve(state: AgentState) -> AgentState:
     """Retrieve relevant documents"""
     if not state.should_retrieve:
         return state
-        
+
+    writer = get_stream_writer()
+    query = state.sub_question or state.question
+    state.cycle_started = time.monotonic()
     try:
-        tools = create_tool_retrievers()
-        tool_enabled_llm = current_llm.bind_tools(tools)
-        
-        # Select tools and retrieve docs
-        # ... existing tool selection logic ...
-        
+        loop = asyncio.get_running_loop()
+        query_vector = None
+        if not state.candidate_tools:
+            # 先在工具级索引上选出少数候选工具（embedding 请求是同步的，放到线程池中）
+            question_vector, candidates = await loop.run_in_executor(
+                registry.get("fanout_executor"), registry.get("hierarchical_doc_retriever").route, state.question
+            )
+            state.candidate_tools = [tool for tool, _ in candidates]
+            # 路由时算出的问题向量直接用于各来源的向量检索，同一问题只请求一次 embedding
+            if query == state.question:
+                query_vector = question_vector
+        # 各文档来源（及网络搜索）并发检索：有候选工具时只在候选工具中做 BM25 + 向量混合检索，超时的来源被丢弃
+        docs, statuses = await registry.get("doc_fanout_retriever").fanout(
+            query, tool_names=state.candidate_tools or None, deadline=max(0.0, state.remaining()),
+            query_vector=query_vector
+        )
+        seen = set(state.seen_docs)
+        state.current_docs = [doc for doc in docs if doc_key(doc) not in seen]
+        state.seen_docs += [doc_key(doc) for doc in state.current_docs]
+        state.confidence = retrieval_confidence(state.current_docs)
+        writer({"type": "step", "step": "retrieve", "query": query, "docs": len(state.current_docs),
+                "confidence": round(state.confidence, 3), "sources": statuses})
+
         state.should_retrieve = False
-        state.should_generate = True
-        
+        state.should_generate = bool(state.current_docs) or state.current_answer is None
+
     except Exception as e:
-        state.current_answer = f"Retrieval error: {str(e)}"
+        logger.warning(f"文档检索失败: {e}")
+        # 补充检索失败时保留已有回答
+        if state.current_answer is None:
+            state.current_answer = f"Retrieval error: {str(e)}"
         state.should_retrieve = False
-        
+        state.should_generate = False
+
     return state
 
+
 async def generate(state: AgentState) -> AgentState:
     """Generate answer from retrieved docs"""
     if not state.should_generate:
         return state
-        
+
+    writer = get_stream_writer()
+    # 首轮回答原问题；补充轮只回答缺失的子问题，并追加在原回答之后
+    question = state.sub_question or state.question
+    prefix = SUPPLEMENT_HEADER.format(question) if state.current_answer else ""
+    writer({"type": "step", "step": "generate", "attempt": state.retrieval_attempts})
     try:
-        # ... existing answer generation logic ...
-        
+        context = registry.get("context_packer").pack(state.current_docs, llm=current_llm).text
+        chunks = []
+        if prefix:
+            writer({"type": "token", "text": prefix, "attempt": state.retrieval_attempts})
+        async for chunk in registry.get("doc_query_chain").astream({"question": question, "context": context}):
+            chunks.append(chunk)
+            writer({"type": "token", "text": chunk, "attempt": state.retrieval_attempts})
+        state.current_answer = (state.current_answer or "") + prefix + "".join(chunks)
         state.should_generate = False
-        state.should_refine = True
-        
+        state.cycle_seconds = time.monotonic() - state.cycle_started
+
+        # 检索置信度已经足够高、没有候选工具（补充检索也只能查到同样的结果）、重试次数用完、
+        # 或剩余时间不够再来一轮时，不再 refine
+        if state.confidence >= DOC_QA_CONFIDENT_SCORE:
+            skipped = "confident"
+        elif not state.candidate_tools:
+            skipped = "no_candidates"
+        elif state.retrieval_attempts >= state.max_attempts:
+            skipped = "attempts"
+        elif state.remaining() < state.cycle_seconds:
+            skipped = "budget"
+        else:
+            skipped = None
+        if skipped:
+            doc_qa_counters[f"skipped_{skipped}"] += 1
+            writer({"type": "step", "step": "refine_skipped", "reason": skipped})
+        state.should_refine = skipped is None
+
     except Exception as e:
-        state.current_answer = f"Generation error: {str(e)}"
+        logger.warning(f"回答生成失败: {e}")
+        if state.current_answer is None:
+            state.current_answer = f"Generation error: {str(e)}"
         state.should_generate = False
-        
+        state.should_refine = False
+
     return state
 
+
+refine_prompt = ChatPromptTemplate.from_messages([
+    ("system", """Evaluate whether the answer fully addresses the question.
+If something the question asks for is missing or unsupported, write ONE short, self-contained search query
+for only the missing part (not the whole question).
+Return only JSON: {{"needs_refinement": true/false, "missing": "search query for the missing part, or empty"}}"""),
+    ("user", "Question: {question}\nAnswer: {answer}")
+])
+
+
 async def refine(state: AgentState) -> AgentState:
     """Decide whether to continue retrieval"""
     if not state.should_refine:
         return state
-        
+
+    writer = get_stream_writer()
+    state.should_refine = False
     try:
-        eval_prompt = ChatPromptTemplate.from_messages([
-            ("system", """Evaluate if the current answer is satisfactory:
-            1. Is it complete and accurate?
-            2. Does it need more context?
-            Return: {"needs_refinement": true/false, "reason": "explanation"}"""),
-            ("user", f"Question: {state.question}\nAnswer: {state.current_answer}")
-        ])
-        
-        chain = eval_prompt | current_llm | StrOutputParser()
-        result = await chain.ainvoke({})
-        evaluation = json.loads(result)
-        
-        if evaluation["needs_refinement"] and state.retrieval_attempts < state.max_attempts:
+        chain = refine_prompt | registry.get(current_llm) | StrOutputParser()
+        result = await asyncio.wait_for(
+            chain.ainvoke({"question": state.question, "answer": state.current_answer}),
+            timeout=max(0.0, state.remaining())
+        )
+        match = re.search(r"\{.*\}", result, re.S)
+        evaluation = json.loads(match.group(0)) if match else {}
+        missing = (evaluation.get("missing") or "").strip()
+
+        # 只用缺失的子问题补充检索；与原问题或上一轮子问题相同时不再重复
+        if evaluation.get("needs_refinement") and missing and missing not in (state.question, state.sub_question):
             state.retrieval_attempts += 1
+            state.sub_question = missing
             state.should_retrieve = True
-        else:
-            state.should_refine = False
-            
+            doc_qa_counters["refine_rounds"] += 1
+        writer({"type": "step", "step": "refine", "sub_question": missing if state.should_retrieve else None})
+
     except Exception as e:
-        state.current_answer = f"Refinement error: {str(e)}"
-        state.should_refine = False
-        
+        # 评估失败不影响已生成的回答
+        logger.warning(f"回答评估失败: {e}")
+
     return state
 
 def create_rag_graph() -> StateGraph:
@@ -382,29 +867,108 @@ def create_rag_graph() -> StateGraph:
     
     return workflow.compile()
 
+registry.register("doc_qa_graph", create_rag_graph, tags=("graph",))
+
 # Usage
+async def stream_rag_response(
+    question: str,
+    chat_history: Optional[List[BaseMessage]] = None,
+    budget: float = DOC_QA_BUDGET
+):
+    """流式运行 RAG 工作流，依次产出事件：
+
+    {"type": "step", ...}     各节点的进度（检索到的文档数、置信度、是否跳过 refine 等）
+    {"type": "token", ...}    回答的增量文本（补充回答以 SUPPLEMENT_HEADER 开头，只追加）
+    {"type": "answer", ...}   最终回答；超出 budget 秒时停止工作流，返回已有的回答
+    """
+    graph = registry.get("doc_qa_graph")
+    started = time.monotonic()
+    state = AgentState(question=question, chat_history=chat_history or [], deadline=started + budget)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run():
+        try:
+            async for item in graph.astream(state, {"recursion_limit": 16}, stream_mode=["custom", "values"]):
+                queue.put_nowait(item)
+        finally:
+            queue.put_nowait(None)
+
+    # 工作流在单独的任务中运行，到期时直接取消，不受调用方处理事件的速度影响
+    task = asyncio.create_task(run())
+    answer, partial, timed_out = None, [], False
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=max(0.0, started + budget - time.monotonic()))
+            except asyncio.TimeoutError:
+                timed_out = True
+                break
+            if item is None:
+                break
+            mode, chunk = item
+            if mode == "values":
+                answer = chunk.get("current_answer") if isinstance(chunk, dict) else chunk.current_answer
+                partial = []
+                continue
+            if chunk.get("type") == "token":
+                partial.append(chunk["text"])
+            yield chunk
+    finally:
+        if not task.done():
+            task.cancel()
+
+    error = None
+    if task.done() and not task.cancelled() and task.exception() is not None:
+        error = f"工作流执行错误: {str(task.exception())}"
+        doc_qa_counters["errors"] += 1
+    if timed_out:
+        doc_qa_counters["timeouts"] += 1
+        # 生成到一半时用已输出的部分
+        answer = (answer or "") + "".join(partial) + TIMEOUT_NOTE
+    doc_qa_counters["runs"] += 1
+    doc_qa_latency.observe((time.monotonic() - started) * 1000)
+    yield {"type": "answer", "answer": answer or error or "", "timed_out": timed_out,
+           "elapsed": round(time.monotonic() - started, 3)}
+
+
 async def get_rag_response(
     question: str,
     chat_history: Optional[List[BaseMessage]] = None
 ) -> Tuple[str, List[BaseMessage]]:
     """运行增强版RAG工作流"""
-    graph = create_rag_graph()
-    
-    config = {
-        "recursion_limit": 10,
-        "timeout": 30  # 30秒超时
-    }
-    
-    state = AgentState(
-        question=question,
-        chat_history=chat_history or []
-    )
-    
-    try:
-        result = await graph.stream(state, config)
-        return result.current_answer, result.chat_history
-    except Exception as e:
-        error_msg = f"工作流执行错误: {str(e)}"
-        return error_msg, chat_history or []
+    answer = ""
+    async for event in stream_rag_response(question, chat_history):
+        if event["type"] == "answer":
+            answer = event["answer"]
+    return answer, (chat_history or []) + [HumanMessage(content=question), AIMessage(content=answer)]
+
+
+def doc_qa_stats() -> Dict[str, Any]:
+    return {**doc_qa_counters, "latency_ms": doc_qa_latency.snapshot()}
+
+
+def __getattr__(name):
+    # 兼容旧的模块级变量
+    if name == "doc_query_chain":
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+if __name__ == "__main__":
+    # 增量同步文档向量库：python docQA.py --sync [Bioconductor|Bioconda]
+    # 流水线并行全量重建：python docQA.py --rebuild [Bioconductor|Bioconda]
+    if "--migrate" in sys.argv:
+        # 旧的每工具一个 collection 迁移到合并后的 collection：python docQA.py --migrate
+        print(migrate_docs_collections())
+    for flag, action in (("--sync", sync_docs_vectorstores), ("--rebuild", build_docs_vectorstores_pipelined)):
+        if flag in sys.argv:
+            sources = [a for a in sys.argv[sys.argv.index(flag) + 1:] if a in DOC_SOURCES] or list(DOC_SOURCES)
+            for source in sources:
+                print(source, json.dumps(action(source), ensure_ascii=False, indent=2))
+    if "--export-snapshot" in sys.argv:
+        # 导出文档库快照：python docQA.py --export-snapshot
+        manifest = export_docs_snapshot()
+        print({k: manifest[k] for k in ("embedding_model", "dim", "count", "content_hash")})
+    if "--compression-report" in sys.argv:
+        # 评估文档向量降维/量化后的 recall 与大小：python docQA.py --compression-report
+        print(json.dumps(docs_compression_report(), ensure_ascii=False, indent=2))
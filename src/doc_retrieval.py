@@ -0,0 +1,209 @@
+"""两阶段的工具文档检索与 BM25 + 向量混合检索
+
+第一阶段在一个很小的工具级索引上选出最相关的几个工具：
+每个工具用其全部 chunk 向量的归一化均值（质心）表示，问题中直接出现的工具名优先；
+第二阶段只在选中工具的 chunk 中做向量检索。
+相比在全部工具的 chunk 上检索，候选范围小、结果集中在问题涉及的工具上。
+
+HybridDocRetriever 同时做 BM25 和向量检索，用 RRF 融合，函数名、参数名类的问题也能命中。
+"""
+import re
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from retrieval_cache import RetrievalCache, collection_version
+
+
+class ToolIndex:
+    """工具级索引：工具质心向量 + 工具名匹配
+
+    Args:
+        centroids: {tool_name: 质心向量}
+        sources: {tool_name: 文档来源}
+        name_bonus: 问题中出现工具名时加到相似度上的分数
+    """
+
+    def __init__(self, centroids: Dict[str, Sequence[float]], sources: Optional[Dict[str, str]] = None,
+                 name_bonus: float = 1.0):
+        self.tools = list(centroids)
+        self.sources = sources or {}
+        self.name_bonus = name_bonus
+        matrix = np.asarray([centroids[tool] for tool in self.tools], dtype=np.float32).reshape(len(self.tools), -1) \
+            if self.tools else np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1, norms)
+        # 长名字优先匹配，避免 "DESeq" 抢先匹配 "DESeq2"
+        names = sorted(self.tools, key=len, reverse=True)
+        self.name_pattern = re.compile(
+            r"(?<![\w-])(" + "|".join(re.escape(name) for name in names) + r")(?![\w-])", re.IGNORECASE
+        ) if names else None
+        self._by_lower = {tool.lower(): tool for tool in self.tools}
+
+    @classmethod
+    def from_vectors(cls, rows, name_bonus: float = 1.0) -> "ToolIndex":
+        """由 (tool_name, source, vector) 序列构建，按工具累加归一化向量求质心"""
+        sums: Dict[str, np.ndarray] = {}
+        sources: Dict[str, str] = {}
+        for tool_name, source, vector in rows:
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+            if tool_name in sums:
+                sums[tool_name] += vector
+            else:
+                sums[tool_name] = vector.copy()
+                sources[tool_name] = source
+        return cls(sums, sources, name_bonus)
+
+    def __len__(self) -> int:
+        return len(self.tools)
+
+    def mentioned(self, question: str) -> List[str]:
+        """问题中直接出现的工具名"""
+        if self.name_pattern is None:
+            return []
+        found = []
+        for match in self.name_pattern.finditer(question):
+            tool = self._by_lower[match.group(1).lower()]
+            if tool not in found:
+                found.append(tool)
+        return found
+
+    def scores(self, query_vector: Sequence[float], question: str = "") -> np.ndarray:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.matrix @ (query / norm if norm else query)
+        for tool in self.mentioned(question):
+            scores[self.tools.index(tool)] += self.name_bonus
+        return scores
+
+    def route(self, query_vector: Sequence[float], question: str = "", top_m: int = 3,
+              min_score: Optional[float] = None) -> List[Tuple[str, float]]:
+        """返回得分最高的 top_m 个工具及得分，低于 min_score 的不返回"""
+        if not self.tools:
+            return []
+        scores = self.scores(query_vector, question)
+        top_m = min(top_m, len(self.tools))
+        top = np.argpartition(-scores, top_m - 1)[:top_m]
+        ranked = sorted(((self.tools[i], float(scores[i])) for i in top), key=lambda item: -item[1])
+        if min_score is not None:
+            ranked = [(tool, score) for tool, score in ranked if score >= min_score]
+        return ranked
+
+
+class HierarchicalDocRetriever(BaseRetriever):
+    """两阶段检索器：先选工具，再只在这些工具的 chunk 中检索
+
+    Args:
+        vectorstore: 合并后的工具文档向量库
+        tool_index: 工具级索引
+        filter_expr: 由工具名列表生成过滤表达式的函数
+        top_m: 第一阶段选出的工具数
+        k: 第二阶段返回的 chunk 数
+        min_tool_score: 工具得分下限，全部低于下限时不检索
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: object
+    tool_index: ToolIndex
+    filter_expr: object
+    top_m: int = 3
+    k: int = 4
+    min_tool_score: Optional[float] = None
+
+    def route(self, question: str) -> Tuple[List[float], List[Tuple[str, float]]]:
+        query_vector = self.vectorstore.embeddings.embed_query(question)
+        return query_vector, self.tool_index.route(query_vector, question, self.top_m, self.min_tool_score)
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        query_vector, tools = self.route(query)
+        if not tools:
+            return []
+        return self.vectorstore.similarity_search_by_vector(
+            query_vector, k=self.k, expr=self.filter_expr([tool for tool, _ in tools])
+        )
+
+
+class HybridDocRetriever(BaseRetriever):
+    """BM25 + 向量混合检索，两路并行执行后用 RRF 融合
+
+    Args:
+        vectorstore: 合并后的工具文档向量库
+        bm25: BM25 索引，doc id 与向量库主键一致
+        fetch_docs: 按主键取回文档的函数，用于只被 BM25 命中的 chunk
+        filter_expr: 由工具名列表生成过滤表达式的函数
+        executor: 执行向量检索的线程池
+        k: 返回的 chunk 数
+        candidates: 每一路参与融合的候选数
+        rrf_k: RRF 常数
+        cache: 检索结果缓存，为 None 时不缓存
+        vector_db_paths: 缓存失效依据的向量库（入库后版本变化）
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: object
+    bm25: BM25Index
+    fetch_docs: Callable[[List[str]], List[Document]]
+    filter_expr: object
+    executor: Executor
+    k: int = 4
+    candidates: int = 20
+    rrf_k: int = 60
+    cache: Optional[RetrievalCache] = None
+    vector_db_paths: Sequence[str] = ()
+
+    def search(self, query: str, tool_names: Optional[List[str]] = None, k: Optional[int] = None,
+               query_vector: Optional[Sequence[float]] = None) -> List[Document]:
+        """query_vector 为 query 的 embedding（如工具路由时已经计算过），提供时不再重复请求 embedding"""
+        k = k or self.k
+        if self.cache is None:
+            return self._search(query, tool_names, k, query_vector)
+        return self.cache.search(
+            RetrievalCache.key("hybrid_docs", query, k, sorted(tool_names or [])),
+            collection_version(*self.vector_db_paths),
+            lambda: self._search(query, tool_names, k, query_vector),
+            self.fetch_docs,
+        )
+
+    def _search(self, query: str, tool_names: Optional[List[str]], k: int,
+                query_vector: Optional[Sequence[float]] = None) -> List[Document]:
+        expr = self.filter_expr(tool_names) if tool_names else None
+        # 向量检索（含 embedding 请求）在线程池中执行，BM25 在当前线程同时计算
+        if query_vector is None:
+            vector_future = self.executor.submit(self.vectorstore.similarity_search, query,
+                                                 k=self.candidates, expr=expr)
+        else:
+            vector_future = self.executor.submit(self.vectorstore.similarity_search_by_vector, list(query_vector),
+                                                 k=self.candidates, expr=expr)
+        bm25_hits = self.bm25.search(query, self.candidates, tool_names)
+        vector_docs = vector_future.result()
+
+        docs_by_id = {doc.metadata["pk"]: doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion(
+            [list(docs_by_id), [doc_id for doc_id, _ in bm25_hits]], k=self.rrf_k
+        )[:k]
+        missing = [doc_id for doc_id, _ in fused if doc_id not in docs_by_id]
+        if missing:
+            docs_by_id.update({doc.metadata["pk"]: doc for doc in self.fetch_docs(missing)})
+        results = []
+        for doc_id, score in fused:
+            doc = docs_by_id.get(doc_id)
+            if doc is not None:
+                doc.metadata["rrf_score"] = score
+                results.append(doc)
+        return results
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        return self.search(query)
@@ -0,0 +1,236 @@
+"""从问题中提取工具检索的过滤条件（facet）
+
+工具库的元数据中有 year / tooltype / topic / keyword，问题里经常直接带着约束，
+如 "2020年以来的单细胞工具"、"有没有 web server"、"R package for ChIP-seq"。
+FacetExtractor 用正则和词表（不调用 LLM）提取这些约束，FacetedToolRetriever 把它们作为标量过滤条件
+下推到向量库（Milvus 表达式或 NumpyVectorStore 的 filter），过滤后结果太少时逐步放宽条件补足。
+"""
+import datetime
+import json
+import logging
+import re
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict
+
+from numpy_store import NumpyVectorStore
+
+logger = logging.getLogger(__name__)
+
+# 短语 -> bio.tools 的 tooltype 取值
+TOOLTYPE_VOCAB: List[Tuple[str, List[str]]] = [
+    (r"web ?servers?|web ?tools?|web ?applications?|web ?interfaces?|online|在线|网页|网站|web\s*服务", ["Web application", "Web service"]),
+    (r"command[- ]line|\bcli\b|命令行", ["Command-line tool"]),
+    (r"\b(?:r|python|perl|java|bioconductor)\s+(?:package|library|module)s?|\blibrar(?:y|ies)\b|[rR]\s*包|python\s*包|软件包",
+     ["Library"]),
+    (r"databases?|data portals?|数据库", ["Database portal"]),
+    (r"desktop|\bgui\b|graphical|桌面|图形界面", ["Desktop application"]),
+    (r"workflows?|pipelines?|流程|工作流", ["Workflow"]),
+    (r"\bapis?\b|rest(?:ful)?\s+service", ["Web API"]),
+    (r"plug-?ins?|插件", ["Plug-in"]),
+]
+
+# 短语 -> EDAM topic
+TOPIC_VOCAB: List[Tuple[str, List[str]]] = [
+    (r"rna-?seq|转录组|transcriptom", ["RNA-Seq", "Transcriptomics"]),
+    (r"chip-?seq", ["ChIP-seq"]),
+    (r"epigenom|methylation|甲基化|表观", ["Epigenomics"]),
+    (r"proteom|蛋白质组|mass spectrometry|质谱", ["Proteomics"]),
+    (r"metagenom|microbiome|宏基因组|微生物组", ["Metagenomics"]),
+    (r"metabolom|代谢组", ["Metabolomics"]),
+    (r"phylogen|系统发育|进化树", ["Phylogenetics"]),
+    (r"protein structure|蛋白质?结构", ["Protein structure analysis"]),
+    (r"variant calling|genetic variation|\bsnps?\b|变异", ["Genetic variation"]),
+    (r"genome assembly|sequence assembly|组装", ["Sequence assembly"]),
+    (r"gene expression|基因表达", ["Gene expression"]),
+    (r"machine learning|deep learning|机器学习|深度学习", ["Machine learning"]),
+    (r"visuali[sz]|可视化", ["Data visualisation"]),
+]
+
+# 短语 -> 关键词（在 keyword 字段中按子串匹配）
+KEYWORD_VOCAB: List[Tuple[str, List[str]]] = [
+    (r"single[- ]cell|scrna|单细胞", ["single-cell", "single cell"]),
+    (r"spatial transcriptom|空间转录组", ["spatial"]),
+    (r"enhancers?|增强子", ["enhancer"]),
+    (r"long[- ]reads?|nanopore|pacbio|长读长", ["long-read", "nanopore"]),
+    (r"crispr", ["CRISPR"]),
+    (r"atac-?seq|chromatin accessibility|染色质可及性", ["ATAC"]),
+]
+
+YEAR = r"((?:19|20)\d{2})"
+
+
+@dataclass
+class Facets:
+    """检索约束，各字段之间为 AND，字段内的多个取值为 OR"""
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    tooltypes: List[str] = field(default_factory=list)
+    topics: List[str] = field(default_factory=list)
+    keywords: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return any((self.year_min, self.year_max, self.tooltypes, self.topics, self.keywords))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: value for name, value in vars(self).items() if value}
+
+    def relaxations(self) -> List["Facets"]:
+        """逐步放宽的条件序列：依次去掉 keyword、topic、tooltype、year，最后一个为不过滤"""
+        levels = [self]
+        for name in ("keywords", "topics", "tooltypes"):
+            if getattr(levels[-1], name):
+                levels.append(replace(levels[-1], **{name: []}))
+        if levels[-1]:
+            levels.append(Facets())
+        return levels
+
+    def milvus_expr(self) -> Optional[str]:
+        """Milvus 标量过滤表达式；year 以字符串保存，四位年份按字符串比较即可"""
+        clauses = []
+        if self.year_min:
+            clauses.append(f'year >= "{self.year_min}"')
+        if self.year_max:
+            clauses.append(f'year <= "{self.year_max}"')
+        for name, values in (("tooltype", self.tooltypes), ("topic", self.topics), ("keyword", self.keywords)):
+            if values:
+                # like 区分大小写，同时匹配原样、小写和首字母大写
+                variants = list(dict.fromkeys(form for v in values for form in (v, v.lower(), v.capitalize())))
+                clauses.append("(" + " or ".join(f"{name} like {json.dumps(f'%{v}%')}" for v in variants) + ")")
+        return " and ".join(clauses) or None
+
+    def predicates(self) -> Dict[str, Callable[[Any], bool]]:
+        """每个元数据字段的判断函数，供 NumpyVectorStore 的 filter 使用"""
+        predicates: Dict[str, Callable[[Any], bool]] = {}
+        if self.year_min or self.year_max:
+            low, high = self.year_min or 0, self.year_max or 9999
+
+            def year_ok(value: Any) -> bool:
+                return str(value or "").isdigit() and low <= int(value) <= high
+
+            predicates["year"] = year_ok
+        for name, values in (("tooltype", self.tooltypes), ("topic", self.topics), ("keyword", self.keywords)):
+            if values:
+                lowered = [v.lower() for v in values]
+                predicates[name] = lambda value, lowered=lowered: any(v in str(value or "").lower() for v in lowered)
+        return predicates
+
+
+class FacetExtractor:
+    """基于正则和词表的 facet 提取
+
+    Args:
+        current_year: 计算 "近 N 年" 时使用的当前年份，默认取系统时间
+    """
+
+    def __init__(self, current_year: Optional[int] = None):
+        self.current_year = current_year
+        self._vocabs = [
+            (name, [(re.compile(pattern, re.IGNORECASE), values) for pattern, values in vocab])
+            for name, vocab in (("tooltypes", TOOLTYPE_VOCAB), ("topics", TOPIC_VOCAB), ("keywords", KEYWORD_VOCAB))
+        ]
+        self._year_rules = [
+            # 2018-2020 / 2018 to 2020 / 2018至2020年
+            (re.compile(rf"{YEAR}\s*(?:-|–|~|to|至|到)\s*{YEAR}", re.IGNORECASE), "range"),
+            (re.compile(rf"(?:since|from|starting(?: in)?|as of)\s+{YEAR}", re.IGNORECASE), "min"),
+            (re.compile(rf"(?:after|newer than|later than)\s+{YEAR}", re.IGNORECASE), "after"),
+            (re.compile(rf"{YEAR}\s*年?\s*(?:以来|之后|以后|后|起)"), "min"),
+            (re.compile(rf"(?:before|prior to|older than)\s+{YEAR}", re.IGNORECASE), "before"),
+            (re.compile(rf"(?:until|up to|through)\s+{YEAR}", re.IGNORECASE), "max"),
+            (re.compile(rf"{YEAR}\s*年?\s*(?:以前|之前|前)"), "before"),
+            (re.compile(r"(?:last|past|recent)\s+(\d{1,2})\s+years?", re.IGNORECASE), "recent"),
+            (re.compile(r"(?:近|最近|过去)\s*(\d{1,2})\s*年"), "recent"),
+            (re.compile(rf"(?:\bin|published in|released in)\s+{YEAR}\b", re.IGNORECASE), "exact"),
+            (re.compile(rf"{YEAR}\s*年\s*(?:发表|发布|推出)"), "exact"),
+        ]
+
+    def extract(self, question: str) -> Facets:
+        facets = Facets()
+        for name, rules in self._vocabs:
+            values = getattr(facets, name)
+            for pattern, mapped in rules:
+                if pattern.search(question):
+                    values.extend(v for v in mapped if v not in values)
+        for pattern, kind in self._year_rules:
+            match = pattern.search(question)
+            if not match:
+                continue
+            if kind == "range":
+                facets.year_min, facets.year_max = sorted(int(g) for g in match.groups())
+            elif kind == "recent":
+                current = self.current_year or datetime.date.today().year
+                facets.year_min = current - int(match.group(1)) + 1
+            else:
+                year = int(match.group(1))
+                if kind in ("min", "exact"):
+                    facets.year_min = year
+                if kind in ("max", "exact"):
+                    facets.year_max = year
+                if kind == "after":
+                    facets.year_min = year + 1
+                if kind == "before":
+                    facets.year_max = year - 1
+            break
+        return facets
+
+
+def search_with_facets(vectorstore: VectorStore, vector: List[float], k: int, facets: Facets) -> List[Document]:
+    """按向量库类型下推过滤条件"""
+    if not facets:
+        return vectorstore.similarity_search_by_vector(vector, k=k)
+    if isinstance(vectorstore, NumpyVectorStore):
+        return vectorstore.similarity_search_by_vector(vector, k=k, filter=facets.predicates())
+    return vectorstore.similarity_search_by_vector(vector, k=k, expr=facets.milvus_expr())
+
+
+class FacetedToolRetriever(BaseRetriever):
+    """先按问题中的 facet 过滤检索，结果少于 min_results 时逐级放宽条件补足
+
+    返回的文档元数据中 "facets" 记录命中时实际使用的条件。
+
+    Args:
+        vectorstore: 工具库向量库（Milvus 或 NumpyVectorStore）
+        extractor: facet 提取器
+        k: 返回的工具数
+        min_results: 过滤后的结果少于该数时放宽条件
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: object
+    extractor: FacetExtractor
+    k: int = 5
+    min_results: int = 3
+
+    def search(self, query: str, k: Optional[int] = None, facets: Optional[Facets] = None) -> List[Document]:
+        k = k or self.k
+        facets = self.extractor.extract(query) if facets is None else facets
+        vector = self.vectorstore.embeddings.embed_query(query)
+        results: List[Document] = []
+        seen = set()
+        for level in facets.relaxations():
+            try:
+                docs = search_with_facets(self.vectorstore, vector, k, level)
+            except Exception as e:
+                # 旧的向量库可能缺少某些元数据字段，直接放宽到下一级
+                logger.warning(f"按条件 {level.to_dict()} 检索失败: {e}")
+                continue
+            for doc in docs:
+                key = doc.metadata.get("pk", doc.page_content)
+                if key in seen:
+                    continue
+                seen.add(key)
+                doc.metadata["facets"] = json.dumps(level.to_dict(), ensure_ascii=False)
+                results.append(doc)
+            if len(results) >= min(self.min_results, k):
+                break
+        return results[:k]
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        return self.search(query)
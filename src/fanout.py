@@ -0,0 +1,209 @@
+"""多来源并发检索
+
+文档问答原来通过 LLM 工具调用依次查询 Bioconductor 文档、Bioconda 文档和 Tavily 网络搜索，延迟是各来源之和。
+FanoutRetriever 用 asyncio.gather 同时查询全部选中的来源：每个来源有自己的超时，
+到期未返回的来源直接丢弃、使用其余来源的部分结果，总延迟不超过实际等待的最慢来源（以及整体截止时间）。
+各来源的结果按加权 RRF 融合为一个排序，融合得分写入返回文档副本的 metadata["score"]，
+来源记录在 metadata["fanout_sources"]；来源返回的文档对象本身不会被修改（可能来自缓存）。
+
+同步的检索函数（如 Milvus 客户端）放在专用线程池中执行。超时的同步调用无法中断，会继续占用线程；
+每个来源最多允许 max_stuck 个这样的调用，达到上限后该来源直接跳过（状态 busy），不会占满线程池。
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+
+from bm25_index import reciprocal_rank_fusion
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SearchSource:
+    """一个检索来源
+
+    Args:
+        name: 来源名
+        search: (query, k, tool_names) -> 文档列表，可以是 async 函数或同步函数；
+            fanout 收到 query_vector 时以同名关键字参数传入
+        timeout: 该来源的超时（秒）
+        weight: 融合时的权重
+        max_stuck: 同步检索超时后仍在运行的调用数上限，达到后跳过该来源
+    """
+    name: str
+    search: Callable[[str, int, Optional[List[str]]], Union[Awaitable[List[Document]], List[Document]]]
+    timeout: float = 2.0
+    weight: float = 1.0
+    max_stuck: int = 2
+
+
+def doc_key(doc: Document) -> str:
+    """跨来源去重用的文档标识：向量库主键、网页 URL，否则为内容哈希"""
+    for name in ("pk", "url"):
+        if doc.metadata.get(name):
+            return f"{name}:{doc.metadata[name]}"
+    return "sha1:" + hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class FanoutRetriever(BaseRetriever):
+    """并发查询多个来源并融合结果
+
+    Args:
+        sources: 全部可用的来源
+        k: 融合后返回的文档数
+        per_source_k: 每个来源返回的文档数
+        deadline: 整体截止时间（秒），任何来源的等待时间都不会超过它
+        rrf_k: RRF 常数
+        executor: 执行同步检索函数的线程池，为 None 时创建 max_workers 个线程的专用线程池
+        max_workers: 专用线程池的线程数
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    sources: List[SearchSource]
+    k: int = 6
+    per_source_k: int = 4
+    deadline: float = 5.0
+    rrf_k: int = 60
+    executor: Optional[Executor] = None
+    max_workers: int = 8
+    _latency: Dict[str, Histogram] = PrivateAttr(default_factory=dict)
+    _counters: Dict[str, Dict[str, int]] = PrivateAttr(default_factory=dict)
+    _stuck: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _stuck_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._latency = {source.name: Histogram() for source in self.sources}
+        self._latency["total"] = Histogram()
+        self._counters = {source.name: {"calls": 0, "ok": 0, "timeouts": 0, "errors": 0, "busy": 0}
+                          for source in self.sources}
+        self._stuck = {source.name: 0 for source in self.sources}
+
+    def _sync_executor(self) -> Executor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="fanout-search")
+        return self.executor
+
+    def _unstick(self, source: SearchSource) -> None:
+        with self._stuck_lock:
+            self._stuck[source.name] -= 1
+
+    def _call_source(self, source: SearchSource, query: str, tool_names: Optional[List[str]],
+                     kwargs: Dict[str, Any]) -> Tuple[Optional[Awaitable[List[Document]]], Optional[Future]]:
+        """返回 (可等待对象, 同步调用的 Future)；来源被超时调用占满时返回 (None, None)"""
+        if asyncio.iscoroutinefunction(source.search):
+            return source.search(query, self.per_source_k, tool_names, **kwargs), None
+        with self._stuck_lock:
+            if self._stuck[source.name] >= source.max_stuck:
+                return None, None
+        future = self._sync_executor().submit(source.search, query, self.per_source_k, tool_names, **kwargs)
+        return asyncio.wrap_future(future), future
+
+    async def _run_source(self, source: SearchSource, query: str, tool_names: Optional[List[str]],
+                          started: float, deadline: float,
+                          kwargs: Dict[str, Any]) -> Tuple[List[Document], Dict[str, Any]]:
+        timeout = max(0.0, min(source.timeout, deadline - (time.perf_counter() - started)))
+        counters = self._counters[source.name]
+        counters["calls"] += 1
+        t0 = time.perf_counter()
+        awaitable, future = self._call_source(source, query, tool_names, kwargs)
+        if awaitable is None:
+            counters["busy"] += 1
+            return [], {"status": "busy", "docs": 0, "ms": 0.0}
+        try:
+            docs = await asyncio.wait_for(awaitable, timeout=timeout)
+            status = "ok"
+        except asyncio.TimeoutError:
+            docs, status = [], "timeout"
+            counters["timeouts"] += 1
+            # 还在排队的同步调用已被取消；已经开始执行的继续占用线程，结束前计入该来源的上限
+            if future is not None and not future.done():
+                with self._stuck_lock:
+                    self._stuck[source.name] += 1
+                future.add_done_callback(lambda _: self._unstick(source))
+        except Exception as e:
+            logger.warning(f"来源 {source.name} 检索失败: {e}")
+            docs, status = [], "error"
+            counters["errors"] += 1
+        elapsed = (time.perf_counter() - t0) * 1000
+        if status == "ok":
+            counters["ok"] += 1
+            self._latency[source.name].observe(elapsed)
+        return docs, {"status": status, "docs": len(docs), "ms": round(elapsed, 1)}
+
+    async def fanout(self, query: str, source_names: Optional[Sequence[str]] = None,
+                     tool_names: Optional[List[str]] = None,
+                     k: Optional[int] = None,
+                     deadline: Optional[float] = None,
+                     query_vector: Optional[List[float]] = None) -> Tuple[List[Document], Dict[str, Dict[str, Any]]]:
+        """并发查询选中的来源（默认全部），返回 (融合后的文档, 每个来源的状态)
+
+        deadline 为本次调用的截止时间（秒），不超过 self.deadline，用于调用方自己的时间预算所剩不多时；
+        query_vector 为调用方已经计算好的 query embedding，传给各来源以免每个来源各自请求一次
+        """
+        selected = [s for s in self.sources if source_names is None or s.name in source_names]
+        deadline = self.deadline if deadline is None else min(deadline, self.deadline)
+        kwargs = {"query_vector": query_vector} if query_vector is not None else {}
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._run_source(s, query, tool_names, started, deadline, kwargs)
+                                         for s in selected))
+        self._latency["total"].observe((time.perf_counter() - started) * 1000)
+
+        docs_by_key: Dict[str, Document] = {}
+        found_in: Dict[str, List[str]] = {}
+        rankings = []
+        for source, (docs, _) in zip(selected, results):
+            ranking = []
+            for doc in docs:
+                key = doc_key(doc)
+                docs_by_key.setdefault(key, doc)
+                found_in.setdefault(key, []).append(source.name)
+                ranking.append(key)
+            rankings.append(ranking)
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k, weights=[s.weight for s in selected])
+        merged = []
+        for key, score in fused[:k or self.k]:
+            doc = docs_by_key[key]
+            # 在副本上标注，来源返回的文档可能被缓存或被其他请求共用
+            merged.append(doc.model_copy(update={"metadata": {
+                **doc.metadata, "score": score, "fanout_sources": ",".join(found_in[key])
+            }}))
+        return merged, {source.name: status for source, (_, status) in zip(selected, results)}
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: Optional[AsyncCallbackManagerForRetrieverRun] = None
+                                       ) -> List[Document]:
+        docs, _ = await self.fanout(query)
+        return docs
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            docs, _ = asyncio.run(self.fanout(query))
+            return docs
+        # 在运行中的事件循环里被同步调用（如 async 接口中的同步检索）时不能再 asyncio.run，改在单独线程的新事件循环中执行
+        with ThreadPoolExecutor(1, thread_name_prefix="fanout-sync") as pool:
+            docs, _ = pool.submit(asyncio.run, self.fanout(query)).result()
+        return docs
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            name: {**self._counters.get(name, {}), "latency_ms": histogram.snapshot()}
+            for name, histogram in self._latency.items()
+        }
+        for name, stuck in self._stuck.items():
+            stats[name]["stuck"] = stuck
+        return stats
@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+
+from registry import registry
+
+# LLM 后端探测地址：名称 -> (base_url 环境变量, 探测路径)
+LLM_ENDPOINTS = {
+    "ollama_1": ("OLLAMA_BASE_URL1", "/api/tags"),
+    "ollama_2": ("OLLAMA_BASE_URL2", "/api/tags"),
+    "openai": ("OPENAI_API_BASE_URL", "/models"),
+    "deepseek": ("DEEPSEEK_API_BASE_URL", "/models"),
+    "doubao": ("ARK_API_BASE_URL", "/models"),
+    "openrouter": ("OPENROUTER_API_BASE_URL", "/models"),
+}
+
+# 探测结果缓存时间（秒），避免探针请求把后端打满
+PROBE_TTL = float(os.getenv("BIOINFO_PROBE_TTL", "10"))
+PROBE_TIMEOUT = float(os.getenv("BIOINFO_PROBE_TIMEOUT", "2"))
+
+_probe_cache: Dict[str, Dict[str, Any]] = {}
+_probe_lock = threading.Lock()
+
+
+def check_url(url: str, timeout: float = PROBE_TIMEOUT) -> Dict[str, Any]:
+    """探测地址是否可达；任何 HTTP 响应（包括 401）都说明后端在线"""
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, timeout=timeout)
+        return {"reachable": response.status_code < 500, "status_code": response.status_code,
+                "latency": time.perf_counter() - start}
+    except requests.RequestException as e:
+        return {"reachable": False, "error": str(e), "latency": time.perf_counter() - start}
+
+
+def llm_reachability(force: bool = False) -> Dict[str, Dict[str, Any]]:
+    """探测已配置的 LLM 后端，结果缓存 PROBE_TTL 秒"""
+    results = {}
+    now = time.monotonic()
+    for name, (env_var, path) in LLM_ENDPOINTS.items():
+        base_url = os.getenv(env_var)
+        if not base_url:
+            continue
+        with _probe_lock:
+            cached = _probe_cache.get(name)
+        if cached and not force and now - cached["checked_at"] < PROBE_TTL:
+            results[name] = cached
+            continue
+        result = check_url(base_url.rstrip("/") + path)
+        result["checked_at"] = now
+        with _probe_lock:
+            _probe_cache[name] = result
+        results[name] = result
+    return results
+
+
+def memory_usage() -> Dict[str, Optional[int]]:
+    """当前进程内存（KB）；Linux 下区分与父进程共享的页和私有页"""
+    usage = {"rss": None, "pss": None, "shared": None, "private": None}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+        usage["rss"] = fields.get("Rss")
+        usage["pss"] = fields.get("Pss")
+        usage["shared"] = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+        usage["private"] = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    except OSError:
+        import resource
+        usage["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
+
+
+def liveness() -> Dict[str, Any]:
+    return {"status": "alive", "pid": os.getpid(), "memory_kb": memory_usage()}
+
+
+def readiness(required: Iterable[str] = (), check_llm: bool = True) -> Dict[str, Any]:
+    """就绪状态：所需组件均已构建且 LLM 后端可达
+
+    Args:
+        required: 必须已构建的组件名
+        check_llm: 是否探测 LLM 后端
+    """
+    required: List[str] = list(required)
+    stats = registry.stats()["components"]
+    components = {}
+    for name, info in stats.items():
+        for tag in info["tags"] or ["other"]:
+            components.setdefault(tag, {})[name] = info["ready"]
+    missing = [name for name in required if not stats.get(name, {}).get("ready")]
+    llm = llm_reachability() if check_llm else {}
+    unreachable = [name for name, result in llm.items() if not result["reachable"]]
+    return {
+        "ready": not missing and not unreachable,
+        "pid": os.getpid(),
+        "missing": missing,
+        "unreachable": unreachable,
+        "components": components,
+        "llm": llm,
+    }
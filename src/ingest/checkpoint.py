@@ -0,0 +1,73 @@
+"""可续传入库的断点记录
+
+按 rowid 顺序读取源表，记录经过并发的 embedding / 写入阶段后可能乱序提交。
+断点只记录"连续提交"的最大 rowid（水位线）：水位线之前的行都已写入，
+续传时删除水位线之后已写入的行，再从水位线继续读取。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+
+class RowidCheckpoint:
+    """记录已连续提交的最大 rowid，并定期持久化
+
+    Args:
+        path: 断点文件路径
+        save_interval: 两次写盘之间的最短间隔（秒）
+    """
+
+    def __init__(self, path: str, save_interval: float = 2.0):
+        self.path = path
+        self.save_interval = save_interval
+        self.source: Optional[str] = None
+        self.last_rowid = 0
+        self.rows = 0
+        self._issued: deque = deque()
+        self._committed = set()
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.source, self.last_rowid, self.rows = data["source"], data["last_rowid"], data["rows"]
+
+    def matches(self, source: str) -> bool:
+        return self.source == source
+
+    def reset(self, source: str) -> None:
+        with self._lock:
+            self.source, self.last_rowid, self.rows = source, 0, 0
+            self._issued.clear()
+            self._committed.clear()
+        self.save()
+
+    def issue(self, rowid: int) -> None:
+        """读取一行时调用，rowid 需单调递增"""
+        with self._lock:
+            self._issued.append(rowid)
+
+    def commit(self, rowids: Iterable[int]) -> None:
+        """行写入成功后调用，推进水位线"""
+        with self._lock:
+            self._committed.update(rowids)
+            while self._issued and self._issued[0] in self._committed:
+                rowid = self._issued.popleft()
+                self._committed.discard(rowid)
+                self.last_rowid = rowid
+                self.rows += 1
+            due = time.monotonic() - self._saved_at >= self.save_interval
+        if due:
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"source": self.source, "last_rowid": self.last_rowid, "rows": self.rows}
+            self._saved_at = time.monotonic()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,159 @@
+"""MinHash / LSH 近似重复 chunk 检测
+
+Bioconductor 和 Bioconda 文档中有大量重复的样板内容（安装说明、许可证、sessionInfo 输出等），
+内容哈希只能去掉完全相同的 chunk。这里对每个 chunk 的词 n-gram 计算 MinHash 签名，
+用 LSH 分桶找出候选，签名估计的 Jaccard 相似度超过阈值即视为近似重复，不再 embedding 和写入。
+只在同一 group（collection，即同一来源的同一工具）内去重：检索按 tool_name / source 过滤，
+工具 B 中与工具 A 重复的 chunk 如果被丢弃，B 的过滤检索就再也看不到这段内容，A 被删除后也无法恢复。
+
+索引保存在一个目录中（signatures.npy + meta.json），增量同步时加载后继续使用。
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"\w+")
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+
+
+class MinHasher:
+    """num_perm 个 multiply-shift 哈希函数，签名为每个函数在全部 shingle 上的最小值"""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # 奇数乘数，uint64 溢出即取模 2^64，取高 32 位作为哈希值
+        self.a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = _shingle_hashes(text, self.shingle_size)
+        with np.errstate(over="ignore"):
+            values = (hashes[:, None] * self.a[None, :] + self.b[None, :]) >> np.uint64(32)
+        return (values & _MASK32).min(axis=0).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """LSH 索引：签名切成 bands 段，同一 group 中任一段完全相同的 chunk 成为候选，再用签名估计相似度确认
+
+    Args:
+        threshold: 估计的 Jaccard 相似度不低于该值视为近似重复
+        num_perm: MinHash 函数个数
+        bands: LSH 段数，num_perm 需能被整除；段数越多召回越高、候选越多
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, shingle_size: int = 5):
+        if num_perm % bands:
+            raise ValueError(f"num_perm {num_perm} 不能被 bands {bands} 整除")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.ids: List[str] = []
+        self.groups: List[str] = []
+        self.signatures: List[np.ndarray] = []
+        self._alive: List[bool] = []
+        self._positions: Dict[str, int] = {}
+        self._buckets: List[Dict[Tuple[str, bytes], List[int]]] = [defaultdict(list) for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, signature: np.ndarray, group: str = "") -> Optional[Tuple[str, float]]:
+        """返回同一 group 中最相似的已有 chunk (id, 估计相似度)，没有超过阈值的返回 None"""
+        candidates = {pos for band, key in self._band_keys(signature)
+                      for pos in self._buckets[band].get((group, key), ())}
+        best = None
+        for pos in candidates:
+            if not self._alive[pos]:
+                continue
+            similarity = float(np.mean(self.signatures[pos] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (self.ids[pos], similarity)
+        return best
+
+    def add(self, doc_id: str, signature: np.ndarray, group: str = "") -> None:
+        if doc_id in self._positions:
+            return
+        pos = len(self.ids)
+        self.ids.append(doc_id)
+        self.groups.append(group)
+        self.signatures.append(signature)
+        self._alive.append(True)
+        self._positions[doc_id] = pos
+        for band, key in self._band_keys(signature):
+            self._buckets[band][(group, key)].append(pos)
+
+    def check(self, doc_id: str, text: str, group: str = "") -> Optional[str]:
+        """检查一个 chunk：与同一 group 中的 chunk 近似重复时返回重复对象的 id，否则加入索引并返回 None"""
+        signature = self.hasher.signature(text)
+        match = self.find(signature, group)
+        if match is not None and match[0] != doc_id:
+            return match[0]
+        self.add(doc_id, signature, group)
+        return None
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        for doc_id in doc_ids:
+            pos = self._positions.pop(doc_id, None)
+            if pos is not None:
+                self._alive[pos] = False
+
+    def remove_groups(self, predicate: Callable[[str], bool]) -> None:
+        """删除 group 满足条件的全部条目（如重建某个来源、首次同步某个工具时）"""
+        self.remove([doc_id for doc_id, pos in list(self._positions.items()) if predicate(self.groups[pos])])
+
+    def save(self, path: str) -> None:
+        alive = sorted(self._positions.values())
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        signatures = np.asarray([self.signatures[pos] for pos in alive], dtype=np.uint32)
+        np.save(os.path.join(tmp_path, "signatures.npy"), signatures.reshape(len(alive), self.bands * self.rows))
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "ids": [self.ids[pos] for pos in alive],
+                "groups": [self.groups[pos] for pos in alive],
+                "threshold": self.threshold, "bands": self.bands, "rows": self.rows,
+                "shingle_size": self.hasher.shingle_size,
+            }, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "NearDuplicateIndex":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["threshold"], meta["bands"] * meta["rows"], meta["bands"], meta["shingle_size"])
+        for doc_id, group, signature in zip(meta["ids"], meta["groups"], np.load(os.path.join(path, "signatures.npy"))):
+            index.add(doc_id, signature, group)
+        return index
+
+    @classmethod
+    def open(cls, path: str, **kwargs) -> "NearDuplicateIndex":
+        return cls.load(path) if os.path.exists(path) else cls(**kwargs)
@@ -0,0 +1,66 @@
+"""文档加载与切分任务
+
+这里的函数会在子进程中执行（入库流水线的加载/切分进程池），所以只依赖可 pickle 的参数，
+加载器和切分器按名称从下面的表中选取。
+"""
+import functools
+from typing import Any, Dict, List
+
+from langchain_community.document_loaders import TextLoader, UnstructuredMarkdownLoader
+from langchain_core.documents import Document
+from langchain.text_splitter import MarkdownTextSplitter, RecursiveCharacterTextSplitter
+
+from ingest.manifest import chunk_id, file_hash
+from ingest.structured import StructuredDocSplitter
+
+LOADERS = {
+    "text": lambda path: TextLoader(path, encoding='utf-8'),
+    "markdown": lambda path: UnstructuredMarkdownLoader(path, encoding='utf-8'),
+}
+
+SPLITTERS = {
+    "recursive": lambda: RecursiveCharacterTextSplitter(
+        chunk_size=500,
+        chunk_overlap=100,
+        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
+        length_function=len,
+    ),
+    "markdown": lambda: MarkdownTextSplitter(chunk_size=500, chunk_overlap=100),
+    # 按 Rd / markdown 结构切分，不重叠，chunk 带 section / function / content_type 元数据
+    "structured": lambda: StructuredDocSplitter(chunk_size=1000, min_chunk_size=200),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_splitter(name: str):
+    return SPLITTERS[name]()
+
+
+def load_file(loader: str, path: str, metadata: Dict[str, Any]) -> List[Document]:
+    docs = LOADERS[loader](path).load()
+    for doc in docs:
+        doc.metadata.update(metadata)
+    return docs
+
+
+def split_file(splitter: str, collection: str, file_name: str, docs: List[Document]) -> Dict[str, Document]:
+    """切分一个文件的文档，返回 {chunk id: chunk}，内容相同的 chunk 只保留一个"""
+    chunks: Dict[str, Document] = {}
+    for split in get_splitter(splitter).split_documents(docs):
+        chunks.setdefault(chunk_id(collection, file_name, split.page_content), split)
+    return chunks
+
+
+def load_task(task: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """流水线加载阶段：读取文件并计算文件哈希"""
+    return [dict(task, hash=file_hash(task["path"]), docs=load_file(task["loader"], task["path"], task["metadata"]))]
+
+
+def split_task(task: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """流水线切分阶段：把一个文件的文档切成带 id 的 chunk 记录"""
+    chunks = split_file(task["splitter"], task["collection"], task["file_name"], task["docs"])
+    return [
+        {"collection": task["collection"], "file_name": task["file_name"], "hash": task["hash"],
+         "id": cid, "doc": doc, "file_chunks": len(chunks)}
+        for cid, doc in chunks.items()
+    ]
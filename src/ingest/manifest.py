@@ -0,0 +1,77 @@
+"""增量入库使用的清单（manifest）
+
+清单按 collection 记录每个源文件的内容哈希和它写入向量库的 chunk id，
+下次同步时据此判断哪些文件新增、修改或删除，只对变化的部分重新切分和 embedding。
+作为近似重复跳过的 chunk 不算写入，单独记录它与哪个 chunk 重复，原 chunk 删除时据此重新检查。
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(collection: str, file_name: str, text: str) -> str:
+    """chunk 的内容寻址 id，同时作为向量库主键"""
+    return hashlib.sha256(f"{collection}\0{file_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """{collection: {file_name: {"hash": 文件哈希, "chunks": [chunk id, ...], "duplicates": {chunk id: 原 chunk id}}}}
+    的持久化清单"""
+
+    # 版本 1 的 chunks 中混有未写入的近似重复 chunk，升级后按首次同步处理
+    VERSION = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        self.collections: Dict[str, Dict[str, Dict]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                self.collections = data.get("collections", {})
+
+    def save(self) -> None:
+        # 先写临时文件再替换，中途失败不会留下损坏的清单
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "collections": self.collections}, f)
+        os.replace(tmp_path, self.path)
+
+    def files(self, collection: str) -> Dict[str, Dict]:
+        return self.collections.get(collection, {})
+
+    def diff(self, collection: str, current: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """对比当前文件哈希与清单，返回 (新增或修改的文件, 删除的文件, 未变化的文件)"""
+        known = self.files(collection)
+        changed = [name for name, digest in current.items() if known.get(name, {}).get("hash") != digest]
+        removed = [name for name in known if name not in current]
+        unchanged = [name for name in current if name not in changed]
+        return changed, removed, unchanged
+
+    def update_file(self, collection: str, file_name: str, digest: str, chunk_ids: Iterable[str],
+                    duplicates: Optional[Dict[str, str]] = None) -> None:
+        """记录文件已写入的 chunk；duplicates 为作为近似重复跳过的 {chunk id: 原 chunk id}"""
+        entry = {"hash": digest, "chunks": list(chunk_ids)}
+        if duplicates:
+            entry["duplicates"] = dict(duplicates)
+        self.collections.setdefault(collection, {})[file_name] = entry
+
+    def files_duplicating(self, collection: str, chunk_ids: Set[str]) -> List[str]:
+        """有 chunk 作为 chunk_ids 中某个 chunk 的近似重复被跳过的文件"""
+        return [name for name, entry in self.files(collection).items()
+                if any(original in chunk_ids for original in entry.get("duplicates", {}).values())]
+
+    def remove_file(self, collection: str, file_name: str) -> None:
+        self.collections.get(collection, {}).pop(file_name, None)
+
+    def remove_collection(self, collection: str) -> None:
+        self.collections.pop(collection, None)
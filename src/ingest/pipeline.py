@@ -0,0 +1,232 @@
+"""流水线式并行入库引擎
+
+入库分为若干阶段（加载 -> 切分 -> embedding -> 写入），阶段之间用有界队列连接：
+CPU 密集的加载/切分在进程池中执行，网络密集的 embedding 按批并发请求，写入按批提交，
+各阶段同时工作，下游变慢时有界队列会让上游阻塞等待（背压），内存占用不会无限增长。
+
+每个阶段统计处理数、输出数、错误数、吞吐量、队列深度和单次处理耗时。
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from metrics import Histogram
+
+_DONE = object()
+
+
+class Stage:
+    """流水线中的一个阶段
+
+    Args:
+        name: 阶段名称
+        fn: 处理函数，输入一个元素（batch_size 大于 1 时为元素列表），返回可迭代的输出
+        workers: 并发的工作线程数
+        queue_size: 输入队列容量
+        executor: 可选的执行器（如进程池），设置后 fn 在执行器中运行，fn 必须可被 pickle
+        batch_size: 每次交给 fn 的元素数，大于 1 时把输入攒成批再处理
+        batch_wait: 攒批时最多等待的秒数
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Iterable[Any]], workers: int = 1, queue_size: int = 64,
+                 executor: Optional[Executor] = None, batch_size: int = 1, batch_wait: float = 0.05):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.executor = executor
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.latency_hist = Histogram()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.processed = 0
+        self.produced = 0
+        self.errors = 0
+        self.recent_errors: deque = deque(maxlen=5)
+        self.max_queue_depth = 0
+        self.busy_seconds = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def put(self, item: Any) -> None:
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def _next_batch(self) -> List[Any]:
+        """取下一批输入；遇到结束标记时返回的批以 _DONE 结尾"""
+        batch = [self.queue.get()]
+        if batch[0] is _DONE or self.batch_size <= 1:
+            return batch
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is _DONE:
+                break
+        return batch
+
+    def _call(self, arg: Any) -> List[Any]:
+        if self.executor is not None:
+            return list(self.executor.submit(self.fn, arg).result())
+        return list(self.fn(arg))
+
+    def process(self, items: List[Any]) -> List[Any]:
+        arg = items if self.batch_size > 1 else items[0]
+        start = time.perf_counter()
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = start
+        try:
+            outputs = self._call(arg)
+        except Exception as e:
+            outputs = []
+            with self._lock:
+                self.errors += len(items)
+                self.recent_errors.append(f"{type(e).__name__}: {e}")
+        elapsed = time.perf_counter() - start
+        self.latency_hist.observe(elapsed * 1000)
+        with self._lock:
+            self.processed += len(items)
+            self.produced += len(outputs)
+            self.busy_seconds += elapsed
+        return outputs
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished_at or time.perf_counter()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "produced": self.produced,
+                "errors": self.errors,
+                "recent_errors": list(self.recent_errors),
+                "throughput": self.processed / elapsed if elapsed > 0 else 0.0,
+                # 工作线程忙碌时间占比，接近 1 说明该阶段是瓶颈
+                "utilization": self.busy_seconds / (elapsed * self.workers) if elapsed > 0 else 0.0,
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "latency_ms": self.latency_hist.snapshot(),
+            }
+
+
+class IngestPipeline:
+    """按顺序连接的多个阶段，最后一个阶段的输出交给 sink"""
+
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        self.stages = stages
+        self._threads: List[threading.Thread] = []
+
+    def _worker(self, index: int, remaining: List[int], lock: threading.Lock,
+                sink: Optional[Callable[[Any], None]]) -> None:
+        stage = self.stages[index]
+        downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        done = False
+        while not done:
+            batch = stage._next_batch()
+            done = batch[-1] is _DONE
+            items = batch[:-1] if done else batch
+            if not items:
+                continue
+            for output in stage.process(items):
+                if downstream is not None:
+                    downstream.put(output)
+                elif sink is not None:
+                    try:
+                        sink(output)
+                    except Exception as e:
+                        with stage._lock:
+                            stage.errors += 1
+                            stage.recent_errors.append(f"sink {type(e).__name__}: {e}")
+        # 本阶段最后一个退出的线程负责通知下游结束
+        with lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last:
+            with stage._lock:
+                stage.finished_at = time.perf_counter()
+            if downstream is not None:
+                for _ in range(downstream.workers):
+                    downstream.put(_DONE)
+
+    def run(self, items: Iterable[Any], sink: Optional[Callable[[Any], None]] = None) -> Dict[str, Any]:
+        """把 items 送入流水线并等待全部阶段完成，返回各阶段统计"""
+        for stage in self.stages:
+            stage._reset()
+        remaining = [stage.workers for stage in self.stages]
+        lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, args=(index, remaining, lock, sink),
+                             name=f"ingest-{stage.name}-{n}", daemon=True)
+            for index, stage in enumerate(self.stages)
+            for n in range(stage.workers)
+        ]
+        start = time.perf_counter()
+        for thread in self._threads:
+            thread.start()
+        first = self.stages[0]
+        for item in items:
+            first.put(item)
+        for _ in range(first.workers):
+            first.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        return {
+            "elapsed_seconds": time.perf_counter() - start,
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """运行中也可调用，用于观察各阶段进度"""
+        return {stage.name: stage.stats() for stage in self.stages}
+
+
+def embed_stage(embeddings, batch_size: int = 64, workers: int = 4, queue_size: int = 1024) -> Stage:
+    """批量 embedding 阶段：输入 chunk 记录（含 "doc"），输出带 "vector" 的记录列表（一批一个输出）"""
+
+    def embed(records: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        vectors = embeddings.embed_documents([record["doc"].page_content for record in records])
+        if len(vectors) != len(records):
+            raise ValueError(f"embedding 数量不匹配: 期望 {len(records)}，实际 {len(vectors)}")
+        return [[dict(record, vector=vector) for record, vector in zip(records, vectors)]]
+
+    return Stage("embed", embed, workers=workers, queue_size=queue_size, batch_size=batch_size)
+
+
+def insert_stage(get_vectorstore: Callable[[str], Any], workers: int = 1, queue_size: int = 16) -> Stage:
+    """批量写入阶段：按 collection 分组后一次写入，输出成功写入的记录
+
+    get_vectorstore(collection) 返回对应的向量库；记录中没有 "id" 时由向量库自动生成主键。
+    """
+
+    def insert(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for record in batch:
+            groups.setdefault(record.get("collection", ""), []).append(record)
+        for collection, records in groups.items():
+            kwargs = {"ids": [r["id"] for r in records]} if all("id" in r for r in records) else {}
+            get_vectorstore(collection).add_embeddings(
+                texts=[r["doc"].page_content for r in records],
+                embeddings=[r["vector"] for r in records],
+                metadatas=[r["doc"].metadata for r in records],
+                **kwargs,
+            )
+        return batch
+
+    return Stage("insert", insert, workers=workers, queue_size=queue_size)
@@ -0,0 +1,251 @@
+"""按文档结构切分 R / Bioconductor / Bioconda 文档
+
+按字符数切分会把 vignette 中的代码块、函数帮助中的参数表从中间切开，重叠部分又让 chunk 数膨胀。
+这里先把文档解析成结构块，再在结构边界上打包成 chunk：
+    - markdown 标题（# 和下划线式）、R 帮助文本的函数头（"DESeq   package:DESeq2   R Documentation"）
+      和小节标题（Usage: / Arguments: ...）、Rd 源码的 \\name{} / \\arguments{} 等宏决定所属章节
+    - 围栏代码块（``` / ~~~，包括 Rmd 的 ```{r}）、markdown 表格整体作为一个块
+    - 参数表中的每个参数（\\item{x}{...} 或 "x: ..."）作为一个块，不会被切开
+chunk 不跨章节、不重叠，每个 chunk 的元数据中带有 section（标题路径）、function（所属函数）和 content_type。
+超过 chunk_size 的单个块才会被继续切分：代码按行切分并补全围栏，文本交给 RecursiveCharacterTextSplitter。
+"""
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+FENCE = re.compile(r"^\s*(```+|~~~+)")
+ATX_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+SETEXT_UNDERLINE = re.compile(r"^(={3,}|-{3,})\s*$")
+TABLE_ROW = re.compile(r"^\s*\|")
+# R 帮助文本（Rd2txt / help() 输出）
+RD_TXT_HEADER = re.compile(r"^(\S+)\s+package:(\S+)\s+R Documentation\s*$")
+RD_TXT_SECTION = re.compile(
+    r"^(Description|Usage|Arguments|Format|Details|Value|Slots|Methods|Note|Author\(s\)|Source|"
+    r"References|See Also|Examples):\s*$"
+)
+RD_TXT_ITEM = re.compile(r"^\s{0,8}[\w.]+(?:\s*,\s*[\w.]+)*: \S")
+# Rd 源码
+RD_NAME = re.compile(r"^\\name\{([^}]+)\}")
+RD_SECTION = re.compile(
+    r"^\\(title|description|usage|arguments|format|details|value|note|author|source|references|seealso|examples)\{"
+    r"|^\\(?:sub)?section\{([^}]+)\}\{"
+)
+RD_ITEM = re.compile(r"^\s*\\item\{")
+
+CODE_SECTIONS = {"usage", "examples"}
+
+
+@dataclass
+class Block:
+    text: str
+    kind: str  # text / code / table / heading / item
+    section: Tuple[str, ...]
+    function: str
+
+
+def parse_blocks(text: str) -> List[Block]:
+    """把文档解析为结构块序列"""
+    blocks: List[Block] = []
+    headings: List[Tuple[int, str]] = []
+    function = ""
+    paragraph: List[str] = []
+    paragraph_kind = "text"
+
+    def section() -> Tuple[str, ...]:
+        return tuple(title for _, title in headings)
+
+    def set_heading(level: int, title: str) -> None:
+        while headings and headings[-1][0] >= level:
+            headings.pop()
+        headings.append((level, title))
+
+    def current_section_name() -> str:
+        return headings[-1][1].lower() if headings else ""
+
+    def flush() -> None:
+        nonlocal paragraph, paragraph_kind
+        if paragraph and any(line.strip() for line in paragraph):
+            blocks.append(Block("\n".join(paragraph).strip("\n"), paragraph_kind, section(), function))
+        paragraph, paragraph_kind = [], "text"
+
+    def start_paragraph(kind: str) -> None:
+        nonlocal paragraph_kind
+        flush()
+        paragraph_kind = kind
+
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+
+        fence = FENCE.match(line)
+        if fence:
+            flush()
+            marker = fence.group(1)
+            code = [line]
+            i += 1
+            while i < len(lines):
+                code.append(lines[i])
+                i += 1
+                if lines[i - 1].strip().startswith(marker[:3]) and len(code) > 1:
+                    break
+            blocks.append(Block("\n".join(code), "code", section(), function))
+            continue
+
+        if TABLE_ROW.match(line):
+            if paragraph_kind != "table":
+                start_paragraph("table")
+            paragraph.append(line)
+            i += 1
+            continue
+        if paragraph_kind == "table":
+            flush()
+
+        # 代码小节中以 # 开头的是 R 注释，不是标题
+        heading = ATX_HEADING.match(line) if paragraph_kind != "code" else None
+        if heading:
+            flush()
+            set_heading(len(heading.group(1)), heading.group(2))
+            blocks.append(Block(line, "heading", section(), function))
+            i += 1
+            continue
+
+        # 下划线式标题：单行段落后跟 ==== 或 ----
+        if SETEXT_UNDERLINE.match(line) and len(paragraph) == 1 and paragraph[0].strip() and paragraph_kind == "text":
+            title = paragraph[0].strip()
+            paragraph = []
+            set_heading(1 if line.startswith("=") else 2, title)
+            blocks.append(Block(f"{title}\n{line}", "heading", section(), function))
+            i += 1
+            continue
+
+        rd_header = RD_TXT_HEADER.match(line)
+        rd_name = RD_NAME.match(line)
+        if rd_header or rd_name:
+            flush()
+            function = (rd_header or rd_name).group(1)
+            headings = [(1, function)]
+            blocks.append(Block(line, "heading", section(), function))
+            i += 1
+            continue
+
+        rd_txt_section = RD_TXT_SECTION.match(line)
+        rd_section = RD_SECTION.match(line)
+        if rd_txt_section or rd_section:
+            flush()
+            name = rd_txt_section.group(1) if rd_txt_section else (rd_section.group(1) or rd_section.group(2))
+            set_heading(2, name)
+            if name.lower() in CODE_SECTIONS:
+                paragraph_kind = "code"
+            paragraph.append(line)
+            i += 1
+            continue
+
+        in_arguments = current_section_name() == "arguments"
+        if in_arguments and (RD_ITEM.match(line) or RD_TXT_ITEM.match(line)):
+            start_paragraph("item")
+            paragraph.append(line)
+            i += 1
+            continue
+
+        if not line.strip():
+            # 代码小节（Usage / Examples）中的空行不打断代码
+            if paragraph_kind != "code":
+                flush()
+            else:
+                paragraph.append(line)
+            i += 1
+            continue
+
+        paragraph.append(line)
+        i += 1
+    flush()
+    return blocks
+
+
+class StructuredDocSplitter:
+    """按文档结构切分，接口与 LangChain 的 TextSplitter.split_documents 一致
+
+    Args:
+        chunk_size: chunk 的最大字符数
+        min_chunk_size: 小于该长度的 chunk（如只有标题）并入后面的 chunk
+    """
+
+    def __init__(self, chunk_size: int = 1000, min_chunk_size: int = 200):
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=0,
+            separators=["\n\n", "\n", ". ", " ", ""],
+        )
+
+    def _split_block(self, block: Block) -> List[Block]:
+        """切分超长的单个块"""
+        if len(block.text) <= self.chunk_size:
+            return [block]
+        if block.kind != "code":
+            return [Block(piece, block.kind, block.section, block.function)
+                    for piece in self._fallback.split_text(block.text)]
+        lines = block.text.split("\n")
+        fence = FENCE.match(lines[0])
+        opener, closer = (lines[0], fence.group(1)) if fence else ("", "")
+        body = (lines[1:-1] if FENCE.match(lines[-1]) else lines[1:]) if fence else lines
+        budget = self.chunk_size - len(opener) - len(closer) - 2
+        pieces, current, size = [], [], 0
+        for line in body:
+            if current and size + len(line) + 1 > budget:
+                pieces.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            pieces.append(current)
+        return [
+            Block("\n".join(([opener] if fence else []) + piece + ([closer] if fence else [])),
+                  "code", block.section, block.function)
+            for piece in pieces
+        ]
+
+    def split_text(self, text: str) -> List[Tuple[str, dict]]:
+        """返回 [(chunk 文本, 结构元数据)]"""
+        chunks: List[Tuple[str, dict]] = []
+        current: List[Block] = []
+        size = 0
+
+        def emit() -> None:
+            nonlocal current, size
+            if current:
+                kinds = {b.kind for b in current if b.kind != "heading"}
+                content_type = "code" if kinds == {"code"} else ("mixed" if "code" in kinds else "text")
+                last = current[-1]
+                chunks.append(("\n\n".join(b.text for b in current), {
+                    "section": " > ".join(last.section),
+                    "function": last.function,
+                    "content_type": content_type,
+                }))
+            current, size = [], 0
+
+        for block in parse_blocks(text):
+            for piece in self._split_block(block):
+                # 换函数时总是切开；章节变化时切开，但过短的 chunk（如只有标题）与后面的内容合并
+                if current and piece.function != current[-1].function:
+                    emit()
+                elif current and piece.section != current[-1].section and size >= self.min_chunk_size:
+                    emit()
+                if current and size + len(piece.text) + 2 > self.chunk_size:
+                    emit()
+                current.append(piece)
+                size += len(piece.text) + 2
+        emit()
+        return chunks
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        return [
+            Document(page_content=chunk, metadata={**doc.metadata, **structure})
+            for doc in documents
+            for chunk, structure in self.split_text(doc.page_content)
+        ]
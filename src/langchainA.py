@@ -3,11 +3,13 @@ import requests
 from bs4 import BeautifulSoup
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import HumanMessage
-from bridge_llm.llm_openai import chat_openai
-from bridge_llm.llm_ollama import chat_ollama_llama31, chat_ollama_llama31_fp16, chat_ollama_llama32_3b_fp16, chat_ollama_llama31_70b
-from bridge_llm.llm_openrouter import chat_openrouter
-from bridge_llm.llm_doubao import chat_doubao
-from bridge_llm.llm_deepseek import chat_deepseek
+import bridge_llm.llm_openai
+import bridge_llm.llm_ollama
+import bridge_llm.llm_openrouter
+import bridge_llm.llm_doubao
+import bridge_llm.llm_deepseek
+import bridge_llm.cascade
+from registry import registry
 from langchain_core.prompts import ChatPromptTemplate
 import time
 from tools.ncbitools import get_gene_info, get_snp_info, blastn, blastp, blastx, tblastx, tblastn , _submit_blast_request
@@ -17,11 +19,13 @@ from tools.ncbitools import get_gene_info, get_snp_info, blastn, blastp, blastx,
 from dotenv import load_dotenv
 load_dotenv('/home/awgao/BioinfoGPT/.env',verbose=True)
 
-# select llm
-# current_llm = chat_ollama_llama31_fp16
-# current_llm = chat_doubao
-# current_llm = chat_ollama_llama31 
-current_llm = chat_openai
+# select llm（注册表中的组件名）
+# current_llm = "chat_ollama_llama31_fp16"
+# current_llm = "chat_doubao"
+# current_llm = "chat_ollama_llama31"
+current_llm = "chat_openai"
+# 级联：先用本地小模型，校验不通过再升级到 gpt-4o-mini（见 bridge_llm/cascade.py）
+# current_llm = "chat_cascade"
 
 def trim_text(text: str) -> str:
     """修剪搜索结果，只要前5个结果"""
@@ -259,8 +263,19 @@ def blastn_untrimmed(sequence: str) -> str:
 tools = [search_gene_info, search_snp_info, blastn]
 
 
-# 创建一个agent with tools
-agent = create_react_agent(model=current_llm, tools=tools)
+# 创建一个agent with tools（首次使用时构建）
+registry.register(
+    "bio_db_agent",
+    lambda: create_react_agent(model=registry.get(current_llm), tools=tools),
+    tags=("graph",)
+)
+
+
+def __getattr__(name):
+    # 兼容旧的模块级变量 agent
+    if name == "agent":
+        return registry.get("bio_db_agent")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # agent_use_import_tools = create_react_agent(model=current_llm, tools=tools_from_import)
 # agent_use_import_tools_untrimmed = create_react_agent(model=current_llm, tools=tools_from_import_untrimmed)
@@ -343,6 +358,7 @@ if __name__ == "__main__":
         "Which gene is SNP rs962314907 associated with?",
     ]
     ## worm # yeast
+    agent = registry.get("bio_db_agent")
     for question in test_alignment_questions:
         response = agent.invoke({"messages": [HumanMessage(content=question)]})
         print("回答结果是：" + response["messages"][-1].content)
@@ -350,5 +366,7 @@ if __name__ == "__main__":
         # print(response["messages"][-2].content)
         # print("="*100)
         # print(response["messages"])
+    if current_llm == "chat_cascade":
+        print(registry.get("chat_cascade").stats())
 
     
\ No newline at end of file
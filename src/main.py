@@ -1,16 +1,47 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any, Literal
 from enum import Enum
-
-from bioinfogpt_graph import app as bioinfo_graph
-from docQA import get_rag_response
-from toolRecommend import bioinfo_tools_retriever, recommend_tools_chain
-from langchainA import agent as bio_db_agent
+from contextlib import asynccontextmanager
+import json
+import os
+import time
+import uuid
+
+from registry import registry
+import health
 from langchain_core.messages import HumanMessage
 
-app = FastAPI(title="BioinfoGPT API")
+# 导入各智能体模块（只登记组件，不连接任何后端），并记录导入耗时
+for _module in ("bioinfogpt_graph", "docQA", "toolRecommend", "langchainA"):
+    registry.import_module(_module)
+
+from docQA import TIMEOUT_NOTE, doc_qa_stats, get_rag_response, stream_rag_response
+from toolRecommend import pack_tools_docs
+
+# 启动时预热的组件：BIOINFO_WARMUP=all 或以逗号分隔的组件名，默认不预热
+WARMUP_COMPONENTS = os.getenv("BIOINFO_WARMUP", "")
+
+
+def warmup_names() -> List[str]:
+    if WARMUP_COMPONENTS == "all":
+        return registry.names()
+    return [name.strip() for name in WARMUP_COMPONENTS.split(",") if name.strip()]
+
+
+def warm_up_components() -> Dict[str, Optional[str]]:
+    return registry.warm_up(warmup_names())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_components()
+    yield
+
+
+app = FastAPI(title="BioinfoGPT API", lifespan=lifespan)
 
 # 配置CORS
 app.add_middleware(
@@ -36,6 +67,34 @@ class ChatCompletionRequest(BaseModel):
     temperature: Optional[float] = 0.7
     stream: Optional[bool] = False
 
+async def doc_qa_event_stream(question: str, model: str):
+    """把文档问答的增量回答转换为 OpenAI chat.completion.chunk 格式的 SSE"""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }, ensure_ascii=False) + "\n\n"
+
+    yield chunk({"role": "assistant"})
+    streamed = False
+    async for event in stream_rag_response(question):
+        if event["type"] == "token":
+            streamed = True
+            yield chunk({"content": event["text"]})
+        elif event["type"] == "answer":
+            # 没有流式输出任何内容（检索失败等）时直接发送最终回答；超时时补上提示
+            if not streamed:
+                yield chunk({"content": event["answer"]})
+            elif event["timed_out"]:
+                yield chunk({"content": TIMEOUT_NOTE})
+    yield chunk({}, "stop")
+    yield "data: [DONE]\n\n"
+
 class ChatCompletionResponse(BaseModel):
     id: str = Field(default_factory=lambda: f"chatcmpl-{id}")
     object: str = "chat.completion"
@@ -55,16 +114,21 @@ async def chat_completion(request: ChatCompletionRequest):
         if not user_message:
             raise HTTPException(status_code=400, message="No user message found")
 
+        if request.stream and request.model == "bioinfo-doc-qa":
+            # 文档问答支持流式输出：检索完成后逐 token 返回回答
+            return StreamingResponse(doc_qa_event_stream(user_message, request.model),
+                                     media_type="text/event-stream")
+
         response_content = ""
         usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
 
         # 根据model选择不同的处理流程
         if request.model == "bioinfo-tool-recommend":
             # 工具推荐智能体
-            docs = bioinfo_tools_retriever.invoke(user_message)
-            response_content = recommend_tools_chain.invoke({
+            docs = registry.get("bioinfo_tools_retriever").invoke(user_message)
+            response_content = registry.get("recommend_tools_chain").invoke({
                 "question": user_message,
-                "tools_docs": docs
+                "tools_docs": pack_tools_docs(docs)
             })
 
         elif request.model == "bioinfo-doc-qa":
@@ -73,14 +137,14 @@ async def chat_completion(request: ChatCompletionRequest):
 
         elif request.model == "bioinfo-db-agent":
             # 数据库查询智能体
-            response = bio_db_agent.invoke({
+            response = registry.get("bio_db_agent").invoke({
                 "messages": [HumanMessage(content=user_message)]
             })
             response_content = response["messages"][-1].content
 
         elif request.model == "bioinfo-graph":
             # 综合路由智能体
-            response = bioinfo_graph.invoke({
+            response = registry.get("bioinfo_graph").invoke({
                 "messages": [HumanMessage(content=user_message)]
             })
             response_content = response["messages"][-1].content
@@ -107,6 +171,84 @@ async def chat_completion(request: ChatCompletionRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/v1/components")
+async def components():
+    """各组件的初始化状态与耗时"""
+    return registry.stats()
+
+@app.get("/v1/ollama/stats")
+async def ollama_stats():
+    """各 Ollama 节点的在途请求、平滑延迟与熔断状态"""
+    from bridge_llm.ollama_pool import endpoint_stats
+    return endpoint_stats()
+
+@app.get("/v1/cascade/stats")
+async def cascade_stats():
+    """模型级联的升级率、各级延迟与估算节省"""
+    if not registry.is_ready("chat_cascade"):
+        return {}
+    return registry.get("chat_cascade").stats()
+
+@app.get("/v1/embeddings/stats")
+async def embeddings_stats():
+    """已构建的 embedding 模型的批大小与等待时间直方图"""
+    return {
+        name: registry.get(name).stats()
+        for name in registry.names("embedding")
+        if registry.is_ready(name) and hasattr(registry.get(name), "stats")
+    }
+
+@app.get("/v1/retrieval/cache/stats")
+async def retrieval_cache_stats():
+    """检索结果缓存的命中率、失效与淘汰次数"""
+    if not registry.is_ready("retrieval_cache"):
+        return {}
+    return registry.get("retrieval_cache").stats()
+
+@app.get("/v1/retrieval/fanout/stats")
+async def fanout_stats():
+    """多来源并发检索中各来源的调用、超时、错误次数与延迟"""
+    if not registry.is_ready("doc_fanout_retriever"):
+        return {}
+    return registry.get("doc_fanout_retriever").stats()
+
+@app.get("/v1/router/stats")
+async def router_stats():
+    """综合路由各决策方式（关键词 / 质心分类 / 优先级 / 默认）的次数"""
+    if not registry.is_ready("router_engine"):
+        return {}
+    return registry.get("router_engine").stats()
+
+@app.get("/v1/graph/speculative/stats")
+async def speculative_stats():
+    """综合路由图推测式预取的命中、取消次数，以及节省的延迟与浪费的工作量（毫秒）"""
+    if not registry.is_ready("graph_prefetcher"):
+        return {}
+    return registry.get("graph_prefetcher").stats()
+
+@app.get("/v1/doc-qa/stats")
+async def doc_qa_workflow_stats():
+    """文档问答工作流的运行次数、refine 轮数、跳过 refine 的原因、超时次数与延迟"""
+    return doc_qa_stats()
+
+@app.get("/v1/context/stats")
+async def context_stats():
+    """生成前上下文打包的累计 token 数（打包前 / 后）与去重、合并、截断次数"""
+    if not registry.is_ready("context_packer"):
+        return {}
+    return registry.get("context_packer").stats()
+
+@app.get("/healthz")
+async def healthz():
+    """存活探针"""
+    return health.liveness()
+
+@app.get("/readyz")
+def readyz():
+    """就绪探针：预热组件全部构建完成且 LLM 后端可达时返回 200"""
+    status = health.readiness(warmup_names())
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""fork 之后在子进程中重建 Milvus 连接
+
+pymilvus 按 uri 在进程级的 connections 中缓存 gRPC 连接，fork 出的子进程会继承父进程的 channel，
+不能继续使用。reconnect_milvus 原地替换 langchain Milvus 实例持有的客户端和 Collection，
+实例对象不变，引用它的检索器、索引等无需重新构建。
+"""
+import logging
+import os
+
+from langchain_milvus import Milvus
+from pymilvus import Collection, MilvusClient, connections
+
+logger = logging.getLogger(__name__)
+
+# 已丢弃继承连接的进程号
+_reset_pid = os.getpid()
+# 从父进程继承的连接：既不关闭也不释放（析构时会等待父进程的 gRPC 线程，在子进程中永远等不到）
+_inherited_handlers = []
+
+
+def _forget_inherited_connections() -> None:
+    # 同一 uri 的多个实例共用一个连接：每个子进程只丢弃一次继承来的连接，之后重连的实例之间继续共用
+    global _reset_pid
+    if _reset_pid != os.getpid():
+        _inherited_handlers.extend(connections._alias_handlers.values())
+        connections._alias_handlers.clear()
+        _reset_pid = os.getpid()
+
+
+def reconnect_milvus(vectorstore) -> None:
+    """原地重连 Milvus 实例；其他后端（NumPy、快照等）不持有连接，直接跳过"""
+    if not isinstance(vectorstore, Milvus):
+        return
+    _forget_inherited_connections()
+    vectorstore._milvus_client = MilvusClient(**vectorstore._connection_args)
+    # 异步客户端在首次使用时按当前事件循环重新创建
+    vectorstore._async_milvus_client = None
+    vectorstore.alias = vectorstore.client._using
+    if vectorstore.col is not None:
+        vectorstore.col = Collection(vectorstore.collection_name, using=vectorstore.alias)
+    logger.info(f"进程 {os.getpid()} 已重连 Milvus collection {vectorstore.collection_name}")
@@ -0,0 +1,328 @@
+"""进程内的 NumPy 向量库
+
+工具目录只有几千条记录，Milvus Lite 的连接、文件锁和序列化开销远大于检索本身。
+NumpyVectorStore 把归一化后的向量放在一个连续矩阵中，用矩阵乘法求 top-k，实现 LangChain 的 VectorStore 接口，
+可以直接 as_retriever() 替换 Milvus。
+
+- quantization="int8"：每行按最大绝对值缩放到 int8，先用 int8 矩阵粗排，再用 float 向量对候选重排
+- quantization="binary"：按符号位压缩为 bit，用汉明距离粗排，再用 float 向量重排
+- quantization="pq"：乘积量化，每 pq_subspaces 段各 1 字节；dims 先做 PCA / 截断降维（见 vector_compression）
+- filter：{字段: 值或值列表}，由预先编码的元数据列生成布尔掩码
+- save/load：目录中的 .npy 以内存映射方式加载，多个 worker 进程共享页缓存
+- 也可以由 snapshot.load_snapshot 从快照加载，文本与元数据为 Arrow 列的内存映射视图
+"""
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from vector_compression import ProductQuantizer, Reducer
+
+QUANTIZATIONS = ("none", "int8", "binary", "pq")
+
+# 汉明距离查表：每个字节中 1 的个数
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return (matrix / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    scales = np.abs(matrix).max(axis=1).astype(np.float32) / 127
+    scales[scales == 0] = 1
+    return np.round(matrix / scales[:, None]).astype(np.int8), scales
+
+
+def quantize_binary(matrix: np.ndarray) -> np.ndarray:
+    return np.packbits(matrix > 0, axis=1)
+
+
+class NumpyVectorStore(VectorStore):
+    """基于 NumPy 矩阵的向量库
+
+    Args:
+        embedding: embedding 模型
+        quantization: none / int8 / binary / pq
+        rescore_factor: 压缩向量粗排时保留 k * rescore_factor 个候选做 float 重排
+        dims: 降维后的维度，None 表示不降维
+        reduction: pca / truncate
+        pq_subspaces: pq 量化的子空间数，需整除（降维后的）维度
+    """
+
+    def __init__(self, embedding: Embeddings, quantization: str = "none", rescore_factor: int = 4,
+                 dims: Optional[int] = None, reduction: str = "pca", pq_subspaces: int = 0):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"不支持的量化方式: {quantization}")
+        if quantization == "pq" and pq_subspaces <= 0:
+            raise ValueError("pq 量化需要指定 pq_subspaces")
+        self.embedding = embedding
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.dims = dims
+        self.reduction = reduction
+        self.pq_subspaces = pq_subspaces
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._reset_derived()
+
+    def _reset_derived(self) -> None:
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.reducer: Optional[Reducer] = None
+        self.pq: Optional[ProductQuantizer] = None
+        self._columns: Dict[str, Tuple[Dict[Any, int], np.ndarray]] = {}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # 写入
+
+    def _materialize(self) -> None:
+        # 从快照加载的 ids / texts / metadatas 是只读的 Arrow 列视图，写入前转为列表
+        if not isinstance(self.ids, list):
+            self.ids, self.texts, self.metadatas = list(self.ids), list(self.texts), list(self.metadatas)
+
+    def add_embeddings(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]],
+                       metadatas: Optional[Sequence[dict]] = None, ids: Optional[Sequence[str]] = None,
+                       **kwargs: Any) -> List[str]:
+        if not texts:
+            return []
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        self._materialize()
+        matrix = _normalize(np.asarray(embeddings, dtype=np.float32))
+        self.vectors = matrix if not len(self.ids) else np.vstack([np.asarray(self.vectors), matrix])
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        self.metadatas.extend(dict(m) for m in (metadatas or [{} for _ in texts]))
+        self._reset_derived()
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        drop = set(ids)
+        keep = [i for i, doc_id in enumerate(self.ids) if doc_id not in drop]
+        self.vectors = np.asarray(self.vectors)[keep]
+        self.ids = [self.ids[i] for i in keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self._reset_derived()
+        return True
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    # 量化与过滤
+
+    @property
+    def compressed(self) -> bool:
+        return self.quantization != "none" or self.dims is not None
+
+    @property
+    def codes_name(self) -> str:
+        """压缩编码的文件名前缀，如 int8、pq32.pca256"""
+        name = f"pq{self.pq_subspaces}" if self.quantization == "pq" else self.quantization
+        return f"{name}.{self.reduction}{self.dims}" if self.dims else name
+
+    def _ensure_codes(self) -> None:
+        if not self.compressed or self.codes is not None:
+            return
+        vectors = np.asarray(self.vectors)
+        if self.dims:
+            self.reducer = self.reducer or Reducer.fit(vectors, self.dims, self.reduction)
+            vectors = self.reducer.transform(vectors)
+        if self.quantization == "int8":
+            self.codes, self.scales = quantize_int8(vectors)
+        elif self.quantization == "binary":
+            self.codes = quantize_binary(vectors)
+        elif self.quantization == "pq":
+            self.pq = self.pq or ProductQuantizer.fit(vectors, self.pq_subspaces)
+            self.codes = self.pq.encode(vectors)
+        else:
+            self.codes = vectors
+
+    def index_bytes(self) -> int:
+        """粗排常驻内存的大小；float 原始向量只在重排时按行读取"""
+        self._ensure_codes()
+        if not self.compressed:
+            return int(np.asarray(self.vectors).nbytes)
+        return int(self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+                   + (self.reducer.nbytes if self.reducer else 0) + (self.pq.nbytes if self.pq else 0))
+
+    def disk_bytes(self) -> int:
+        """save 写入的向量数据大小：压缩编码之外总是保存 float32 原始向量（vectors.npy），用于重排"""
+        vectors_bytes = len(self.ids) * np.asarray(self.vectors).shape[-1] * np.dtype(np.float32).itemsize
+        return vectors_bytes + (self.index_bytes() if self.compressed else 0)
+
+    def _column(self, field: str) -> Tuple[Dict[Any, int], np.ndarray]:
+        """元数据列编码为整数数组，过滤时只需比较整数"""
+        if field not in self._columns:
+            values: Dict[Any, int] = {}
+            codes = np.fromiter(
+                (values.setdefault(meta.get(field), len(values)) for meta in self.metadatas),
+                dtype=np.int32, count=len(self.metadatas)
+            )
+            self._columns[field] = (values, codes)
+        return self._columns[field]
+
+    def filter_mask(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """filter 的值可以是单个值、值列表，或对字段值的判断函数（只对每个不同的取值调用一次）"""
+        if not filter:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, wanted in filter.items():
+            values, codes = self._column(field)
+            if callable(wanted):
+                allowed = [code for value, code in values.items() if wanted(value)]
+            else:
+                wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+                allowed = [values[v] for v in wanted if v in values]
+            mask &= np.isin(codes, allowed)
+        return mask
+
+    # 检索
+
+    def _coarse_scores(self, queries: np.ndarray, block_size: int = 8192) -> np.ndarray:
+        if not self.compressed:
+            return queries @ np.asarray(self.vectors).T
+        if self.reducer is not None:
+            queries = self.reducer.transform(queries)
+        if self.quantization == "none":
+            return queries @ np.asarray(self.codes).T
+        if self.quantization == "pq":
+            return self.pq.scores(queries, np.asarray(self.codes))
+        scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        if self.quantization == "int8":
+            q_codes, q_scales = quantize_int8(queries)
+            q_codes = q_codes.astype(np.float32)
+            # 分块转换为 float32 后用 BLAS 计算，避免一次性展开整个 int8 矩阵
+            for start in range(0, len(self.ids), block_size):
+                block = self.codes[start:start + block_size].astype(np.float32)
+                scores[:, start:start + block_size] = (q_codes @ block.T) * q_scales[:, None] \
+                    * self.scales[None, start:start + block_size]
+        else:
+            q_bits = quantize_binary(queries)
+            for start in range(0, len(self.ids), block_size):
+                block = self.codes[start:start + block_size]
+                distance = _POPCOUNT[q_bits[:, None, :] ^ block[None, :, :]].sum(axis=2, dtype=np.int32)
+                scores[:, start:start + block_size] = -distance
+        return scores
+
+    def batch_search(self, query_vectors: Sequence[Sequence[float]], k: int = 4,
+                     filter: Optional[Dict[str, Any]] = None, rescore: bool = True) -> List[List[Tuple[int, float]]]:
+        """一次矩阵乘法完成多条查询，返回每条查询的 [(行号, 余弦相似度)]
+
+        rescore=False 时直接返回压缩向量上的粗排结果（用于评估压缩损失）
+        """
+        if not len(self.ids):
+            return [[] for _ in query_vectors]
+        queries = _normalize(np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1))
+        self._ensure_codes()
+        scores = self._coarse_scores(queries)
+        mask = self.filter_mask(filter)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        rescore = rescore and self.compressed
+        n_candidates = min(len(self.ids), k * self.rescore_factor if rescore else k)
+        candidates = np.argpartition(-scores, n_candidates - 1, axis=1)[:, :n_candidates]
+        results = []
+        vectors = np.asarray(self.vectors)
+        for row, cand in enumerate(candidates):
+            cand = cand[np.isfinite(scores[row, cand])]
+            # 压缩向量粗排后用 float 向量重排
+            exact = vectors[cand] @ queries[row] if rescore else scores[row, cand]
+            order = np.argsort(-exact, kind="stable")[:k]
+            results.append([(int(cand[i]), float(exact[i])) for i in order])
+        return results
+
+    def _document(self, index: int) -> Document:
+        metadata = dict(self.metadatas[index])
+        metadata.setdefault("pk", self.ids[index])
+        return Document(page_content=self.texts[index], metadata=metadata, id=self.ids[index])
+
+    def similarity_search_with_score_by_vector(self, embedding: Sequence[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(self._document(i), score) for i, score in self.batch_search([embedding], k, filter)[0]]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # 余弦相似度映射到 [0, 1]
+        return lambda score: (score + 1) / 2
+
+    # 持久化
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "vectors.npy"), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        self._ensure_codes()
+        name = self.codes_name
+        if self.codes is not None:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), self.codes)
+        if self.scales is not None:
+            np.save(os.path.join(tmp_path, f"{name}.scales.npy"), self.scales)
+        if self.reducer is not None:
+            self.reducer.save(os.path.join(tmp_path, f"{name}.reducer.npy"))
+        if self.pq is not None:
+            self.pq.save(os.path.join(tmp_path, f"{name}.codebooks.npy"))
+        with open(os.path.join(tmp_path, "docs.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}, f, ensure_ascii=False)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, embedding: Embeddings, quantization: str = "none", rescore_factor: int = 4,
+             dims: Optional[int] = None, reduction: str = "pca", pq_subspaces: int = 0) -> "NumpyVectorStore":
+        """加载索引；目录中没有对应配置的压缩编码时在首次检索时重新计算"""
+        store = cls(embedding, quantization, rescore_factor, dims, reduction, pq_subspaces)
+        with open(os.path.join(path, "docs.json"), encoding="utf-8") as f:
+            docs = json.load(f)
+        store.ids, store.texts, store.metadatas = docs["ids"], docs["texts"], docs["metadatas"]
+        store.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        prefix = os.path.join(path, store.codes_name)
+        if store.compressed and os.path.exists(f"{prefix}.npy"):
+            store.codes = np.load(f"{prefix}.npy", mmap_mode="r")
+            if quantization == "int8":
+                store.scales = np.load(f"{prefix}.scales.npy")
+            if dims:
+                store.reducer = Reducer.load(f"{prefix}.reducer.npy", reduction)
+            if quantization == "pq":
+                store.pq = ProductQuantizer.load(f"{prefix}.codebooks.npy")
+        return store
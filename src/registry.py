@@ -0,0 +1,212 @@
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ComponentRegistry:
+    """组件注册表：检索器、链、图和 LLM 客户端只在首次使用或显式预热时构建
+
+    模块导入时只登记工厂函数，不连接任何后端；
+    每个组件的构建耗时、失败信息以及模块导入耗时都会被记录下来。
+
+    持有网络连接的组件（如 Milvus 连接）应以 fork_safe=False 注册：
+    提供了 reconnect 的组件在 fork 之后的子进程中原地重连，实例本身以及依赖它的组件
+    （查找表、质心索引、检索器等）都保留下来，与父进程写时复制共享；
+    没有 reconnect 的组件（如线程池）连同依赖它的组件一起丢弃，在首次使用时重新构建。
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._tags: Dict[str, tuple] = {}
+        self._instances: Dict[str, Any] = {}
+        self._init_times: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._import_times: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._fork_unsafe: set = set()
+        self._reconnects: Dict[str, Callable[[Any], None]] = {}
+        # 每次丢弃实例时递增；构建期间被 invalidate 的组件不保存构建结果
+        self._generations: Dict[str, int] = {}
+        # 组件名 -> 构建时依赖了它的组件名
+        self._dependents: Dict[str, set] = {}
+        self._building = threading.local()
+
+    def register(self, name: str, factory: Callable[[], Any], tags: Iterable[str] = (),
+                 fork_safe: bool = True, reconnect: Optional[Callable[[Any], None]] = None) -> None:
+        """登记组件工厂；重复登记会覆盖旧工厂并丢弃已构建的实例
+
+        Args:
+            name: 组件名
+            factory: 无参工厂函数
+            tags: 组件标签，用于按类别列出组件
+            fork_safe: 实例能否在 fork 出的子进程中直接使用
+            reconnect: fork_safe=False 时可选，在子进程中原地重建实例持有的连接
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._tags[name] = tuple(tags)
+            self._locks.setdefault(name, threading.Lock())
+            self._drop(name)
+            if fork_safe:
+                self._fork_unsafe.discard(name)
+            else:
+                self._fork_unsafe.add(name)
+            if reconnect is None:
+                self._reconnects.pop(name, None)
+            else:
+                self._reconnects[name] = reconnect
+
+    def component(self, name: str, tags: Iterable[str] = (), fork_safe: bool = True,
+                  reconnect: Optional[Callable[[Any], None]] = None):
+        """装饰器形式的 register"""
+        def decorator(factory: Callable[[], Any]) -> Callable[[], Any]:
+            self.register(name, factory, tags, fork_safe, reconnect)
+            return factory
+        return decorator
+
+    def get(self, name: str) -> Any:
+        """获取组件，未构建时同步构建（同一组件只构建一次）"""
+        stack = getattr(self._building, "stack", None)
+        with self._lock:
+            if stack:
+                self._dependents.setdefault(name, set()).add(stack[-1])
+            if name in self._instances:
+                return self._instances[name]
+            if name not in self._factories:
+                raise KeyError(f"未注册的组件: {name}")
+            build_lock = self._locks[name]
+
+        with build_lock:
+            with self._lock:
+                if name in self._instances:
+                    return self._instances[name]
+                generation = self._generations.get(name, 0)
+                factory = self._factories[name]
+            if stack is None:
+                stack = self._building.stack = []
+            stack.append(name)
+            start = time.perf_counter()
+            try:
+                instance = factory()
+            except Exception as e:
+                self._errors[name] = str(e)
+                raise
+            finally:
+                self._init_times[name] = time.perf_counter() - start
+                stack.pop()
+            self._errors.pop(name, None)
+            with self._lock:
+                # 构建期间组件或其依赖被 invalidate：结果可能引用旧实例，只交给本次调用方，不缓存
+                if self._generations.get(name, 0) != generation:
+                    logger.info(f"组件 {name} 在构建期间失效，丢弃构建结果")
+                    return instance
+                self._instances[name] = instance
+            logger.info(f"组件 {name} 初始化完成，耗时 {self._init_times[name]:.3f}s")
+            return instance
+
+    def is_ready(self, name: str) -> bool:
+        return name in self._instances
+
+    def names(self, tag: Optional[str] = None) -> List[str]:
+        return [n for n in self._factories if tag is None or tag in self._tags[n]]
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, raise_on_error: bool = False) -> Dict[str, Optional[str]]:
+        """预热组件
+
+        Args:
+            names: 需要预热的组件名，默认为全部已注册组件
+            raise_on_error: 为 False 时某个组件失败不影响其他组件
+
+        Returns:
+            组件名到错误信息的映射（成功为 None）
+        """
+        results = {}
+        for name in list(names) if names is not None else self.names():
+            try:
+                self.get(name)
+                results[name] = None
+            except Exception as e:
+                logger.warning(f"组件 {name} 预热失败: {e}")
+                if raise_on_error:
+                    raise
+                results[name] = str(e)
+        return results
+
+    def _drop(self, name: str) -> None:
+        # 调用方持有 self._lock
+        self._instances.pop(name, None)
+        self._generations[name] = self._generations.get(name, 0) + 1
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """丢弃已构建的实例及依赖它的组件，下次 get 时重新构建"""
+        with self._lock:
+            if name is None:
+                for current in list(self._factories):
+                    self._drop(current)
+                return
+            pending, seen = [name], set()
+            while pending:
+                current = pending.pop()
+                if current in seen:
+                    continue
+                seen.add(current)
+                self._drop(current)
+                pending.extend(self._dependents.get(current, ()))
+
+    def after_fork(self) -> None:
+        """子进程中调用：重建锁，重连或丢弃不能跨进程共享的组件
+
+        有 reconnect 的组件原地重连，依赖它的组件继续使用同一个实例；
+        没有 reconnect 或重连失败的组件连同依赖它的组件一起丢弃。
+        """
+        self._lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in self._factories}
+        self._building = threading.local()
+        for name in list(self._fork_unsafe):
+            if name not in self._instances:
+                continue
+            reconnect = self._reconnects.get(name)
+            if reconnect is not None:
+                try:
+                    reconnect(self._instances[name])
+                    continue
+                except Exception as e:
+                    logger.warning(f"组件 {name} 在子进程中重连失败，将重新构建: {e}")
+            self.invalidate(name)
+
+    def import_module(self, module_name: str):
+        """导入模块并记录导入耗时"""
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        self._import_times.setdefault(module_name, time.perf_counter() - start)
+        return module
+
+    def stats(self) -> Dict[str, Any]:
+        """各组件的状态与耗时"""
+        return {
+            "imports": dict(self._import_times),
+            "components": {
+                name: {
+                    "ready": name in self._instances,
+                    "init_seconds": self._init_times.get(name),
+                    "error": self._errors.get(name),
+                    "tags": list(self._tags[name]),
+                    "fork_safe": name not in self._fork_unsafe,
+                    "reconnect": name in self._reconnects,
+                }
+                for name in self._factories
+            },
+        }
+
+
+# 进程级单例
+registry = ComponentRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registry.after_fork)
@@ -0,0 +1,199 @@
+"""检索结果缓存
+
+同一个（规范化后的）问题重复出现时，跳过 embedding 请求和向量检索，直接按缓存的文档 id 取回文档。
+缓存键为 (检索器 id, 规范化问题, k, 过滤条件)，值只保存文档 id 及检索时附加的得分等元数据，
+容量有上限（LRU）且有过期时间（TTL）。
+
+入库（重建、增量同步、迁移）结束时调用 bump_collection_version 更新向量库旁的 *.version 文件，
+缓存条目记录写入时的版本，版本变化后自动失效；版本以文件方式保存，预派生的多个 worker 以及
+单独运行的入库进程之间同样有效。
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from registry import registry
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("BIOINFO_RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("BIOINFO_RETRIEVAL_CACHE_TTL", "3600"))
+
+# 检索器在结果元数据中附加的字段，随文档 id 一起缓存
+ANNOTATION_KEYS = ("score", "rrf_score", "facets", "match")
+
+
+def normalize_query(query: str, casefold: bool = True) -> str:
+    """全角转半角、合并空白、去掉首尾空白和句末标点，casefold 为 True 时统一小写"""
+    query = unicodedata.normalize("NFKC", query)
+    query = re.sub(r"\s+", " ", query).strip().rstrip("?？。.!！ ")
+    return query.casefold() if casefold else query
+
+
+def version_path_for(vector_db_path: str) -> str:
+    return f"{vector_db_path}.version"
+
+
+def bump_collection_version(vector_db_path: str) -> int:
+    """入库完成后调用，使基于该向量库的缓存全部失效；返回新版本号"""
+    path = version_path_for(vector_db_path)
+    version = 0
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            version = json.load(f).get("version", 0)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version + 1, "updated_at": time.time()}, f)
+    os.replace(tmp_path, path)
+    return version + 1
+
+
+def collection_version(*vector_db_paths: str) -> str:
+    """当前版本标识；只做 stat，不读文件内容（替换文件会改变 inode 和修改时间）"""
+    parts = []
+    for vector_db_path in vector_db_paths:
+        try:
+            st = os.stat(version_path_for(vector_db_path))
+            parts.append(f"{st.st_ino}:{st.st_mtime_ns}")
+        except FileNotFoundError:
+            parts.append("0")
+    return "|".join(parts)
+
+
+class RetrievalCache:
+    """进程内的检索结果缓存（LRU + TTL）
+
+    Args:
+        max_entries: 最多缓存的查询数，为 0 时不缓存
+        ttl: 条目的过期时间（秒）
+    """
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, Tuple[str, float, List[Tuple[Any, Dict[str, Any]]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "stale": 0, "evictions": 0, "uncacheable": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(retriever_id: str, query: str, k: Optional[int] = None, filters: Any = None,
+            casefold: bool = True) -> tuple:
+        return (retriever_id, normalize_query(query, casefold), k,
+                json.dumps(filters, sort_keys=True, ensure_ascii=False))
+
+    def get(self, key: tuple, version: str) -> Optional[List[Tuple[Any, Dict[str, Any]]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            entry_version, expires_at, hits = entry
+            if entry_version != version or expires_at < time.monotonic():
+                del self._entries[key]
+                self.counters["stale" if entry_version != version else "expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return hits
+
+    def put(self, key: tuple, version: str, hits: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, hits)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def search(self, key: tuple, version: str, search: Callable[[], List[Document]],
+               fetch_docs: Callable[[List[Any]], List[Document]], id_field: str = "pk") -> List[Document]:
+        """命中时按缓存的 id 取回文档并恢复得分等元数据，否则执行 search 并缓存结果
+
+        结果中有文档缺少 id_field 时（如旧版向量库）不缓存。
+        """
+        hits = self.get(key, version)
+        if hits is not None:
+            docs = {doc.metadata.get(id_field): doc for doc in fetch_docs([doc_id for doc_id, _ in hits])}
+            # 文档已被删除但版本未更新时，当作未命中
+            if all(doc_id in docs for doc_id, _ in hits):
+                results = []
+                for doc_id, annotations in hits:
+                    doc = docs[doc_id]
+                    for name in ANNOTATION_KEYS:
+                        doc.metadata.pop(name, None)
+                    doc.metadata.update(annotations)
+                    results.append(doc)
+                return results
+        docs = search()
+        if all(doc.metadata.get(id_field) is not None for doc in docs):
+            self.put(key, version, [
+                (doc.metadata[id_field], {name: doc.metadata[name] for name in ANNOTATION_KEYS if name in doc.metadata})
+                for doc in docs
+            ])
+        else:
+            with self._lock:
+                self.counters["uncacheable"] += 1
+        return docs
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {**self.counters, "size": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl,
+                    "hit_rate": self.counters["hits"] / lookups if lookups else 0.0}
+
+
+class CachedRetriever(BaseRetriever):
+    """给任意检索器加上结果缓存
+
+    Args:
+        retriever: 实际执行检索的检索器
+        cache: 检索结果缓存
+        retriever_id: 缓存键中区分检索器的标识（不同过滤范围的检索器应使用不同的 id）
+        vector_db_paths: 检索器依赖的向量库，其中任何一个的版本变化都会使缓存失效
+        fetch_docs: 按 id 批量取回文档
+        id_field: 文档元数据中的 id 字段
+        k: 返回的文档数，仅作为缓存键的一部分
+        casefold: 缓存键是否忽略大小写；检索结果依赖大小写时（如按 ArchR 这类大小写混写判断工具名）设为 False
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    retriever: BaseRetriever
+    cache: RetrievalCache
+    retriever_id: str
+    vector_db_paths: Sequence[str]
+    fetch_docs: Callable[[List[Any]], List[Document]]
+    id_field: str = "pk"
+    k: Optional[int] = None
+    casefold: bool = True
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        return self.cache.search(
+            RetrievalCache.key(self.retriever_id, query, self.k, casefold=self.casefold),
+            collection_version(*self.vector_db_paths),
+            lambda: self.retriever.invoke(query),
+            self.fetch_docs,
+            self.id_field,
+        )
+
+
+# 所有检索器共用一个缓存，各检索器以 retriever_id 区分
+registry.register("retrieval_cache", RetrievalCache, tags=("cache",))
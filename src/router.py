@@ -1,50 +1,319 @@
-from typing import Dict, Any, List
-from pydantic import BaseModel
-from langchain_core.messages import HumanMessage, AIMessage
+"""智能体路由
+
+全部关键词编译为一个交替正则，一次扫描得到各智能体的命中数（得分）：长关键词优先匹配，
+"how to use" 不会先被 "how to" 截走；英文关键词要求从词首开始匹配（how to 不匹配 show to）。
+唯一最高分的智能体直接返回；没有命中或最高分并列时，用查询 embedding 与各智能体质心的余弦相似度决定
+（质心由日志中关键词明确路由的查询和人工标注的查询训练，见 train_centroids），没有质心或相似度过低时按默认优先级。
+"""
+import json
+import logging
+import os
 import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import bridge_llm.llm_ollama
+from registry import registry
+
+logger = logging.getLogger(__name__)
+
+# 注册表中的组件名，实例在首次使用时构建
+current_embedding_model = "embeddings_nomic"
+
+# 质心分类器文件，由 python router.py --train 生成
+ROUTER_CENTROIDS_PATH = os.getenv("BIOINFO_ROUTER_CENTROIDS", "/home/awgao/BioinfoGPT/data/router/centroids.npz")
+# 路由日志（JSONL），用于训练质心；为空时不记录
+ROUTER_LOG_PATH = os.getenv("BIOINFO_ROUTER_LOG", "")
+# 质心相似度低于该值时不采用，按默认优先级
+ROUTER_MIN_SIMILARITY = float(os.getenv("BIOINFO_ROUTER_MIN_SIMILARITY", "0.3"))
+
+# 各智能体的关键词（字面量，不区分大小写），按默认优先级排列
+ROUTE_KEYWORDS = {
+    # 工具推荐模式的关键词
+    "tool-recommend": [
+        "工具", "软件", "推荐", "用什么", "怎么做",
+        "tool", "software", "recommend", "how to",
+        "도구", "소프트웨어", "추천"
+    ],
+    # 文档问答模式的关键词
+    "doc-qa": [
+        "怎么使用", "参数", "文档", "说明",
+        "how to use", "parameter", "document",
+        "사용 방법", "매개변수", "문서"
+    ],
+    # 生物数据库查询模式的关键词
+    "bio-db": [
+        "基因", "序列", "BLAST", "SNP",
+        "gene", "sequence", "protein",
+        "유전자", "서열", "단백질"
+    ],
+}
+
+
+@dataclass
+class RouteDecision:
+    """一次路由的结果
+
+    method: keywords（唯一最高分）/ centroid（质心分类）/ precedence（并列时按优先级）/ default（没有命中）
+    """
+    route: str
+    method: str
+    scores: Dict[str, float] = field(default_factory=dict)
+    similarity: Optional[float] = None
+
+
+def compile_keywords(route_keywords: Dict[str, List[str]]) -> Tuple["re.Pattern", Dict[str, str]]:
+    """把全部关键词编译为一个交替正则，返回 (正则, {小写关键词: 智能体})
+
+    不使用捕获分组（分组会使 re 放弃字面量前缀优化，慢数倍），匹配到的文本直接查表得到智能体
+    """
+    keyword_routes = {}
+    for route, keywords in route_keywords.items():
+        for keyword in keywords:
+            keyword_routes.setdefault(keyword.lower(), route)
+    keywords = sorted(keyword_routes, key=len, reverse=True)
+    return re.compile("|".join(re.escape(keyword) for keyword in keywords)), keyword_routes
+
+
+def _ascii_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+class CentroidClassifier:
+    """最近质心分类器：每个智能体一个归一化的平均 embedding
+
+    Args:
+        routes: 智能体名
+        centroids: 与 routes 对应的质心矩阵
+        embedding_model: 训练时使用的 embedding 组件名
+    """
+
+    def __init__(self, routes: Sequence[str], centroids: np.ndarray, embedding_model: str):
+        self.routes = list(routes)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.embedding_model = embedding_model
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def fit(cls, vectors: Sequence[Sequence[float]], labels: Sequence[str], embedding_model: str) -> "CentroidClassifier":
+        vectors = cls._normalize(np.asarray(vectors, dtype=np.float32))
+        routes = [route for route in ROUTE_KEYWORDS if route in set(labels)]
+        labels = np.asarray(labels)
+        centroids = np.stack([vectors[labels == route].mean(axis=0) for route in routes])
+        return cls(routes, cls._normalize(centroids), embedding_model)
+
+    def predict(self, vectors: Sequence[Sequence[float]],
+                allowed: Optional[Sequence[Optional[Iterable[str]]]] = None) -> List[Tuple[str, float]]:
+        """返回每条查询最近的质心及余弦相似度；allowed[i] 限定第 i 条查询的候选智能体"""
+        scores = self._normalize(np.asarray(vectors, dtype=np.float32)) @ self.centroids.T
+        results = []
+        for i, row in enumerate(scores):
+            candidates = set(allowed[i]) if allowed is not None and allowed[i] else None
+            best = max((j for j, route in enumerate(self.routes) if candidates is None or route in candidates),
+                       key=lambda j: row[j], default=None)
+            results.append((self.routes[best], float(row[best])) if best is not None else (None, 0.0))
+        return results
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, routes=np.asarray(self.routes),
+                 embedding_model=np.asarray(self.embedding_model))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CentroidClassifier":
+        with np.load(path) as data:
+            return cls(data["routes"].tolist(), data["centroids"], str(data["embedding_model"]))
+
+
+class RouterEngine:
+    """关键词正则 + 质心分类的路由引擎
+
+    Args:
+        route_keywords: {智能体: 关键词列表}，字典顺序即默认优先级
+        embedding: 质心分类使用的 embedding 模型
+        classifier: 质心分类器，为 None 时只用关键词
+        min_similarity: 采用质心分类结果的最低相似度
+        log_path: 路由日志路径，为空时不记录
+    """
+
+    def __init__(self, route_keywords: Dict[str, List[str]] = ROUTE_KEYWORDS, embedding=None,
+                 classifier: Optional[CentroidClassifier] = None, min_similarity: float = ROUTER_MIN_SIMILARITY,
+                 log_path: str = ROUTER_LOG_PATH):
+        self.routes = list(route_keywords)
+        self.pattern, self.keyword_routes = compile_keywords(route_keywords)
+        self.embedding = embedding
+        self.classifier = classifier if embedding is not None else None
+        self.min_similarity = min_similarity
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.counters = {"keywords": 0, "centroid": 0, "precedence": 0, "default": 0, "embedding_errors": 0}
+
+    def keyword_scores(self, query: str) -> Dict[str, float]:
+        scores = dict.fromkeys(self.routes, 0.0)
+        query = query.lower()
+        for match in self.pattern.finditer(query):
+            keyword, start = match.group(), match.start()
+            # 英文关键词须从词首开始
+            if start and _ascii_word_char(keyword[0]) and _ascii_word_char(query[start - 1]):
+                continue
+            scores[self.keyword_routes[keyword]] += 1
+        return scores
+
+    def ranked_routes(self, scores: Dict[str, float]) -> List[str]:
+        """按得分从高到低，同分按默认优先级"""
+        return sorted(self.routes, key=lambda route: (-scores[route], self.routes.index(route)))
+
+    @staticmethod
+    def _ambiguous(scores: Dict[str, float]) -> Optional[List[str]]:
+        """关键词不能唯一确定时返回候选智能体（没有命中时为全部），否则返回 None"""
+        top = max(scores.values())
+        tied = [route for route, score in scores.items() if score == top]
+        return None if top > 0 and len(tied) == 1 else tied
+
+    def route_batch(self, queries: Sequence[str]) -> List[RouteDecision]:
+        """批量路由：关键词不能确定的查询只做一次批量 embedding"""
+        all_scores = [self.keyword_scores(query) for query in queries]
+        decisions: List[Optional[RouteDecision]] = [None] * len(queries)
+        pending = []
+        for i, scores in enumerate(all_scores):
+            candidates = self._ambiguous(scores)
+            if candidates is None:
+                decisions[i] = RouteDecision(self.ranked_routes(scores)[0], "keywords", scores)
+            else:
+                pending.append((i, candidates))
+
+        predictions: Dict[int, Tuple[str, float]] = {}
+        if pending and self.classifier is not None:
+            try:
+                vectors = self.embedding.embed_documents([queries[i] for i, _ in pending])
+                for (i, _), prediction in zip(pending, self.classifier.predict(vectors, [c for _, c in pending])):
+                    predictions[i] = prediction
+            except Exception as e:
+                logger.warning(f"路由 embedding 失败，按默认优先级: {e}")
+                self._count("embedding_errors")
+
+        for i, candidates in pending:
+            scores = all_scores[i]
+            route, similarity = predictions.get(i, (None, None))
+            if route is not None and similarity >= self.min_similarity:
+                decisions[i] = RouteDecision(route, "centroid", scores, similarity)
+            else:
+                method = "precedence" if max(scores.values()) > 0 else "default"
+                decisions[i] = RouteDecision(self.ranked_routes(scores)[0], method, scores, similarity)
+
+        for decision in decisions:
+            self._count(decision.method)
+        self.log(queries, decisions)
+        return decisions
+
+    def route(self, query: str) -> RouteDecision:
+        return self.route_batch([query])[0]
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def log(self, queries: Sequence[str], decisions: Sequence[RouteDecision]) -> None:
+        if not self.log_path:
+            return
+        lines = "".join(
+            json.dumps({"query": query, "route": d.route, "method": d.method, "scores": d.scores, "ts": time.time()},
+                       ensure_ascii=False) + "\n"
+            for query, d in zip(queries, decisions)
+        )
+        try:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning(f"写入路由日志失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, "centroids": self.classifier is not None}
+
+
+def load_training_samples(log_path: str = ROUTER_LOG_PATH,
+                          labeled_paths: Sequence[str] = ()) -> List[Tuple[str, str]]:
+    """训练样本：日志中由关键词唯一确定的查询（其余查询的标签来自分类器本身，不使用）和标注文件中的全部查询"""
+    samples = {}
+    if log_path and os.path.exists(log_path):
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("method") == "keywords":
+                    samples[record["query"]] = record["route"]
+    for path in labeled_paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    samples[record["query"]] = record["route"]
+    return list(samples.items())
+
+
+def train_centroids(samples: Sequence[Tuple[str, str]], embedding=None,
+                    embedding_model: str = current_embedding_model) -> CentroidClassifier:
+    embedding = embedding or registry.get(embedding_model)
+    vectors = embedding.embed_documents([query for query, _ in samples])
+    return CentroidClassifier.fit(vectors, [route for _, route in samples], embedding_model)
+
+
+@registry.component("router_engine", tags=("router",))
+def build_router_engine() -> RouterEngine:
+    classifier = None
+    if os.path.exists(ROUTER_CENTROIDS_PATH):
+        classifier = CentroidClassifier.load(ROUTER_CENTROIDS_PATH)
+        if classifier.embedding_model != current_embedding_model:
+            logger.warning(f"路由质心由 {classifier.embedding_model} 训练，与当前 embedding 模型不一致，不使用")
+            classifier = None
+    embedding = registry.get(current_embedding_model) if classifier is not None else None
+    return RouterEngine(embedding=embedding, classifier=classifier)
+
 
 class Router:
     """路由器类，用于确定使用哪个智能体处理查询"""
-    
+
+    ROUTE_KEYWORDS = ROUTE_KEYWORDS
+
+    @staticmethod
+    def candidate_routes(query: str, top_n: int = 2) -> List[str]:
+        """按关键词得分排列的前 top_n 个智能体（不做 embedding），供推测式预取使用"""
+        engine = registry.get("router_engine")
+        return engine.ranked_routes(engine.keyword_scores(query))[:top_n]
+
     @staticmethod
     def route_query(query: str) -> str:
         """
         根据查询内容确定使用哪个智能体
-        
+
         Returns:
-            str: 'tool-recommend', 'doc-qa', 'bio-db', 或 'unknown'
+            str: 'tool-recommend', 'doc-qa' 或 'bio-db'
         """
-        # 工具推荐模式的关键词
-        tool_keywords = [
-            r"工具", r"软件", r"推荐", r"用什么", r"怎么做",
-            r"tool", r"software", r"recommend", r"how to",
-            r"도구", r"소프트웨어", r"추천"
-        ]
-        
-        # 文档问答模式的关键词
-        doc_keywords = [
-            r"怎么使用", r"参数", r"文档", r"说明",
-            r"how to use", r"parameter", r"document",
-            r"사용 방법", r"매개변수", r"문서"
-        ]
-        
-        # 生物数据库查询模式的关键词
-        bio_db_keywords = [
-            r"基因", r"序列", r"BLAST", r"SNP",
-            r"gene", r"sequence", r"protein",
-            r"유전자", r"서열", r"단백질"
-        ]
-        
-        # 转换查询为小写以进行匹配
-        query_lower = query.lower()
-        
-        # 检查关键词匹配
-        if any(re.search(kw.lower(), query_lower) for kw in tool_keywords):
-            return "tool-recommend"
-        elif any(re.search(kw.lower(), query_lower) for kw in doc_keywords):
-            return "doc-qa"
-        elif any(re.search(kw.lower(), query_lower) for kw in bio_db_keywords):
-            return "bio-db"
-        
-        # 默认返回工具推荐
-        return "tool-recommend" 
\ No newline at end of file
+        return registry.get("router_engine").route(query).route
+
+    @staticmethod
+    def route_batch(queries: Sequence[str]) -> List[str]:
+        """批量路由（评估用）"""
+        return [decision.route for decision in registry.get("router_engine").route_batch(queries)]
+
+
+if __name__ == "__main__":
+    # 训练路由质心：python router.py --train [labeled.jsonl ...]（另读取 BIOINFO_ROUTER_LOG 中的路由日志）
+    if "--train" in sys.argv:
+        labeled = [arg for arg in sys.argv[sys.argv.index("--train") + 1:] if not arg.startswith("--")]
+        samples = load_training_samples(ROUTER_LOG_PATH, labeled)
+        classifier = train_centroids(samples)
+        classifier.save(ROUTER_CENTROIDS_PATH)
+        registry.invalidate("router_engine")
+        print({"samples": len(samples), "routes": classifier.routes, "path": ROUTER_CENTROIDS_PATH})
@@ -0,0 +1,177 @@
+"""预派生（pre-fork）服务模式
+
+父进程只做一次重量级初始化（导入模块、预热组件），随后 fork 出多个 worker，
+worker 以写时复制方式共享父进程中已构建的只读数据（编译好的图、查找表、索引等）。
+持有网络连接的组件在子进程中原地重连（见 registry.after_fork），无法重连而被丢弃的预热组件在 worker 接受请求前重新构建。
+
+用法:
+    python serve.py --workers 4 --port 8000 --warmup all
+
+运行中可通过信号调整 worker 数量：
+    kill -TTIN <master_pid>   # 增加一个 worker
+    kill -TTOU <master_pid>   # 减少一个 worker
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+from registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+def create_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """父进程创建监听 socket，所有 worker 共享"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """父进程预热 + fork worker 的服务器"""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 8000, workers: int = 2,
+                 warmup: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.warmup = warmup
+        self.warmup_names: List[str] = []
+        self.workers: Dict[int, float] = {}
+        self.fork_times: List[float] = []
+        self.running = False
+        self.app = None
+        self.sock = None
+
+    def prepare(self) -> None:
+        """父进程中完成导入和预热，然后冻结 GC，避免 GC 触碰共享页导致复制"""
+        start = time.perf_counter()
+        import main
+        self.app = main.app
+        if self.warmup is None:
+            names = main.warmup_names()
+        elif self.warmup == "all":
+            names = registry.names()
+        else:
+            names = [name.strip() for name in self.warmup.split(",") if name.strip()]
+        # worker 中的启动预热和 /readyz 读取 main.WARMUP_COMPONENTS，fork 前写入解析后的列表
+        self.warmup_names = names
+        main.WARMUP_COMPONENTS = os.environ["BIOINFO_WARMUP"] = ",".join(names)
+        errors = {name: err for name, err in registry.warm_up(names).items() if err}
+        for name, err in errors.items():
+            logger.warning(f"预热组件 {name} 失败: {err}")
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        self.sock = create_socket(self.host, self.port)
+        logger.info(f"父进程初始化完成，耗时 {time.perf_counter() - start:.2f}s")
+
+    def rewarm(self) -> Dict[str, Optional[str]]:
+        """子进程中调用：registry.after_fork 丢弃的预热组件（无法原地重连的线程池等）在开始接受请求前重新构建"""
+        names = [name for name in self.warmup_names if not registry.is_ready(name)]
+        errors = registry.warm_up(names)
+        for name, err in errors.items():
+            if err:
+                logger.warning(f"worker {os.getpid()} 重新预热组件 {name} 失败: {err}")
+        return errors
+
+    def spawn_worker(self) -> int:
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            # 子进程：恢复默认信号处理，交由 uvicorn 接管
+            for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+                signal.signal(sig, signal.SIG_DFL)
+            self.rewarm()
+            config = uvicorn.Config(self.app, log_level="info")
+            try:
+                uvicorn.Server(config).run(sockets=[self.sock])
+            finally:
+                os._exit(0)
+        self.fork_times.append(time.perf_counter() - start)
+        self.workers[pid] = time.time()
+        logger.info(f"启动 worker {pid}，fork 耗时 {self.fork_times[-1] * 1000:.1f}ms")
+        return pid
+
+    def stop_worker(self, pid: int, sig: int = signal.SIGTERM) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _handle_stop(self, signum, frame):
+        self.running = False
+
+    def _handle_ttin(self, signum, frame):
+        self.num_workers += 1
+
+    def _handle_ttou(self, signum, frame):
+        self.num_workers = max(1, self.num_workers - 1)
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.workers.pop(pid, None) is not None:
+                logger.warning(f"worker {pid} 已退出")
+
+    def run(self) -> None:
+        self.prepare()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGTTIN, self._handle_ttin)
+        signal.signal(signal.SIGTTOU, self._handle_ttou)
+        self.running = True
+        logger.info(f"master {os.getpid()} 监听 {self.host}:{self.port}")
+
+        try:
+            while self.running:
+                self._reap()
+                # 补齐或缩减 worker 数量
+                while len(self.workers) < self.num_workers:
+                    self.spawn_worker()
+                if len(self.workers) > self.num_workers:
+                    # 每轮只停一个最新的 worker，等其退出后再继续
+                    self.stop_worker(max(self.workers, key=self.workers.get))
+                time.sleep(0.5)
+        finally:
+            for pid in list(self.workers):
+                self.stop_worker(pid)
+            deadline = time.time() + 10
+            while self.workers and time.time() < deadline:
+                self._reap()
+                time.sleep(0.1)
+            for pid in list(self.workers):
+                self.stop_worker(pid, signal.SIGKILL)
+            self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BioinfoGPT pre-fork server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BIOINFO_WORKERS", "2")))
+    parser.add_argument("--warmup", default=None,
+                        help="预热组件：all 或逗号分隔的组件名，默认读取 BIOINFO_WARMUP")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    PreforkServer(args.host, args.port, args.workers, args.warmup).run()
+
+
+if __name__ == "__main__":
+    main()
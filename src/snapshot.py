@@ -0,0 +1,243 @@
+"""向量索引快照：导出 / 以内存映射方式加载
+
+每个进程通过 Milvus(...) 打开 data/vector_db 下的 .db 文件需要连接、加锁和反序列化，collection 多时耗时数十秒。
+快照把已建好的索引导出为一个目录：
+    vectors.npy     归一化后的 float32 向量矩阵（N × dim），np.load(mmap_mode="r") 直接映射
+    docs.arrow      Arrow IPC 文件，列 id / text / metadata（JSON），字符串以 offsets + 数据缓冲区保存，
+                    pa.memory_map 后按行读取，不需要整体解析
+    manifest.json   格式版本、embedding 模型、维度、行数、各文件的大小与 sha256、整体内容哈希
+加载时只读取 manifest 并建立内存映射，不重新 embedding，也不把全部文本读入内存；
+多个 worker 进程共享同一份页缓存。
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from numpy_store import NumpyVectorStore, _normalize
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.arrow"
+# 加载时是否校验文件 sha256（需要完整读一遍文件，CI 中可打开）
+SNAPSHOT_VERIFY = os.getenv("BIOINFO_SNAPSHOT_VERIFY", "0") == "1"
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArrowColumn(Sequence):
+    """Arrow 列的只读序列视图：按下标取值时才转换为 Python 对象
+
+    Args:
+        array: pyarrow 的 (Chunked)Array
+        decode: 对每个取出的值做的转换，如 json.loads
+    """
+
+    def __init__(self, array, decode: Optional[Callable[[Any], Any]] = None):
+        self.array = array
+        self.decode = decode
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        value = self.array[index].as_py()
+        return self.decode(value) if self.decode else value
+
+    def __iter__(self) -> Iterator[Any]:
+        for batch in (self.array.chunks if hasattr(self.array, "chunks") else [self.array]):
+            for value in batch.to_pylist():
+                yield self.decode(value) if self.decode else value
+
+
+class SnapshotWriter:
+    """逐批写入快照，内存占用与批大小有关、与总行数无关
+
+    向量先追加到临时的原始文件，close 时补上 .npy 头；文档逐批写入 Arrow IPC 文件。
+    整个目录写完后原子替换 path。
+
+    Args:
+        path: 快照目录
+        embedding_model: 生成向量的 embedding 组件名，加载时用于校验
+        source: 导出来源的说明（向量库路径、collection 名等），原样写入 manifest
+    """
+
+    def __init__(self, path: str, embedding_model: str, source: Optional[Dict[str, Any]] = None):
+        import pyarrow as pa
+
+        self.path = path
+        self.embedding_model = embedding_model
+        self.source = source or {}
+        self.tmp_path = f"{path}.tmp"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.dim: Optional[int] = None
+        self.count = 0
+        self._schema = pa.schema([("id", pa.string()), ("text", pa.large_string()), ("metadata", pa.large_string())])
+        self._raw = open(os.path.join(self.tmp_path, "vectors.raw"), "wb")
+        self._docs_sink = pa.OSFile(os.path.join(self.tmp_path, DOCS_FILE), "wb")
+        self._docs = pa.ipc.new_file(self._docs_sink, self._schema)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], vectors: Sequence[Sequence[float]],
+            metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        import pyarrow as pa
+
+        if not len(ids):
+            return
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        if matrix.ndim != 2 or len(matrix) != len(ids) or len(texts) != len(ids):
+            raise ValueError(f"快照批次的行数不一致: ids={len(ids)}, texts={len(texts)}, vectors={matrix.shape}")
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"向量维度不一致: 期望 {self.dim}，实际 {matrix.shape[1]}")
+        self._raw.write(np.ascontiguousarray(matrix).tobytes())
+        metadatas = metadatas or [{} for _ in ids]
+        self._docs.write_batch(pa.record_batch([
+            pa.array([str(i) for i in ids], pa.string()),
+            pa.array(list(texts), pa.large_string()),
+            pa.array([json.dumps(m, ensure_ascii=False, default=str) for m in metadatas], pa.large_string()),
+        ], schema=self._schema))
+        self.count += len(ids)
+
+    def _write_vectors(self) -> None:
+        raw_path = os.path.join(self.tmp_path, "vectors.raw")
+        with open(os.path.join(self.tmp_path, VECTORS_FILE), "wb") as out, open(raw_path, "rb") as raw:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                "fortran_order": False,
+                "shape": (self.count, self.dim or 0),
+            })
+            shutil.copyfileobj(raw, out, 1 << 20)
+        os.remove(raw_path)
+
+    def close(self) -> Dict[str, Any]:
+        """写入 manifest 并替换旧快照，返回 manifest"""
+        self._raw.close()
+        self._docs.close()
+        self._docs_sink.close()
+        self._write_vectors()
+        files = {}
+        for name in (VECTORS_FILE, DOCS_FILE):
+            file_path = os.path.join(self.tmp_path, name)
+            files[name] = {"bytes": os.path.getsize(file_path), "sha256": file_sha256(file_path)}
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "embedding_model": self.embedding_model,
+            "dim": self.dim or 0,
+            "count": self.count,
+            "dtype": "float32",
+            "normalized": True,
+            "files": files,
+            "content_hash": hashlib.sha256(
+                "".join(files[name]["sha256"] for name in sorted(files)).encode("ascii")
+            ).hexdigest(),
+            "source": self.source,
+            "created_at": time.time(),
+        }
+        with open(os.path.join(self.tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.tmp_path, self.path)
+        return manifest
+
+
+def write_snapshot(store: NumpyVectorStore, path: str, embedding_model: str,
+                   source: Optional[Dict[str, Any]] = None, batch_size: int = 10000) -> Dict[str, Any]:
+    """把 NumpyVectorStore 导出为快照"""
+    writer = SnapshotWriter(path, embedding_model, source)
+    vectors = np.asarray(store.vectors)
+    for start in range(0, len(store), batch_size):
+        end = start + batch_size
+        writer.add(store.ids[start:end], store.texts[start:end], vectors[start:end], store.metadatas[start:end])
+    return writer.close()
+
+
+def export_milvus_snapshot(client, collection_name: str, path: str, embedding_model: str,
+                           id_field: str = "pk", text_field: str = "text", vector_field: str = "vector",
+                           batch_size: int = 1000, source: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """从 Milvus collection 逐批导出快照（直接复制向量，不重新 embedding）
+
+    id_field 保留在 metadata 中，与 Milvus 检索结果的元数据一致。
+    """
+    writer = SnapshotWriter(path, embedding_model, {"collection": collection_name, **(source or {})})
+    iterator = client.query_iterator(collection_name, batch_size=batch_size, filter="", output_fields=["*"])
+    while True:
+        rows = iterator.next()
+        if not rows:
+            iterator.close()
+            break
+        writer.add(
+            ids=[str(row[id_field]) for row in rows],
+            texts=[row.pop(text_field) for row in rows],
+            vectors=[row.pop(vector_field) for row in rows],
+            metadatas=rows,
+        )
+    return writer.close()
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify_snapshot(path: str, manifest: Optional[Dict[str, Any]] = None, checksums: bool = True) -> None:
+    """校验文件大小（以及 sha256），不一致时抛出 ValueError"""
+    manifest = manifest or read_manifest(path)
+    for name, expected in manifest["files"].items():
+        file_path = os.path.join(path, name)
+        if os.path.getsize(file_path) != expected["bytes"]:
+            raise ValueError(f"快照文件 {file_path} 大小不符: 期望 {expected['bytes']}")
+        if checksums and file_sha256(file_path) != expected["sha256"]:
+            raise ValueError(f"快照文件 {file_path} 的 sha256 不符")
+
+
+def load_snapshot(path: str, embedding: Embeddings, embedding_model: Optional[str] = None,
+                  verify: bool = SNAPSHOT_VERIFY, **store_kwargs: Any) -> NumpyVectorStore:
+    """以内存映射方式把快照加载为 NumpyVectorStore
+
+    Args:
+        path: 快照目录
+        embedding: 查询用的 embedding 模型
+        embedding_model: 当前 embedding 组件名，与快照中记录的不一致时拒绝加载（向量空间不同）
+        verify: 是否校验 sha256；否则只校验文件大小
+        store_kwargs: 传给 NumpyVectorStore 的量化 / 降维参数，压缩编码在首次检索时计算
+    """
+    import pyarrow as pa
+
+    manifest = read_manifest(path)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"不支持的快照格式版本: {manifest.get('format_version')}")
+    if embedding_model and manifest["embedding_model"] != embedding_model:
+        raise ValueError(f"快照 {path} 由 {manifest['embedding_model']} 生成，与当前 embedding 模型 {embedding_model} 不一致")
+    verify_snapshot(path, manifest, checksums=verify)
+
+    vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+    if vectors.shape != (manifest["count"], manifest["dim"]):
+        raise ValueError(f"快照向量形状 {vectors.shape} 与 manifest 不符")
+    table = pa.ipc.open_file(pa.memory_map(os.path.join(path, DOCS_FILE), "r")).read_all()
+    if table.num_rows != manifest["count"]:
+        raise ValueError(f"快照文档行数 {table.num_rows} 与 manifest 不符")
+
+    store = NumpyVectorStore(embedding, **store_kwargs)
+    store.vectors = vectors
+    store.ids = ArrowColumn(table.column("id"))
+    store.texts = ArrowColumn(table.column("text"))
+    store.metadatas = ArrowColumn(table.column("metadata"), json.loads)
+    store.snapshot_manifest = manifest
+    return store
@@ -0,0 +1,122 @@
+"""推测式预取
+
+综合路由图原来先分类、再由选中的分支开始检索，路由耗时直接加在总延迟上。
+SpeculativePrefetcher 在路由的同时为最可能的几个分支启动廉价、无副作用的预取（查询 embedding、工具目录检索、
+实体抽取等），路由结果确定后只保留选中分支的预取，其余的取消：尚未开始的直接取消，
+已在执行的通过 threading.Event 通知其在下一个检查点放弃。
+
+统计：
+    saved_ms   选中分支的预取在被使用前已完成的工作量（= 预取耗时 - 分支等待预取的时间），即节省的延迟
+    wasted_ms  被放弃的分支实际执行的时间
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetch:
+    """一个分支的预取任务
+
+    Args:
+        route: 分支名
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+        self.future: Optional[Future] = None
+        # 通知预取函数放弃
+        self.cancelled = threading.Event()
+        self.run_started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def run_ms(self) -> float:
+        if self.run_started is None:
+            return 0.0
+        return ((self.finished or time.perf_counter()) - self.run_started) * 1000
+
+
+class SpeculativePrefetcher:
+    """在路由的同时为候选分支预取
+
+    Args:
+        executor: 执行预取的线程池
+        prefetchers: {分支名: fn(question, cancelled) -> 预取结果}；fn 应在各步骤之间检查 cancelled.is_set()
+    """
+
+    def __init__(self, executor: Executor, prefetchers: Dict[str, Callable[[str, threading.Event], Any]]):
+        self.executor = executor
+        self.prefetchers = prefetchers
+        self._lock = threading.Lock()
+        self.counters = {"runs": 0, "hits": 0, "misses": 0, "prefetches": 0, "cancelled_before_start": 0,
+                         "abandoned": 0, "errors": 0}
+        self.saved = Histogram()
+        self.wasted = Histogram()
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def start(self, question: str, routes: Iterable[str]) -> Dict[str, Prefetch]:
+        """为各候选分支提交预取，没有预取函数的分支跳过"""
+        prefetches = {}
+        for route in routes:
+            fn = self.prefetchers.get(route)
+            if fn is None or route in prefetches:
+                continue
+            prefetch = Prefetch(route)
+
+            def run(fn=fn, prefetch=prefetch):
+                prefetch.run_started = time.perf_counter()
+                try:
+                    return fn(question, prefetch.cancelled)
+                finally:
+                    prefetch.finished = time.perf_counter()
+
+            prefetch.future = self.executor.submit(run)
+            prefetches[route] = prefetch
+        self._count("prefetches", len(prefetches))
+        return prefetches
+
+    def commit(self, prefetches: Dict[str, Prefetch], route: str) -> Optional[Prefetch]:
+        """确定路由：取消其他分支的预取，返回选中分支的预取（没有预取时为 None）"""
+        self._count("runs")
+        for name, prefetch in prefetches.items():
+            if name == route:
+                continue
+            prefetch.cancelled.set()
+            if prefetch.future.cancel():
+                self._count("cancelled_before_start")
+            else:
+                # 已在执行：结束时记录浪费的工作量
+                self._count("abandoned")
+                prefetch.future.add_done_callback(lambda _, p=prefetch: self.wasted.observe(p.run_ms))
+        chosen = prefetches.get(route)
+        self._count("hits" if chosen is not None else "misses")
+        return chosen
+
+    def result(self, prefetch: Optional[Prefetch], timeout: Optional[float] = None) -> Optional[Any]:
+        """取出预取结果；预取失败时返回 None，由分支自行计算"""
+        if prefetch is None:
+            return None
+        waited_from = time.perf_counter()
+        try:
+            value = prefetch.future.result(timeout)
+        except Exception as e:
+            logger.warning(f"分支 {prefetch.route} 的预取失败，改为直接计算: {e}")
+            self._count("errors")
+            return None
+        waited = (time.perf_counter() - waited_from) * 1000
+        self.saved.observe(max(0.0, prefetch.run_ms - waited))
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, "saved_ms": self.saved.snapshot(), "wasted_ms": self.wasted.snapshot()}
@@ -1,6 +1,6 @@
 from langgraph.graph import StateGraph, START, END
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from typing_extensions import TypedDict
 from langchain_milvus import Milvus
 from langchain_ollama import OllamaEmbeddings
@@ -8,30 +8,62 @@ from langchain_community.document_loaders import CSVLoader
 from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import os
+import sys
+import sqlite3
 import pandas as pd
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from bridge_llm.llm_doubao import chat_doubao   
-from bridge_llm.llm_ollama import embeddings_nomic, embeddings_bge_m3
-from langchain_community.document_loaders import SQLDatabaseLoader
-from langchain_community.utilities import SQLDatabase
+import bridge_llm.llm_doubao
+import bridge_llm.llm_ollama
+from registry import registry
+from ingest.pipeline import IngestPipeline, embed_stage, insert_stage
+from numpy_store import NumpyVectorStore
+from vector_compression import compression_report, parse_config, write_report
+from facets import FacetExtractor, FacetedToolRetriever
+from langchain_core.documents import Document
+from ingest.checkpoint import RowidCheckpoint
+from tool_fts import ToolFtsIndex, FtsFirstToolRetriever
+from retrieval_cache import CachedRetriever, bump_collection_version
+import context_packer
+from snapshot import export_milvus_snapshot, load_snapshot
+from milvus_conn import reconnect_milvus
 
-current_embedding_model = embeddings_nomic
-current_llm = chat_doubao
+# 注册表中的组件名，实例在首次使用时构建
+current_embedding_model = "embeddings_nomic"
+current_llm = "chat_doubao"
 
-def create_tools_vectorstore(csv_file_path:str) :
+TOOLS_CSV_PATH = "/home/awgao/BioinfoGPT/data/tools/bioinfo_tools_test.csv"
+TOOLS_DB_PATH = "/home/awgao/BioinfoGPT/data/paper_summaries_local_xml_v2.db"
+TOOLS_VECTOR_DB_PATH = "/home/awgao/BioinfoGPT/data/vector_db/milvus_7000_bge_m3.db"
+
+# 工具库向量检索后端：milvus、numpy（进程内矩阵检索，首次使用时从 Milvus 导出到 TOOLS_NUMPY_INDEX_PATH）
+# 或 snapshot（与 numpy 相同的检索，从 TOOLS_SNAPSHOT_PATH 的快照以内存映射方式加载，冷启动不打开 Milvus）
+VECTOR_BACKEND = os.getenv("BIOINFO_VECTOR_BACKEND", "milvus")
+# NumPy 后端的压缩配置，如 int8、pca256+int8、pca256+pq32，格式见 vector_compression.parse_config
+NUMPY_COMPRESSION = os.getenv("BIOINFO_NUMPY_COMPRESSION", os.getenv("BIOINFO_NUMPY_QUANTIZATION", "none"))
+NUMPY_RESCORE_FACTOR = int(os.getenv("BIOINFO_NUMPY_RESCORE_FACTOR", "4"))
+TOOLS_NUMPY_INDEX_PATH = f"{TOOLS_VECTOR_DB_PATH}.numpy"
+TOOLS_SNAPSHOT_PATH = f"{TOOLS_VECTOR_DB_PATH}.snapshot"
+# 工具名 / 缩写的 FTS5 关键词索引，由工具表生成
+TOOLS_FTS_PATH = f"{TOOLS_DB_PATH}.fts"
+
+def create_tools_vectorstore(
+        csv_file_path: str = TOOLS_CSV_PATH,
+        vector_db_path: str = "/home/awgao/BioinfoGPT/data/vector_db/milvus_100_test.db"
+) :
     """初始化工具向量数据库
     args:
         csv_file_path: 生信工具数据文件路径
+        vector_db_path: 向量数据库文件路径
     returns:
         vectorstore: 生信工具向量数据库
     """
     # 加载CSV数据
-    
+
     # column_name: doi,pmc,pmid,title,year,description,function,homepage,keyword,tooltype,topic
     loader = CSVLoader(
-        file_path=file_path,
+        file_path=csv_file_path,
         csv_args={
             'delimiter': ',',
         },
@@ -39,112 +71,284 @@ def create_tools_vectorstore(csv_file_path:str) :
         metadata_columns=('year', 'keyword', 'tooltype', 'topic'),
     )
     documents = loader.load()
-    
+
     # 初始化embedding模型
-    embeddings = current_embedding_model
-    
+    embeddings = registry.get(current_embedding_model)
+
     # 创建向量数据库
     vectorstore = Milvus(
         embedding_function=embeddings,
         collection_name="bioinfo_tools",
-        connection_args={"uri":"/home/awgao/BioinfoGPT/data/vector_db/milvus_100_test.db"},
+        connection_args={"uri": vector_db_path},
         auto_id=True,
         drop_old=True
     )
-     
+
     # 添加文档到向量数据库
     vectorstore.add_documents(documents)
 
     return vectorstore
 
-file_path = "/home/awgao/BioinfoGPT/data/tools/bioinfo_tools_test.csv"
-create_tools_vectorstore(file_path)
 
-# 载入已有的向量数据库
-bioinfo_tools_vectorstore = Milvus(
-    embedding_function=current_embedding_model,
-    collection_name="bioinfo_tools",
-    connection_args={"uri":"/home/awgao/BioinfoGPT/data/vector_db/milvus_7000_test.db"},
-    auto_id=True,
-)   
-# 创建retriever并设置搜索参数
-bioinfo_tools_retriever = bioinfo_tools_vectorstore.as_retriever(search_kwargs={'k': 5})
 
+def create_tools_vectorstore_pipelined(
+        csv_file_path: str = TOOLS_CSV_PATH,
+        vector_db_path: str = "/home/awgao/BioinfoGPT/data/vector_db/milvus_100_test.db",
+        embed_workers: int = 4,
+        embed_batch_size: int = 64
+):
+    """流水线方式初始化工具向量数据库：边读取 CSV 边并发批量 embedding 和写入
+
+    returns:
+        (vectorstore, 流水线各阶段统计)
+    """
+    loader = CSVLoader(
+        file_path=csv_file_path,
+        csv_args={
+            'delimiter': ',',
+        },
+        source_column='pmid',
+        metadata_columns=('year', 'keyword', 'tooltype', 'topic'),
+    )
+    embeddings = registry.get(current_embedding_model)
+    vectorstore = Milvus(
+        embedding_function=embeddings,
+        collection_name="bioinfo_tools",
+        connection_args={"uri": vector_db_path},
+        auto_id=True,
+        drop_old=True
+    )
+    pipeline = IngestPipeline([
+        embed_stage(embeddings, batch_size=embed_batch_size, workers=embed_workers),
+        insert_stage(lambda collection_name: vectorstore),
+    ])
+    stats = pipeline.run({"doc": doc} for doc in loader.lazy_load())
+    return vectorstore, stats
 
 # 使用 bge-m3 作为嵌入模型
-current_embedding_model = embeddings_bge_m3
+current_embedding_model = "embeddings_bge_m3"
 
-# 直接使用 .db 文件作为文档源，使用SQLDatabaseloader 直接读取而不是使用 csvloader
+# 直接使用 .db 文件作为文档源，按 rowid 分页流式读取，只取用到的列
 # db 文件的列名是 toolname,pmid,pmc,doi,year,keyword,homepage,title,abstract,content,description,function,tooltype,topic
-def create_tools_vectorstore_from_db(db_file_path: str,vector_db_path:str):
-    db_url = f"sqlite:///{db_file_path}"
-    db = SQLDatabase.from_uri(db_url)
-    
-    def content_mapper(row):
-        title = row.title or ''
-        description = row.description or ''
-        function = row.function or ''
-        homepage = row.homepage or ''
-        return f"Title: {title}\nDescription: {description}\nFunction: {function}\nHomepage: {homepage}"
-     
-    def metadata_mapper(row):
-        # 处理 JSON 字符串格式的字段
-        def clean_json_string(value):
-            if not value:
-                return ''
-            # 移除 [] 和 引号，分割并重新组合
-            cleaned = value.strip('[]').replace('"', '').split(',')
-            return ', '.join(cleaned)
-        
-        return {
-            "year": str(row.year) if row.year else '',
-            "keyword": str(row.keyword) if row.keyword else '',
-            "tooltype": clean_json_string(row.tooltype),
-            "topic": clean_json_string(row.topic),
-            "pmid": f"https://pubmed.ncbi.nlm.nih.gov/{row.pmid}/" if row.pmid else '',
-            "doi": str(row.doi) if row.doi else ''
-        }
-    
-    loader = SQLDatabaseLoader(
-        query="SELECT * FROM articles",
-        db=db,
-        metadata_mapper=metadata_mapper,
-        page_content_mapper=content_mapper
+TOOLS_TABLE = "articles"
+TOOLS_DB_COLUMNS = ("title", "description", "function", "homepage", "year", "keyword", "tooltype", "topic", "pmid", "doi")
+
+def tool_page_content(row) -> str:
+    title = row["title"] or ''
+    description = row["description"] or ''
+    function = row["function"] or ''
+    homepage = row["homepage"] or ''
+    return f"Title: {title}\nDescription: {description}\nFunction: {function}\nHomepage: {homepage}"
+
+def tool_metadata(row) -> Dict[str, Any]:
+    # 处理 JSON 字符串格式的字段
+    def clean_json_string(value):
+        if not value:
+            return ''
+        # 移除 [] 和 引号，分割并重新组合
+        cleaned = value.strip('[]').replace('"', '').split(',')
+        return ', '.join(cleaned)
+
+    return {
+        "year": str(row["year"]) if row["year"] else '',
+        "keyword": str(row["keyword"]) if row["keyword"] else '',
+        "tooltype": clean_json_string(row["tooltype"]),
+        "topic": clean_json_string(row["topic"]),
+        "pmid": f"https://pubmed.ncbi.nlm.nih.gov/{row['pmid']}/" if row["pmid"] else '',
+        "doi": str(row["doi"]) if row["doi"] else ''
+    }
+
+def iter_tool_rows(db_file_path: str, after_rowid: int = 0, page_size: int = 500,
+                   columns: Tuple[str, ...] = TOOLS_DB_COLUMNS):
+    """按 rowid 分页读取工具表（WHERE rowid > ? LIMIT ?），任意时刻只有一页数据在内存中"""
+    conn = sqlite3.connect(f"file:{db_file_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    select = ", ".join(f'"{column}"' for column in columns)
+    query = f"SELECT rowid AS _rowid, {select} FROM {TOOLS_TABLE} WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    try:
+        while True:
+            rows = conn.execute(query, (after_rowid, page_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            after_rowid = rows[-1]["_rowid"]
+    finally:
+        conn.close()
+
+def build_tools_fts_index(db_file_path: str = TOOLS_DB_PATH, fts_path: str = TOOLS_FTS_PATH,
+                          page_size: int = 500) -> int:
+    """从工具表生成 FTS5 关键词索引，Document 的格式与向量库中的相同；返回行数"""
+    columns = tuple(dict.fromkeys(("toolname",) + TOOLS_DB_COLUMNS))
+    rows = (
+        (row["_rowid"], {c: row[c] for c in columns}, tool_page_content(row),
+         {**tool_metadata(row), "rowid": row["_rowid"]})
+        for row in iter_tool_rows(db_file_path, 0, page_size, columns)
     )
-    documents = loader.load()
+    return ToolFtsIndex.build(rows, fts_path)
+
+def checkpoint_path_for(vector_db_path: str) -> str:
+    return f"{vector_db_path}.ingest_checkpoint.json"
+
+def create_tools_vectorstore_from_db(
+        db_file_path: str,
+        vector_db_path: str,
+        resume: bool = False,
+        page_size: int = 500,
+        embed_batch_size: int = 64,
+        embed_workers: int = 4,
+        fts_path: str = TOOLS_FTS_PATH
+):
+    """流式建库：分页读取工具表，批量 embedding 并写入，内存占用与表大小无关
+
+    每行以 rowid 作为元数据写入，已连续写入的最大 rowid 记录在向量库旁的断点文件中。
+    resume=True 且断点来自同一个 db 文件时，删除断点之后已写入的行，从断点继续；否则重建 collection。
+    向量写入完成后重新生成 fts_path 处的 FTS5 关键词索引（fts_path 为 None 时跳过）。
+
+    returns:
+        (vectorstore, 流水线各阶段统计)
+    """
+    embeddings = registry.get(current_embedding_model)
+    checkpoint = RowidCheckpoint(checkpoint_path_for(vector_db_path))
+    resume = resume and checkpoint.matches(db_file_path)
 
-    embeddings = current_embedding_model
-    
     # 创建向量数据库
     vectorstore = Milvus(
         embedding_function=embeddings,
         collection_name="bioinfo_tools",
-        connection_args={"uri":vector_db_path},
+        connection_args={"uri": vector_db_path},
         auto_id=True,
-        drop_old=True
+        drop_old=not resume
     )
-     
-    # 添加文档到向量数据库
-    vectorstore.add_documents(documents)
+    if resume and vectorstore.col is not None:
+        # 断点之后可能有乱序写入的行，删除后重新写入
+        vectorstore.delete(expr=f"rowid > {checkpoint.last_rowid}")
+    else:
+        checkpoint.reset(db_file_path)
 
-    return vectorstore
+    def records():
+        for row in iter_tool_rows(db_file_path, checkpoint.last_rowid, page_size):
+            checkpoint.issue(row["_rowid"])
+            doc = Document(page_content=tool_page_content(row), metadata={**tool_metadata(row), "rowid": row["_rowid"]})
+            yield {"doc": doc}
+
+    pipeline = IngestPipeline([
+        embed_stage(embeddings, batch_size=embed_batch_size, workers=embed_workers,
+                    queue_size=embed_batch_size * embed_workers * 2),
+        insert_stage(lambda collection_name: vectorstore, queue_size=embed_workers * 2),
+    ])
+    stats = pipeline.run(records(), sink=lambda record: checkpoint.commit([record["doc"].metadata["rowid"]]))
+    checkpoint.save()
+    stats.update({"rows": checkpoint.rows, "last_rowid": checkpoint.last_rowid, "resumed": resume})
+    if fts_path:
+        stats["fts_rows"] = build_tools_fts_index(db_file_path, fts_path, page_size)
+    # 工具库内容已变化，基于它的检索结果缓存全部失效
+    bump_collection_version(vector_db_path)
+    return vectorstore, stats
+
+
+# 载入已有的向量数据库（不重建、不重新embedding）
+def load_tools_milvus(vector_db_path: str = TOOLS_VECTOR_DB_PATH) -> Milvus:
+    return Milvus(
+        embedding_function=registry.get(current_embedding_model),
+        collection_name="bioinfo_tools",
+        connection_args={"uri": vector_db_path},
+        auto_id=True,
+    )
+
+def export_tools_to_numpy(
+        vector_db_path: str = TOOLS_VECTOR_DB_PATH,
+        index_path: str = TOOLS_NUMPY_INDEX_PATH
+) -> NumpyVectorStore:
+    """把 Milvus 中的工具向量导出为 NumPy 索引（直接复制向量，不重新embedding）
+
+    同时在索引目录中写入 compression_report.json：各压缩配置的 recall@k 与索引大小
+    """
+    milvus = load_tools_milvus(vector_db_path)
+    store = NumpyVectorStore(registry.get(current_embedding_model), rescore_factor=NUMPY_RESCORE_FACTOR,
+                             **parse_config(NUMPY_COMPRESSION))
+    iterator = milvus.client.query_iterator("bioinfo_tools", batch_size=1000, filter="", output_fields=["*"])
+    while True:
+        rows = iterator.next()
+        if not rows:
+            iterator.close()
+            break
+        store.add_embeddings(
+            texts=[row.pop("text") for row in rows],
+            embeddings=[row.pop("vector") for row in rows],
+            metadatas=rows,
+            ids=[str(row["pk"]) for row in rows],
+        )
+    store.save(index_path)
+    if len(store):
+        write_report(compression_report(store.vectors, rescore_factor=NUMPY_RESCORE_FACTOR),
+                     os.path.join(index_path, "compression_report.json"))
+    return store
+
+def export_tools_snapshot(
+        vector_db_path: str = TOOLS_VECTOR_DB_PATH,
+        snapshot_path: str = TOOLS_SNAPSHOT_PATH
+) -> Dict[str, Any]:
+    """把 Milvus 中的工具库导出为快照（见 snapshot 模块），返回 manifest"""
+    milvus = load_tools_milvus(vector_db_path)
+    return export_milvus_snapshot(milvus.client, "bioinfo_tools", snapshot_path, current_embedding_model,
+                                  source={"vector_db_path": vector_db_path})
 
+@registry.component("bioinfo_tools_vectorstore", tags=("vectorstore",), fork_safe=False, reconnect=reconnect_milvus)
+def load_tools_vectorstore(vector_db_path: str = TOOLS_VECTOR_DB_PATH):
+    if VECTOR_BACKEND == "snapshot":
+        if not os.path.exists(TOOLS_SNAPSHOT_PATH):
+            export_tools_snapshot(vector_db_path, TOOLS_SNAPSHOT_PATH)
+        return load_snapshot(TOOLS_SNAPSHOT_PATH, registry.get(current_embedding_model), current_embedding_model,
+                             rescore_factor=NUMPY_RESCORE_FACTOR, **parse_config(NUMPY_COMPRESSION))
+    if VECTOR_BACKEND == "numpy":
+        if not os.path.exists(TOOLS_NUMPY_INDEX_PATH):
+            export_tools_to_numpy(vector_db_path, TOOLS_NUMPY_INDEX_PATH)
+        return NumpyVectorStore.load(TOOLS_NUMPY_INDEX_PATH, registry.get(current_embedding_model),
+                                     rescore_factor=NUMPY_RESCORE_FACTOR, **parse_config(NUMPY_COMPRESSION))
+    return load_tools_milvus(vector_db_path)
 
-db_file_path = "/home/awgao/BioinfoGPT/data/paper_summaries_local_xml_v2.db"
-milvus_vdb_path = "/home/awgao/BioinfoGPT/data/vector_db/milvus_7000_bge_m3.db"
-bioinfo_tools_vectorstore = create_tools_vectorstore_from_db(db_file_path, milvus_vdb_path)
+@registry.component("bioinfo_tools_fts", tags=("index",), fork_safe=False,
+                    reconnect=lambda index: index and index.reconnect())
+def load_tools_fts(fts_path: str = TOOLS_FTS_PATH, db_file_path: str = TOOLS_DB_PATH):
+    if not os.path.exists(fts_path):
+        if not os.path.exists(db_file_path):
+            return None
+        build_tools_fts_index(db_file_path, fts_path)
+    return ToolFtsIndex(fts_path)
 
-# 载入已有的向量数据库
-bioinfo_tools_vectorstore = Milvus(
-    embedding_function=current_embedding_model,
-    collection_name="bioinfo_tools",
-    connection_args={"uri":"/home/awgao/BioinfoGPT/data/vector_db/milvus_7000_bge_m3.db"},
-    auto_id=True,
+# 创建retriever并设置搜索参数
+# 问题中的年份、工具类型、主题、关键词约束作为过滤条件下推到向量库，结果太少时逐级放宽
+registry.register(
+    "bioinfo_tools_vector_retriever",
+    lambda: FacetedToolRetriever(vectorstore=registry.get("bioinfo_tools_vectorstore"), extractor=FacetExtractor(), k=5),
+    tags=("retriever",)
 )
 
+# 问题中有工具名（精确或前缀匹配）时直接由 FTS5 索引返回，否则走向量检索
+registry.register(
+    "bioinfo_tools_fts_retriever",
+    lambda: FtsFirstToolRetriever(index=registry.get("bioinfo_tools_fts"),
+                                  fallback=registry.get("bioinfo_tools_vector_retriever"), k=5),
+    tags=("retriever",)
+)
 
+# 重复的问题直接按缓存的 rowid 从 FTS5 索引取回文档，不再 embedding 和检索；重建工具库后缓存自动失效
+@registry.component("bioinfo_tools_retriever", tags=("retriever",))
+def load_tools_retriever():
+    retriever = registry.get("bioinfo_tools_fts_retriever")
+    fts = registry.get("bioinfo_tools_fts")
+    if fts is None:
+        return retriever
+    return CachedRetriever(retriever=retriever, cache=registry.get("retrieval_cache"),
+                           retriever_id="bioinfo_tools", vector_db_paths=[TOOLS_VECTOR_DB_PATH],
+                           fetch_docs=fts.documents, id_field="rowid", k=5,
+                           # FTS5 按大小写混写判断工具名（ArchR 命中、archr 可能走向量检索），缓存键保留大小写
+                           casefold=False)
 
 
+def pack_tools_docs(docs: List[Document], llm: str = current_llm) -> str:
+    """把检索到的工具去重、排序并压缩到模型的上下文预算内，作为提示词中的 tools_docs"""
+    return registry.get("context_packer").pack(docs, llm=llm).text
 
 
 recommend_tools_prompt = PromptTemplate(
@@ -154,7 +358,7 @@ recommend_tools_prompt = PromptTemplate(
 根据用户的问题和检索到的工具信息,生成一个专业的推荐回答。
 
 问题: {question}
-检索到的工具信息:{tool_docs}
+检索到的工具信息:{tools_docs}
 
 回答需要:
 1. 解释为什么这些工具适合用户的需求。
@@ -165,14 +369,11 @@ recommend_tools_prompt = PromptTemplate(
 """
 )
 
-
-recommend_tools_chain = recommend_tools_prompt | current_llm | StrOutputParser()
-
-question = '有哪些分析ATACseq数据的软件？'
-document = bioinfo_tools_retriever.invoke(question)
-print(f'问题 {question} 找到的文档有：\n {document}')
-res1 = recommend_tools_chain.invoke({'question': question, 'tool_docs': document})
-print(res1)
+registry.register(
+    "recommend_tools_chain",
+    lambda: recommend_tools_prompt | registry.get(current_llm) | StrOutputParser(),
+    tags=("chain",)
+)
 
 
 recommend_tools_prompt_KR = PromptTemplate(
@@ -180,31 +381,66 @@ recommend_tools_prompt_KR = PromptTemplate(
     template="""
 당신은 생물정보학 도구 추천 전문가입니다. 사용자의 질문과 검색된 도구 정보를 바탕으로 전문적인 추천 답변을 생성합니다.
 
-질문: {question} 검색된 도구 정보: {tool_docs}
+질문: {question} 검색된 도구 정보: {tools_docs}
 
-답변 요구사항: 
-1. 이 도구들이 사용자의 요구에 적합한 이유를 설명합니다. 
-2. 각 도구의 주요 기능과 특징을 간략히 소개합니다. 
-3. 도구 간에 우열 또는 상호보완 관계가 있다면 설명합니다. 
-4. 가능한 도구의 DOI 링크와 PubMed ID를 제공합니다. 
+답변 요구사항:
+1. 이 도구들이 사용자의 요구에 적합한 이유를 설명합니다.
+2. 각 도구의 주요 기능과 특징을 간략히 소개합니다.
+3. 도구 간에 우열 또는 상호보완 관계가 있다면 설명합니다.
+4. 가능한 도구의 DOI 링크와 PubMed ID를 제공합니다.
 답변을 간결하고 전문적으로 유지합니다.
 """
 )
-bioinfo_tools_retriever_KR = bioinfo_tools_vectorstore.as_retriever(search_kwargs={'k': 5})
-
-KR_question = '관련 단일 세포 증강 인자 데이터베이스에는 어떤 것이 있나요?'
-KR_document = bioinfo_tools_retriever_KR.invoke(KR_question)
-for f in KR_document:
-    print(f.page_content)
-
-    
-recommend_tools_chain_KR = recommend_tools_prompt_KR | current_llm | StrOutputParser()
-res2 = recommend_tools_chain_KR.invoke({'question': KR_question, 'tool_docs': KR_document})
-print(res2)
-
-question1 = "有哪些相关单细胞增强子的数据库？"
-document1 = bioinfo_tools_retriever.invoke(question1)
-for f in document1:
-    print(f.page_content)
-res3 = recommend_tools_chain.invoke({'question': question1, 'tool_docs': document1})
-print(res3)
\ No newline at end of file
+
+registry.register(
+    "recommend_tools_chain_KR",
+    lambda: recommend_tools_prompt_KR | registry.get(current_llm) | StrOutputParser(),
+    tags=("chain",)
+)
+
+
+def __getattr__(name):
+    # 兼容旧的模块级变量：bioinfo_tools_retriever / recommend_tools_chain 等
+    if name in ("bioinfo_tools_vectorstore", "bioinfo_tools_retriever",
+                "recommend_tools_chain", "recommend_tools_chain_KR"):
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    # 显式重建工具向量库：python toolRecommend.py --rebuild [--resume]
+    if "--rebuild" in sys.argv:
+        # 中断后加 --resume 从断点继续
+        _, stats = create_tools_vectorstore_from_db(TOOLS_DB_PATH, TOOLS_VECTOR_DB_PATH, resume="--resume" in sys.argv)
+        print({k: v for k, v in stats.items() if k != "stages"})
+        # NumPy 后端的索引同步重新导出
+        if VECTOR_BACKEND == "numpy":
+            export_tools_to_numpy(TOOLS_VECTOR_DB_PATH, TOOLS_NUMPY_INDEX_PATH)
+    # 导出快照供新 worker / CI 直接加载：python toolRecommend.py --export-snapshot
+    if ("--rebuild" in sys.argv and VECTOR_BACKEND == "snapshot") or "--export-snapshot" in sys.argv:
+        manifest = export_tools_snapshot(TOOLS_VECTOR_DB_PATH, TOOLS_SNAPSHOT_PATH)
+        print({k: manifest[k] for k in ("embedding_model", "dim", "count", "content_hash")})
+
+    bioinfo_tools_retriever = registry.get("bioinfo_tools_retriever")
+    recommend_tools_chain = registry.get("recommend_tools_chain")
+
+    question = '有哪些分析ATACseq数据的软件？'
+    document = bioinfo_tools_retriever.invoke(question)
+    print(f'问题 {question} 找到的文档有：\n {document}')
+    res1 = recommend_tools_chain.invoke({'question': question, 'tools_docs': pack_tools_docs(document)})
+    print(res1)
+
+    KR_question = '관련 단일 세포 증강 인자 데이터베이스에는 어떤 것이 있나요?'
+    KR_document = bioinfo_tools_retriever.invoke(KR_question)
+    for f in KR_document:
+        print(f.page_content)
+
+    res2 = registry.get("recommend_tools_chain_KR").invoke({'question': KR_question, 'tools_docs': pack_tools_docs(KR_document)})
+    print(res2)
+
+    question1 = "有哪些相关单细胞增强子的数据库？"
+    document1 = bioinfo_tools_retriever.invoke(question1)
+    for f in document1:
+        print(f.page_content)
+    res3 = recommend_tools_chain.invoke({'question': question1, 'tools_docs': pack_tools_docs(document1)})
+    print(res3)
@@ -0,0 +1,188 @@
+"""工具目录的 SQLite FTS5 关键词索引
+
+"MACS2"、"ArchR"、"cellranger" 这类工具名和缩写用 embedding 检索效果很差。
+入库时在 paper_summaries 工具表旁建一个 FTS5 索引（toolname / title / description / function / keyword），
+同时保存与向量库相同格式的 page_content 和元数据，命中时直接返回 Document，不需要 embedding 和访问向量库：
+    1. 问题中的词与工具名完全相同（内存中的工具名表）
+    2. 工具名前缀匹配（FTS5 前缀索引，如 "cellrang" -> CellRanger）
+只有"像工具名"的词参与匹配：含数字或小写字母后跟大写字母（MACS2、edgeR、DESeq），或在全部工具的文本中很少出现
+（"peak"、"single" 这类在描述中大量出现的普通词即使恰好是某个工具名也不算；全大写的缩写如 STAR、RNA 也按此判断）。
+有工具名完全相同时直接返回索引结果；只有前缀命中时（如 "ATACseq" -> ATACseqQC，问的往往是一类数据而不是这个工具）
+前缀命中排在前面，其余名额由后备检索器（向量检索）补足。
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+FTS_COLUMNS = ("toolname", "title", "description", "function", "keyword")
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9_.+-]*[A-Za-z0-9+]")
+# 含数字或小写字母后跟大写字母：MACS2、edgeR、DESeq（全大写的缩写 RNA、ATAC 不算）
+NAME_LIKE_PATTERN = re.compile(r"\d|[a-z][A-Z]")
+
+# 不会作为工具名查询的常见词
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "best", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "me", "of", "on", "or", "the", "to", "use", "using", "what", "which", "with", "tool", "tools",
+    "software", "package", "packages", "analysis", "data", "seq", "there", "any", "some", "recommend", "find",
+}
+
+
+class ToolFtsIndex:
+    """只读打开的 FTS5 索引文件，每个线程一个连接
+
+    Args:
+        path: 索引文件路径（由 build 生成）
+        max_df: 普通词判定阈值，在超过该比例的工具文本中出现的全小写词不当作工具名
+    """
+
+    def __init__(self, path: str, max_df: float = 0.005):
+        self.path = path
+        self.max_df = max_df
+        self._local = threading.local()
+        names: Dict[str, List[int]] = {}
+        for rowid, name in self._conn().execute("SELECT rowid, toolname FROM tools_docs"):
+            if name:
+                names.setdefault(name.lower(), []).append(rowid)
+        self.names = names
+        max_doc_count = max(3, int(len(self) * max_df))
+        self.common_terms = {term for term, in self._conn().execute(
+            "SELECT term FROM tools_vocab WHERE doc > ?", (max_doc_count,))}
+
+    def __len__(self) -> int:
+        return sum(len(rowids) for rowids in self.names.values())
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return conn
+
+    def reconnect(self) -> None:
+        """fork 之后在子进程中调用：丢弃继承来的连接，各线程下次查询时重新打开"""
+        self._local = threading.local()
+
+    @staticmethod
+    def build(rows: Iterable[Tuple[int, Dict[str, Any], str, Dict[str, Any]]], path: str) -> int:
+        """由 (rowid, 各列文本, page_content, metadata) 序列构建索引，写入临时文件后整体替换"""
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        conn.execute(
+            f"CREATE VIRTUAL TABLE tools_fts USING fts5({', '.join(FTS_COLUMNS)}, "
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+        )
+        conn.execute("CREATE VIRTUAL TABLE tools_vocab USING fts5vocab(tools_fts, 'row')")
+        conn.execute("CREATE TABLE tools_docs (rowid INTEGER PRIMARY KEY, toolname TEXT, page_content TEXT, metadata TEXT)")
+        count = 0
+        batch_fts, batch_docs = [], []
+
+        def flush():
+            conn.executemany(f"INSERT INTO tools_fts (rowid, {', '.join(FTS_COLUMNS)}) VALUES (?{', ?' * len(FTS_COLUMNS)})",
+                             batch_fts)
+            conn.executemany("INSERT INTO tools_docs VALUES (?, ?, ?, ?)", batch_docs)
+            batch_fts.clear()
+            batch_docs.clear()
+
+        for rowid, columns, page_content, metadata in rows:
+            batch_fts.append((rowid, *[columns.get(c) or "" for c in FTS_COLUMNS]))
+            batch_docs.append((rowid, columns.get("toolname") or "", page_content,
+                               json.dumps(metadata, ensure_ascii=False)))
+            count += 1
+            if len(batch_docs) >= 1000:
+                flush()
+        flush()
+        conn.execute("INSERT INTO tools_fts (tools_fts) VALUES ('optimize')")
+        conn.commit()
+        conn.close()
+        os.replace(tmp_path, path)
+        return count
+
+    def documents(self, rowids: List[int], match: Optional[str] = None) -> List[Document]:
+        """按 rowid 取回文档，顺序与 rowids 一致"""
+        if not rowids:
+            return []
+        placeholders = ", ".join("?" * len(rowids))
+        rows = self._conn().execute(
+            f"SELECT rowid, page_content, metadata FROM tools_docs WHERE rowid IN ({placeholders})", rowids
+        ).fetchall()
+        by_rowid = {rowid: (content, metadata) for rowid, content, metadata in rows}
+        docs = []
+        for rowid in rowids:
+            if rowid in by_rowid:
+                content, metadata = by_rowid[rowid]
+                metadata = json.loads(metadata)
+                if match:
+                    metadata["match"] = match
+                docs.append(Document(page_content=content, metadata=metadata))
+        return docs
+
+    def _name_like(self, token: str) -> bool:
+        if NAME_LIKE_PATTERN.search(token):
+            return True
+        # 分词后的每个词都要足够少见，如 "single-cell" 按 "single"、"cell" 判断
+        terms = re.findall(r"[a-z0-9]+", token.lower())
+        return bool(terms) and not any(term in self.common_terms for term in terms)
+
+    def search(self, query: str, k: int = 5) -> List[Document]:
+        """工具名精确匹配在前、前缀匹配在后，都没有命中时返回空列表"""
+        tokens = [t for t in dict.fromkeys(TOKEN_PATTERN.findall(query))
+                  if t.lower() not in STOPWORDS and self._name_like(t)]
+        if not tokens:
+            return []
+        exact = list(dict.fromkeys(rowid for t in tokens for rowid in self.names.get(t.lower(), [])))[:k]
+        prefix: List[int] = []
+        if len(exact) < k:
+            expression = " OR ".join(f'toolname : "{t.lower()}"*' for t in tokens if len(t) >= 3)
+            if expression:
+                rows = self._conn().execute(
+                    "SELECT rowid FROM tools_fts WHERE tools_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (expression, k + len(exact))
+                ).fetchall()
+                prefix = [rowid for rowid, in rows if rowid not in exact][:k - len(exact)]
+        return self.documents(exact, "exact") + self.documents(prefix, "prefix")
+
+
+def _tool_key(doc: Document) -> Any:
+    """同一工具的去重键：工具表 rowid，旧向量库中没有 rowid 时用正文"""
+    rowid = doc.metadata.get("rowid")
+    return ("rowid", int(rowid)) if rowid not in (None, "") else ("text", doc.page_content)
+
+
+class FtsFirstToolRetriever(BaseRetriever):
+    """先查 FTS5 关键词索引：工具名完全相同时直接返回，只有前缀命中时排在前面、其余由后备检索器补足
+
+    Args:
+        index: 工具 FTS5 索引，为 None 时总是使用后备检索器
+        fallback: 后备检索器（向量检索）
+        k: 返回的工具数
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: Optional[ToolFtsIndex]
+    fallback: BaseRetriever
+    k: int = 5
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        docs = self.index.search(query, self.k) if self.index is not None else []
+        if any(doc.metadata.get("match") == "exact" for doc in docs):
+            return docs
+        seen = {_tool_key(doc) for doc in docs}
+        for doc in self.fallback.invoke(query):
+            if len(docs) >= self.k:
+                break
+            if _tool_key(doc) not in seen:
+                seen.add(_tool_key(doc))
+                docs.append(doc)
+        return docs
@@ -0,0 +1,236 @@
+"""向量降维与量化
+
+bge-m3 的 1024 维 float32 向量占据了索引的大部分空间。这里提供入库时可选的压缩变换：
+    - 降维：pca（按库内向量拟合主成分）或 truncate（Matryoshka 式截取前 d 维后重新归一化，
+      只适用于按 Matryoshka 方式训练的模型，bge-m3 建议用 pca）
+    - 量化：int8 标量量化、binary 符号位、pq 乘积量化（每个子空间 256 个中心，每段 1 字节）
+查询向量经过相同的变换后在压缩向量上粗排，再用原始 float 向量对候选重排。
+
+compression_report 在同一批向量上比较不同配置的 recall@k 和索引大小，建库时输出。
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+REDUCTIONS = ("pca", "truncate")
+
+# 拟合 PCA / PQ 码本时最多使用的样本数
+FIT_SAMPLE_SIZE = 20000
+
+
+def _sample(matrix: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    if len(matrix) <= size:
+        return np.asarray(matrix, dtype=np.float32)
+    rows = np.sort(np.random.default_rng(seed).choice(len(matrix), size=size, replace=False))
+    return np.asarray(matrix[rows], dtype=np.float32)
+
+
+class Reducer:
+    """降维变换：x -> x @ components.T，再归一化
+
+    PCA 的主成分在中心化后的样本上拟合，但变换时不减均值，保持内积排序的含义。
+    """
+
+    def __init__(self, method: str, components: np.ndarray):
+        if method not in REDUCTIONS:
+            raise ValueError(f"不支持的降维方式: {method}")
+        self.method = method
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self.method == "truncate" else self.components.nbytes
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, dims: int, method: str = "pca") -> "Reducer":
+        full_dims = matrix.shape[1]
+        if not 0 < dims <= full_dims:
+            raise ValueError(f"降维维度 {dims} 超出范围 (1, {full_dims}]")
+        if method == "truncate":
+            return cls(method, np.eye(full_dims, dtype=np.float32)[:dims])
+        sample = _sample(matrix, FIT_SAMPLE_SIZE)
+        centered = sample - sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(centered, full_matrices=False)
+        return cls(method, vt[:dims])
+
+    def transform(self, matrix: np.ndarray) -> np.ndarray:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        reduced = matrix[:, :self.dims] if self.method == "truncate" else matrix @ self.components.T
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return (reduced / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+    def save(self, path: str) -> None:
+        np.save(path, self.components)
+
+    @classmethod
+    def load(cls, path: str, method: str) -> "Reducer":
+        return cls(method, np.load(path))
+
+
+class ProductQuantizer:
+    """乘积量化：向量切成 m 段，每段用 k-means 的 256 个中心之一编码
+
+    查询时先算出每段查询子向量与全部中心的内积表，向量得分为各段查表结果之和。
+    """
+
+    def __init__(self, codebooks: np.ndarray):
+        # (m, 256, 子空间维度)
+        self.codebooks = np.ascontiguousarray(codebooks, dtype=np.float32)
+
+    @property
+    def subspaces(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codebooks.nbytes
+
+    def _split(self, matrix: np.ndarray) -> np.ndarray:
+        m, _, sub_dims = self.codebooks.shape
+        return np.asarray(matrix, dtype=np.float32).reshape(len(matrix), m, sub_dims)
+
+    @classmethod
+    def fit(cls, matrix: np.ndarray, subspaces: int, iterations: int = 15, seed: int = 0) -> "ProductQuantizer":
+        dims = matrix.shape[1]
+        if dims % subspaces:
+            raise ValueError(f"维度 {dims} 不能被子空间数 {subspaces} 整除")
+        sample = _sample(matrix, FIT_SAMPLE_SIZE, seed)
+        n_centroids = min(256, len(sample))
+        rng = np.random.default_rng(seed)
+        parts = sample.reshape(len(sample), subspaces, dims // subspaces)
+        codebooks = np.zeros((subspaces, 256, dims // subspaces), dtype=np.float32)
+        for j in range(subspaces):
+            points = parts[:, j]
+            centroids = points[rng.choice(len(points), size=n_centroids, replace=False)].copy()
+            for _ in range(iterations):
+                assign = cls._nearest(points, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, points)
+                counts = np.bincount(assign, minlength=n_centroids)
+                # 空簇保留原中心
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            codebooks[j, :n_centroids] = centroids
+            if n_centroids < 256:
+                codebooks[j, n_centroids:] = centroids[0]
+        return cls(codebooks)
+
+    @staticmethod
+    def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # |x - c|^2 = |x|^2 - 2 x·c + |c|^2，|x|^2 对所有中心相同
+        distance = (centroids ** 2).sum(axis=1)[None, :] - 2 * points @ centroids.T
+        return distance.argmin(axis=1)
+
+    def encode(self, matrix: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        codes = np.empty((len(matrix), self.subspaces), dtype=np.uint8)
+        for start in range(0, len(matrix), block_size):
+            parts = self._split(matrix[start:start + block_size])
+            for j in range(self.subspaces):
+                codes[start:start + len(parts), j] = self._nearest(parts[:, j], self.codebooks[j])
+        return codes
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """查询与编码向量的近似内积，(查询数, 向量数)"""
+        tables = np.einsum("qmd,mcd->qmc", self._split(queries), self.codebooks)
+        scores = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for j in range(self.subspaces):
+            scores += tables[:, j, codes[:, j]]
+        return scores
+
+    def save(self, path: str) -> None:
+        np.save(path, self.codebooks)
+
+    @classmethod
+    def load(cls, path: str) -> "ProductQuantizer":
+        return cls(np.load(path))
+
+
+def parse_config(spec: str) -> Dict:
+    """解析压缩配置字符串，如 "int8"、"pca256+int8"、"truncate512"、"pca256+pq32"
+
+    pqN 表示 N 个子空间。
+    """
+    config = {"quantization": "none", "dims": None, "reduction": "pca", "pq_subspaces": 0}
+    for part in filter(None, spec.lower().split("+")):
+        for reduction in REDUCTIONS:
+            if part.startswith(reduction) and part[len(reduction):].isdigit():
+                config["reduction"], config["dims"] = reduction, int(part[len(reduction):])
+                break
+        else:
+            if part.startswith("pq") and part[2:].isdigit():
+                config["quantization"], config["pq_subspaces"] = "pq", int(part[2:])
+            elif part in ("none", "int8", "binary"):
+                config["quantization"] = part
+            else:
+                raise ValueError(f"无法解析的压缩配置: {part}")
+    return config
+
+
+DEFAULT_REPORT_CONFIGS = (
+    "none", "int8", "binary", "pca512", "pca256+int8", "pca128+int8", "pq64", "pca256+pq32",
+)
+
+
+def compression_report(vectors: np.ndarray, configs: Iterable[str] = DEFAULT_REPORT_CONFIGS,
+                       n_queries: int = 200, k: int = 10, rescore_factor: int = 4,
+                       noise: float = 0.05, seed: int = 0) -> List[Dict]:
+    """在同一批向量上比较各压缩配置的 recall@k（粗排 / 重排后）与索引大小
+
+    查询为库内随机向量加高斯噪声，标准答案为 float 精确检索结果。
+    index_bytes / compression 是粗排常驻内存的大小及相对 float32 的压缩倍数；
+    重排需要的 float32 原始向量同样保存在磁盘上，计入 disk_bytes。
+    """
+    # 放在函数内导入，避免与 numpy_store 循环导入
+    from numpy_store import NumpyVectorStore
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    queries = vectors[rows] + rng.normal(0, noise, (len(rows), vectors.shape[1])).astype(np.float32)
+
+    exact = NumpyVectorStore(None)
+    exact.ids = [str(i) for i in range(len(vectors))]
+    exact.texts = [""] * len(vectors)
+    exact.metadatas = [{} for _ in range(len(vectors))]
+    exact.vectors = vectors
+    truth = [{i for i, _ in hits} for hits in exact.batch_search(queries, k)]
+    full_bytes = exact.vectors.nbytes
+
+    report = []
+    for spec in configs:
+        config = parse_config(spec)
+        dims = config["dims"] or vectors.shape[1]
+        # 跳过不适用于当前维度的配置
+        if dims > vectors.shape[1] or (config["pq_subspaces"] and dims % config["pq_subspaces"]):
+            continue
+        store = NumpyVectorStore(None, rescore_factor=rescore_factor, **config)
+        store.ids, store.texts, store.metadatas, store.vectors = exact.ids, exact.texts, exact.metadatas, vectors
+        store._ensure_codes()
+        coarse = store.batch_search(queries, k, rescore=False)
+        rescored = store.batch_search(queries, k)
+        index_bytes = store.index_bytes()
+        report.append({
+            "config": spec,
+            "index_bytes": index_bytes,
+            "compression": full_bytes / index_bytes,
+            "disk_bytes": store.disk_bytes(),
+            f"recall@{k}_coarse": _recall(coarse, truth),
+            f"recall@{k}": _recall(rescored, truth),
+        })
+    return report
+
+
+def _recall(results: Sequence[Sequence[Tuple[int, float]]], truth: Sequence[set]) -> float:
+    return float(np.mean([len({i for i, _ in hits} & t) / len(t) for hits, t in zip(results, truth) if t]))
+
+
+def write_report(report: List[Dict], path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,118 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+import threading
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from bridge_llm.batching import MicroBatchEmbeddings
+
+
+class SlowEmbeddings(Embeddings):
+    """每次批量请求耗时 delay 秒，向量为 [len(text)]"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls: List[List[str]] = []
+        self.fail = threading.Event()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        time.sleep(self.delay)
+        if self.fail.is_set():
+            raise RuntimeError("embedding service down")
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def test_concurrent_queries_share_one_batch():
+    inner = SlowEmbeddings()
+    embeddings = MicroBatchEmbeddings(inner, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(embeddings.aembed_query(text) for text in ["a", "bb", "a"]))
+
+    assert asyncio.run(main()) == [[1.0], [2.0], [1.0]]
+    assert inner.calls == [["a", "bb"]]
+
+
+def test_cancelled_caller_does_not_hang_sibling():
+    embeddings = MicroBatchEmbeddings(SlowEmbeddings(), max_wait_ms=20)
+
+    async def main():
+        loser = asyncio.create_task(embeddings.aembed_query("loser"))
+        winner = asyncio.create_task(embeddings.aembed_query("winner"))
+        await asyncio.sleep(0)
+        loser.cancel()
+        return await asyncio.wait_for(winner, timeout=2)
+
+    assert asyncio.run(main()) == [6.0]
+    # 后台线程仍然存活，之后的同步调用正常返回
+    assert embeddings._submit(["after"]).result(timeout=2) == [[5.0]]
+    assert embeddings._worker.is_alive()
+
+
+def test_cancel_while_batch_in_flight():
+    embeddings = MicroBatchEmbeddings(SlowEmbeddings(delay=0.1), max_wait_ms=1)
+
+    async def main():
+        loser = asyncio.create_task(embeddings.aembed_query("loser"))
+        winner = asyncio.create_task(embeddings.aembed_query("winner"))
+        # 等批量请求发出后再取消
+        await asyncio.sleep(0.05)
+        loser.cancel()
+        return await asyncio.wait_for(winner, timeout=2)
+
+    assert asyncio.run(main()) == [6.0]
+    assert embeddings.embed_query("again") == [5.0]
+
+
+def test_failed_batch_propagates_and_worker_survives():
+    inner = SlowEmbeddings(delay=0)
+    embeddings = MicroBatchEmbeddings(inner, max_wait_ms=1)
+    inner.fail.set()
+    try:
+        embeddings._submit(["x"]).result(timeout=2)
+    except RuntimeError as e:
+        assert "down" in str(e)
+    else:
+        raise AssertionError("expected RuntimeError")
+    inner.fail.clear()
+    assert embeddings._submit(["ok"]).result(timeout=2) == [[2.0]]
+
+
+def test_batches_run_concurrently_up_to_limit():
+    inner = SlowEmbeddings(delay=0.2)
+    embeddings = MicroBatchEmbeddings(inner, max_wait_ms=1, max_concurrency=2)
+    started = time.perf_counter()
+    futures = []
+    for i in range(2):
+        futures.append(embeddings._submit([str(i)]))
+        time.sleep(0.03)
+    # 两个名额都被占用：之后的请求在队列中合并成一批
+    futures += [embeddings._submit([text]) for text in ["x", "yy", "zzz"]]
+    results = [future.result(timeout=2) for future in futures]
+    assert results == [[[1.0]], [[1.0]], [[1.0]], [[2.0]], [[3.0]]]
+    assert sorted(map(sorted, inner.calls)) == [["0"], ["1"], ["x", "yy", "zzz"]]
+    # 前两批并行执行，总耗时约两轮而不是三轮
+    assert time.perf_counter() - started < 0.55
+
+
+def test_fork_hook_does_not_keep_instances_alive():
+    import gc
+    import weakref
+
+    from bridge_llm import batching
+
+    embeddings = MicroBatchEmbeddings(SlowEmbeddings(delay=0))
+    ref = weakref.ref(embeddings)
+    assert embeddings in batching._instances
+    del embeddings
+    gc.collect()
+    assert ref() is None
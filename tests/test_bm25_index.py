@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    ("d1", "DESeq2", "DESeq(dds, fitType = 'local') fits a local dispersion trend"),
+    ("d2", "DESeq2", "results(dds) returns log2 fold changes; plotMA shows them"),
+    ("d3", "DESeq2", "estimateDispersions uses fitType parametric by default, fitType mean is faster"),
+    ("d4", "edgeR", "glmQLFit fits a quasi-likelihood dispersion trend"),
+    ("d5", "edgeR", "exactTest(y) with res.df degrees of freedom"),
+]
+
+
+def reference_scores(docs, query, k1=1.2, b=0.75):
+    """逐文档直接按 BM25 公式计算"""
+    counts = [Counter(tokenize(text)) for _, _, text in docs]
+    lengths = [sum(c.values()) for c in counts]
+    avg_len = sum(lengths) / len(lengths)
+    scores = []
+    for c, length in zip(counts, lengths):
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(1 for other in counts if term in other)
+            if not c[term]:
+                continue
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * c[term] * (k1 + 1) / (c[term] + k1 * (1 - b + b * length / avg_len))
+        scores.append(score)
+    return np.asarray(scores)
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("fitType") == ["fittype", "fit", "type"]
+    assert tokenize("res.df plotMA_v2") == ["res.df", "res", "df", "plotma_v2", "plot", "ma", "v", "2"]
+    assert tokenize("DESeq(dds)") == ["deseq", "de", "seq", "dds"]
+
+
+@pytest.mark.parametrize("query", ["fitType", "dispersion trend", "res.df", "DESeq fitType local", "unknownword"])
+def test_csr_scores_match_reference_bm25(query):
+    index = BM25Index.build(DOCS)
+    assert np.allclose(index.scores(query), reference_scores(DOCS, query), atol=1e-5)
+
+
+def test_search_ranks_filters_by_tool_and_truncates():
+    index = BM25Index.build(DOCS)
+    # d3 中 fitType 出现两次，排在 d1 前面；d4 只通过子词 fit（glmQLFit）命中，排最后
+    assert [doc_id for doc_id, _ in index.search("fitType")] == ["d3", "d1", "d4"]
+    assert [doc_id for doc_id, _ in index.search("local dispersion trend", k=1)] == ["d1"]
+    assert {doc_id for doc_id, _ in index.search("dispersion trend", tool_names=["edgeR"])} == {"d4"}
+    assert index.search("dispersion", tool_names=["limma"]) == []
+    assert index.search("unknownword") == []
+    assert BM25Index.build([]).search("fitType") == []
+
+
+def test_save_and_memory_mapped_load(tmp_path):
+    path = str(tmp_path / "bm25")
+    index = BM25Index.build(DOCS, k1=1.5, b=0.5)
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert isinstance(loaded.postings, np.memmap)
+    assert (loaded.k1, loaded.b, loaded.tools) == (1.5, 0.5, ["DESeq2", "edgeR"])
+    assert loaded.search("fitType dispersion", tool_names=["DESeq2"]) == index.search("fitType dispersion",
+                                                                                       tool_names=["DESeq2"])
+
+    # 重新保存整体替换旧索引，不留下临时目录
+    BM25Index.build(DOCS[:1]).save(path)
+    assert len(BM25Index.load(path)) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["bm25"]
+
+
+def test_reciprocal_rank_fusion():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60))
+    assert fused["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused["b"] == pytest.approx(1 / 62)
+    assert fused["c"] == pytest.approx(1 / 63 + 1 / 61)
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]])] == ["a", "c", "b"]
+    # 权重放大第二路后 c 排第一
+    weighted = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60, weights=[1.0, 3.0])
+    assert weighted[0] == ("c", pytest.approx(1 / 63 + 3 / 61))
+    assert reciprocal_rank_fusion([[], []]) == []
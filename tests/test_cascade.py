@@ -0,0 +1,144 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+from typing import Any, List
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from bridge_llm.cascade import CascadeChatModel, extract_confidence
+from registry import registry
+
+
+@tool
+def query_gene(symbol: str, species: str = "human") -> str:
+    """Look up a gene by symbol"""
+    return symbol
+
+
+class ScriptedChat(BaseChatModel):
+    """按顺序返回预设消息的 chat model，记录收到的消息"""
+
+    replies: List[Any]
+    received: List[Any] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.received.append(messages)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+
+@pytest.fixture
+def tiers():
+    models = {"test_cascade_small": ScriptedChat(replies=[], received=[]),
+              "test_cascade_large": ScriptedChat(replies=[], received=[])}
+    for name, model in models.items():
+        registry.register(name, lambda model=model: model)
+    yield models
+    for name in models:
+        registry.invalidate(name)
+
+
+def cascade(**kwargs) -> CascadeChatModel:
+    return CascadeChatModel(tiers=["test_cascade_small", "test_cascade_large"], **kwargs)
+
+
+@pytest.mark.parametrize("text, confidence, cleaned", [
+    ("DESeq2 is an R package.\nConfidence: 0.9", 0.9, "DESeq2 is an R package."),
+    ("Answer\n**Confidence**：85%", 0.85, "Answer"),
+    ("Answer\nconfidence: 70", 0.7, "Answer"),
+    ("Confidence: 0.2 in the middle\nConfidence: 0.8", 0.8, "Confidence: 0.2 in the middle"),
+    ("My confidence: high", None, "My confidence: high"),
+    ("No confidence line", None, "No confidence line"),
+])
+def test_extract_confidence(text, confidence, cleaned):
+    value, rest = extract_confidence(text)
+    assert value == (pytest.approx(confidence) if confidence is not None else None)
+    assert rest == cleaned
+
+
+def tool_call(name: str, args: dict) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": "call-1"}])
+
+
+@pytest.mark.parametrize("message, reason", [
+    (tool_call("query_gene", {"symbol": "TP53"}), None),
+    (tool_call("query_gene", {"symbol": "TP53", "species": "mouse"}), None),
+    (tool_call("query_protein", {"symbol": "TP53"}), "unknown_tool"),
+    (tool_call("query_gene", {"species": "mouse"}), "missing_tool_args"),
+    (tool_call("query_gene", {"symbol": "TP53", "organism": "mouse"}), "unexpected_tool_args"),
+    (AIMessage(content="", invalid_tool_calls=[{"name": "query_gene", "args": "{symbol:", "id": "call-1",
+                                                "error": "bad json"}]), "invalid_tool_call"),
+])
+def test_validate_tool_calls(message, reason):
+    model = cascade().bind_tools([query_gene])
+    assert model._validate_tool_calls(message) == reason
+
+
+def test_confident_small_tier_is_accepted(tiers):
+    tiers["test_cascade_small"].replies = [AIMessage(content="DESeq2 fits a negative binomial GLM.\nConfidence: 0.9")]
+    model = cascade()
+    result = model.invoke([HumanMessage(content="How does DESeq2 model counts?")])
+    assert result.content == "DESeq2 fits a negative binomial GLM."
+    # 非最后一级会被要求给出置信度
+    assert isinstance(tiers["test_cascade_small"].received[0][0], SystemMessage)
+    assert not tiers["test_cascade_large"].received
+    stats = model.stats()
+    assert stats["accepted"] == {"test_cascade_small": 1, "test_cascade_large": 0}
+    assert stats["escalation_rate"] == 0.0
+
+
+@pytest.mark.parametrize("reply, reason", [
+    (AIMessage(content="It uses a GLM.\nConfidence: 0.3"), "low_confidence"),
+    (AIMessage(content="It uses a GLM."), "missing_confidence"),
+    (AIMessage(content="I don't know.\nConfidence: 0.9"), "answer_format"),
+    (tool_call("query_protein", {"symbol": "TP53"}), "unknown_tool"),
+    (RuntimeError("ollama down"), "error"),
+])
+def test_escalates_to_last_tier(tiers, reply, reason):
+    tiers["test_cascade_small"].replies = [reply]
+    # 最后一级不需要置信度，结果总是被采用
+    tiers["test_cascade_large"].replies = [AIMessage(content="It uses a negative binomial GLM.")]
+    model = cascade().bind_tools([query_gene])
+    result = asyncio.run(model.ainvoke([HumanMessage(content="How does DESeq2 model counts?")]))
+    assert result.content == "It uses a negative binomial GLM."
+    assert not isinstance(tiers["test_cascade_large"].received[0][0], SystemMessage)
+    stats = model.stats()
+    assert stats["escalations"]["test_cascade_small"] == {reason: 1}
+    assert stats["accepted"] == {"test_cascade_small": 0, "test_cascade_large": 1}
+    assert stats["escalation_rate"] == 1.0
+
+
+def test_last_tier_error_propagates(tiers):
+    tiers["test_cascade_small"].replies = [AIMessage(content="Maybe.\nConfidence: 0.1")]
+    tiers["test_cascade_large"].replies = [RuntimeError("openai down")]
+    with pytest.raises(RuntimeError, match="openai down"):
+        cascade().invoke([HumanMessage(content="?")])
+
+
+def test_stats_keep_histograms_instead_of_samples(tiers):
+    model = cascade(tier_costs={"test_cascade_small": 0.1, "test_cascade_large": 1.0})
+    for _ in range(50):
+        tiers["test_cascade_small"].replies.append(AIMessage(content="Yes.\nConfidence: 0.95"))
+        model.invoke([HumanMessage(content="?")])
+    stats = model.stats()
+    assert stats["request_latency"]["count"] == 50
+    assert stats["tier_latency"]["test_cascade_small"]["count"] == 50
+    assert stats["median_latency"] is not None
+    # 最后一级从未被调用：无法估算节省的延迟，成本按每级相对成本估算
+    assert "estimated_latency_saved" not in stats
+    assert stats["estimated_cost_saved"] == pytest.approx(50 * 1.0 - 50 * 0.1)
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import json
+
+from ingest.checkpoint import RowidCheckpoint
+
+
+def test_watermark_only_advances_over_contiguous_commits(tmp_path):
+    checkpoint = RowidCheckpoint(str(tmp_path / "ckpt.json"), save_interval=3600)
+    checkpoint.reset("tools.db")
+    for rowid in (3, 5, 8, 9):
+        checkpoint.issue(rowid)
+    checkpoint.commit([5, 9])
+    assert checkpoint.last_rowid == 0 and checkpoint.rows == 0
+    checkpoint.commit([3])
+    assert checkpoint.last_rowid == 5 and checkpoint.rows == 2
+    checkpoint.commit([8])
+    assert checkpoint.last_rowid == 9 and checkpoint.rows == 4
+
+
+def test_persisted_and_reloaded(tmp_path):
+    path = str(tmp_path / "ckpt.json")
+    checkpoint = RowidCheckpoint(path, save_interval=0)
+    checkpoint.reset("tools.db")
+    checkpoint.issue(1)
+    checkpoint.issue(2)
+    checkpoint.commit([1, 2])
+    assert json.loads(Path(path).read_text()) == {"source": "tools.db", "last_rowid": 2, "rows": 2}
+
+    reloaded = RowidCheckpoint(path)
+    assert reloaded.matches("tools.db") and not reloaded.matches("other.db")
+    assert (reloaded.last_rowid, reloaded.rows) == (2, 2)
+    reloaded.reset("other.db")
+    assert RowidCheckpoint(path).last_rowid == 0
+
+
+def test_save_interval_throttles_writes(tmp_path):
+    path = tmp_path / "ckpt.json"
+    checkpoint = RowidCheckpoint(str(path), save_interval=3600)
+    checkpoint.reset("tools.db")
+    checkpoint.issue(1)
+    checkpoint.commit([1])
+    assert json.loads(path.read_text())["last_rowid"] == 0
+    checkpoint.save()
+    assert json.loads(path.read_text())["last_rowid"] == 1
@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from langchain_core.documents import Document
+
+from context_packer import ContextPacker, TokenCounter
+
+
+def words(text: str) -> int:
+    return len(text.split())
+
+
+def doc(text: str, score: float, file_name: str = "DESeq.Rd", tool_name: str = "DESeq2") -> Document:
+    return Document(page_content=text, metadata={"tool_name": tool_name, "file_name": file_name, "score": score})
+
+
+def test_duplicates_are_dropped_and_overlaps_merged():
+    first = "DESeq runs the default analysis: estimation of size factors, estimation of dispersion"
+    second = "estimation of size factors, estimation of dispersion, and negative binomial GLM fitting"
+    packed = ContextPacker(words, min_overlap=20).pack([
+        doc(first, 0.9),
+        doc(first + "  ", 0.5),
+        doc(second, 0.8),
+        doc("results() extracts a results table", 0.7, file_name="results.Rd"),
+    ], budget=1000)
+    assert packed.stats["duplicates"] == 1
+    assert packed.stats["merged"] == 1
+    assert len(packed.passages) == 2
+    merged = packed.passages[0]
+    assert merged.text == first + ", and negative binomial GLM fitting"
+    assert merged.merged == 2
+    assert packed.text.startswith("[1] tool_name: DESeq2 | file_name: DESeq.Rd\n")
+    assert "[2] tool_name: DESeq2 | file_name: results.Rd" in packed.text
+
+
+def test_passages_ordered_by_score_and_budget_respected():
+    docs = [doc(" ".join(f"w{i}_{j}" for j in range(50)), score=i / 10, file_name=f"f{i}.Rd") for i in range(6)]
+    packer = ContextPacker(words, min_tail_tokens=10)
+    packed = packer.pack(docs, budget=150)
+    assert packed.packed_tokens <= 150
+    assert [p.metadata["file_name"] for p in packed.passages][:2] == ["f5.Rd", "f4.Rd"]
+    assert packed.stats["truncated"] == 1
+    assert packed.stats["dropped"] == 3
+    assert packed.raw_tokens > packed.packed_tokens
+    stats = packer.stats()
+    assert stats["calls"] == 1 and 0 < stats["saved_ratio"] < 1
+
+
+def test_budget_for_unknown_llm_uses_default():
+    assert ContextPacker.budget_for("no_such_llm") == ContextPacker.budget_for(None)
+
+
+def test_token_counter_estimates_without_encoding():
+    counter = TokenCounter(encoding="no_such_encoding")
+    assert counter("") == 0
+    assert counter("单细胞") == 3
+    assert counter("abcdefgh") == 2
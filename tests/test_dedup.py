@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from ingest.dedup import NearDuplicateIndex
+
+PARAGRAPH = ("object: a DESeqDataSet object containing raw counts, the design formula and sample "
+             "information; fitType: either parametric, local, mean or glmGamPoi for the type of fitting "
+             "of dispersions to the mean intensity")
+
+
+def test_near_duplicate_within_group():
+    index = NearDuplicateIndex()
+    assert index.check("a1", PARAGRAPH, "Bioconductor_DESeq2") is None
+    assert index.check("a2", PARAGRAPH + " of counts", "Bioconductor_DESeq2") == "a1"
+    assert index.check("a3", "completely unrelated text about peak calling in ChIP-seq", "Bioconductor_DESeq2") is None
+
+
+def test_same_text_in_other_tools_is_kept():
+    index = NearDuplicateIndex()
+    assert index.check("a1", PARAGRAPH, "Bioconductor_DESeq") is None
+    assert index.check("b1", PARAGRAPH, "Bioconductor_DESeq2") is None
+    assert index.check("c1", PARAGRAPH, "Bioconda_deseq2") is None
+    assert len(index) == 3
+
+
+def test_remove_groups_and_reload(tmp_path):
+    index = NearDuplicateIndex()
+    index.check("a1", PARAGRAPH, "Bioconductor_DESeq")
+    index.check("b1", PARAGRAPH, "Bioconductor_DESeq2")
+    index.remove_groups(lambda group: group == "Bioconductor_DESeq")
+    assert len(index) == 1
+    path = str(tmp_path / "index.minhash")
+    index.save(path)
+    loaded = NearDuplicateIndex.load(path)
+    assert loaded.check("b2", PARAGRAPH, "Bioconductor_DESeq2") == "b1"
+    assert loaded.check("a1", PARAGRAPH, "Bioconductor_DESeq") is None
@@ -0,0 +1,154 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+docQA = pytest.importorskip("docQA")
+from context_packer import ContextPacker
+from registry import registry
+
+CONFIDENT = 2 / 61  # BM25 与向量检索都排第一
+UNSURE = 1 / 61
+
+
+def chunk(text: str, rrf_score: float) -> Document:
+    return Document(page_content=text, metadata={"tool_name": "DESeq2", "file_name": "DESeq.Rd",
+                                                 "rrf_score": rrf_score})
+
+
+class StubRouter:
+    def __init__(self, tools: List[str]):
+        self.tools = tools
+
+    def route(self, question):
+        return [float(len(question))], [(tool, 1.0) for tool in self.tools]
+
+
+class StubFanout:
+    """第 i 次检索返回 results[i]（超出时返回最后一个）"""
+
+    def __init__(self, results: List[List[Document]]):
+        self.results = results
+        self.queries = []
+        self.vectors = []
+
+    async def fanout(self, query, tool_names=None, deadline=None, query_vector=None):
+        self.queries.append((query, tool_names))
+        self.vectors.append(query_vector)
+        return self.results[min(len(self.queries), len(self.results)) - 1], {"Bioconductor": "ok"}
+
+
+class StubChain:
+    """逐个输出 tokens，每个 token 之间等待 delay 秒"""
+
+    def __init__(self, tokens: List[str], delay: float = 0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.questions = []
+
+    async def astream(self, inputs: Dict[str, str]):
+        self.questions.append(inputs["question"])
+        for token in self.tokens:
+            yield token
+            await asyncio.sleep(self.delay)
+
+
+def stub_llm(replies: List[Dict]):
+    """refine 使用的 LLM：依次返回 replies 中的 JSON，记录调用次数"""
+    calls = []
+
+    def reply(prompt):
+        calls.append(prompt)
+        return json.dumps(replies[min(len(calls), len(replies)) - 1])
+
+    return RunnableLambda(reply), calls
+
+
+@pytest.fixture
+def components():
+    """用桩替换文档问答依赖的组件，测试结束后恢复原来的工厂"""
+    names = ("fanout_executor", "hierarchical_doc_retriever", "doc_fanout_retriever", "context_packer",
+             "doc_query_chain", docQA.current_llm)
+    saved = {name: (registry._factories[name], registry._tags[name], name not in registry._fork_unsafe)
+             for name in names}
+    executor = ThreadPoolExecutor(2)
+
+    def install(tools, results, chain, llm):
+        for name, instance in (("fanout_executor", executor), ("hierarchical_doc_retriever", StubRouter(tools)),
+                               ("doc_fanout_retriever", results), ("context_packer", ContextPacker(len)),
+                               ("doc_query_chain", chain), (docQA.current_llm, llm)):
+            registry.register(name, lambda instance=instance: instance)
+
+    yield install
+    for name, (factory, tags, fork_safe) in saved.items():
+        registry.register(name, factory, tags, fork_safe)
+    executor.shutdown(wait=False)
+
+
+def run(question: str, budget: float = 10.0) -> List[Dict]:
+    async def collect():
+        return [event async for event in docQA.stream_rag_response(question, budget=budget)]
+    return asyncio.run(collect())
+
+
+def skipped_reasons(events: List[Dict]) -> List[str]:
+    return [e["reason"] for e in events if e.get("step") == "refine_skipped"]
+
+
+def test_confident_retrieval_skips_refine(components):
+    llm, calls = stub_llm([{"needs_refinement": True, "missing": "fitType"}])
+    components(["DESeq2"], StubFanout([[chunk("DESeq(object, fitType)", CONFIDENT)]]),
+               StubChain(["Use ", "DESeq()."]), llm)
+    events = run("How do I run DESeq2?")
+    assert skipped_reasons(events) == ["confident"]
+    assert calls == []
+    assert events[-1] == {**events[-1], "type": "answer", "answer": "Use DESeq().", "timed_out": False}
+
+
+def test_no_candidate_tools_skips_refine(components):
+    llm, calls = stub_llm([{"needs_refinement": True, "missing": "fitType"}])
+    fanout = StubFanout([[Document(page_content="web result", metadata={"url": "https://example.org"})]])
+    components([], fanout, StubChain(["From the web."]), llm)
+    events = run("What is a hypothetical tool?")
+    assert skipped_reasons(events) == ["no_candidates"]
+    assert calls == []
+    assert fanout.queries == [("What is a hypothetical tool?", None)]
+    assert events[-1]["answer"] == "From the web."
+
+
+def test_refine_queries_only_the_missing_part_and_appends(components):
+    llm, calls = stub_llm([{"needs_refinement": True, "missing": "DESeq2 fitType options"},
+                           {"needs_refinement": False, "missing": ""}])
+    fanout = StubFanout([[chunk("DESeq(object)", UNSURE)], [chunk("fitType: parametric, local, mean", UNSURE)]])
+    chain = StubChain(["answer"])
+    components(["DESeq2"], fanout, chain, llm)
+    events = run("How do I run DESeq2 and choose fitType?")
+    answer = events[-1]["answer"]
+    assert [query for query, _ in fanout.queries] == ["How do I run DESeq2 and choose fitType?",
+                                                      "DESeq2 fitType options"]
+    # 首轮复用路由时算出的问题向量；补充检索的子问题由检索器自己计算
+    assert fanout.vectors == [[float(len("How do I run DESeq2 and choose fitType?"))], None]
+    assert chain.questions[1] == "DESeq2 fitType options"
+    assert answer == "answer" + docQA.SUPPLEMENT_HEADER.format("DESeq2 fitType options") + "answer"
+    assert len(calls) == 2
+    tokens = "".join(e["text"] for e in events if e["type"] == "token")
+    assert tokens == answer
+
+
+def test_budget_timeout_returns_partial_answer(components):
+    llm, _ = stub_llm([{"needs_refinement": False, "missing": ""}])
+    components(["DESeq2"], StubFanout([[chunk("DESeq(object)", UNSURE)]]),
+               StubChain(["partial ", "never"], delay=5.0), llm)
+    events = run("How do I run DESeq2?", budget=0.5)
+    final = events[-1]
+    assert final["timed_out"] is True
+    assert final["answer"] == "partial " + docQA.TIMEOUT_NOTE
+    assert final["elapsed"] < 2.0
@@ -0,0 +1,134 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from bm25_index import BM25Index
+from doc_retrieval import HierarchicalDocRetriever, HybridDocRetriever, ToolIndex
+
+# 每个工具的 chunk 向量：DESeq2 偏第 0 维，edgeR 偏第 1 维，ArchR 偏第 2 维
+ROWS = [
+    ("DESeq2", "Bioconductor", [3.0, 0.0, 0.0]),
+    ("DESeq2", "Bioconductor", [1.0, 1.0, 0.0]),
+    ("edgeR", "Bioconductor", [0.0, 2.0, 0.0]),
+    ("DESeq", "Bioconductor", [0.5, 0.5, 0.0]),
+    ("ArchR", "Bioconductor", [0.0, 0.1, 5.0]),
+]
+
+
+def unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def index():
+    return ToolIndex.from_vectors(ROWS)
+
+
+def test_centroid_is_mean_of_normalized_chunk_vectors(index):
+    # 先归一化再累加：长度不同的 chunk 向量权重相同
+    expected = unit(unit([3.0, 0.0, 0.0]) + unit([1.0, 1.0, 0.0]))
+    assert np.allclose(index.matrix[index.tools.index("DESeq2")], expected)
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+    assert index.sources == {tool: "Bioconductor" for tool in ("DESeq2", "edgeR", "DESeq", "ArchR")}
+
+
+def test_route_by_similarity_with_top_m_and_min_score(index):
+    assert [tool for tool, _ in index.route([0.0, 0.0, 1.0], top_m=1)] == ["ArchR"]
+    ranked = index.route([1.0, 0.2, 0.0], top_m=3)
+    assert [tool for tool, _ in ranked] == ["DESeq2", "DESeq", "edgeR"]
+    assert all(a[1] >= b[1] for a, b in zip(ranked, ranked[1:]))
+    assert index.route([0.0, 0.0, 1.0], top_m=4, min_score=0.5) == [("ArchR", pytest.approx(float(unit([0, 0.1, 5])[2])))]
+    assert ToolIndex({}).route([1.0, 0.0, 0.0]) == []
+
+
+def test_mentioned_tool_names_take_priority(index):
+    # 问题中出现工具名时加分，即使向量更接近其他工具；长名字优先匹配
+    assert index.mentioned("Compare deseq2 with DESeq and edgeR-based tools") == ["DESeq2", "DESeq"]
+    assert index.route([0.0, 0.0, 1.0], "How does edgeR normalize?", top_m=1)[0][0] == "edgeR"
+
+
+class RecordingStore:
+    """记录检索调用的向量库桩，embedding 为问题长度"""
+
+    def __init__(self, docs: List[Document]):
+        self.docs = docs
+        self.calls = []
+        self.embedded: List[str] = []
+        self.embeddings = self
+
+    def embed_query(self, text: str) -> List[float]:
+        self.embedded.append(text)
+        return [1.0, 0.0, 0.0]
+
+    def similarity_search(self, query: str, k: int = 4, expr: Optional[str] = None) -> List[Document]:
+        return self.similarity_search_by_vector(self.embed_query(query), k, expr)
+
+    def similarity_search_by_vector(self, vector, k: int = 4, expr: Optional[str] = None) -> List[Document]:
+        self.calls.append((list(vector), k, expr))
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in self.docs[:k]]
+
+
+def filter_expr(tools: List[str]) -> str:
+    return "tool_name in " + ",".join(tools)
+
+
+def test_hierarchical_retriever_searches_only_routed_tools(index):
+    store = RecordingStore([Document(page_content="DESeq(dds)", metadata={"pk": "a"})])
+    retriever = HierarchicalDocRetriever(vectorstore=store, tool_index=index, filter_expr=filter_expr, top_m=2, k=3)
+    assert [doc.page_content for doc in retriever.invoke("run DESeq2")] == ["DESeq(dds)"]
+    # 问题只 embedding 一次，路由和 chunk 检索共用
+    assert store.embedded == ["run DESeq2"]
+    assert store.calls == [([1.0, 0.0, 0.0], 3, "tool_name in DESeq2,DESeq")]
+
+    strict = HierarchicalDocRetriever(vectorstore=store, tool_index=index, filter_expr=filter_expr,
+                                      min_tool_score=10.0)
+    assert strict.invoke("unrelated") == []
+    assert len(store.calls) == 1
+
+
+def test_hybrid_search_reuses_precomputed_query_vector():
+    docs = [Document(page_content=text, metadata={"pk": pk, "tool_name": "DESeq2"})
+            for pk, text in (("a", "DESeq(dds, fitType = 'local')"), ("b", "results(dds)"))]
+    store = RecordingStore(docs)
+    bm25 = BM25Index.build((doc.metadata["pk"], "DESeq2", doc.page_content) for doc in docs)
+    with ThreadPoolExecutor(1) as executor:
+        retriever = HybridDocRetriever(vectorstore=store, bm25=bm25, fetch_docs=lambda ids: [],
+                                       filter_expr=filter_expr, executor=executor, k=2)
+        results = retriever.search("fitType", ["DESeq2"], query_vector=[0.0, 1.0, 0.0])
+        assert store.embedded == []
+        assert store.calls == [([0.0, 1.0, 0.0], 20, "tool_name in DESeq2")]
+        assert results[0].metadata["pk"] == "a"
+        # 没有提供向量时由向量库自己 embedding
+        retriever.search("fitType", ["DESeq2"])
+        assert store.embedded == ["fitType"]
+
+
+def test_hybrid_search_fuses_vector_and_bm25_rankings():
+    texts = {"a": "DESeq(dds, fitType = 'local')", "b": "plotMA(res)", "c": "fitType parametric fitType mean"}
+    docs = {pk: Document(page_content=text, metadata={"pk": pk, "tool_name": "DESeq2"}) for pk, text in texts.items()}
+    store = RecordingStore([docs["b"], docs["a"]])
+    fetched = []
+
+    def fetch_docs(ids):
+        fetched.extend(ids)
+        return [docs[pk] for pk in ids]
+
+    bm25 = BM25Index.build((pk, "DESeq2", text) for pk, text in texts.items())
+    with ThreadPoolExecutor(1) as executor:
+        retriever = HybridDocRetriever(vectorstore=store, bm25=bm25, fetch_docs=fetch_docs,
+                                       filter_expr=filter_expr, executor=executor, k=3, rrf_k=60)
+        results = retriever.search("fitType")
+    # 向量: b, a；BM25: c, a —— a 在两路都出现排第一，b、c 得分相同时保持向量结果在前；
+    # 只被 BM25 命中的 c 按主键取回
+    assert [doc.metadata["pk"] for doc in results] == ["a", "b", "c"]
+    assert fetched == ["c"]
+    assert results[0].metadata["rrf_score"] == pytest.approx(1 / 62 + 1 / 62)
+    assert results[1].metadata["rrf_score"] == results[2].metadata["rrf_score"] == pytest.approx(1 / 61)
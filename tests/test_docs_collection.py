@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+docQA = pytest.importorskip("docQA")
+from langchain_milvus import Milvus
+from registry import registry
+
+MIGRATED = {"tool_name": "DESeq2", "source": "Bioconductor", "doc_type": "manual", "file_name": "merged.txt"}
+STRUCTURED = dict(MIGRATED, tool_name="edgeR", section="edgeR > Usage", function="glmFit", content_type="code")
+
+
+@pytest.fixture
+def embedding():
+    name = docQA.current_embedding_model
+    saved = registry._factories[name], registry._tags[name]
+    embedding = DeterministicFakeEmbedding(size=8)
+    registry.register(name, lambda: embedding)
+    yield embedding
+    registry.register(name, *saved)
+
+
+def test_migrated_rows_first_keep_structured_metadata(tmp_path, embedding):
+    db_path = str(tmp_path / "milvus_tools.db")
+    store = docQA.open_docs_vectorstore(db_path)
+    # 先迁移（没有结构化字段），再同步结构化切分的 chunk
+    store.add_embeddings(["old chunk"], [embedding.embed_query("old chunk")], [MIGRATED], ids=["a"])
+    store.add_documents([Document(page_content="glmFit(y, design)", metadata=STRUCTURED)], ids=["b"])
+
+    reopened = docQA.open_docs_vectorstore(db_path)
+    docs = {doc.metadata["pk"]: doc.metadata
+            for doc in reopened.similarity_search("x", k=5, expr=docQA.docs_filter_expr(["DESeq2", "edgeR"]))}
+    assert docs["b"]["section"] == "edgeR > Usage" and docs["b"]["content_type"] == "code"
+    assert "section" not in docs["a"]
+
+
+def test_fixed_schema_collection_is_used_as_is(tmp_path, embedding):
+    db_path = str(tmp_path / "milvus_tools.db")
+    legacy = Milvus(embedding_function=embedding, collection_name=docQA.DOCS_COLLECTION,
+                    connection_args={"uri": db_path}, auto_id=False)
+    legacy.add_embeddings(["old chunk"], [embedding.embed_query("old chunk")], [MIGRATED], ids=["a"])
+
+    store = docQA.open_docs_vectorstore(db_path)
+    assert store.enable_dynamic_field is False
+    # 固定 schema 中没有的字段在写入时丢弃，不会报错
+    store.add_documents([Document(page_content="glmFit(y, design)", metadata=STRUCTURED)], ids=["b"])
+    assert len(store.similarity_search("x", k=5)) == 2
+    assert docQA.open_docs_vectorstore(db_path, drop_old=True).col is None
@@ -0,0 +1,129 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import json
+import os
+from typing import Dict, List
+
+import pytest
+from langchain_core.documents import Document
+
+docQA = pytest.importorskip("docQA")
+from ingest import loaders
+
+BOILERPLATE = " ".join(f"word{i}" for i in range(60))
+ORIGINAL = BOILERPLATE + " original ending"
+DUPLICATE = BOILERPLATE + " duplicate ending"
+OTHER = "DESeq runs the default differential expression analysis on a DESeqDataSet"
+
+
+class ParagraphSplitter:
+    def split_documents(self, docs: List[Document]) -> List[Document]:
+        return [Document(page_content=part.strip(), metadata=dict(doc.metadata))
+                for doc in docs for part in doc.page_content.split("\n\n") if part.strip()]
+
+
+class FakeStore:
+    def __init__(self):
+        self.docs: Dict[str, Document] = {}
+        self.col = None
+
+    def add_documents(self, docs, ids):
+        self.docs.update(zip(ids, docs))
+        self.col = object()
+
+    def delete(self, ids=None, expr=None):
+        for cid in ids or ([] if expr is None else list(self.docs)):
+            self.docs.pop(cid, None)
+
+    def texts(self):
+        return sorted(doc.page_content for doc in self.docs.values())
+
+
+@pytest.fixture
+def sync(tmp_path, monkeypatch):
+    store = FakeStore()
+    monkeypatch.setitem(loaders.SPLITTERS, "paragraphs", ParagraphSplitter)
+    monkeypatch.setitem(docQA.DOC_SOURCES, "Test", {
+        "docs_dir": str(tmp_path / "docs"),
+        "collection_prefix": "test",
+        "list_files": lambda tool_path: sorted(f for f in os.listdir(tool_path) if f.endswith(".md")),
+        "loader": "text",
+        "splitter": "paragraphs",
+    })
+    monkeypatch.setattr(docQA, "open_docs_vectorstore", lambda path: store)
+    monkeypatch.setattr(docQA, "bump_collection_version", lambda path: None)
+    monkeypatch.setattr(docQA, "rebuild_bm25_index", lambda path: None)
+    tool_dir = tmp_path / "docs" / "DESeq2"
+    tool_dir.mkdir(parents=True)
+    db_path = str(tmp_path / "milvus_tools.db")
+
+    def run(files: Dict[str, str]):
+        for path in tool_dir.iterdir():
+            path.unlink()
+        for name, text in files.items():
+            (tool_dir / name).write_text(text)
+        return docQA.sync_docs_vectorstores("Test", vector_db_path=db_path).get("DESeq2")
+
+    run.store = store
+    run.sync_all = lambda: docQA.sync_docs_vectorstores("Test", vector_db_path=db_path)
+    run.manifest = lambda: json.loads(Path(docQA.manifest_path_for(db_path)).read_text())["collections"]["test_DESeq2"]
+    return run
+
+
+def test_duplicate_comes_back_when_original_in_same_file_is_deleted(sync):
+    assert sync({"a.md": f"{ORIGINAL}\n\n{DUPLICATE}\n\n{OTHER}"})["near_duplicates"] == 1
+    assert sync.store.texts() == sorted([ORIGINAL, OTHER])
+    # 清单只记录实际写入的 chunk
+    entry = sync.manifest()["a.md"]
+    assert len(entry["chunks"]) == 2 and len(entry["duplicates"]) == 1
+
+    result = sync({"a.md": f"{DUPLICATE}\n\n{OTHER}"})
+    assert result == {"added": 1, "deleted": 1, "near_duplicates": 0}
+    assert sync.store.texts() == sorted([DUPLICATE, OTHER])
+
+
+def test_duplicate_in_unchanged_file_comes_back_when_original_file_is_deleted(sync):
+    sync({"a.md": ORIGINAL, "b.md": f"{DUPLICATE}\n\n{OTHER}"})
+    assert sync.store.texts() == sorted([ORIGINAL, OTHER])
+
+    result = sync({"b.md": f"{DUPLICATE}\n\n{OTHER}"})
+    assert result == {"added": 1, "deleted": 1, "near_duplicates": 0}
+    assert sync.store.texts() == sorted([DUPLICATE, OTHER])
+    assert "duplicates" not in sync.manifest()["b.md"]
+
+
+def test_unchanged_tool_is_skipped(sync):
+    assert sync({"a.md": OTHER}) == {"added": 1, "deleted": 0, "near_duplicates": 0}
+    assert sync({"a.md": OTHER}) is None
+
+
+FIT_TYPE = "fitType controls how DESeq2 fits the dispersion trend: parametric, local or mean"
+RESULTS = "results extracts a result table with log2 fold changes and adjusted p values"
+
+
+def test_modified_file_only_replaces_changed_chunks(sync):
+    assert sync({"a.md": f"{OTHER}\n\n{FIT_TYPE}", "b.md": RESULTS}) == {"added": 3, "deleted": 0, "near_duplicates": 0}
+    ids_before = set(sync.store.docs)
+
+    # a.md 中一个段落被替换：只写入新段落、删除旧段落，b.md 不重新处理
+    assert sync({"a.md": f"{OTHER}\n\n{ORIGINAL}", "b.md": RESULTS}) == {"added": 1, "deleted": 1, "near_duplicates": 0}
+    assert sync.store.texts() == sorted([OTHER, ORIGINAL, RESULTS])
+    assert len(ids_before & set(sync.store.docs)) == 2
+    assert set(sync.manifest()["b.md"]["chunks"]) < ids_before
+
+
+def test_removed_file_and_removed_tool_delete_their_chunks(sync, tmp_path):
+    sync({"a.md": OTHER, "b.md": f"{FIT_TYPE}\n\n{RESULTS}"})
+    assert sync({"a.md": OTHER}) == {"added": 0, "deleted": 2, "near_duplicates": 0}
+    assert sync.store.texts() == [OTHER]
+    assert list(sync.manifest()) == ["a.md"]
+
+    # 文档目录中删除整个工具：清空它的 chunk 并移出清单
+    for path in (tmp_path / "docs" / "DESeq2").iterdir():
+        path.unlink()
+    (tmp_path / "docs" / "DESeq2").rmdir()
+    assert sync.sync_all() == {"DESeq2": {"added": 0, "deleted": 1}}
+    assert sync.store.texts() == []
+    assert sync.sync_all() == {}
@@ -0,0 +1,137 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import multiprocessing
+import os
+import sqlite3
+import threading
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from bridge_llm import embedding_cache
+from bridge_llm.embedding_cache import CachedEmbeddings, EmbeddingStore, text_key
+
+DIM = 8
+
+
+def vector(seed: int) -> List[float]:
+    return np.random.default_rng(seed).normal(size=DIM).astype(np.float32).tolist()
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.texts: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts.extend(texts)
+        return [vector(len(text)) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_get_many_put_many_round_trip(tmp_path, dtype):
+    store = EmbeddingStore(str(tmp_path), dtype)
+    keys = [f"k{i}" for i in range(1200)]
+    vectors = [vector(i) for i in range(1200)]
+    store.put_many(keys[:700], vectors[:700], "bge-m3")
+    store.put_many(keys[700:], vectors[700:], "bge-m3")
+    # 超过 SQLite 单条语句参数上限的查询分批执行，顺序与 keys 一致
+    found = store.get_many(keys[::-1] + ["missing"], "bge-m3", DIM)
+    assert found[-1] is None
+    tolerance = 1e-6 if dtype == "float32" else 1e-2
+    assert np.allclose(found[:-1], vectors[::-1], atol=tolerance)
+    # 模型和维度都是键的一部分
+    assert store.get_many(["k1"], "jina", DIM) == [None]
+    assert store.get_many(["k1"], "bge-m3", DIM * 2) == [None]
+
+
+def test_reopen_reads_existing_cache(tmp_path):
+    inner = CountingEmbeddings()
+    CachedEmbeddings(inner, EmbeddingStore(str(tmp_path)), "bge-m3").embed_documents(["DESeq2", "edgeR"])
+
+    reopened = CachedEmbeddings(inner, EmbeddingStore(str(tmp_path)), "bge-m3")
+    # 重新打开时从索引中恢复维度，不需要先计算一次
+    assert reopened.dim == DIM
+    assert reopened.embed_documents(["edgeR", "limma", "DESeq2"]) == [vector(5), vector(5), vector(6)]
+    assert reopened.embed_query("DESeq2") == vector(6)
+    assert inner.texts == ["DESeq2", "edgeR", "limma"]
+    assert reopened.stats()["cache"]["doc_hits"] == 2 and reopened.counters["query_store_hits"] == 1
+
+
+def test_reopen_migrates_index_without_generations(tmp_path):
+    # 早期版本的索引没有 gen / used_at 列，向量文件名也没有代数后缀
+    conn = sqlite3.connect(str(tmp_path / "index.sqlite"))
+    conn.execute("CREATE TABLE embeddings (key TEXT NOT NULL, model TEXT NOT NULL, dim INTEGER NOT NULL,"
+                 " dtype TEXT NOT NULL, row INTEGER NOT NULL, PRIMARY KEY (key, model, dim, dtype))")
+    conn.execute("INSERT INTO embeddings VALUES (?, 'bge-m3', ?, 'float32', 0)", (text_key("DESeq2"), DIM))
+    conn.commit()
+    conn.close()
+    np.asarray([vector(6)], dtype=np.float32).tofile(str(tmp_path / f"bge-m3_{DIM}_float32.vec"))
+
+    store = EmbeddingStore(str(tmp_path))
+    assert store.get_many([text_key("DESeq2")], "bge-m3", DIM) == [vector(6)]
+    store.put_many(["new"], [vector(1)], "bge-m3")
+    assert store.get_many(["new", text_key("DESeq2")], "bge-m3", DIM) == [vector(1), vector(6)]
+
+
+def _append(cache_dir: str, worker: int, n: int) -> None:
+    store = EmbeddingStore(cache_dir)
+    for i in range(n):
+        store.put_many([f"w{worker}-{i}-{j}" for j in range(3)],
+                       [vector(worker * 1000 + i * 3 + j) for j in range(3)], "bge-m3")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 os.fork")
+def test_concurrent_append_from_processes_and_threads(tmp_path):
+    cache_dir = str(tmp_path)
+    EmbeddingStore(cache_dir)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_append, args=(cache_dir, worker, 20)) for worker in range(3)]
+    threads = [threading.Thread(target=_append, args=(cache_dir, worker, 20)) for worker in range(3, 5)]
+    for task in processes + threads:
+        task.start()
+    for task in processes + threads:
+        task.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    store = EmbeddingStore(cache_dir)
+    keys = [f"w{worker}-{i}-{j}" for worker in range(5) for i in range(20) for j in range(3)]
+    expected = [vector(worker * 1000 + i * 3 + j) for worker in range(5) for i in range(20) for j in range(3)]
+    # 每个键都指向自己写入的那一行
+    assert store.get_many(keys, "bge-m3", DIM) == expected
+    assert os.path.getsize(store.vector_path("bge-m3", DIM)) == len(keys) * DIM * 4
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path, monkeypatch):
+    row_bytes = DIM * 4
+    store = EmbeddingStore(str(tmp_path), max_bytes=10 * row_bytes)
+    now = [1_000_000]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    store.put_many([f"k{i}" for i in range(10)], [vector(i) for i in range(10)], "bge-m3")
+    # k0、k1 在之后被读取过，整理时保留
+    now[0] += 2 * embedding_cache.USED_AT_RESOLUTION
+    assert store.get_many(["k0", "k1"], "bge-m3", DIM) == [vector(0), vector(1)]
+    now[0] += 1
+    store.put_many(["k10"], [vector(10)], "bge-m3")
+
+    assert store.stats()["compactions"] == 1
+    kept = [key for key, found in zip([f"k{i}" for i in range(11)],
+                                      store.get_many([f"k{i}" for i in range(11)], "bge-m3", DIM)) if found]
+    # 保留上限的 80%：最近写入的 k10、最近读取的 k0 和 k1，以及较新的写入
+    assert len(kept) == 8 and {"k0", "k1", "k10"} <= set(kept) and "k2" not in kept
+    assert store.get_many(["k0", "k10"], "bge-m3", DIM) == [vector(0), vector(10)]
+    assert not os.path.exists(store.vector_path("bge-m3", DIM, 0))
+    assert os.path.getsize(store.vector_path("bge-m3", DIM, 1)) == 8 * row_bytes
+
+    # 其他进程（新的存储实例）按索引中的代数读取新文件，之后的追加写入同一代文件
+    other = EmbeddingStore(str(tmp_path), max_bytes=10 * row_bytes)
+    assert other.get_many(["k10"], "bge-m3", DIM) == [vector(10)]
+    other.put_many(["k11"], [vector(11)], "bge-m3")
+    assert store.get_many(["k11"], "bge-m3", DIM) == [vector(11)]
+    assert os.path.getsize(store.vector_path("bge-m3", DIM, 1)) == 9 * row_bytes
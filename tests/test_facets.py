@@ -0,0 +1,137 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import json
+import logging
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from facets import FacetedToolRetriever, FacetExtractor, Facets
+from numpy_store import NumpyVectorStore
+
+
+@pytest.fixture
+def extractor():
+    return FacetExtractor(current_year=2024)
+
+
+@pytest.mark.parametrize("question, year_min, year_max", [
+    ("single-cell tools since 2020", 2020, None),
+    ("2020年以来的单细胞工具", 2020, None),
+    ("aligners published after 2018", 2019, None),
+    ("peak callers released before 2015", None, 2014),
+    ("2015年以前的比对工具", None, 2014),
+    ("tools from 2016 to 2019", 2016, 2019),
+    ("2019至2016年的工具", 2016, 2019),
+    ("assemblers from the last 3 years", 2022, None),
+    ("近5年的甲基化工具", 2020, None),
+    ("what came out in 2021", 2021, 2021),
+    ("DESeq2 2.0 vs edgeR", None, None),
+])
+def test_year_rules(extractor, question, year_min, year_max):
+    facets = extractor.extract(question)
+    assert (facets.year_min, facets.year_max) == (year_min, year_max)
+
+
+@pytest.mark.parametrize("question, tooltypes", [
+    ("Is there a web server for motif discovery?", ["Web application", "Web service"]),
+    ("命令行的比对工具", ["Command-line tool"]),
+    ("an R package for ChIP-seq", ["Library"]),
+    ("a snakemake pipeline for variant calling", ["Workflow"]),
+    ("Which DESeq2 function normalizes counts?", []),
+])
+def test_tooltype_rules(extractor, question, tooltypes):
+    assert extractor.extract(question).tooltypes == tooltypes
+
+
+@pytest.mark.parametrize("question, topics, keywords", [
+    ("R package for ChIP-seq", ["ChIP-seq"], []),
+    ("单细胞转录组聚类", ["RNA-Seq", "Transcriptomics"], ["single-cell", "single cell"]),
+    ("scATAC-seq chromatin accessibility", [], ["ATAC"]),
+    ("DNA methylation and RNA-seq integration", ["RNA-Seq", "Transcriptomics", "Epigenomics"], []),
+])
+def test_topic_and_keyword_rules(extractor, question, topics, keywords):
+    facets = extractor.extract(question)
+    assert facets.topics == topics and facets.keywords == keywords
+
+
+def test_relaxation_order():
+    facets = Facets(year_min=2020, tooltypes=["Library"], topics=["RNA-Seq"], keywords=["single-cell"])
+    levels = [level.to_dict() for level in facets.relaxations()]
+    # 依次去掉 keyword、topic、tooltype，最后不过滤；year 与最后一级一起去掉
+    assert levels == [
+        {"year_min": 2020, "tooltypes": ["Library"], "topics": ["RNA-Seq"], "keywords": ["single-cell"]},
+        {"year_min": 2020, "tooltypes": ["Library"], "topics": ["RNA-Seq"]},
+        {"year_min": 2020, "tooltypes": ["Library"]},
+        {"year_min": 2020},
+        {},
+    ]
+    assert [level.to_dict() for level in Facets(topics=["ChIP-seq"]).relaxations()] == [{"topics": ["ChIP-seq"]}, {}]
+    assert Facets().relaxations() == [Facets()]
+
+
+def test_predicates_and_milvus_expr():
+    facets = Facets(year_min=2018, year_max=2020, keywords=["ATAC"])
+    predicates = facets.predicates()
+    assert predicates["year"]("2019") and not predicates["year"]("2021") and not predicates["year"]("")
+    assert predicates["keyword"]("scATAC-seq, chromatin") and not predicates["keyword"]("RNA-seq")
+    expr = facets.milvus_expr()
+    assert expr.startswith('year >= "2018" and year <= "2020" and (')
+    assert 'keyword like "%atac%"' in expr and 'keyword like "%ATAC%"' in expr
+
+
+class WordEmbeddings(Embeddings):
+    """每个词一维：共享词越多越相似"""
+
+    VOCAB = ["single-cell", "clustering", "rna-seq", "peak", "web"]
+
+    def embed_query(self, text: str) -> List[float]:
+        words = text.lower().split()
+        return [float(word in words) for word in self.VOCAB] + [0.1]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def tools_store() -> NumpyVectorStore:
+    tools = [
+        ("a", "single-cell clustering", {"year": "2021", "tooltype": "Library", "topic": "RNA-Seq", "keyword": "single-cell"}),
+        ("b", "single-cell clustering web", {"year": "2017", "tooltype": "Web application", "topic": "RNA-Seq", "keyword": "single-cell"}),
+        ("c", "rna-seq clustering", {"year": "2022", "tooltype": "Library", "topic": "RNA-Seq", "keyword": ""}),
+        ("d", "peak clustering", {"year": "2023", "tooltype": "Command-line tool", "topic": "ChIP-seq", "keyword": ""}),
+    ]
+    return NumpyVectorStore.from_texts([text for _, text, _ in tools], WordEmbeddings(),
+                                       [meta for _, _, meta in tools], ids=[pk for pk, _, _ in tools])
+
+
+def test_retriever_relaxes_until_enough_results():
+    retriever = FacetedToolRetriever(vectorstore=tools_store(), extractor=FacetExtractor(2024), k=3, min_results=3)
+    docs = retriever.invoke("single-cell clustering R package since 2020")
+    assert [doc.metadata["pk"] for doc in docs] == ["a", "c", "d"]
+    # 每个结果记录命中时实际使用的条件：先带 keyword，再去掉 keyword，最后只保留年份
+    used = [json.loads(doc.metadata["facets"]) for doc in docs]
+    assert used[0] == {"year_min": 2020, "tooltypes": ["Library"], "keywords": ["single-cell", "single cell"]}
+    assert used[1] == {"year_min": 2020, "tooltypes": ["Library"]}
+    assert used[2] == {"year_min": 2020}
+
+
+class BrokenFilterStore(NumpyVectorStore):
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        if filter:
+            raise KeyError("keyword")
+        return super().similarity_search_by_vector(embedding, k, **kwargs)
+
+
+def test_failed_filter_is_logged_and_relaxed(caplog):
+    store = tools_store()
+    broken = BrokenFilterStore(WordEmbeddings())
+    broken.ids, broken.texts, broken.metadatas, broken.vectors = store.ids, store.texts, store.metadatas, store.vectors
+    retriever = FacetedToolRetriever(vectorstore=broken, extractor=FacetExtractor(2024), k=2)
+    with caplog.at_level(logging.WARNING, logger="facets"):
+        docs = retriever.invoke("single-cell clustering web server")
+    assert [doc.metadata["pk"] for doc in docs] == ["b", "a"]
+    assert json.loads(docs[0].metadata["facets"]) == {}
+    assert sum("检索失败" in record.getMessage() for record in caplog.records) == 2
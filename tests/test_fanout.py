@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from fanout import FanoutRetriever, SearchSource
+
+
+def source(name, docs, delay=0.0, timeout=1.0):
+    async def search(query, k, tool_names):
+        await asyncio.sleep(delay)
+        return [Document(page_content=text, metadata={"pk": text}) for text in docs[:k]]
+    return SearchSource(name, search, timeout=timeout)
+
+
+def make_retriever():
+    return FanoutRetriever(sources=[
+        source("Bioconductor", ["a", "b"]),
+        source("Bioconda", ["b", "c"]),
+        source("web", ["slow"], delay=1.0, timeout=0.05),
+    ], k=3)
+
+
+def test_fanout_fuses_and_drops_timed_out_source():
+    docs, statuses = asyncio.run(make_retriever().fanout("query"))
+    assert [doc.page_content for doc in docs][0] == "b"
+    assert {doc.page_content for doc in docs} == {"a", "b", "c"}
+    assert docs[0].metadata["fanout_sources"] == "Bioconductor,Bioconda"
+    assert statuses["web"]["status"] == "timeout"
+    assert statuses["Bioconductor"]["status"] == "ok"
+
+
+def test_sync_invoke_outside_event_loop():
+    assert len(make_retriever().invoke("query")) == 3
+
+
+def test_sync_invoke_inside_running_event_loop():
+    retriever = make_retriever()
+
+    async def handler():
+        # 例如 FastAPI async def 接口中调用同步检索器
+        return retriever.invoke("query")
+
+    assert len(asyncio.run(handler())) == 3
+
+
+def test_fanout_does_not_mutate_source_documents():
+    cached = [Document(page_content="a", metadata={"pk": "a", "score": 0.9})]
+
+    async def search(query, k, tool_names):
+        return cached
+
+    retriever = FanoutRetriever(sources=[SearchSource("Bioconductor", search)], k=1)
+    docs, _ = asyncio.run(retriever.fanout("query"))
+    assert docs[0].metadata["fanout_sources"] == "Bioconductor"
+    assert docs[0].metadata["score"] != 0.9
+    # 来源（如检索缓存）返回的文档保持原样
+    assert cached[0].metadata == {"pk": "a", "score": 0.9}
+
+
+def test_timed_out_sync_searches_are_bounded():
+    release = threading.Event()
+    calls = []
+
+    def stuck_search(query, k, tool_names):
+        calls.append(query)
+        release.wait(5)
+        return [Document(page_content="late", metadata={"pk": "late"})]
+
+    def fast_search(query, k, tool_names):
+        return [Document(page_content="fast", metadata={"pk": "fast"})]
+
+    retriever = FanoutRetriever(sources=[SearchSource("Bioconductor", stuck_search, timeout=0.05, max_stuck=2),
+                                         SearchSource("Bioconda", fast_search)], max_workers=4)
+    statuses = [asyncio.run(retriever.fanout(f"q{i}"))[1]["Bioconductor"]["status"] for i in range(4)]
+    # 前两次超时的调用仍占着线程，之后该来源直接跳过，不再提交新的同步调用
+    assert statuses == ["timeout", "timeout", "busy", "busy"]
+    assert calls == ["q0", "q1"]
+    docs, statuses = asyncio.run(retriever.fanout("q4"))
+    assert [doc.page_content for doc in docs] == ["fast"] and statuses["Bioconda"]["status"] == "ok"
+    assert retriever.stats()["Bioconductor"]["stuck"] == 2
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while retriever.stats()["Bioconductor"]["stuck"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert retriever.stats()["Bioconductor"]["stuck"] == 0
+    assert asyncio.run(retriever.fanout("q5"))[1]["Bioconductor"]["status"] == "ok"
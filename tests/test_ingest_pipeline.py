@@ -0,0 +1,128 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import threading
+import time
+from typing import Dict, List
+
+import pytest
+from langchain_core.documents import Document
+
+from ingest.pipeline import IngestPipeline, Stage, embed_stage, insert_stage
+
+
+def test_items_flow_through_all_stages_to_sink():
+    pipeline = IngestPipeline([
+        Stage("split", lambda n: [n * 10, n * 10 + 1], workers=2),
+        Stage("batch", lambda batch: [sum(batch)], batch_size=4, batch_wait=0.01),
+    ])
+    received: List[int] = []
+    stats = pipeline.run(range(10), sink=received.append)
+    # 批中的元素和合计等于全部切分输出之和，结束标记会把不满一批的剩余元素冲出
+    assert sum(received) == sum(n * 10 + n * 10 + 1 for n in range(10))
+    split, batch = stats["stages"]["split"], stats["stages"]["batch"]
+    assert (split["processed"], split["produced"], split["errors"]) == (10, 20, 0)
+    assert batch["processed"] == 20 and batch["produced"] == len(received) >= 5
+    assert all(stage["queue_depth"] == 0 for stage in stats["stages"].values())
+
+
+def test_slow_downstream_blocks_upstream():
+    gate = threading.Event()
+    pulled: List[int] = []
+
+    def items():
+        for n in range(100):
+            pulled.append(n)
+            yield n
+
+    def slow(n):
+        gate.wait()
+        return [n]
+
+    pipeline = IngestPipeline([Stage("load", lambda n: [n], queue_size=2), Stage("write", slow, queue_size=2)])
+    received: List[int] = []
+    runner = threading.Thread(target=pipeline.run, args=(items(), received.append))
+    runner.start()
+    time.sleep(0.2)
+    # 下游阻塞时上游最多取走：两个队列各 2 个 + 两个阶段各处理中 1 个 + 正在放入队列的 1 个
+    assert len(pulled) <= 7
+    assert all(stage["max_queue_depth"] <= 2 for stage in pipeline.stats().values())
+    gate.set()
+    runner.join(timeout=5)
+    assert not runner.is_alive()
+    assert sorted(received) == list(range(100))
+
+
+def test_errors_are_counted_and_do_not_stop_the_pipeline():
+    def parse(n):
+        if n % 3 == 0:
+            raise ValueError(f"bad item {n}")
+        return [n]
+
+    def sink(n):
+        if n == 4:
+            raise IOError("disk full")
+
+    pipeline = IngestPipeline([Stage("parse", parse, workers=2), Stage("keep", lambda n: [n], workers=2)])
+    stats = pipeline.run(range(9), sink=sink)
+    parse_stats, keep_stats = stats["stages"]["parse"], stats["stages"]["keep"]
+    assert (parse_stats["processed"], parse_stats["produced"], parse_stats["errors"]) == (9, 6, 3)
+    assert sorted(parse_stats["recent_errors"]) == [f"ValueError: bad item {n}" for n in (0, 3, 6)]
+    # 写入 sink 失败记在最后一个阶段
+    assert keep_stats["processed"] == 6 and keep_stats["errors"] == 1
+    assert keep_stats["recent_errors"] == ["sink OSError: disk full"]
+
+
+def test_failed_batch_counts_every_item():
+    pipeline = IngestPipeline([Stage("batch", lambda batch: 1 / 0, batch_size=5, batch_wait=0.5)])
+    stats = pipeline.run(range(5))["stages"]["batch"]
+    assert stats["processed"] == stats["errors"] == 5 and stats["produced"] == 0
+
+
+def test_empty_pipeline_is_rejected():
+    with pytest.raises(ValueError):
+        IngestPipeline([])
+
+
+class FakeEmbeddings:
+    def __init__(self, drop: int = 0):
+        self.drop = drop
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(len(text))] for text in texts][self.drop:]
+
+
+class FakeStore:
+    def __init__(self):
+        self.calls: List[Dict] = []
+
+    def add_embeddings(self, texts, embeddings, metadatas, **kwargs):
+        self.calls.append({"texts": texts, "embeddings": embeddings, **kwargs})
+
+
+def records(n: int, **extra) -> List[Dict]:
+    return [{"doc": Document(page_content="x" * (i + 1)), "collection": f"c{i % 2}", **extra} for i in range(n)]
+
+
+def test_embed_and_insert_stages_group_by_collection():
+    stores: Dict[str, FakeStore] = {}
+    pipeline = IngestPipeline([
+        embed_stage(FakeEmbeddings(), batch_size=4, workers=1),
+        insert_stage(lambda collection: stores.setdefault(collection, FakeStore())),
+    ])
+    stats = pipeline.run(records(4))
+    assert stats["stages"]["insert"]["produced"] == 4
+    assert stores["c0"].calls == [{"texts": ["x", "xxx"], "embeddings": [[1.0], [3.0]]}]
+    assert stores["c1"].calls == [{"texts": ["xx", "xxxx"], "embeddings": [[2.0], [4.0]]}]
+
+
+def test_insert_stage_passes_ids_and_embed_mismatch_is_an_error():
+    store = FakeStore()
+    stage = insert_stage(lambda collection: store)
+    assert len(stage.process([[dict(r, vector=[0.0], id=str(i)) for i, r in enumerate(records(2))]])) == 2
+    assert [call["ids"] for call in store.calls] == [["0"], ["1"]]
+
+    stage = embed_stage(FakeEmbeddings(drop=1), batch_size=2)
+    assert stage.process(records(2)) == []
+    assert stage.errors == 2 and "embedding 数量不匹配" in stage.recent_errors[0]
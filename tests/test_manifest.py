@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import json
+
+from ingest.manifest import IngestManifest, chunk_id, file_hash
+
+
+def test_diff_classifies_new_modified_removed_and_unchanged(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    # 没有记录的 collection：全部文件都是新增
+    assert manifest.diff("bioc_DESeq2", {"a.md": "h1", "b.md": "h2"}) == (["a.md", "b.md"], [], [])
+
+    manifest.update_file("bioc_DESeq2", "a.md", "h1", ["c1"])
+    manifest.update_file("bioc_DESeq2", "b.md", "h2", ["c2"])
+    manifest.update_file("bioc_DESeq2", "c.md", "h3", ["c3"])
+    changed, removed, unchanged = manifest.diff("bioc_DESeq2", {"a.md": "h1", "b.md": "h2-new", "d.md": "h4"})
+    assert changed == ["b.md", "d.md"] and removed == ["c.md"] and unchanged == ["a.md"]
+    # 其他 collection 的记录不影响对比
+    assert manifest.diff("bioc_edgeR", {"a.md": "h1"}) == (["a.md"], [], [])
+
+
+def test_save_and_reload_roundtrip(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = IngestManifest(path)
+    manifest.update_file("bioc_DESeq2", "a.md", "h1", ["c1", "c2"], {"c3": "c1"})
+    manifest.update_file("bioc_edgeR", "b.md", "h2", ["c4"])
+    manifest.remove_collection("bioc_edgeR")
+    manifest.save()
+    assert not Path(f"{path}.tmp").exists()
+
+    reloaded = IngestManifest(path)
+    assert reloaded.files("bioc_DESeq2") == {"a.md": {"hash": "h1", "chunks": ["c1", "c2"], "duplicates": {"c3": "c1"}}}
+    assert reloaded.diff("bioc_DESeq2", {"a.md": "h1"}) == ([], [], ["a.md"])
+    reloaded.remove_file("bioc_DESeq2", "a.md")
+    assert reloaded.diff("bioc_DESeq2", {"a.md": "h1"}) == (["a.md"], [], [])
+
+
+def test_old_version_is_treated_as_first_sync(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps({"version": 1, "collections": {"bioc_DESeq2": {"a.md": {"hash": "h1", "chunks": []}}}}))
+    assert IngestManifest(str(path)).collections == {}
+
+
+def test_files_duplicating_finds_files_with_skipped_copies(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manifest.update_file("bioc_DESeq2", "a.md", "h1", ["c1"])
+    manifest.update_file("bioc_DESeq2", "b.md", "h2", ["c2"], {"c3": "c1"})
+    assert manifest.files_duplicating("bioc_DESeq2", {"c1"}) == ["b.md"]
+    assert manifest.files_duplicating("bioc_DESeq2", {"c2"}) == []
+    assert manifest.files_duplicating("bioc_edgeR", {"c1"}) == []
+
+
+def test_ids_and_hashes_are_content_addressed(tmp_path):
+    a, b = tmp_path / "a.md", tmp_path / "b.md"
+    a.write_text("DESeq(dds)")
+    b.write_text("DESeq(dds)")
+    assert file_hash(str(a)) == file_hash(str(b))
+    b.write_text("results(dds)")
+    assert file_hash(str(a)) != file_hash(str(b))
+    # chunk id 由 collection、文件名和文本共同决定
+    assert chunk_id("bioc_DESeq2", "a.md", "x") == chunk_id("bioc_DESeq2", "a.md", "x")
+    assert len({chunk_id("bioc_DESeq2", "a.md", "x"), chunk_id("bioc_DESeq2", "b.md", "x"),
+                chunk_id("bioc_edgeR", "a.md", "x"), chunk_id("bioc_DESeq2", "a.md", "y")}) == 4
@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import os
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+langchain_milvus = pytest.importorskip("langchain_milvus")
+from milvus_conn import reconnect_milvus
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 os.fork")
+def test_reconnect_in_forked_worker(tmp_path):
+    store = langchain_milvus.Milvus(embedding_function=DeterministicFakeEmbedding(size=8), collection_name="docs",
+                                    connection_args={"uri": str(tmp_path / "milvus.db")}, auto_id=True)
+    store.add_texts(["peak calling", "differential expression"])
+    assert len(store.similarity_search("peak calling", k=2)) == 2
+    reconnect_milvus(object())
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            # 原地重连后同一个实例可以继续检索
+            reconnect_milvus(store)
+            code = 0 if len(store.similarity_search("peak calling", k=2)) == 2 else 1
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    # 父进程的连接不受影响
+    assert len(store.similarity_search("differential expression", k=2)) == 2
@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import hashlib
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from numpy_store import NumpyVectorStore
+
+
+class HashEmbeddings(Embeddings):
+    """确定性的词袋哈希 embedding：共享词越多越相似"""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+TEXTS = ["peak calling for chip-seq", "differential expression of rna-seq counts",
+         "single-cell clustering", "sequence alignment to a reference genome"]
+METADATAS = [{"tooltype": "command-line"}, {"tooltype": "R package"}, {"tooltype": "R package"},
+             {"tooltype": "command-line"}]
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8", "binary"])
+def test_search_filter_and_delete(quantization):
+    store = NumpyVectorStore.from_texts(TEXTS, HashEmbeddings(), METADATAS, ids=["a", "b", "c", "d"],
+                                        quantization=quantization)
+    assert store.similarity_search("differential expression rna-seq", k=1)[0].metadata["pk"] == "b"
+    filtered = store.similarity_search("peak calling", k=4, filter={"tooltype": "R package"})
+    assert {doc.metadata["pk"] for doc in filtered} == {"b", "c"}
+    store.delete(["b"])
+    assert len(store) == 3
+    assert "b" not in {doc.metadata["pk"] for doc in store.similarity_search("rna-seq", k=4)}
+
+
+def test_save_and_load(tmp_path):
+    store = NumpyVectorStore.from_texts(TEXTS, HashEmbeddings(), METADATAS, ids=["a", "b", "c", "d"],
+                                        quantization="int8")
+    store.similarity_search("x", k=1)
+    path = str(tmp_path / "index")
+    store.save(path)
+    loaded = NumpyVectorStore.load(path, HashEmbeddings(), quantization="int8")
+    assert loaded.ids == store.ids
+    assert [d.metadata["pk"] for d in loaded.similarity_search("single-cell clustering", k=2)] == \
+           [d.metadata["pk"] for d in store.similarity_search("single-cell clustering", k=2)]
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8", "binary"])
+def test_disk_bytes_match_saved_vectors(tmp_path, quantization):
+    store = NumpyVectorStore.from_texts(TEXTS, HashEmbeddings(), METADATAS, quantization=quantization)
+    path = tmp_path / "index"
+    store.save(str(path))
+    # 压缩编码与重排用的 float32 向量都计入磁盘占用
+    saved = sum(np.load(f, mmap_mode="r").nbytes for f in path.glob("*.npy"))
+    assert store.disk_bytes() == saved
+    assert store.disk_bytes() == len(TEXTS) * 64 * 4 + (store.index_bytes() if store.compressed else 0)
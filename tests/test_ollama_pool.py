@@ -0,0 +1,159 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import asyncio
+import itertools
+from typing import Dict, List
+
+import pytest
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+pytest.importorskip("langchain_ollama")
+from bridge_llm.ollama_pool import OllamaEndpointPool, PooledChatOllama, PooledOllamaEmbeddings
+
+_ids = itertools.count()
+
+
+def urls(n: int) -> List[str]:
+    # 节点状态按 URL 在进程内共享，每个测试使用新的地址
+    test_id = next(_ids)
+    return [f"http://pool-test-{test_id}-{i}:11434" for i in range(n)]
+
+
+def states(pool: OllamaEndpointPool) -> Dict[str, Dict]:
+    return {s["url"]: s for s in pool.stats()}
+
+
+def test_ewma_latency_and_in_flight_decide_selection():
+    a, b = urls(2)
+    pool = OllamaEndpointPool([a, b], latency_alpha=0.5)
+    pool.release(pool.acquire(exclude=[b]), 1.0, ok=True)
+    pool.release(pool.acquire(exclude=[a]), 0.2, ok=True)
+    # 得分为 (在途数 + 1) × 平滑延迟：b 有 4 个在途请求时与 a 持平，第 5 个请求分给 a
+    assert [pool.acquire().url for _ in range(5)] == [b, b, b, b, a]
+    for _ in range(4):
+        pool.release(pool.endpoints[1], 0.6, ok=True)
+    assert states(pool)[b]["in_flight"] == 0
+    assert states(pool)[b]["ewma_latency"] == pytest.approx(0.2 + (0.6 - 0.2) * (1 - 0.5 ** 4))
+
+
+def test_circuit_breaker_opens_and_half_open_probe_recovers(monkeypatch):
+    a, b = urls(2)
+    pool = OllamaEndpointPool([a, b], failure_threshold=2, cooldown=30.0)
+    for _ in range(2):
+        pool.release(pool.acquire(exclude=[b]), 0.1, ok=False)
+    assert states(pool)[a]["state"] == "open"
+    assert {pool.acquire().url for _ in range(3)} == {b}
+
+    # 冷却结束后只放行一个探测请求
+    import bridge_llm.ollama_pool as ollama_pool
+    now = ollama_pool.time.monotonic()
+    monkeypatch.setattr(ollama_pool.time, "monotonic", lambda: now + 31)
+    assert states(pool)[a]["state"] == "half_open"
+    probe = pool.acquire(exclude=[b])
+    assert probe.url == a and probe.half_open_probe
+    assert pool.acquire().url == b
+    pool.release(probe, 0.05, ok=True)
+    assert states(pool)[a]["state"] == "closed" and states(pool)[a]["consecutive_failures"] == 0
+
+
+def test_failed_half_open_probe_reopens():
+    (a,) = urls(1)
+    pool = OllamaEndpointPool([a], failure_threshold=1, cooldown=0.0)
+    pool.release(pool.acquire(), 0.1, ok=False)
+    pool.release(pool.acquire(), 0.1, ok=False)
+    assert states(pool)[a]["failures"] == 2 and pool.endpoints[0].opened_until > 0
+
+
+class FakeEmbeddingClient:
+    def __init__(self, url: str, failing: set, calls: List[str], block: asyncio.Event = None):
+        self.url, self.failing, self.calls, self.block = url, failing, calls, block
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls.append(self.url)
+        if self.url in self.failing:
+            raise ConnectionError(self.url)
+        return [1.0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.block is not None:
+            await self.block.wait()
+        return self.embed_query(text)
+
+
+def pooled_embeddings(endpoints, failing=(), block=None):
+    embeddings = PooledOllamaEmbeddings("bge-m3", endpoints)
+    calls: List[str] = []
+    clients = {url: FakeEmbeddingClient(url, set(failing), calls, block) for url in endpoints}
+    embeddings._client = clients.__getitem__
+    return embeddings, calls
+
+
+def test_embeddings_retry_on_another_endpoint():
+    a, b = urls(2)
+    embeddings, calls = pooled_embeddings([a, b], failing={a})
+    # 先让 a 的延迟更低，保证第一次选中 a
+    embeddings.pool.release(embeddings.pool.acquire(exclude=[b]), 0.01, ok=True)
+    embeddings.pool.release(embeddings.pool.acquire(exclude=[a]), 1.0, ok=True)
+    assert embeddings.embed_query("x") == [1.0]
+    assert calls == [a, b]
+    assert asyncio.run(embeddings.aembed_query("x")) == [1.0]
+    assert calls == [a, b, a, b]
+    assert states(embeddings.pool)[a]["failures"] == 2
+    assert all(s["in_flight"] == 0 for s in embeddings.pool.stats())
+
+
+def test_embeddings_raise_after_all_endpoints_fail():
+    a, b = urls(2)
+    embeddings, calls = pooled_embeddings([a, b], failing={a, b})
+    with pytest.raises(ConnectionError):
+        embeddings.embed_query("x")
+    assert sorted(calls) == [a, b]
+
+
+def test_cancelled_request_releases_endpoint_without_failure():
+    a, b = urls(2)
+
+    async def scenario():
+        embeddings, _ = pooled_embeddings([a, b], block=asyncio.Event())
+        task = asyncio.ensure_future(embeddings.aembed_query("x"))
+        await asyncio.sleep(0.01)
+        assert sum(s["in_flight"] for s in embeddings.pool.stats()) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return embeddings.pool.stats()
+
+    for state in asyncio.run(scenario()):
+        assert state["in_flight"] == 0 and state["failures"] == 0 and state["ewma_latency"] is None
+
+
+class FakeChatClient:
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for token in ("DESeq2", " is", " an", " R package"):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in self._stream(messages):
+            yield chunk
+
+
+def test_chat_streams_through_pool():
+    (a,) = urls(1)
+    llm = PooledChatOllama(model="llama3.2", endpoints=[a])
+    llm._clients[a] = FakeChatClient()
+    chunks = [chunk.content for chunk in llm.stream([HumanMessage(content="What is DESeq2?")])]
+    assert chunks == ["DESeq2", " is", " an", " R package"]
+
+    async def astream():
+        return [chunk.content async for chunk in llm.astream([HumanMessage(content="What is DESeq2?")])]
+
+    assert "".join(asyncio.run(astream())) == "DESeq2 is an R package"
+    # 提前停止读取时也归还节点
+    stream = llm.stream([HumanMessage(content="What is DESeq2?")])
+    next(stream)
+    stream.close()
+    state = states(llm.pool)[a]
+    assert state["in_flight"] == 0 and state["requests"] == 3 and state["failures"] == 0
@@ -0,0 +1,157 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import threading
+import time
+
+import pytest
+
+from registry import ComponentRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = ComponentRegistry()
+    registry.register("connection", lambda: object(), tags=("vectorstore",), fork_safe=False)
+    registry.register("retriever", lambda: ("retriever", registry.get("connection")), tags=("retriever",))
+    registry.register("chain", lambda: ("chain", registry.get("retriever")), tags=("chain",))
+    registry.register("lookup", lambda: {"a": 1})
+    return registry
+
+
+def test_get_builds_once_and_records_stats(registry):
+    chain = registry.get("chain")
+    assert registry.get("chain") is chain
+    assert registry.is_ready("connection") and registry.is_ready("retriever")
+    stats = registry.stats()["components"]
+    assert stats["chain"]["ready"] and stats["chain"]["init_seconds"] is not None
+    assert stats["connection"]["fork_safe"] is False
+    assert registry.names("retriever") == ["retriever"]
+    with pytest.raises(KeyError):
+        registry.get("missing")
+
+
+def test_concurrent_get_builds_once():
+    registry = ComponentRegistry()
+    builds = []
+
+    def slow():
+        builds.append(1)
+        time.sleep(0.05)
+        return object()
+
+    registry.register("slow", slow)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("slow"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+    assert len({id(result) for result in results}) == 1
+
+
+def test_invalidate_cascades_to_dependents(registry):
+    chain = registry.get("chain")
+    lookup = registry.get("lookup")
+    registry.invalidate("connection")
+    assert not registry.is_ready("connection")
+    assert not registry.is_ready("retriever")
+    assert not registry.is_ready("chain")
+    assert registry.get("lookup") is lookup
+    assert registry.get("chain") is not chain
+
+
+def test_invalidate_all(registry):
+    registry.get("chain")
+    registry.invalidate()
+    assert not any(info["ready"] for info in registry.stats()["components"].values())
+
+
+def test_register_replaces_instance(registry):
+    registry.get("lookup")
+    registry.register("lookup", lambda: {"b": 2})
+    assert registry.get("lookup") == {"b": 2}
+
+
+def test_after_fork_drops_fork_unsafe_and_dependents(registry):
+    registry.get("chain")
+    lookup = registry.get("lookup")
+    registry.after_fork()
+    assert not registry.is_ready("connection")
+    assert not registry.is_ready("chain")
+    assert registry.get("lookup") is lookup
+    # 锁已重建，组件可以重新构建
+    assert registry.get("chain")[0] == "chain"
+
+
+def test_after_fork_reconnects_in_place_and_keeps_dependents():
+    registry = ComponentRegistry()
+    reconnected = []
+    registry.register("vectorstore", lambda: {"client": "parent"}, fork_safe=False,
+                      reconnect=lambda store: (reconnected.append(1), store.update(client="child")))
+    registry.register("tool_index", lambda: ("centroids", registry.get("vectorstore")))
+    registry.register("executor", lambda: object(), fork_safe=False)
+    registry.register("retriever", lambda: ("retriever", registry.get("executor")))
+    registry.register("not_built", lambda: object(), fork_safe=False, reconnect=lambda _: reconnected.append(2))
+    index, retriever = registry.get("tool_index"), registry.get("retriever")
+    registry.after_fork()
+    # 重连的实例原地更新，依赖它的索引不重建
+    assert reconnected == [1]
+    assert registry.get("tool_index") is index and index[1]["client"] == "child"
+    # 没有 reconnect 的组件连同依赖一起丢弃
+    assert not registry.is_ready("executor") and not registry.is_ready("retriever")
+    assert registry.get("retriever") is not retriever
+    assert registry.stats()["components"]["vectorstore"]["reconnect"] is True
+
+
+def test_failed_reconnect_falls_back_to_rebuild():
+    registry = ComponentRegistry()
+
+    def broken(_):
+        raise ConnectionError("refused")
+
+    registry.register("vectorstore", lambda: object(), fork_safe=False, reconnect=broken)
+    registry.register("retriever", lambda: ("retriever", registry.get("vectorstore")))
+    registry.get("retriever")
+    registry.after_fork()
+    assert not registry.is_ready("vectorstore") and not registry.is_ready("retriever")
+
+
+def test_invalidate_during_build_does_not_cache_stale_instance():
+    registry = ComponentRegistry()
+    connections = iter(range(10))
+    registry.register("connection", lambda: next(connections))
+    building, release = threading.Event(), threading.Event()
+
+    def slow_retriever():
+        connection = registry.get("connection")
+        building.set()
+        release.wait(5)
+        return ("retriever", connection)
+
+    registry.register("retriever", slow_retriever)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(registry.get("retriever")))
+    thread.start()
+    assert building.wait(5)
+    registry.invalidate("connection")
+    release.set()
+    thread.join()
+    # 构建中的实例引用了旧连接：交给调用方但不缓存
+    assert results == [("retriever", 0)]
+    assert not registry.is_ready("retriever")
+    assert registry.get("retriever") == ("retriever", 1)
+
+
+def test_warm_up_reports_errors(registry):
+    def broken():
+        raise RuntimeError("backend down")
+
+    registry.register("broken", broken)
+    results = registry.warm_up(["lookup", "broken"])
+    assert results == {"lookup": None, "broken": "backend down"}
+    assert registry.stats()["components"]["broken"]["error"] == "backend down"
+    with pytest.raises(RuntimeError):
+        registry.warm_up(["broken"], raise_on_error=True)
@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import time
+
+from langchain_core.documents import Document
+
+from retrieval_cache import RetrievalCache, bump_collection_version, collection_version, normalize_query
+
+
+class Store:
+    """按 pk 取回文档，记录检索次数"""
+
+    def __init__(self):
+        self.docs = {pk: Document(page_content=f"doc {pk}", metadata={"pk": pk}) for pk in ("a", "b", "c")}
+        self.searches = 0
+
+    def search(self):
+        self.searches += 1
+        return [Document(page_content=self.docs[pk].page_content, metadata={"pk": pk, "score": score})
+                for pk, score in (("b", 0.9), ("a", 0.5))]
+
+    def fetch(self, ids):
+        return [Document(page_content=self.docs[pk].page_content, metadata=dict(self.docs[pk].metadata))
+                for pk in ids if pk in self.docs]
+
+
+def test_normalize_query():
+    assert normalize_query("  Which  tools for ＲＮＡ-seq？ ") == normalize_query("which tools for RNA-seq")
+    key = RetrievalCache.key("tools", "DESeq2?", 5, {"year": 2020})
+    assert key == RetrievalCache.key("tools", "deseq2", 5, {"year": 2020})
+    assert key != RetrievalCache.key("tools", "deseq2", 3, {"year": 2020})
+
+
+def test_hit_restores_order_and_annotations():
+    cache, store = RetrievalCache(), Store()
+    key = cache.key("docs", "query", 2)
+    first = cache.search(key, "v1", store.search, store.fetch)
+    second = cache.search(key, "v1", store.search, store.fetch)
+    assert store.searches == 1
+    assert [(d.metadata["pk"], d.metadata["score"]) for d in second] == \
+           [(d.metadata["pk"], d.metadata["score"]) for d in first] == [("b", 0.9), ("a", 0.5)]
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_expiry():
+    cache, store = RetrievalCache(ttl=0.05), Store()
+    key = cache.key("docs", "query")
+    cache.search(key, "v1", store.search, store.fetch)
+    time.sleep(0.1)
+    cache.search(key, "v1", store.search, store.fetch)
+    assert store.searches == 2
+    assert cache.counters["expired"] == 1
+
+
+def test_version_change_and_deleted_docs_invalidate():
+    cache, store = RetrievalCache(), Store()
+    key = cache.key("docs", "query")
+    cache.search(key, "v1", store.search, store.fetch)
+    cache.search(key, "v2", store.search, store.fetch)
+    assert store.searches == 2 and cache.counters["stale"] == 1
+    # 文档已被删除但版本未更新时重新检索
+    store.fetch = lambda ids: [d for d in Store.fetch(store, ids) if d.metadata["pk"] != "a"]
+    cache.search(key, "v2", store.search, store.fetch)
+    assert store.searches == 3
+
+
+def test_lru_eviction_and_uncacheable():
+    cache, store = RetrievalCache(max_entries=2), Store()
+    for query in ("q1", "q2", "q3"):
+        cache.search(cache.key("docs", query), "v1", store.search, store.fetch)
+    assert len(cache) == 2 and cache.counters["evictions"] == 1
+    assert cache.get(cache.key("docs", "q1"), "v1") is None
+
+    no_ids = lambda: [Document(page_content="web result", metadata={"url": "https://example.org"})]
+    cache.search(cache.key("web", "q"), "v1", no_ids, store.fetch)
+    assert cache.counters["uncacheable"] == 1
+
+
+def test_collection_version_changes_on_bump(tmp_path):
+    db = str(tmp_path / "milvus_tools.db")
+    assert collection_version(db) == "0"
+    assert bump_collection_version(db) == 1
+    before = collection_version(db)
+    assert bump_collection_version(db) == 2
+    assert collection_version(db) != before
@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import json
+
+import numpy as np
+import pytest
+
+router = pytest.importorskip("router")
+from router import CentroidClassifier, RouterEngine, compile_keywords
+
+
+@pytest.fixture
+def engine():
+    return RouterEngine(classifier=None, log_path="")
+
+
+def test_longest_keyword_wins(engine):
+    scores = engine.keyword_scores("How to use the --fitType parameter in DESeq2?")
+    assert scores == {"tool-recommend": 0.0, "doc-qa": 2.0, "bio-db": 0.0}
+
+
+def test_english_keywords_start_at_word_boundary(engine):
+    assert engine.keyword_scores("show to me")["tool-recommend"] == 0
+    assert engine.keyword_scores("autogenerate reports")["bio-db"] == 0
+    assert engine.keyword_scores("genes and sequences")["bio-db"] == 2
+
+
+def test_cjk_and_case_insensitive_keywords(engine):
+    assert engine.keyword_scores("推荐一个做BLAST比对的工具") == {"tool-recommend": 2.0, "doc-qa": 0.0, "bio-db": 1.0}
+    assert engine.keyword_scores("blast") == engine.keyword_scores("BLAST")
+    assert engine.keyword_scores("단백질 서열")["bio-db"] == 2
+
+
+def test_route_methods(engine):
+    decisions = engine.route_batch(["Which software is best for peak calling?", "BRCA1 gene tool",
+                                    "hello there"])
+    assert [(d.route, d.method) for d in decisions] == [
+        ("tool-recommend", "keywords"), ("tool-recommend", "precedence"), ("tool-recommend", "default")]
+    assert engine.ranked_routes({"tool-recommend": 0, "doc-qa": 1, "bio-db": 1}) == \
+           ["doc-qa", "bio-db", "tool-recommend"]
+    assert engine.stats()["keywords"] == 1
+
+
+def test_compile_keywords_keeps_first_route_for_shared_keyword():
+    pattern, routes = compile_keywords({"a": ["Gene", "x"], "b": ["gene"]})
+    assert routes == {"gene": "a", "x": "a"}
+    assert pattern.pattern.startswith("gene")
+
+
+class FixedEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+
+def test_centroid_fallback_for_ambiguous_queries(tmp_path):
+    classifier = CentroidClassifier(["tool-recommend", "doc-qa", "bio-db"], np.eye(4)[:3], "test")
+    embedding = FixedEmbeddings({"BRCA1 gene tool": [0.1, 0, 1, 0], "hello there": [0.1, 0, 0, 1]})
+    log_path = tmp_path / "router.jsonl"
+    engine = RouterEngine(embedding=embedding, classifier=classifier, min_similarity=0.5, log_path=str(log_path))
+    tied, unknown = engine.route_batch(["BRCA1 gene tool", "hello there"])
+    assert (tied.route, tied.method) == ("bio-db", "centroid")
+    # 相似度低于阈值时按默认优先级
+    assert (unknown.route, unknown.method) == ("tool-recommend", "default")
+    assert [json.loads(line)["method"] for line in log_path.read_text().splitlines()] == ["centroid", "default"]
+
+    path = str(tmp_path / "centroids.npz")
+    classifier.save(path)
+    loaded = CentroidClassifier.load(path)
+    assert loaded.routes == classifier.routes and loaded.embedding_model == "test"
@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import gc
+import os
+
+import pytest
+
+main = pytest.importorskip("main")
+import health
+from registry import registry
+from serve import PreforkServer
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 os.fork")
+def test_worker_rewarms_fork_unsafe_components(monkeypatch):
+    monkeypatch.setenv("BIOINFO_WARMUP", "")
+    monkeypatch.setattr(main, "WARMUP_COMPONENTS", "")
+    registry.register("test_connection", lambda: object(), fork_safe=False)
+    server = PreforkServer(host="127.0.0.1", port=0, warmup="test_connection")
+    server.prepare()
+    try:
+        assert main.WARMUP_COMPONENTS == os.environ["BIOINFO_WARMUP"] == "test_connection"
+        assert registry.is_ready("test_connection")
+        pid = os.fork()
+        if pid == 0:
+            # 子进程：after_fork 已丢弃连接类组件，rewarm 后 /readyz 按同一列表检查
+            code = 1
+            try:
+                dropped = not registry.is_ready("test_connection")
+                not_ready = not health.readiness(main.warmup_names(), check_llm=False)["ready"]
+                server.rewarm()
+                ready = health.readiness(main.warmup_names(), check_llm=False)["ready"]
+                code = 0 if dropped and not_ready and ready else 1
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+    finally:
+        server.sock.close()
+        if hasattr(gc, "unfreeze"):
+            gc.unfreeze()
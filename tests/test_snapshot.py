@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import numpy as np
+import pytest
+
+from numpy_store import NumpyVectorStore
+from snapshot import ArrowColumn, export_milvus_snapshot, load_snapshot, read_manifest, write_snapshot
+from test_numpy_store import HashEmbeddings, METADATAS, TEXTS
+
+
+@pytest.fixture
+def store():
+    return NumpyVectorStore.from_texts(TEXTS, HashEmbeddings(), METADATAS, ids=["a", "b", "c", "d"])
+
+
+def test_round_trip(store, tmp_path):
+    path = str(tmp_path / "tools.snapshot")
+    manifest = write_snapshot(store, path, "embeddings_test", batch_size=3)
+    assert manifest["count"] == 4 and manifest["dim"] == 64
+    assert read_manifest(path)["content_hash"] == manifest["content_hash"]
+
+    loaded = load_snapshot(path, HashEmbeddings(), "embeddings_test", verify=True)
+    assert isinstance(loaded.vectors, np.memmap)
+    assert isinstance(loaded.texts, ArrowColumn)
+    assert list(loaded.ids) == store.ids
+    assert list(loaded.metadatas) == store.metadatas
+    for query in ("peak calling", "single-cell clustering"):
+        assert [d.metadata["pk"] for d in loaded.similarity_search(query, k=2)] == \
+               [d.metadata["pk"] for d in store.similarity_search(query, k=2)]
+    assert loaded.similarity_search("rna-seq", k=4, filter={"tooltype": "R package"})[0].metadata["pk"] == "b"
+
+    # 写入前把 Arrow 列视图转为列表
+    loaded.add_texts(["genome assembly"], [{"tooltype": "web server"}], ids=["e"])
+    assert loaded.similarity_search("genome assembly", k=1)[0].metadata["pk"] == "e"
+
+
+def test_rejects_other_embedding_model(store, tmp_path):
+    path = str(tmp_path / "tools.snapshot")
+    write_snapshot(store, path, "embeddings_test")
+    with pytest.raises(ValueError, match="embedding"):
+        load_snapshot(path, HashEmbeddings(), "embeddings_other")
+
+
+def test_detects_corruption(store, tmp_path):
+    path = str(tmp_path / "tools.snapshot")
+    write_snapshot(store, path, "embeddings_test")
+    vectors = Path(path) / "vectors.npy"
+    data = bytearray(vectors.read_bytes())
+    data[-1] ^= 0xFF
+    vectors.write_bytes(bytes(data))
+    load_snapshot(path, HashEmbeddings(), "embeddings_test", verify=False)
+    with pytest.raises(ValueError, match="sha256"):
+        load_snapshot(path, HashEmbeddings(), "embeddings_test", verify=True)
+
+
+class FakeIterator:
+    def __init__(self, rows, batch_size):
+        self.batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+
+    def next(self):
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        pass
+
+
+class FakeMilvusClient:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query_iterator(self, collection_name, batch_size, filter, output_fields):
+        return FakeIterator([dict(row) for row in self.rows], batch_size)
+
+
+def test_export_milvus_snapshot(tmp_path):
+    embeddings = HashEmbeddings()
+    rows = [{"pk": i, "text": text, "vector": embeddings.embed_query(text), **metadata}
+            for i, (text, metadata) in enumerate(zip(TEXTS, METADATAS))]
+    path = str(tmp_path / "milvus.snapshot")
+    manifest = export_milvus_snapshot(FakeMilvusClient(rows), "bioinfo_tools", path, "embeddings_test",
+                                      batch_size=3)
+    assert manifest["count"] == 4 and manifest["source"]["collection"] == "bioinfo_tools"
+    loaded = load_snapshot(path, embeddings, "embeddings_test")
+    doc = loaded.similarity_search("differential expression of rna-seq counts", k=1)[0]
+    assert doc.page_content == TEXTS[1]
+    assert doc.metadata["tooltype"] == "R package" and doc.metadata["pk"] == 1
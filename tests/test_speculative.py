@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from speculative import SpeculativePrefetcher
+
+
+def test_commit_keeps_chosen_branch_and_cancels_the_rest():
+    running = threading.Event()
+    checkpoints = []
+
+    def tool_prefetch(question, cancelled):
+        running.set()
+        # 模拟分步骤执行，每步之间检查是否被放弃
+        while not cancelled.is_set():
+            checkpoints.append(question)
+            time.sleep(0.005)
+        return "abandoned"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        prefetcher = SpeculativePrefetcher(executor, {
+            "tool": tool_prefetch,
+            "doc": lambda question, cancelled: f"doc:{question}",
+            "web": lambda question, cancelled: f"web:{question}",
+        })
+        prefetches = prefetcher.start("DESeq2 fitType", ["tool", "doc", "web", "doc", "chat"])
+        # 没有预取函数的分支和重复的分支跳过
+        assert list(prefetches) == ["tool", "doc", "web"]
+        assert running.wait(1)
+
+        chosen = prefetcher.commit(prefetches, "doc")
+        assert chosen is prefetches["doc"] and not chosen.cancelled.is_set()
+        assert prefetches["tool"].cancelled.is_set() and prefetches["web"].cancelled.is_set()
+        # web 还在排队，直接取消；tool 已在执行，在下一个检查点放弃
+        assert prefetches["web"].future.cancelled()
+        assert prefetcher.result(chosen, timeout=1) == "doc:DESeq2 fitType"
+        assert prefetches["tool"].future.result() == "abandoned"
+
+    stats = prefetcher.stats()
+    assert {name: stats[name] for name in ("runs", "hits", "misses", "prefetches", "cancelled_before_start",
+                                           "abandoned", "errors")} == {
+        "runs": 1, "hits": 1, "misses": 0, "prefetches": 3, "cancelled_before_start": 1, "abandoned": 1, "errors": 0}
+    assert stats["wasted_ms"]["count"] == 1 and stats["wasted_ms"]["max"] > 0
+    assert stats["saved_ms"]["count"] == 1
+
+
+def test_finished_prefetch_counts_its_run_time_as_saved():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        prefetcher = SpeculativePrefetcher(executor, {"doc": lambda question, cancelled: time.sleep(0.05) or [1.0]})
+        prefetches = prefetcher.start("q", ["doc"])
+        prefetches["doc"].future.result()
+        chosen = prefetcher.commit(prefetches, "doc")
+        assert prefetcher.result(chosen) == [1.0]
+    # 分支取结果时预取已完成，预取耗时全部节省
+    assert prefetcher.saved.snapshot()["max"] >= 50
+    assert prefetcher.stats()["wasted_ms"]["count"] == 0
+
+
+def test_route_without_prefetch_is_a_miss():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        prefetcher = SpeculativePrefetcher(executor, {"doc": lambda question, cancelled: "doc"})
+        prefetches = prefetcher.start("q", ["doc"])
+        prefetches["doc"].future.result()
+        assert prefetcher.commit(prefetches, "chat") is None
+        assert prefetcher.result(None) is None
+    stats = prefetcher.stats()
+    assert (stats["hits"], stats["misses"], stats["abandoned"]) == (0, 1, 1)
+    assert prefetches["doc"].cancelled.is_set()
+
+
+def test_failed_prefetch_falls_back_to_none(caplog):
+    def broken(question, cancelled):
+        raise RuntimeError("embedding server down")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        prefetcher = SpeculativePrefetcher(executor, {"doc": broken})
+        chosen = prefetcher.commit(prefetcher.start("q", ["doc"]), "doc")
+        with caplog.at_level("WARNING", logger="speculative"):
+            assert prefetcher.result(chosen) is None
+    assert prefetcher.stats()["errors"] == 1
+    assert "embedding server down" in caplog.text
+
+
+def test_slow_prefetch_times_out_to_direct_computation():
+    gate = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        prefetcher = SpeculativePrefetcher(executor, {"doc": lambda question, cancelled: gate.wait(1)})
+        chosen = prefetcher.commit(prefetcher.start("q", ["doc"]), "doc")
+        # 等待超时与预取失败一样返回 None，由分支自行计算
+        assert prefetcher.result(chosen, timeout=0.01) is None
+        gate.set()
+        assert prefetcher.result(chosen, timeout=1) is True
+    assert prefetcher.stats()["errors"] == 1
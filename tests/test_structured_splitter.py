@@ -0,0 +1,95 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from langchain_core.documents import Document
+
+from ingest.structured import StructuredDocSplitter, parse_blocks
+
+VIGNETTE = """# DESeq2 vignette
+
+Intro paragraph about differential expression analysis of count data.
+
+## Quick start
+
+```{r}
+dds <- DESeqDataSetFromMatrix(countData = cts,
+                              colData = coldata,
+                              design = ~ condition)
+dds <- DESeq(dds)
+```
+
+| column | meaning |
+|---|---|
+| baseMean | mean of normalized counts |
+
+## Results
+
+The results function extracts a results table with log2 fold changes.
+"""
+
+RD_HELP = """DESeq                 package:DESeq2                 R Documentation
+
+Differential expression analysis
+
+Usage:
+
+     DESeq(object, test = c("Wald", "LRT"), fitType = "parametric")
+
+Arguments:
+
+  object: a DESeqDataSet object, see the constructor functions
+          DESeqDataSetFromMatrix.
+
+    test: either "Wald" or "LRT", which will then use either Wald
+          significance tests, or the likelihood ratio test.
+
+ fitType: either "parametric", "local", "mean", or "glmGamPoi".
+"""
+
+
+def test_code_blocks_and_tables_are_kept_whole():
+    chunks = StructuredDocSplitter(chunk_size=400, min_chunk_size=50).split_text(VIGNETTE)
+    texts = [text for text, _ in chunks]
+    code = next(text for text in texts if "```{r}" in text)
+    assert "dds <- DESeq(dds)\n```" in code
+    assert any("| baseMean | mean of normalized counts |" in text and "| column | meaning |" in text
+               for text in texts)
+    sections = {meta["section"] for _, meta in chunks}
+    assert {"DESeq2 vignette > Quick start", "DESeq2 vignette > Results"} <= sections
+    quick_start = next(meta for text, meta in chunks if "```{r}" in text)
+    assert quick_start["content_type"] == "mixed"
+
+
+def test_rd_help_sections_and_arguments():
+    blocks = parse_blocks(RD_HELP)
+    assert {block.function for block in blocks} == {"DESeq"}
+    items = [block.text for block in blocks if block.kind == "item"]
+    assert len(items) == 3
+    assert items[0].startswith("  object:") and "DESeqDataSetFromMatrix." in items[0]
+
+    chunks = StructuredDocSplitter(chunk_size=150, min_chunk_size=20).split_text(RD_HELP)
+    assert all(meta["function"] == "DESeq" for _, meta in chunks)
+    usage = next(meta for text, meta in chunks if text.startswith("Usage:"))
+    assert usage == {"section": "DESeq > Usage", "function": "DESeq", "content_type": "code"}
+    # 单个参数的说明不会被切开
+    for item in items:
+        assert any(item.strip() in text for text, _ in chunks)
+
+
+def test_chunk_size_and_oversized_code_keeps_fences():
+    code = "```r\n" + "\n".join(f"x{i} <- rnorm({i})" for i in range(60)) + "\n```"
+    text = "# Simulation\n\n" + code + "\n\n" + "word " * 300
+    splitter = StructuredDocSplitter(chunk_size=200, min_chunk_size=20)
+    chunks = splitter.split_text(text)
+    assert all(len(chunk) <= 200 for chunk, _ in chunks)
+    code_chunks = [chunk for chunk, meta in chunks if meta["content_type"] == "code"]
+    assert len(code_chunks) > 1
+    assert all(chunk.startswith("```r\n") and chunk.endswith("\n```") for chunk in code_chunks)
+
+
+def test_split_documents_keeps_source_metadata():
+    docs = StructuredDocSplitter(chunk_size=400).split_documents(
+        [Document(page_content=RD_HELP, metadata={"tool_name": "DESeq2", "file_name": "DESeq.txt"})])
+    assert docs and all(doc.metadata["tool_name"] == "DESeq2" and doc.metadata["function"] == "DESeq"
+                        for doc in docs)
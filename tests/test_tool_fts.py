@@ -0,0 +1,96 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from retrieval_cache import CachedRetriever, RetrievalCache
+from tool_fts import FtsFirstToolRetriever, ToolFtsIndex
+
+TOOLS = [
+    ("ATACseqQC", "ATAC-seq quality control", "Quality control of ATAC-seq data"),
+    ("RNA-SeQC", "RNA-seq quality metrics", "Quality metrics for RNA-seq data"),
+    ("DESeq2", "Differential expression of RNA-seq counts", "Differential expression analysis of RNA-seq data"),
+    ("edgeR", "Empirical analysis of digital gene expression", "Differential expression of RNA-seq count data"),
+    ("MACS2", "Model-based analysis of ChIP-seq", "Peak calling for ChIP-seq data"),
+    ("chromVAR", "Chromatin accessibility variation", "Motif deviations from single-cell ATAC-seq data"),
+    ("ArchR", "Single-cell chromatin accessibility", "Scalable analysis of single-cell ATAC-seq data"),
+] + [(f"filler{i}", f"Generic RNA-seq and ATAC-seq data tool {i}", "Analysis of sequencing data") for i in range(20)]
+
+
+def tool_doc(rowid: int, name: str) -> Document:
+    return Document(page_content=f"Title: {name}", metadata={"rowid": rowid, "name": name})
+
+
+class StubRetriever(BaseRetriever):
+    docs: List[Document]
+    calls: int = 0
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        self.calls += 1
+        return list(self.docs)
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("fts") / "tools.fts")
+    rows = [
+        (rowid, {"toolname": name, "title": title, "description": description}, f"Title: {name}",
+         {"rowid": rowid, "name": name})
+        for rowid, (name, title, description) in enumerate(TOOLS, start=1)
+    ]
+    ToolFtsIndex.build(rows, path)
+    return ToolFtsIndex(path)
+
+
+def names(docs: List[Document]) -> List[str]:
+    return [doc.metadata["name"] for doc in docs]
+
+
+def test_exact_tool_name_short_circuits(index):
+    fallback = StubRetriever(docs=[tool_doc(4, "edgeR")])
+    retriever = FtsFirstToolRetriever(index=index, fallback=fallback, k=5)
+    docs = retriever.invoke("How do I set the design formula in deseq2?")
+    assert names(docs)[0] == "DESeq2"
+    assert docs[0].metadata["match"] == "exact"
+    assert fallback.calls == 0
+
+
+def test_assay_prefix_hit_is_filled_from_fallback(index):
+    fallback = StubRetriever(docs=[tool_doc(1, "ATACseqQC"), tool_doc(6, "chromVAR"), tool_doc(7, "ArchR")])
+    retriever = FtsFirstToolRetriever(index=index, fallback=fallback, k=5)
+    docs = retriever.invoke("有哪些分析ATACseq数据的软件？")
+    assert names(docs) == ["ATACseqQC", "chromVAR", "ArchR"]
+    assert docs[0].metadata["match"] == "prefix"
+
+
+def test_rna_seq_question_is_not_answered_by_name_prefix_alone(index):
+    fallback = StubRetriever(docs=[tool_doc(3, "DESeq2"), tool_doc(4, "edgeR"), tool_doc(2, "RNA-SeQC")])
+    retriever = FtsFirstToolRetriever(index=index, fallback=fallback, k=5)
+    docs = retriever.invoke("Which tools are best for RNA-seq differential expression?")
+    assert {"DESeq2", "edgeR"} <= set(names(docs))
+    assert len(names(docs)) == len(set(names(docs)))
+    assert fallback.calls == 1
+
+
+def test_plain_acronyms_are_not_name_like(index):
+    assert not index._name_like("RNA")
+    assert not index._name_like("ATAC")
+    assert index._name_like("MACS2")
+    assert index._name_like("edgeR")
+
+
+def test_cache_key_keeps_case_for_name_detection(index, tmp_path):
+    fallback = StubRetriever(docs=[tool_doc(3, "DESeq2")])
+    retriever = CachedRetriever(retriever=FtsFirstToolRetriever(index=index, fallback=fallback, k=1),
+                                cache=RetrievalCache(), retriever_id="tools",
+                                vector_db_paths=[str(tmp_path / "tools.db")], fetch_docs=index.documents,
+                                id_field="rowid", k=1, casefold=False)
+    # 大小写混写的 RNA-SeQC 按工具名命中，全小写时不像工具名、走后备检索，两者不能共用缓存
+    assert names(retriever.invoke("quality of RNA-SeQC")) == ["RNA-SeQC"]
+    assert names(retriever.invoke("quality of rna-seqc")) == ["DESeq2"]
+    assert fallback.calls == 1
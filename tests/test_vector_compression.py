@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import numpy as np
+import pytest
+
+from vector_compression import ProductQuantizer, Reducer, compression_report, parse_config
+
+
+def clustered_vectors(n: int = 3000, dim: int = 64, clusters: int = 50, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_compression_recall_on_random_data():
+    report = {row["config"]: row for row in compression_report(
+        clustered_vectors(), ["none", "int8", "binary", "pq16", "pca32+int8"], n_queries=100)}
+    assert report["none"]["recall@10"] == 1.0
+    assert report["int8"]["recall@10"] >= 0.98
+    assert report["pq16"]["recall@10"] >= 0.95
+    # 粗排后用 float 向量重排可以找回大部分损失
+    for config in ("binary", "pq16", "pca32+int8"):
+        assert report[config]["recall@10"] > report[config]["recall@10_coarse"]
+        assert report[config]["compression"] > 1
+    # 重排用的 float32 向量始终保存，压缩配置的磁盘占用不会小于不压缩
+    assert report["none"]["disk_bytes"] == report["none"]["index_bytes"]
+    assert report["int8"]["disk_bytes"] == report["none"]["disk_bytes"] + report["int8"]["index_bytes"]
+
+
+def test_parse_config():
+    assert parse_config("pca256+pq32") == {"quantization": "pq", "dims": 256, "reduction": "pca", "pq_subspaces": 32}
+    assert parse_config("truncate512+int8")["reduction"] == "truncate"
+    with pytest.raises(ValueError):
+        parse_config("fp4")
+
+
+def test_reducer_and_pq_round_trip(tmp_path):
+    vectors = clustered_vectors(500)
+    reducer = Reducer.fit(vectors, 16)
+    assert reducer.transform(vectors).shape == (500, 16)
+    reducer.save(str(tmp_path / "reducer.npy"))
+    assert np.allclose(Reducer.load(str(tmp_path / "reducer.npy"), "pca").transform(vectors),
+                       reducer.transform(vectors))
+    pq = ProductQuantizer.fit(vectors, 8)
+    codes = pq.encode(vectors)
+    assert codes.shape == (500, 8) and codes.dtype == np.uint8
+    pq.save(str(tmp_path / "codebooks.npy"))
+    assert np.array_equal(ProductQuantizer.load(str(tmp_path / "codebooks.npy")).encode(vectors), codes)